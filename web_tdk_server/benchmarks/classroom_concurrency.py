@@ -0,0 +1,170 @@
+"""Concurrency benchmark: latency of unrelated endpoints while classrooms are being promoted.
+
+Starts the API with uvicorn against a throw-away SQLite database (or DATABASE_URL if
+given), seeds classrooms with students directly through the models, then measures
+p50/p99 latency of ``GET /`` (no DB) and ``GET /users/me`` (auth + DB) twice: once idle
+and once while ``POST /classrooms/{id}/promote`` runs back to back.
+
+With blocking ``async def`` handlers the probes queue behind each promotion, so their
+p99 is roughly the promotion time; with thread-pool dispatch it stays flat.
+
+Usage:
+    python benchmarks/classroom_concurrency.py --students 400 --classrooms 4 --probes 200
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+
+ADMIN_USERNAME = "bench_admin"
+ADMIN_PASSWORD = "benchpass"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed(database_url: str, classrooms: int, students: int) -> list:
+    """Create a school, an admin and ``classrooms`` rooms of ``students`` each. Returns classroom ids."""
+    os.environ["DATABASE_URL"] = database_url
+    from create_tables import ensure_schema
+    from database.connection import SessionLocal
+    from models.school import School
+    from models.user import User
+    from models.classroom import Classroom, ClassroomStudent
+    from utils.security import hash_password
+
+    ensure_schema()
+    db = SessionLocal()
+    try:
+        school = School(name=f"Bench School {int(time.time())}")
+        db.add(school)
+        db.flush()
+        db.add(User(username=ADMIN_USERNAME, email=None, full_name="Bench Admin",
+                    hashed_password=hash_password(ADMIN_PASSWORD), role="admin", school_id=school.id))
+        student_hash = hash_password("studentpass")
+        classroom_ids = []
+        for c in range(classrooms):
+            room = Classroom(name=f"ป.1/{c + 1}", grade_level="ป.1", room_number=str(c + 1),
+                             semester=1, academic_year="2025", school_id=school.id)
+            db.add(room)
+            db.flush()
+            users = [User(username=f"bench_s{c}_{i}", full_name=f"Student {c}-{i}", hashed_password=student_hash,
+                          role="student", school_id=school.id, grade_level="ป.1") for i in range(students)]
+            db.add_all(users)
+            db.flush()
+            db.add_all([ClassroomStudent(classroom_id=room.id, student_id=u.id) for u in users])
+            classroom_ids.append(room.id)
+        db.commit()
+        return classroom_ids
+    finally:
+        db.close()
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+async def probe(client: httpx.AsyncClient, path: str, headers: dict, count: int, concurrency: int) -> list:
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            start = time.perf_counter()
+            r = await client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            r.raise_for_status()
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    return latencies
+
+
+async def run(base_url: str, classroom_ids: list, probes: int, concurrency: int):
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        r = await client.post("/users/login", data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        results = {}
+        for path in ("/", "/users/me"):
+            results[(path, "idle")] = await probe(client, path, headers, probes, concurrency)
+
+        promote_times = []
+
+        async def promotions():
+            for cid in classroom_ids:
+                start = time.perf_counter()
+                r = await client.post(f"/classrooms/{cid}/promote", headers=headers,
+                                      json={"promotion_type": "end_of_year", "new_grade_level": "ป.2"})
+                r.raise_for_status()
+                promote_times.append((time.perf_counter() - start) * 1000)
+
+        async def probes_during():
+            # give the first promotion a head start so the probes overlap it
+            await asyncio.sleep(0.05)
+            for path in ("/", "/users/me"):
+                results[(path, "promoting")] = await probe(client, path, headers, probes, concurrency)
+
+        await asyncio.gather(promotions(), probes_during())
+
+    print(f"promotion: n={len(promote_times)} mean={sum(promote_times) / max(len(promote_times), 1):.1f}ms")
+    print(f"{'endpoint':<12} {'phase':<10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for (path, phase), samples in results.items():
+        print(f"{path:<12} {phase:<10} {percentile(samples, 50):>8.1f} {percentile(samples, 99):>8.1f} {max(samples):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=400, help="students per classroom")
+    parser.add_argument("--classrooms", type=int, default=4, help="classrooms promoted back to back")
+    parser.add_argument("--probes", type=int, default=200, help="requests per probe endpoint and phase")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if not database_url:
+        tmpdir = tempfile.mkdtemp(prefix="tdk_bench_")
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    classroom_ids = seed(database_url, args.classrooms, args.students)
+
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=database_url)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(base_url + "/", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        asyncio.run(run(base_url, classroom_ids, args.probes, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Synthetic school dataset generator for benchmarks and load tests.
+
+Creates N schools, each with classrooms of students, subjects taught to every
+classroom (with timetable entries), homeroom teachers, and ``weeks`` of weekly
+quizzes plus midterm/final grades and attendance. Rows are inserted through the
+models in bulk, so this works on SQLite files and on MySQL (e.g. a local
+container) alike:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/dataset.py --schools 2 --students 30
+    DATABASE_URL=mysql+pymysql://root:pw@127.0.0.1:3306/tdk_bench python benchmarks/dataset.py
+
+All generated users share the password ``benchpass``. A manifest with the ids and
+usernames the benchmark harness needs is written to ``--manifest``.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BENCH_PASSWORD = "benchpass"
+DEFAULT_MANIFEST = "bench_manifest.json"
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+STATUSES = ["present"] * 17 + ["late", "absent", "sick_leave"]
+
+
+def generate(schools: int = 2, classrooms: int = 4, students: int = 30, subjects: int = 6,
+             weeks: int = 10, seed: int = 42, academic_year: str = "2568") -> dict:
+    """Insert the dataset into DATABASE_URL and return the manifest."""
+    from create_tables import ensure_schema
+    from database.connection import SessionLocal
+    from models.school import School
+    from models.user import User
+    from models.classroom import Classroom, ClassroomStudent
+    from models.classroom_subject import ClassroomSubject
+    from models.subject import Subject
+    from models.subject_student import SubjectStudent
+    from models.schedule import SubjectSchedule
+    from models.homeroom import HomeroomTeacher
+    from models.grade import Grade
+    from models.attendance import Attendance, AttendanceRecord
+    from utils.security import hash_password
+    from utils.ranking import rebuild_all_scores
+
+    ensure_schema()
+    rng = random.Random(seed)
+    hashed = hash_password(BENCH_PASSWORD)
+    run_tag = f"{int(time.time())}{rng.randint(0, 999)}"
+    term_start = date(int(academic_year) - 543 if int(academic_year) > 2400 else int(academic_year), 5, 15)
+    manifest = {"password": BENCH_PASSWORD, "schools": []}
+
+    db = SessionLocal()
+    try:
+        owner = User(username=f"bench_owner_{run_tag}", full_name="Bench Owner", hashed_password=hashed, role="owner")
+        db.add(owner)
+        db.flush()
+        manifest["owner"] = owner.username
+
+        for s in range(schools):
+            school = School(name=f"Bench School {run_tag}-{s + 1}")
+            db.add(school)
+            db.flush()
+
+            admin = User(username=f"bench_admin_{run_tag}_{s}", full_name=f"Admin {s + 1}",
+                         hashed_password=hashed, role="admin", school_id=school.id)
+            teachers = [User(username=f"bench_teacher_{run_tag}_{s}_{t}", full_name=f"Teacher {s + 1}-{t + 1}",
+                             hashed_password=hashed, role="teacher", school_id=school.id)
+                        for t in range(max(subjects, classrooms))]
+            db.add_all([admin] + teachers)
+            db.flush()
+
+            rooms, room_students = [], {}
+            for c in range(classrooms):
+                grade_level = f"ป.{c // 2 + 1}"
+                room = Classroom(name=f"{grade_level}/{c % 2 + 1}", grade_level=grade_level, room_number=str(c % 2 + 1),
+                                 semester=1, academic_year=academic_year, school_id=school.id)
+                db.add(room)
+                db.flush()
+                users = [User(username=f"bench_student_{run_tag}_{s}_{c}_{i}", full_name=f"Student {s + 1}-{c + 1}-{i + 1}",
+                              hashed_password=hashed, role="student", school_id=school.id, grade_level=grade_level)
+                         for i in range(students)]
+                db.add_all(users)
+                db.flush()
+                db.add_all([ClassroomStudent(classroom_id=room.id, student_id=u.id) for u in users])
+                rooms.append(room)
+                room_students[room.id] = [u.id for u in users]
+
+            # one homeroom teacher per grade level
+            for t, level in enumerate(sorted({r.grade_level for r in rooms})):
+                db.add(HomeroomTeacher(teacher_id=teachers[t].id, grade_level=level,
+                                       school_id=school.id, academic_year=academic_year))
+
+            subject_rows = []
+            for j in range(subjects):
+                subj = Subject(name=f"Subject {j + 1}", code=f"S{j + 1:02d}", subject_type="main", teacher_id=teachers[j].id,
+                               school_id=school.id, credits=rng.choice([1, 2, 3]), max_collected_score=70, max_exam_score=30)
+                db.add(subj)
+                subject_rows.append(subj)
+            db.flush()
+
+            all_students = [sid for room in rooms for sid in room_students[room.id]]
+            for j, subj in enumerate(subject_rows):
+                db.add_all([ClassroomSubject(classroom_id=room.id, subject_id=subj.id) for room in rooms])
+                db.add_all([SubjectStudent(subject_id=subj.id, student_id=sid) for sid in all_students])
+                for c, room in enumerate(rooms):
+                    # each (subject, classroom) meets once a week in its own period
+                    period = (j + c) % 7
+                    db.add(SubjectSchedule(subject_id=subj.id, teacher_id=subj.teacher_id, classroom_id=room.id,
+                                           day_of_week=DAYS[(j + c) % len(DAYS)],
+                                           start_time=dtime(8 + period, 0), end_time=dtime(8 + period, 50)))
+            db.flush()
+
+            grade_rows = []
+            for subj in subject_rows:
+                for room in rooms:
+                    titles = [(f"Quiz week {w + 1}", 10.0) for w in range(weeks)] + [("Midterm", 20.0), ("Final", 30.0)]
+                    for title, max_score in titles:
+                        for sid in room_students[room.id]:
+                            grade_rows.append(Grade(subject_id=subj.id, student_id=sid, classroom_id=room.id, title=title,
+                                                    max_score=max_score, grade=round(rng.uniform(0.4, 1.0) * max_score, 1)))
+            db.bulk_save_objects(grade_rows)
+
+            for subj in subject_rows:
+                for w in range(weeks):
+                    day = term_start + timedelta(weeks=w)
+                    session = Attendance(subject_id=subj.id, date=day)
+                    db.add(session)
+                    db.flush()
+                    db.bulk_save_objects([
+                        AttendanceRecord(attendance_id=session.id, subject_id=subj.id, student_id=sid,
+                                         date=day, status=rng.choice(STATUSES))
+                        for sid in all_students
+                    ])
+            db.commit()
+
+            first_room = rooms[0]
+            manifest["schools"].append({
+                "school_id": school.id,
+                "admin": admin.username,
+                "homeroom_teacher": teachers[0].username,
+                "subject_teacher": teachers[0].username,
+                "student": f"bench_student_{run_tag}_{s}_0_0",
+                "student_id": room_students[first_room.id][0],
+                "classroom_id": first_room.id,
+                "subject_id": subject_rows[0].id if subject_rows else None,
+            })
+            print(f"school {s + 1}/{schools}: {len(rooms)} classrooms, {len(all_students)} students, "
+                  f"{len(subject_rows)} subjects, {len(grade_rows)} grades")
+
+        # materialize ranking aggregates like a production tree would have
+        for entry in manifest["schools"]:
+            rebuild_all_scores(db, school_id=entry["school_id"])
+    finally:
+        db.close()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic school dataset into DATABASE_URL")
+    parser.add_argument("--schools", type=int, default=2)
+    parser.add_argument("--classrooms", type=int, default=4, help="classrooms per school")
+    parser.add_argument("--students", type=int, default=30, help="students per classroom")
+    parser.add_argument("--subjects", type=int, default=6, help="subjects per school (taught to every classroom)")
+    parser.add_argument("--weeks", type=int, default=10, help="weeks of quizzes and attendance")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        parser.error("DATABASE_URL must be set (e.g. sqlite:////tmp/bench.db)")
+    start = time.perf_counter()
+    manifest = generate(args.schools, args.classrooms, args.students, args.subjects, args.weeks, args.seed)
+    with open(args.manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"done in {time.perf_counter() - start:.1f}s, manifest written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Login throughput benchmark: logins/second (and per core) with inline vs process-pool hashing.
+
+For every HASH_WORKERS value given, starts the API with uvicorn against a throw-away
+SQLite database (or DATABASE_URL), then fires ``POST /users/login`` with
+``--concurrency`` clients for ``--seconds``. ``GET /`` is probed meanwhile, to show
+whether hashing starves unrelated requests.
+
+HASH_WORKERS=0 hashes in the request threads (GIL-bound: about one core no matter
+how many threads); N>0 hashes in N processes.
+
+Usage:
+    python benchmarks/login_throughput.py --workers 0 2 4 --seconds 10 --rounds 29000
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+
+from classroom_concurrency import _free_port, percentile  # noqa: E402
+
+PASSWORD = "benchpass"
+
+
+def seed(database_url: str, users: int, rounds: int) -> list:
+    """Create ``users`` teachers sharing one password; returns their usernames."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["PASSWORD_HASH_ROUNDS"] = str(rounds)
+    from create_tables import ensure_schema
+    from database.connection import SessionLocal
+    from models.user import User
+    from utils.security import hash_password
+
+    ensure_schema()
+    tag = int(time.time())
+    hashed = hash_password(PASSWORD)
+    names = [f"bench_login_{tag}_{i}" for i in range(users)]
+    db = SessionLocal()
+    try:
+        db.add_all([User(username=n, full_name=n, hashed_password=hashed, role="teacher") for n in names])
+        db.commit()
+    finally:
+        db.close()
+    return names
+
+
+async def run(base_url: str, usernames: list, seconds: float, concurrency: int) -> dict:
+    logins, probes = [], []
+    deadline = time.perf_counter() + seconds
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def login_worker(i):
+            n = i
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                r = await client.post("/users/login", data={"username": usernames[n % len(usernames)], "password": PASSWORD})
+                r.raise_for_status()
+                logins.append((time.perf_counter() - start) * 1000)
+                n += concurrency
+
+        async def probe_worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/")
+                probes.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.02)
+
+        started = time.perf_counter()
+        await asyncio.gather(probe_worker(), *(login_worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"logins": len(logins), "elapsed": elapsed, "login_p50": percentile(logins, 50),
+            "login_p99": percentile(logins, 99), "probe_p99": percentile(probes, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1],
+                        help="HASH_WORKERS values to compare (0 = inline)")
+    parser.add_argument("--rounds", type=int, default=29000, help="PASSWORD_HASH_ROUNDS")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='tdk_bench_'), 'bench.db')}"
+    usernames = seed(database_url, args.users, args.rounds)
+    cores = os.cpu_count() or 1
+
+    print(f"rounds={args.rounds} cores={cores} concurrency={args.concurrency}")
+    print(f"{'HASH_WORKERS':>12} {'logins/s':>9} {'per core':>9} {'p50 ms':>8} {'p99 ms':>8} {'GET / p99':>10}")
+    for workers in args.workers:
+        port = _free_port()
+        env = dict(os.environ, DATABASE_URL=database_url, HASH_WORKERS=str(workers),
+                   PASSWORD_HASH_ROUNDS=str(args.rounds))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=SERVER_DIR, env=env
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for _ in range(100):
+                try:
+                    httpx.get(base_url + "/", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.1)
+            # warm up (spawns the hashing processes)
+            httpx.post(base_url + "/users/login", data={"username": usernames[0], "password": PASSWORD}, timeout=60)
+            r = asyncio.run(run(base_url, usernames, args.seconds, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+        rate = r["logins"] / r["elapsed"]
+        used_cores = min(cores, workers) if workers > 0 else 1
+        print(f"{workers:>12} {rate:>9.1f} {rate / used_cores:>9.1f} {r['login_p50']:>8.1f} "
+              f"{r['login_p99']:>8.1f} {r['probe_p99']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
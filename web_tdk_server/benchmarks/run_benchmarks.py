@@ -0,0 +1,134 @@
+"""Benchmark harness for the heavy read endpoints.
+
+Runs each endpoint ``--iterations`` times in-process (FastAPI TestClient) against
+the dataset described by a manifest from ``benchmarks/dataset.py`` and prints
+p50/p95/p99 latency plus the SQL statement count per request (from the
+X-DB-Query-Count header of the query metrics middleware):
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/dataset.py --manifest /tmp/bench.json
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/run_benchmarks.py --manifest /tmp/bench.json --json before.json
+    ... change code ...
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/run_benchmarks.py --manifest /tmp/bench.json --compare before.json
+
+With ``--compare`` the exit status is 1 when an endpoint's p95 got slower than
+``--tolerance`` (default 20%) or it runs more statements than the baseline, so
+the run can gate a PR.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dataset import DEFAULT_MANIFEST  # noqa: E402
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def endpoints(manifest: dict) -> list:
+    """(name, login username, path) for every benchmarked endpoint."""
+    school = manifest["schools"][0]
+    return [
+        ("transcript", school["admin"], f"/grades/student/{school['student_id']}/transcript"),
+        ("classroom_ranking", school["admin"], f"/grades/classroom/{school['classroom_id']}/ranking"),
+        ("school_ranking", school["admin"], f"/grades/school/{school['school_id']}/ranking"),
+        ("homeroom_summary", school["homeroom_teacher"], "/homeroom/my-classrooms/summary"),
+        ("owner_stats", manifest["owner"], "/owner/schools"),
+        ("subject_students", school["admin"], f"/subjects/{school['subject_id']}/students"),
+        ("schedule_teacher", school["subject_teacher"], "/schedule/teacher"),
+        ("schedule_student", school["student"], "/schedule/student"),
+        ("schedule_assignments", school["admin"], "/schedule/assignments"),
+    ]
+
+
+def run(manifest: dict, iterations: int, warmup: int) -> dict:
+    from fastapi.testclient import TestClient
+    from main import app
+    from utils import request_metrics
+
+    request_metrics.QUERY_METRICS_HEADERS = True
+    request_metrics.QUERY_BUDGET = 0
+    client = TestClient(app)
+    tokens = {}
+    results = {}
+    for name, username, path in endpoints(manifest):
+        if username not in tokens:
+            r = client.post("/users/login", data={"username": username, "password": manifest["password"]})
+            r.raise_for_status()
+            tokens[username] = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        headers = tokens[username]
+        for _ in range(warmup):
+            client.get(path, headers=headers)
+        latencies, statements = [], []
+        status = None
+        for _ in range(iterations):
+            start = time.perf_counter()
+            r = client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statements.append(int(r.headers.get(request_metrics.QUERY_COUNT_HEADER, 0)))
+            status = r.status_code
+        results[name] = {
+            "path": path,
+            "status": status,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "statements": max(statements),
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of ``results`` against ``baseline`` as printable strings."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["statements"] > before["statements"]:
+            regressions.append(f"{name}: statements {before['statements']} -> {current['statements']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark heavy read endpoints against a generated dataset")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--json", dest="json_out", default=None, help="write results to this file")
+    parser.add_argument("--compare", default=None, help="baseline results file from a previous --json run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown vs the baseline")
+    args = parser.parse_args()
+
+    with open(args.manifest, encoding="utf-8") as f:
+        manifest = json.load(f)
+    results = run(manifest, args.iterations, args.warmup)
+
+    print(f"{'endpoint':<22} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['status']:>6} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['statements']:>8}")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Timetable generator benchmark on a synthetic school (no database needed).
+
+Builds a week of ``--days`` x ``--periods`` periods and ``--classrooms`` classrooms. Every
+classroom takes the same subject mix (periods per week from ``--mix``). Each subject
+area is taught by as few teachers as can carry it at ``--teacher-load`` periods a
+week, and every teacher has ``--blocked`` random periods unavailable. Then runs
+utils.timetable_generator.solve with the given time budget for ``--repeat`` seeds
+and reports time to a conflict-free timetable, unplaced lessons and soft cost.
+
+Usage:
+    python benchmarks/timetable_generator.py --classrooms 30 --budget 10 --repeat 3
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from datetime import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+# the solver needs no database, but importing utils pulls in the models (and their engine)
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from utils.timetable_generator import Lesson, Period, Problem, solve  # noqa: E402
+
+
+def synthetic_problem(classrooms: int, days: int, periods_per_day: int, mix: list,
+                      teacher_load: int, blocked: int, seed: int) -> Problem:
+    rng = random.Random(seed)
+    periods = [Period(day=d + 1, start=time(8 + h), end=time(9 + h)) for d in range(days) for h in range(periods_per_day)]
+    lessons = []
+    teacher_ids = []
+    next_teacher = 1
+    for subject_id, per_week in enumerate(mix, start=1):
+        # classrooms per teacher so that no teacher exceeds teacher_load periods
+        per_teacher = max(1, teacher_load // per_week)
+        area = [next_teacher + k for k in range(math.ceil(classrooms / per_teacher))]
+        next_teacher += len(area)
+        teacher_ids.extend(area)
+        for c in range(classrooms):
+            teacher = area[c // per_teacher]
+            lessons.extend(Lesson(classroom_id=c + 1, subject_id=subject_id, teacher_id=teacher) for _ in range(per_week))
+    unavailable = {t: set(rng.sample(range(len(periods)), blocked)) for t in teacher_ids} if blocked else {}
+    return Problem(periods=periods, lessons=lessons, teacher_unavailable=unavailable)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classrooms', type=int, default=30)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--periods', type=int, default=8, help='periods per day')
+    parser.add_argument('--mix', default='6,5,5,4,4,3,3,2,2', help='periods per week of each subject')
+    parser.add_argument('--teacher-load', type=int, default=30, help='max periods a week per teacher')
+    parser.add_argument('--blocked', type=int, default=2, help='unavailable periods per teacher')
+    parser.add_argument('--budget', type=float, default=10.0, help='time budget per run (seconds)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    mix = [int(x) for x in args.mix.split(',')]
+    problem = synthetic_problem(args.classrooms, args.days, args.periods, mix, args.teacher_load, args.blocked, args.seed)
+    teachers = len({l.teacher_id for l in problem.lessons})
+    results = []
+    for run in range(args.repeat):
+        solution = solve(problem, time_budget=args.budget, seed=args.seed + run)
+        results.append({
+            'seed': args.seed + run,
+            'elapsed_s': round(solution.elapsed, 3),
+            'complete': solution.complete,
+            'unplaced': sum(1 for p in solution.assignment if p is None),
+            'soft_cost': solution.soft_cost,
+            'iterations': solution.iterations,
+        })
+
+    if args.json:
+        print(json.dumps({'classrooms': args.classrooms, 'lessons': len(problem.lessons), 'teachers': teachers,
+                          'periods': len(problem.periods), 'runs': results}, indent=2))
+        return
+    print(f"{args.classrooms} classrooms, {teachers} teachers, {len(problem.lessons)} lessons, "
+          f"{len(problem.periods)} periods/week, budget {args.budget}s")
+    print(f"{'seed':>6} {'elapsed_s':>10} {'complete':>9} {'unplaced':>9} {'soft':>6} {'iterations':>11}")
+    for r in results:
+        print(f"{r['seed']:>6} {r['elapsed_s']:>10} {str(r['complete']):>9} {r['unplaced']:>9} "
+              f"{r['soft_cost']:>6} {r['iterations']:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,9 @@ from models import user, school, announcement, document, grade, subject, schedul
 from models import homeroom  # เพิ่ม homeroom model
 from models import classroom  # เพิ่ม classroom model
 from models import password_reset_request  # เพิ่ม password_reset_request model
+from models import attendance  # เพิ่ม attendance_records model
 
-from sqlalchemy import inspect, text
+from sqlalchemy import inspect, text, UniqueConstraint
 from sqlalchemy import types as sqltypes
 
 
@@ -55,6 +56,9 @@ def ensure_schema():
             if not sql_type:
                 print(f"Skipping column '{col.name}' on '{table_name}': unsupported type {type(col.type)}")
                 continue
+            if col.computed is not None:
+                # generated column (e.g. grades.classroom_key)
+                sql_type += f" AS ({col.computed.sqltext}) {'STORED' if col.computed.persisted else 'VIRTUAL'}"
             nullable = 'NULL' if col.nullable else 'NOT NULL'
             # Attempt to set a simple default if present
             default_clause = ''
@@ -68,6 +72,84 @@ def ensure_schema():
             except Exception as e:
                 print(f"Failed to add column '{col.name}' to '{table_name}': {e}")
 
+    # Create composite / unique indexes declared in the models that existing tables lack
+    ensure_indexes()
+
+    # Move legacy attendances.present_json blobs into attendance_records (no-op once done)
+    from database.connection import SessionLocal
+    from utils.attendance import backfill_attendance_records
+    db = SessionLocal()
+    try:
+        migrated = backfill_attendance_records(db)
+        if migrated:
+            print(f"Backfilled attendance_records from {migrated} attendance sessions.")
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to backfill attendance_records: {e}")
+    finally:
+        db.close()
+
+    # Seed the activity event log from the source tables on first run (no-op afterwards)
+    from utils.activity import backfill_activity_events
+    db = SessionLocal()
+    try:
+        seeded = backfill_activity_events(db)
+        if seeded:
+            print(f"Seeded activity_events with {seeded} events.")
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to seed activity_events: {e}")
+    finally:
+        db.close()
+
+
+def ensure_indexes():
+    """Create indexes and unique constraints from the models that are missing in the DB.
+
+    A unique constraint is skipped (with a message) while the table still has duplicate
+    rows for its columns; remove the duplicates and restart to create it.
+    """
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    for table_name, table_obj in Base.metadata.tables.items():
+        if table_name not in existing_tables:
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table_name)}
+        existing |= {uc['name'] for uc in inspector.get_unique_constraints(table_name) if uc.get('name')}
+
+        wanted = []
+        for ix in table_obj.indexes:
+            wanted.append((ix.name, [c.name for c in ix.columns], ix.unique))
+        for cons in table_obj.constraints:
+            if isinstance(cons, UniqueConstraint) and cons.name:
+                wanted.append((cons.name, [c.name for c in cons.columns], True))
+
+        for name, columns, unique in wanted:
+            if name in existing:
+                continue
+            if unique:
+                not_null = " AND ".join(f"{c} IS NOT NULL" for c in columns)
+                cols = ", ".join(columns)
+                dup = None
+                with engine.connect() as conn:
+                    dup = conn.execute(text(
+                        f"SELECT {cols}, COUNT(*) FROM {table_name} WHERE {not_null} "
+                        f"GROUP BY {cols} HAVING COUNT(*) > 1 LIMIT 1"
+                    )).first()
+                if dup is not None:
+                    hint = " (run python dedupe_grades.py)" if table_name == 'grades' else ""
+                    print(f"Skipping unique index '{name}' on '{table_name}': duplicate rows exist (e.g. {tuple(dup[:-1])}){hint}")
+                    continue
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(
+                        f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table_name} ({', '.join(columns)})"
+                    ))
+                    conn.commit()
+                print(f"Created {'unique ' if unique else ''}index '{name}' on '{table_name}'.")
+            except Exception as e:
+                print(f"Failed to create index '{name}' on '{table_name}': {e}")
+
 
 if __name__ == "__main__":
     ensure_schema()
@@ -5,22 +5,57 @@ from sqlalchemy import inspect
 from dotenv import load_dotenv
 import os
 
+from database.pool_metrics import TimedQueuePool
+
 load_dotenv()  # Load environment variables from .env file
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Connection pool (per uvicorn worker process). Sizing guidance:
+#   DB_POOL_SIZE + DB_MAX_OVERFLOW <= THREADPOOL_SIZE (threads that can hold a connection)
+#   WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) < MySQL max_connections (leave headroom)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_LIFO = os.getenv("DB_POOL_LIFO", "true").lower() == "true"
+
+
+def engine_kwargs(url: str) -> dict:
+    """create_engine options for ``url`` (pool sizing is skipped for in-memory SQLite)."""
+    kwargs = {
+        "echo": False,  # Set to False in production
+        "pool_pre_ping": True,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if url and url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") == "sqlite:"):
+        return kwargs
+    kwargs.update(
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_use_lifo=DB_POOL_LIFO,
+    )
+    return kwargs
+
+
 # Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,  # Set to False in production
-    pool_pre_ping=True,
-    pool_recycle=3600
-)
+engine = create_engine(DATABASE_URL, **engine_kwargs(DATABASE_URL))
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica for read-only reporting endpoints; falls back to the primary
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+if DATABASE_READ_URL:
+    read_engine = create_engine(DATABASE_READ_URL, **engine_kwargs(DATABASE_READ_URL))
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -32,6 +67,20 @@ def get_db():
     finally:
         db.close()
 
+# Dependency for read-only endpoints (replica when DATABASE_READ_URL is set).
+# Data may lag the primary slightly; never write through this session.
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def is_read_replica(db) -> bool:
+    """True when ``db`` is bound to a separate read replica (writes must go to the primary)."""
+    return read_engine is not engine and db.get_bind() is read_engine
+
 def table_exists(table_name):
     inspector = inspect(engine)
     return table_name in inspector.get_table_names()
@@ -0,0 +1,82 @@
+"""Connection pool instrumentation: checkout wait time, active connections, overflow use."""
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Process-wide counters updated by ``TimedQueuePool`` (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.peak_checked_out = 0
+            self.peak_overflow = 0
+
+    def record_checkout(self, wait_ms: float, checked_out: int, overflow: int):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def record_timeout(self, wait_ms: float):
+        with self._lock:
+            self.timeouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def snapshot(self, pool=None) -> dict:
+        with self._lock:
+            data = {
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.timeouts,
+                'checkout_wait_ms_total': round(self.total_wait_ms, 3),
+                'checkout_wait_ms_avg': round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'checkout_wait_ms_max': round(self.max_wait_ms, 3),
+                'peak_checked_out': self.peak_checked_out,
+                'peak_overflow': self.peak_overflow,
+            }
+        data.update(pool_state(pool))
+        return data
+
+
+def pool_state(pool) -> dict:
+    """Live size/usage of a QueuePool (empty for other pool classes)."""
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        'pool_size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        # negative while the pool has not opened pool_size connections yet
+        'overflow': max(pool.overflow(), 0),
+    }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout((time.perf_counter() - start) * 1000)
+            raise
+        pool_metrics.record_checkout((time.perf_counter() - start) * 1000, self.checkedout(), max(self.overflow(), 0))
+        return entry
@@ -0,0 +1,100 @@
+import argparse
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from sqlalchemy import func
+    from database.connection import SessionLocal
+    import models  # noqa: F401  register all models
+    from models.grade import Grade as GradeModel
+    from utils.ranking import refresh_student_scores
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you have run: pip install -r requirements.txt")
+    sys.exit(1)
+
+GRADE_COLUMNS = (GradeModel.id, GradeModel.subject_id, GradeModel.student_id, GradeModel.classroom_id,
+                 GradeModel.title, GradeModel.grade, GradeModel.updated_at)
+
+
+def pick_keeper(rows):
+    """The row to keep for one grade cell: a scored row first, then the most recently updated."""
+    return max(rows, key=lambda r: (r.grade is not None, r.updated_at is not None, r.updated_at or 0, r.id))
+
+
+def find_duplicate_cells(db):
+    """Grade cells (subject, student, title, classroom or none) that have more than one row."""
+    cell_key = (GradeModel.subject_id, GradeModel.student_id, GradeModel.title,
+                func.coalesce(GradeModel.classroom_id, 0))
+    dup_cells = db.query(*cell_key).filter(GradeModel.title.isnot(None)).group_by(*cell_key).having(
+        func.count(GradeModel.id) > 1
+    ).subquery()
+    rows = db.query(*GRADE_COLUMNS).join(
+        dup_cells,
+        (GradeModel.subject_id == dup_cells.c[0]) & (GradeModel.student_id == dup_cells.c[1])
+        & (GradeModel.title == dup_cells.c[2]) & (func.coalesce(GradeModel.classroom_id, 0) == dup_cells.c[3])
+    ).order_by(GradeModel.id).all()
+
+    cells = defaultdict(list)
+    for row in rows:
+        cells[(row.subject_id, row.student_id, row.title, row.classroom_id or 0)].append(row)
+    return cells
+
+
+def dedupe_grades(apply=False):
+    """Report (and with ``apply`` delete) duplicate grade rows so the grade unique key can be created"""
+    db = SessionLocal()
+    try:
+        cells = find_duplicate_cells(db)
+        if not cells:
+            print("✓ No duplicate grade cells")
+            return True
+
+        delete_ids = []
+        students = set()
+        for (subject_id, student_id, title, classroom_key), rows in sorted(cells.items(), key=lambda c: c[0][:2]):
+            keep = pick_keeper(rows)
+            drop = [r for r in rows if r.id != keep.id]
+            delete_ids.extend(r.id for r in drop)
+            students.add(student_id)
+            print(f"subject={subject_id} student={student_id} classroom={classroom_key or '-'} title={title!r}: "
+                  f"keep id={keep.id} grade={keep.grade}; delete "
+                  + ", ".join(f"id={r.id} grade={r.grade}" for r in drop))
+
+        print(f"{len(cells)} duplicate cells, {len(delete_ids)} rows to delete")
+        if not apply:
+            print("Dry run: nothing deleted. Back up the grades table, then re-run with --apply")
+            return True
+
+        for start in range(0, len(delete_ids), 500):
+            db.query(GradeModel).filter(GradeModel.id.in_(delete_ids[start:start + 500])).delete(synchronize_session=False)
+        refresh_student_scores(db, students)
+        db.commit()
+        print(f"✓ Deleted {len(delete_ids)} rows and refreshed rankings of {len(students)} students")
+    except Exception as e:
+        print(f"✗ Error deduplicating grades: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+    # now that the duplicates are gone, create the missing unique key
+    from create_tables import ensure_indexes
+    ensure_indexes()
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove duplicate grade cells before creating their unique key")
+    parser.add_argument("--apply", action="store_true", help="Delete the duplicates (default: dry run)")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Deduplicating Grades" + ("" if args.apply else " (dry run)"))
+    print("=" * 50)
+    success = dedupe_grades(args.apply)
+    sys.exit(0 if success else 1)
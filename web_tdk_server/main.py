@@ -1,4 +1,5 @@
 from contextlib import asynccontextmanager
+import anyio
 from fastapi import FastAPI
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,6 +16,10 @@ from routers.absence import router as absence_router
 from routers.homeroom import router as homeroom_router
 from routers.classroom import router as classroom_router
 from routers.admin import router as admin_router
+from routers.metrics import router as metrics_router
+from utils.request_metrics import QueryMetricsMiddleware, QUERY_COUNT_HEADER, DB_TIME_HEADER
+from utils.hashing import shutdown_pool as shutdown_hash_pool
+from utils.mailer import EMAIL_WORKER_ENABLED, mail_enabled, outbox_worker
 import os
 
 # import ฟังก์ชันสร้างตาราง
@@ -22,8 +27,14 @@ from database.connection import create_all_tables
 # Use the create_tables.ensure_schema to automatically add any new columns
 from create_tables import ensure_schema
 
+# Worker threads for sync (def) endpoints; every DB-bound endpoint runs here, so keep it
+# in line with the DB connection pool. anyio's default is 40.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     print("Initializing database schema...")
     # Ensure tables exist and add missing columns if any (safe to run multiple times)
     try:
@@ -37,7 +48,11 @@ async def lifespan(app: FastAPI):
         print("Database schema ensured successfully!")
     except Exception as e:
         print(f"Warning: failed to ensure schema changes: {e}")
+    if EMAIL_WORKER_ENABLED and mail_enabled():
+        outbox_worker.start()
     yield
+    outbox_worker.stop()
+    shutdown_hash_pool()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -59,8 +74,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", QUERY_COUNT_HEADER, DB_TIME_HEADER],
 )
 
+# Per-request SQL statement counts / DB time (headers, logs, /metrics, query budget)
+app.add_middleware(QueryMetricsMiddleware)
+
 # Mount static files directory สำหรับให้ serve ไฟล์อัพโหลด (logos)
 if not os.path.exists("uploads"):
     os.makedirs("uploads")
@@ -80,6 +99,7 @@ app.include_router(absence_router)
 app.include_router(homeroom_router)
 app.include_router(classroom_router)
 app.include_router(admin_router)
+app.include_router(metrics_router)
 
 @app.get("/", tags=["root"])
 def read_root():
@@ -0,0 +1,5 @@
+-- Migration: indexes for the absence listing (status filter / per-student, ordered by date)
+-- create_tables.ensure_schema() creates these on startup when missing.
+
+CREATE INDEX ix_absences_status_date ON absences (status, absence_date);
+CREATE INDEX ix_absences_student_date ON absences (student_id, absence_date);
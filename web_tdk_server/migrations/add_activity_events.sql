@@ -0,0 +1,17 @@
+-- Migration: append-only activity event log for the owner activity feed
+-- Rows are written by the announcement, subject, attendance and grade routers;
+-- school_name is denormalized so the feed needs no joins.
+
+CREATE TABLE IF NOT EXISTS activity_events (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    event_type VARCHAR(30) NOT NULL,
+    school_id INTEGER NULL,
+    school_name VARCHAR(255) NULL,
+    title VARCHAR(255) NOT NULL,
+    content TEXT NULL,
+    actor_id INTEGER NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_activity_events_school_id_id (school_id, id),
+    INDEX ix_activity_events_type_id (event_type, id),
+    INDEX ix_activity_events_school_type_id (school_id, event_type, id)
+);
@@ -0,0 +1,20 @@
+-- Migration: normalized per-student attendance (replaces attendances.present_json)
+-- Existing present_json blobs (dict and legacy list formats) are moved into this table
+-- by create_tables.ensure_schema() on startup, or manually with: python create_tables.py
+
+CREATE TABLE IF NOT EXISTS attendance_records (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    attendance_id INTEGER NOT NULL,
+    subject_id INTEGER NOT NULL,
+    student_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (attendance_id) REFERENCES attendances(id),
+    FOREIGN KEY (subject_id) REFERENCES subjects(id),
+    FOREIGN KEY (student_id) REFERENCES users(id),
+    UNIQUE KEY uq_attendance_record_student_subject_date (student_id, subject_id, date),
+    INDEX ix_attendance_records_attendance_id (attendance_id),
+    INDEX ix_attendance_records_subject_id (subject_id)
+);
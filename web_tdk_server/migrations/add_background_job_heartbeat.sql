@@ -0,0 +1,6 @@
+-- Migration: heartbeat of background jobs
+-- update_job() sets heartbeat_at (UTC) on every progress report. A queued/running job
+-- without a heartbeat for JOB_STALE_SECONDS (its worker process died) is marked failed,
+-- so it no longer blocks a new school promotion.
+
+ALTER TABLE background_jobs ADD COLUMN heartbeat_at TIMESTAMP NULL;
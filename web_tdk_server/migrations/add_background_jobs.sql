@@ -0,0 +1,21 @@
+-- Migration: background jobs with pollable progress (bulk user import, ...)
+-- Per-row errors are kept as JSON so the error report can be downloaded later.
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    job_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    school_id INTEGER NULL,
+    created_by INTEGER NULL,
+    total INTEGER NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    succeeded INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    message TEXT NULL,
+    result_json MEDIUMTEXT NULL,
+    errors_json MEDIUMTEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    INDEX ix_background_jobs_school_type (school_id, job_type)
+);
@@ -0,0 +1,28 @@
+-- Migration: composite indexes matching the hot query patterns + natural-key uniqueness
+-- create_tables.ensure_schema() creates any of these that are missing on startup
+-- (unique ones are skipped while duplicate rows exist).
+-- Check for duplicates before adding the unique keys:
+--   SELECT subject_id, date, COUNT(*) FROM attendances GROUP BY subject_id, date HAVING COUNT(*) > 1;
+-- (the grades natural key is added by add_grade_classroom_key.sql, which removes duplicates first)
+
+-- grades: assignment lookups
+CREATE INDEX ix_grades_subject_title_classroom ON grades (subject_id, title, classroom_id);
+
+-- attendances: one session per subject per day
+ALTER TABLE attendances ADD UNIQUE KEY uq_attendance_subject_date (subject_id, date);
+
+-- subject_schedules: teacher conflict checks, classroom timetable, FK indexes
+CREATE INDEX ix_subject_schedules_teacher_day_time ON subject_schedules (teacher_id, day_of_week, start_time, end_time);
+CREATE INDEX ix_subject_schedules_classroom_day ON subject_schedules (classroom_id, day_of_week);
+CREATE INDEX ix_subject_schedules_subject_id ON subject_schedules (subject_id);
+CREATE INDEX ix_subject_schedules_schedule_slot_id ON subject_schedules (schedule_slot_id);
+
+-- schedule_slots: per-school slot listing
+CREATE INDEX ix_schedule_slots_school_day ON schedule_slots (school_id, day_of_week);
+
+-- classroom_students: active enrollments by student / by classroom
+CREATE INDEX ix_classroom_students_student_active ON classroom_students (student_id, is_active);
+CREATE INDEX ix_classroom_students_classroom_active ON classroom_students (classroom_id, is_active);
+
+-- users: per-school role listings and counts
+CREATE INDEX ix_users_school_role ON users (school_id, role);
@@ -0,0 +1,19 @@
+-- Migration: email outbox drained by a background worker (absence notifications, password reset)
+-- Requests only insert rows; the worker claims due rows with claim_token and sends them in batches.
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    to_addrs TEXT NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL,
+    claim_token VARCHAR(64) NULL,
+    claimed_at DATETIME NULL,
+    last_error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME NULL,
+    INDEX ix_email_outbox_status_next_attempt (status, next_attempt_at),
+    INDEX ix_email_outbox_claim_token (claim_token)
+);
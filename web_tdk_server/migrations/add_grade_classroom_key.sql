@@ -0,0 +1,17 @@
+-- Migration: natural key of a grade cell that also covers grades without a classroom
+-- MySQL treats NULLs as distinct in unique keys, so a key on the nullable classroom_id
+-- never constrained /grades/bulk saves without a classroom. classroom_key is a generated
+-- column (classroom_id, or 0) used in the key instead.
+-- create_tables.ensure_schema() does the same on startup.
+
+-- 1. Generated key column
+ALTER TABLE grades ADD COLUMN classroom_key INTEGER AS (COALESCE(classroom_id, 0)) VIRTUAL NOT NULL;
+
+-- 2. Unique key. This fails while duplicate cells exist; review and remove them first with
+--      python dedupe_grades.py            (dry run: lists the rows it would delete)
+--      python dedupe_grades.py --apply    (keeps the scored, most recently updated row per cell)
+--    then re-run this migration (or restart the app).
+ALTER TABLE grades ADD UNIQUE KEY uq_grade_subject_student_title_classroom_key (subject_id, student_id, title, classroom_key);
+
+-- 3. The old key (from add_composite_indexes.sql) is covered by the new one
+ALTER TABLE grades DROP INDEX uq_grade_subject_student_title_classroom;
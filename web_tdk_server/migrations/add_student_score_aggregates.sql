@@ -0,0 +1,19 @@
+-- Migration: materialized per-student score aggregates for classroom/school ranking
+-- scope_classroom_id = 0 means school-wide, otherwise the classroom the scores are filtered to
+-- Populate after running: python rebuild_rankings.py
+
+CREATE TABLE IF NOT EXISTS student_score_aggregates (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    student_id INTEGER NOT NULL,
+    school_id INTEGER NULL,
+    scope_classroom_id INTEGER NOT NULL DEFAULT 0,
+    total_score FLOAT NOT NULL DEFAULT 0,
+    total_max_score FLOAT NOT NULL DEFAULT 0,
+    average_score FLOAT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES users(id),
+    FOREIGN KEY (school_id) REFERENCES schools(id),
+    UNIQUE KEY uq_student_score_scope (student_id, scope_classroom_id),
+    INDEX ix_student_score_scope_total (scope_classroom_id, total_score),
+    INDEX ix_student_score_school_scope_total (school_id, scope_classroom_id, total_score)
+);
@@ -0,0 +1,40 @@
+-- Migration: materialized timetables (per student / teacher / classroom) with ETags
+-- Rows are rebuilt lazily on read after timetable_generations.generation changes for the school.
+
+CREATE TABLE IF NOT EXISTS timetable_entries (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    owner_type VARCHAR(10) NOT NULL,
+    owner_id INTEGER NOT NULL,
+    subject_schedule_id INTEGER NOT NULL,
+    subject_id INTEGER NOT NULL,
+    subject_name VARCHAR(150) NULL,
+    subject_code VARCHAR(50) NULL,
+    teacher_id INTEGER NULL,
+    teacher_name VARCHAR(100) NULL,
+    classroom_id INTEGER NULL,
+    classroom_name VARCHAR(100) NULL,
+    schedule_slot_id INTEGER NULL,
+    day_of_week VARCHAR(10) NULL,
+    start_time TIME NULL,
+    end_time TIME NULL,
+    slot_day_of_week VARCHAR(10) NULL,
+    slot_start_time TIME NULL,
+    slot_end_time TIME NULL,
+    day_index INTEGER NOT NULL,
+    INDEX ix_timetable_entries_owner_day_time (owner_type, owner_id, day_index, start_time)
+);
+
+CREATE TABLE IF NOT EXISTS timetable_states (
+    owner_type VARCHAR(10) NOT NULL,
+    owner_id INTEGER NOT NULL,
+    school_key INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    etag VARCHAR(64) NOT NULL,
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (owner_type, owner_id)
+);
+
+CREATE TABLE IF NOT EXISTS timetable_generations (
+    school_key INTEGER NOT NULL PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,59 @@
+-- Migration: store day_of_week as '0'..'6' (0=Sunday) in schedule tables
+-- Older rows may hold day names ('monday', 'Mon', Thai names); the API now writes digits only
+-- and the conflict checks compare normalized days.
+
+UPDATE schedule_slots
+SET day_of_week = CASE LOWER(TRIM(day_of_week))
+        WHEN 'sunday' THEN '0'
+        WHEN 'sun' THEN '0'
+        WHEN 'อาทิตย์' THEN '0'
+        WHEN 'monday' THEN '1'
+        WHEN 'mon' THEN '1'
+        WHEN 'จันทร์' THEN '1'
+        WHEN 'tuesday' THEN '2'
+        WHEN 'tue' THEN '2'
+        WHEN 'อังคาร' THEN '2'
+        WHEN 'wednesday' THEN '3'
+        WHEN 'wed' THEN '3'
+        WHEN 'พุธ' THEN '3'
+        WHEN 'thursday' THEN '4'
+        WHEN 'thu' THEN '4'
+        WHEN 'พฤหัสบดี' THEN '4'
+        WHEN 'พฤหัส' THEN '4'
+        WHEN 'friday' THEN '5'
+        WHEN 'fri' THEN '5'
+        WHEN 'ศุกร์' THEN '5'
+        WHEN 'saturday' THEN '6'
+        WHEN 'sat' THEN '6'
+        WHEN 'เสาร์' THEN '6'
+        ELSE day_of_week
+    END
+WHERE day_of_week NOT IN ('0', '1', '2', '3', '4', '5', '6');
+
+UPDATE subject_schedules
+SET day_of_week = CASE LOWER(TRIM(day_of_week))
+        WHEN 'sunday' THEN '0'
+        WHEN 'sun' THEN '0'
+        WHEN 'อาทิตย์' THEN '0'
+        WHEN 'monday' THEN '1'
+        WHEN 'mon' THEN '1'
+        WHEN 'จันทร์' THEN '1'
+        WHEN 'tuesday' THEN '2'
+        WHEN 'tue' THEN '2'
+        WHEN 'อังคาร' THEN '2'
+        WHEN 'wednesday' THEN '3'
+        WHEN 'wed' THEN '3'
+        WHEN 'พุธ' THEN '3'
+        WHEN 'thursday' THEN '4'
+        WHEN 'thu' THEN '4'
+        WHEN 'พฤหัสบดี' THEN '4'
+        WHEN 'พฤหัส' THEN '4'
+        WHEN 'friday' THEN '5'
+        WHEN 'fri' THEN '5'
+        WHEN 'ศุกร์' THEN '5'
+        WHEN 'saturday' THEN '6'
+        WHEN 'sat' THEN '6'
+        WHEN 'เสาร์' THEN '6'
+        ELSE day_of_week
+    END
+WHERE day_of_week NOT IN ('0', '1', '2', '3', '4', '5', '6');
@@ -10,9 +10,15 @@ from .admin_request import AdminRequest
 from .absence import Absence
 from .homeroom import HomeroomTeacher
 from .grade import Grade
+from .attendance import Attendance, AttendanceRecord
 from .classroom import Classroom, ClassroomStudent
 from .password_reset_request import PasswordResetRequest
 from .school_deletion_request import SchoolDeletionRequest
+from .student_score import StudentScoreAggregate
+from .activity_event import ActivityEvent
+from .background_job import BackgroundJob
+from .email_outbox import EmailOutbox
+from .timetable import TimetableEntry, TimetableState, TimetableGeneration
 
 # Add relationships to User model
 from sqlalchemy.orm import relationship
@@ -23,4 +29,4 @@ User.documents = relationship("Document", back_populates="uploader")
 User.subjects = relationship("Subject", back_populates=None)
 User.enrolled = relationship("SubjectStudent", back_populates=None)
 
-__all__ = ["User", "Announcement", "Document", "School", "Subject", "SubjectStudent", "ClassroomSubject", "ScheduleSlot", "SubjectSchedule", "Absence", "HomeroomTeacher", "Classroom", "ClassroomStudent", "Grade", "PasswordResetRequest", "AdminRequest", "SchoolDeletionRequest"]
+__all__ = ["User", "Announcement", "Document", "School", "Subject", "SubjectStudent", "ClassroomSubject", "ScheduleSlot", "SubjectSchedule", "Absence", "HomeroomTeacher", "Classroom", "ClassroomStudent", "Grade", "Attendance", "AttendanceRecord", "PasswordResetRequest", "AdminRequest", "SchoolDeletionRequest", "StudentScoreAggregate", "ActivityEvent", "BackgroundJob", "EmailOutbox", "TimetableEntry", "TimetableState", "TimetableGeneration"]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Text, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Date, Text, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.sql import func
 from database.connection import Base
 import enum
@@ -18,6 +18,11 @@ class AbsenceStatus(str, enum.Enum):
 
 class Absence(Base):
     __tablename__ = "absences"
+    __table_args__ = (
+        # approval page: status filter + date-ordered keyset pagination
+        Index('ix_absences_status_date', 'status', 'absence_date'),
+        Index('ix_absences_student_date', 'student_id', 'absence_date'),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from database.connection import Base
+
+
+class ActivityEvent(Base):
+    """
+    บันทึกกิจกรรมแบบ append-only สำหรับหน้า activity feed ของ owner
+    เก็บชื่อโรงเรียน/หัวข้อไว้ในแถว (denormalized) จึงอ่าน feed ได้ด้วย query เดียวโดยไม่ต้อง join
+    """
+    __tablename__ = "activity_events"
+    __table_args__ = (
+        Index('ix_activity_events_school_id_id', 'school_id', 'id'),
+        Index('ix_activity_events_type_id', 'event_type', 'id'),
+        Index('ix_activity_events_school_type_id', 'school_id', 'event_type', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    event_type = Column(String(30), nullable=False)  # announcement, subject_created, attendance, grade
+    school_id = Column(Integer, nullable=True)
+    school_name = Column(String(255), nullable=True)
+    title = Column(String(255), nullable=False)
+    content = Column(Text, nullable=True)
+    actor_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ActivityEvent(id={self.id}, event_type='{self.event_type}', school_id={self.school_id})>"
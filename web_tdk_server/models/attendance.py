@@ -1,16 +1,42 @@
-from sqlalchemy import Column, Integer, Date, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Date, Text, ForeignKey, DateTime, UniqueConstraint
 from sqlalchemy.sql import func
 from database.connection import Base
 
 
 class Attendance(Base):
     __tablename__ = "attendances"
+    __table_args__ = (
+        # one session per subject per day; also the (subject_id, date) lookup index
+        UniqueConstraint('subject_id', 'date', name='uq_attendance_subject_date'),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False, index=True)
     date = Column(Date, nullable=False, index=True)
+    # Legacy JSON blob (student_id -> status). New marks are stored in attendance_records;
+    # old blobs are moved there by utils.attendance.backfill_attendance_records.
     present_json = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     def __repr__(self):
         return f"<Attendance(subject_id={self.subject_id}, date={self.date})>"
+
+
+class AttendanceRecord(Base):
+    """สถานะการเข้าเรียนของนักเรียน 1 คน ใน 1 วิชา ต่อ 1 วัน"""
+    __tablename__ = "attendance_records"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'subject_id', 'date', name='uq_attendance_record_student_subject_date'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    attendance_id = Column(Integer, ForeignKey("attendances.id"), nullable=False, index=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False, index=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    status = Column(String(20), nullable=False)  # present, absent, late, sick_leave, other
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<AttendanceRecord(student_id={self.student_id}, subject_id={self.subject_id}, date={self.date}, status='{self.status}')>"
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from database.connection import Base
+
+
+class BackgroundJob(Base):
+    """
+    งานที่รันเบื้องหลัง (เช่น นำเข้าผู้ใช้จาก Excel) พร้อมความคืบหน้าให้ client poll ได้
+    เก็บไว้ในฐานข้อมูลเพื่อให้ทุก worker process อ่านสถานะเดียวกันได้
+    """
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        Index('ix_background_jobs_school_type', 'school_id', 'job_type'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    job_type = Column(String(50), nullable=False)  # user_import, ...
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    school_id = Column(Integer, nullable=True)
+    created_by = Column(Integer, nullable=True)
+    total = Column(Integer, nullable=True)  # estimated number of items (None if unknown)
+    processed = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    message = Column(Text, nullable=True)
+    result_json = Column(Text(16777215), nullable=True)  # MEDIUMTEXT on MySQL
+    errors_json = Column(Text(16777215), nullable=True)  # per-item errors: [{"row": 2, "error": "..."}]
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # last update_job call (UTC); see fail_stale_jobs
+
+    def __repr__(self):
+        return f"<BackgroundJob(id={self.id}, job_type='{self.job_type}', status='{self.status}')>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database.connection import Base
@@ -43,6 +43,10 @@ class ClassroomStudent(Base):
     นักเรียนหนึ่งคนสามารถอยู่หลายชั้นเรียนได้ (ต่างเทอม/ปี)
     """
     __tablename__ = "classroom_students"
+    __table_args__ = (
+        Index('ix_classroom_students_student_active', 'student_id', 'is_active'),
+        Index('ix_classroom_students_classroom_active', 'classroom_id', 'is_active'),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     classroom_id = Column(Integer, ForeignKey("classrooms.id"), nullable=False, index=True)
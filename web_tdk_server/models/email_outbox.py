@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from database.connection import Base
+
+
+class EmailOutbox(Base):
+    """
+    อีเมลที่รอส่ง: request แค่เพิ่มแถว แล้ว worker เบื้องหลังส่งเป็นชุดผ่าน SMTP connection เดียว
+    ส่งไม่สำเร็จจะลองใหม่แบบ backoff จนครบ EMAIL_MAX_ATTEMPTS
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        Index('ix_email_outbox_claim_token', 'claim_token'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    to_addrs = Column(Text, nullable=False)  # comma-separated recipients
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)  # naive UTC
+    claim_token = Column(String(64), nullable=True)  # which worker batch is sending the row
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<EmailOutbox(id={self.id}, status='{self.status}', attempts={self.attempts})>"
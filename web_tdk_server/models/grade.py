@@ -1,15 +1,24 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, UniqueConstraint, Index, Computed
 from sqlalchemy.sql import func
 from database.connection import Base
 
 
 class Grade(Base):
     __tablename__ = "grades"
+    __table_args__ = (
+        # natural key of a grade cell; classroom_key stands in for the nullable classroom_id
+        # because MySQL treats NULLs as distinct in unique keys
+        UniqueConstraint('subject_id', 'student_id', 'title', 'classroom_key', name='uq_grade_subject_student_title_classroom_key'),
+        # assignment lookups: subject + title (+ classroom)
+        Index('ix_grades_subject_title_classroom', 'subject_id', 'title', 'classroom_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False, index=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     classroom_id = Column(Integer, ForeignKey("classrooms.id"), nullable=True, index=True)
+    # generated: classroom_id, or 0 for grades not tied to a classroom
+    classroom_key = Column(Integer, Computed("COALESCE(classroom_id, 0)", persisted=False), nullable=False)
     title = Column(String(255), nullable=True)  # Assignment title
     max_score = Column(Float, nullable=True, default=100.0)  # Maximum possible score
     grade = Column(Float, nullable=True)  # Actual score obtained
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Time, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Time, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -6,6 +6,9 @@ from database.connection import Base
 
 class ScheduleSlot(Base):
     __tablename__ = "schedule_slots"
+    __table_args__ = (
+        Index('ix_schedule_slots_school_day', 'school_id', 'day_of_week'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     day_of_week = Column(String(10), nullable=False)  # monday, tuesday, etc.
@@ -21,10 +24,16 @@ class ScheduleSlot(Base):
 
 class SubjectSchedule(Base):
     __tablename__ = "subject_schedules"
+    __table_args__ = (
+        # teacher conflict checks; also serves as the teacher_id FK index
+        Index('ix_subject_schedules_teacher_day_time', 'teacher_id', 'day_of_week', 'start_time', 'end_time'),
+        # classroom timetable; also serves as the classroom_id FK index
+        Index('ix_subject_schedules_classroom_day', 'classroom_id', 'day_of_week'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
-    schedule_slot_id = Column(Integer, ForeignKey("schedule_slots.id"), nullable=True)  # Optional for backward compatibility
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False, index=True)
+    schedule_slot_id = Column(Integer, ForeignKey("schedule_slots.id"), nullable=True, index=True)  # Optional for backward compatibility
     teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     classroom_id = Column(Integer, ForeignKey("classrooms.id"), nullable=True)  # Specific classroom (optional - if None, applies to all)
     
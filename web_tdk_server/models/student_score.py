@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from database.connection import Base
+
+
+class StudentScoreAggregate(Base):
+    """
+    คะแนนรวมของนักเรียนที่คำนวณไว้ล่วงหน้า (materialized) สำหรับการจัดอันดับ
+    scope_classroom_id = 0 คือคะแนนรวมทั้งโรงเรียน, ค่าอื่นคือคะแนนในชั้นเรียนนั้น
+    อัปเดตทุกครั้งที่มีการบันทึก/แก้ไข/ลบคะแนน (ดู utils/ranking.py)
+    """
+    __tablename__ = "student_score_aggregates"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'scope_classroom_id', name='uq_student_score_scope'),
+        Index('ix_student_score_scope_total', 'scope_classroom_id', 'total_score'),
+        Index('ix_student_score_school_scope_total', 'school_id', 'scope_classroom_id', 'total_score'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    school_id = Column(Integer, ForeignKey("schools.id"), nullable=True)
+    scope_classroom_id = Column(Integer, nullable=False, default=0)
+    total_score = Column(Float, nullable=False, default=0.0)
+    total_max_score = Column(Float, nullable=False, default=0.0)
+    average_score = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<StudentScoreAggregate(student_id={self.student_id}, scope_classroom_id={self.scope_classroom_id}, total_score={self.total_score})>"
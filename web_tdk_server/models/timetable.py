@@ -0,0 +1,56 @@
+from sqlalchemy import Column, Integer, String, DateTime, Time, Index
+from sqlalchemy.sql import func
+from database.connection import Base
+
+
+class TimetableEntry(Base):
+    """
+    ตารางเรียน/ตารางสอนที่คำนวณไว้ล่วงหน้า (materialized) ต่อเจ้าของหนึ่งคน: student, teacher หรือ classroom
+    สร้างใหม่จาก SubjectSchedule/ClassroomSubject/SubjectStudent เมื่อข้อมูลต้นทางเปลี่ยน (ดู utils/timetable.py)
+    ชื่อวิชา/ครู/ห้อง เก็บไว้ในแถวเลย อ่านได้ด้วย query เดียวเรียงตาม index
+    """
+    __tablename__ = "timetable_entries"
+    __table_args__ = (
+        Index('ix_timetable_entries_owner_day_time', 'owner_type', 'owner_id', 'day_index', 'start_time'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_type = Column(String(10), nullable=False)  # student, teacher, classroom
+    owner_id = Column(Integer, nullable=False)
+    subject_schedule_id = Column(Integer, nullable=False)
+    subject_id = Column(Integer, nullable=False)
+    subject_name = Column(String(150), nullable=True)
+    subject_code = Column(String(50), nullable=True)
+    teacher_id = Column(Integer, nullable=True)
+    teacher_name = Column(String(100), nullable=True)
+    classroom_id = Column(Integer, nullable=True)
+    classroom_name = Column(String(100), nullable=True)
+    schedule_slot_id = Column(Integer, nullable=True)
+    # day/time as stored on the schedule, and of its ScheduleSlot (operating hours) if linked
+    day_of_week = Column(String(10), nullable=True)
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
+    slot_day_of_week = Column(String(10), nullable=True)
+    slot_start_time = Column(Time, nullable=True)
+    slot_end_time = Column(Time, nullable=True)
+    day_index = Column(Integer, nullable=False)  # 0=Sunday .. 6=Saturday, 7 = unknown
+
+
+class TimetableState(Base):
+    """สถานะของตารางที่ materialize แล้ว: ใช้ generation ของโรงเรียนตอนสร้าง และ ETag ของเนื้อหา"""
+    __tablename__ = "timetable_states"
+
+    owner_type = Column(String(10), primary_key=True)
+    owner_id = Column(Integer, primary_key=True, autoincrement=False)
+    school_key = Column(Integer, nullable=False)  # school_id (owners without a school are not materialized)
+    generation = Column(Integer, nullable=False)
+    etag = Column(String(64), nullable=False)
+    built_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class TimetableGeneration(Base):
+    """ตัวนับต่อโรงเรียน เพิ่มขึ้นทุกครั้งที่ข้อมูลตารางของโรงเรียนเปลี่ยน ตารางที่สร้างด้วยค่าเก่าถือว่าล้าสมัย"""
+    __tablename__ = "timetable_generations"
+
+    school_key = Column(Integer, primary_key=True, autoincrement=False)
+    generation = Column(Integer, nullable=False, default=0)
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from database.connection import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index('ix_users_school_role', 'school_id', 'role'),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     username = Column(String(50), unique=True, index=True, nullable=False)
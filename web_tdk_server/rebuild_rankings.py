@@ -0,0 +1,44 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from database.connection import SessionLocal
+    import models  # noqa: F401  register all models
+    from utils.ranking import rebuild_all_scores
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you have run: pip install -r requirements.txt")
+    sys.exit(1)
+
+
+def rebuild_rankings(school_id=None):
+    """Rebuild the materialized ranking aggregates (student_score_aggregates) from grades"""
+    db = SessionLocal()
+    try:
+        scope = f"school {school_id}" if school_id is not None else "all schools"
+        print(f"Rebuilding score aggregates for {scope}...")
+        written = rebuild_all_scores(db, school_id=school_id)
+        print(f"✓ Wrote {written} aggregate rows")
+        return True
+    except Exception as e:
+        print(f"✗ Error rebuilding rankings: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild classroom/school ranking aggregates")
+    parser.add_argument("--school-id", type=int, default=None, help="Only rebuild one school")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Rebuilding Ranking Aggregates")
+    print("=" * 50)
+    success = rebuild_rankings(args.school_id)
+    sys.exit(0 if success else 1)
@@ -1,9 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 import os
-import smtplib
-from email.message import EmailMessage
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, exists, func
 from typing import List, Optional
 from datetime import date, datetime
 
@@ -16,6 +14,8 @@ from models.announcement import Announcement as AnnouncementModel
 from models.classroom import ClassroomStudent, Classroom
 from models.subject import Subject
 from schemas.absence import AbsenceCreate, AbsenceUpdate, AbsenceResponse
+from utils.pagination import PageParams, paginate
+from utils.mailer import enqueue_email
 
 router = APIRouter(prefix="/absences", tags=["absences"])
 
@@ -96,30 +96,19 @@ def can_approve_absence(db: Session, current_user, student_id: int) -> tuple:
     return False, None
 
 
-def absence_to_response(db: Session, absence: AbsenceModel) -> dict:
-    """แปลง Absence model เป็น response dict พร้อมข้อมูลเพิ่มเติม"""
-    # ดึงชื่อนักเรียน
-    student = db.query(User).filter(User.id == absence.student_id).first()
-    student_name = student.full_name if student else None
-    
-    # ดึงชื่อวิชา (ถ้ามี)
-    subject_name = None
-    if absence.subject_id:
-        subject = db.query(Subject).filter(Subject.id == absence.subject_id).first()
-        subject_name = subject.name if subject else None
-    
-    # ดึงชื่อผู้อนุมัติ (ถ้ามี)
-    approver_name = None
-    if absence.approved_by:
-        approver = db.query(User).filter(User.id == absence.approved_by).first()
-        approver_name = approver.full_name if approver else None
-    
-    return {
+def absences_to_response(db: Session, absences: List[AbsenceModel]) -> List[dict]:
+    """แปลง Absence หลายรายการเป็น response dict โดยดึงชื่อนักเรียน/ผู้อนุมัติ/วิชาแบบ batch (2 query ต่อหน้า)"""
+    user_ids = {a.student_id for a in absences} | {a.approved_by for a in absences if a.approved_by}
+    subject_ids = {a.subject_id for a in absences if a.subject_id}
+    user_names = dict(db.query(User.id, User.full_name).filter(User.id.in_(user_ids)).all()) if user_ids else {}
+    subject_names = dict(db.query(Subject.id, Subject.name).filter(Subject.id.in_(subject_ids)).all()) if subject_ids else {}
+
+    return [{
         "id": absence.id,
         "student_id": absence.student_id,
-        "student_name": student_name,
+        "student_name": user_names.get(absence.student_id),
         "subject_id": absence.subject_id,
-        "subject_name": subject_name,
+        "subject_name": subject_names.get(absence.subject_id),
         "absence_date": absence.absence_date,
         "absence_date_end": absence.absence_date_end,
         "days_count": absence.days_count,
@@ -127,16 +116,20 @@ def absence_to_response(db: Session, absence: AbsenceModel) -> dict:
         "reason": absence.reason,
         "status": absence.status,
         "approved_by": absence.approved_by,
-        "approver_name": approver_name,
+        "approver_name": user_names.get(absence.approved_by),
         "approver_role": absence.approver_role,
         "approved_at": absence.approved_at,
         "reject_reason": absence.reject_reason,
         "version": absence.version or 1,
         "created_at": absence.created_at,
-        "updated_at": absence.updated_at
-        ,
+        "updated_at": absence.updated_at,
         "announcement_id": getattr(absence, 'announcement_id', None)
-    }
+    } for absence in absences]
+
+
+def absence_to_response(db: Session, absence: AbsenceModel) -> dict:
+    """แปลง Absence model เป็น response dict พร้อมข้อมูลเพิ่มเติม"""
+    return absences_to_response(db, [absence])[0]
 
 
 @router.post('/', response_model=AbsenceResponse, status_code=status.HTTP_201_CREATED)
@@ -209,31 +202,12 @@ def create_absence(
                 if a.email and a.email not in recipient_emails:
                     recipient_emails.append(a.email)
 
-        # Send email if SMTP configured and we have recipients
-        smtp_host = os.getenv('SMTP_HOST')
-        smtp_port = os.getenv('SMTP_PORT')
-        smtp_user = os.getenv('SMTP_USER')
-        smtp_pass = os.getenv('SMTP_PASS')
-        from_addr = os.getenv('EMAIL_FROM') or smtp_user
-
-        if recipient_emails and smtp_host and smtp_user and smtp_pass:
-            try:
-                subject = f"คำขอลาเรียนจาก {current_user.full_name}"
-                html_content = f"นักเรียน {current_user.full_name} ขออนุญาตลาเรียนในวันที่ {new_absence.absence_date}. เหตุผล: {new_absence.reason}. โปรดเข้าตรวจสอบและอนุมัติหากเหมาะสม."
-
-                msg = EmailMessage()
-                msg['Subject'] = subject
-                msg['From'] = from_addr
-                msg['To'] = ', '.join(recipient_emails)
-                msg.set_content(html_content)
-
-                with smtplib.SMTP(smtp_host, int(smtp_port or 25)) as smtp:
-                    smtp.starttls()
-                    smtp.login(smtp_user, smtp_pass)
-                    smtp.send_message(msg)
-                print(f'Absence email notification sent to: {recipient_emails}')
-            except Exception as e:
-                print('Failed to send absence email notification', e)
+        # Queue the notification; the outbox worker sends it (see utils/mailer.py)
+        if recipient_emails:
+            subject = f"คำขอลาเรียนจาก {current_user.full_name}"
+            html_content = f"นักเรียน {current_user.full_name} ขออนุญาตลาเรียนในวันที่ {new_absence.absence_date}. เหตุผล: {new_absence.reason}. โปรดเข้าตรวจสอบและอนุมัติหากเหมาะสม."
+            if enqueue_email(db, recipient_emails, subject, html_content):
+                db.commit()
     except Exception as e:
         # Swallow any notification errors so absence creation still succeeds, but log it
         print('Error while preparing absence notifications', e)
@@ -268,10 +242,23 @@ def create_absence(
     return absence_to_response(db, new_absence)
 
 
+def _enrolled_in(*conditions):
+    """EXISTS (semi-join): the absence's student has a classroom enrollment matching ``conditions``"""
+    return exists().where(
+        ClassroomStudent.student_id == AbsenceModel.student_id,
+        Classroom.id == ClassroomStudent.classroom_id,
+        *conditions
+    )
+
+
 @router.get('/', response_model=List[AbsenceResponse])
 def list_absences(
+    response: Response,
     student_id: int = None,
     status_filter: str = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -280,6 +267,7 @@ def list_absences(
     - Students can only see their own
     - Teachers (homeroom) can see students in their grade level
     - Admins can see all in their school
+    date_from/date_to keep absences whose date range overlaps [date_from, date_to].
     """
     query = db.query(AbsenceModel)
     role = getattr(current_user, 'role', None)
@@ -294,38 +282,18 @@ def list_absences(
             HomeroomTeacher.teacher_id == current_user.id
         ).first()
         
-        if homeroom:
-            # ดึงรายชื่อนักเรียนในชั้นเรียนที่ครูประจำ
-            student_ids = db.query(ClassroomStudent.student_id).join(
-                Classroom, ClassroomStudent.classroom_id == Classroom.id
-            ).filter(
-                Classroom.grade_level == homeroom.grade_level,
-                Classroom.school_id == homeroom.school_id,
-                ClassroomStudent.is_active == True
-            ).all()
-            student_ids = [s[0] for s in student_ids]
-            
-            if student_ids:
-                query = query.filter(AbsenceModel.student_id.in_(student_ids))
-            else:
-                # No students, return empty
-                return []
-        else:
+        if not homeroom:
             # Teacher is not a homeroom teacher, return empty
             return []
+        query = query.filter(_enrolled_in(
+            Classroom.grade_level == homeroom.grade_level,
+            Classroom.school_id == homeroom.school_id,
+            ClassroomStudent.is_active == True
+        ))
     elif role in ['admin', 'owner']:
         # Admin sees all absences in their school
         if user_school_id and role == 'admin':
-            # ดึงรายชื่อนักเรียนในโรงเรียน
-            student_ids = db.query(ClassroomStudent.student_id).join(
-                Classroom, ClassroomStudent.classroom_id == Classroom.id
-            ).filter(
-                Classroom.school_id == user_school_id
-            ).distinct().all()
-            student_ids = [s[0] for s in student_ids]
-            
-            if student_ids:
-                query = query.filter(AbsenceModel.student_id.in_(student_ids))
+            query = query.filter(_enrolled_in(Classroom.school_id == user_school_id))
         # Owner can see all (no additional filter)
     
     # Filter by specific student_id if provided
@@ -339,10 +307,18 @@ def list_absences(
             query = query.filter(AbsenceModel.status == status_enum)
         except ValueError:
             raise HTTPException(status_code=400, detail='Invalid status value')
+
+    # Filter by date range (multi-day absences count on every day they cover)
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail='date_from must be on or before date_to')
+    if date_to is not None:
+        query = query.filter(AbsenceModel.absence_date <= date_to)
+    if date_from is not None:
+        query = query.filter(func.coalesce(AbsenceModel.absence_date_end, AbsenceModel.absence_date) >= date_from)
     
-    absences = query.order_by(AbsenceModel.absence_date.desc()).all()
+    absences = paginate(query, response, page, id_col=AbsenceModel.id, sort_col=AbsenceModel.absence_date)
     
-    return [absence_to_response(db, a) for a in absences]
+    return absences_to_response(db, absences)
 
 
 @router.get('/{absence_id}', response_model=AbsenceResponse)
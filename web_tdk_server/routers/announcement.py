@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from schemas.announcement import Announcement, AnnouncementCreate, AnnouncementUpdate
@@ -8,6 +8,8 @@ from routers.user import get_current_user  # keep existing
 from models.user import User as UserModel
 from fastapi.security import OAuth2PasswordBearer
 from utils.security import decode_access_token
+from utils.pagination import PageParams, paginate
+from utils.activity import record_activity
 from sqlalchemy import or_
 from datetime import datetime
 
@@ -47,20 +49,22 @@ def create_announcement(
     if getattr(announcement, 'expires_at', None):
         new_announcement.expires_at = announcement.expires_at
     db.add(new_announcement)
+    record_activity(db, 'announcement', announcement.school_id, announcement.title,
+                    content=announcement.content, actor_id=current_user.id)
     db.commit()
     db.refresh(new_announcement)
     return new_announcement
 
 @router.get("", response_model=List[Announcement])
 @router.get("/", response_model=List[Announcement])
-def list_announcements(db: Session = Depends(get_db), school_id: int = None, current_user: Optional[UserModel] = Depends(get_optional_current_user)):
+def list_announcements(response: Response, db: Session = Depends(get_db), school_id: int = None, page: PageParams = Depends(), current_user: Optional[UserModel] = Depends(get_optional_current_user)):
     query = db.query(AnnouncementModel)
     if school_id is not None:
         query = query.filter(AnnouncementModel.school_id == school_id)
 
     # if requester is admin, return all announcements
     if current_user and getattr(current_user, 'role', None) == 'admin':
-        return query.order_by(AnnouncementModel.created_at.desc()).all()
+        return paginate(query, response, page, id_col=AnnouncementModel.id, sort_col=AnnouncementModel.created_at)
 
     # For non-admins / anonymous users, only return announcements that are not expired,
     # or those owned by the current_user (so owners can still see their expired posts).
@@ -70,7 +74,7 @@ def list_announcements(db: Session = Depends(get_db), school_id: int = None, cur
     else:
         query = query.filter(or_(AnnouncementModel.expires_at == None, AnnouncementModel.expires_at > now))
 
-    return query.order_by(AnnouncementModel.created_at.desc()).all()
+    return paginate(query, response, page, id_col=AnnouncementModel.id, sort_col=AnnouncementModel.created_at)
 
 @router.get("/{announcement_id}", response_model=Announcement)
 def get_announcement(announcement_id: int, db: Session = Depends(get_db)):
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from typing import List
-import json
 from datetime import datetime, date
 
 from database.connection import get_db
 from routers.user import get_current_user
 from models.subject import Subject as SubjectModel
-from models.attendance import Attendance as AttendanceModel
+from models.attendance import Attendance as AttendanceModel, AttendanceRecord as AttendanceRecordModel
 from schemas.attendance import AttendanceMark, AttendanceResponse
+from utils.attendance import save_attendance_records, load_attendance_maps
+from utils.pagination import PageParams, paginate
+from utils.activity import record_activity
 
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
@@ -45,24 +48,36 @@ def mark_attendance(payload: AttendanceMark, db: Session = Depends(get_db), curr
     else:
         d = date.today()
 
-    # find existing record for subject/date
-    rec = db.query(AttendanceModel).filter(AttendanceModel.subject_id == payload.subject_id, AttendanceModel.date == d).first()
-    attendance_json = json.dumps(payload.attendance)
-    if rec:
-        rec.present_json = attendance_json
-        db.commit()
-        db.refresh(rec)
-        return { 'detail': 'updated', 'id': rec.id }
-    new = AttendanceModel(subject_id=payload.subject_id, date=d, present_json=attendance_json)
-    db.add(new)
-    db.commit()
-    db.refresh(new)
-    return { 'detail': 'created', 'id': new.id }
+    # Two teachers saving the same subject/day at once: uq_attendance_subject_date rejects the
+    # second insert, so retry once and update the session the first request created.
+    for attempt in range(2):
+        try:
+            # find existing record for subject/date
+            rec = db.query(AttendanceModel).filter(AttendanceModel.subject_id == payload.subject_id, AttendanceModel.date == d).first()
+            detail = 'updated'
+            if rec:
+                # statuses now live in attendance_records; drop any legacy blob
+                rec.present_json = None
+            else:
+                rec = AttendanceModel(subject_id=payload.subject_id, date=d)
+                db.add(rec)
+                db.flush()
+                detail = 'created'
+            save_attendance_records(db, rec, payload.attendance)
+            record_activity(db, 'attendance', subj.school_id, f"Attendance recorded for {subj.name}",
+                            content=f"Date: {d}", actor_id=current_user.id)
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise HTTPException(status_code=409, detail='Attendance was modified concurrently, please retry')
+    return { 'detail': detail, 'id': rec.id }
 
 
 @router.get('', response_model=List[AttendanceResponse])
 @router.get('/', response_model=List[AttendanceResponse])
-def list_attendance(subject_id: int = None, date: str = None, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_attendance(response: Response, subject_id: int = None, date: str = None, student_id: int = None, page: PageParams = Depends(), db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     query = db.query(AttendanceModel)
     if subject_id is not None:
         query = query.filter(AttendanceModel.subject_id == subject_id)
@@ -72,16 +87,17 @@ def list_attendance(subject_id: int = None, date: str = None, db: Session = Depe
             query = query.filter(AttendanceModel.date == d)
         except ValueError:
             raise HTTPException(status_code=400, detail='Invalid date format. Use YYYY-MM-DD')
-    rows = query.order_by(AttendanceModel.date.desc()).all()
-    results = []
-    for r in rows:
-        attendance = {}
-        try:
-            attendance = json.loads(r.present_json) if r.present_json else {}
-            # Handle backward compatibility: convert old list format to new dict format
-            if isinstance(attendance, list):
-                attendance = {str(sid): "present" for sid in attendance}
-        except Exception:
-            attendance = {}
-        results.append({ 'id': r.id, 'subject_id': r.subject_id, 'date': r.date.isoformat(), 'attendance': attendance })
-    return results
+    if student_id is not None:
+        # Indexed per-student lookup on attendance_records (student_id, subject_id, date)
+        query = query.join(
+            AttendanceRecordModel, AttendanceRecordModel.attendance_id == AttendanceModel.id
+        ).filter(AttendanceRecordModel.student_id == student_id)
+    rows = paginate(query, response, page, id_col=AttendanceModel.id, sort_col=AttendanceModel.date)
+    attendance_maps = load_attendance_maps(db, rows)
+    if student_id is not None:
+        key = str(student_id)
+        attendance_maps = {aid: {key: m[key]} for aid, m in attendance_maps.items() if key in m}
+    return [
+        { 'id': r.id, 'subject_id': r.subject_id, 'date': r.date.isoformat(), 'attendance': attendance_maps.get(r.id, {}) }
+        for r in rows
+    ]
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, delete
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from database.connection import get_db
@@ -18,10 +18,20 @@ from schemas.classroom import (
     AvailableStudent,
     PromoteClassroomRequest,
     PromoteClassroomResponse,
+    PromoteSchoolRequest,
     BulkClassroomCreate
 )
 from utils.security import get_current_user, get_optional_current_user
-
+from utils.enrollment import add_to_classroom
+from utils.timetable import invalidate_schools
+from utils.user_cache import invalidate_user
+from utils.jobs import create_job, fail_stale_jobs, job_errors, job_to_dict
+from utils.promotion import PROMOTION_JOB_TYPE, PromotionError, plan_promotion, run_promotion_job
+from models.background_job import BackgroundJob
+from models.school import School
+
+# Endpoints are plain ``def``: they use the synchronous Session from get_db, so FastAPI runs
+# them in its worker thread pool (sized via THREADPOOL_SIZE, see main.py) instead of on the event loop.
 router = APIRouter(prefix="/classrooms", tags=["classrooms"])
 
 
@@ -65,7 +75,7 @@ def get_classroom_or_404(classroom_id: int, db: Session) -> Classroom:
 # ===== Classroom CRUD =====
 
 @router.post("/create", response_model=ClassroomResponse)
-async def create_classroom(
+def create_classroom(
     data: ClassroomCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -137,7 +147,7 @@ async def create_classroom(
 
 
 @router.post("/bulk-create", response_model=List[ClassroomResponse])
-async def bulk_create_classrooms(
+def bulk_create_classrooms(
     data: BulkClassroomCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -213,7 +223,7 @@ async def bulk_create_classrooms(
 
 
 @router.get("/", response_model=List[ClassroomListResponse])
-async def get_classrooms(
+def get_classrooms(
     school_id: int,
     semester: Optional[int] = None,
     academic_year: Optional[str] = None,
@@ -258,7 +268,7 @@ async def get_classrooms(
 
 
 @router.get("/list/{school_id}", response_model=List[ClassroomListResponse])
-async def list_classrooms(
+def list_classrooms(
     school_id: int,
     semester: Optional[int] = None,
     academic_year: Optional[str] = None,
@@ -305,7 +315,7 @@ async def list_classrooms(
 # ===== Student Management =====
 
 @router.get("/{classroom_id}/available-students", response_model=List[AvailableStudent])
-async def get_available_students(
+def get_available_students(
     classroom_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -352,101 +362,32 @@ async def get_available_students(
 
 
 @router.post("/{classroom_id}/add-students", response_model=AddStudentsResponse)
-async def add_students_to_classroom(
+def add_students_to_classroom(
     classroom_id: int,
     student_ids: List[int],
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """เพิ่มนักเรียนเข้าชั้นเรียน"""
+    """เพิ่มนักเรียนเข้าชั้นเรียน (ตรวจสอบทั้งชุดด้วย query ชุดเดียว ดู utils.enrollment)"""
     verify_admin_or_owner(current_user)
     classroom = get_classroom_or_404(classroom_id, db)
 
-    added_count = 0
-    already_enrolled = []
-    errors = []
-    enrolled_in_other_class = []
-
-    for student_id in student_ids:
-        # ตรวจสอบว่ามีนักเรียนนี้หรือไม่
-        student = db.query(User).filter(
-            User.id == student_id,
-            User.role == "student"
-        ).first()
-
-        if not student:
-            errors.append(f"ไม่พบนักเรียน ID {student_id}")
-            continue
+    result = add_to_classroom(db, classroom, student_ids)
 
-        # ตรวจสอบว่ากำลังลงทะเบียนในชั้นเรียนนี้แล้วหรือไม่
-        existing = db.query(ClassroomStudent).filter(
-            ClassroomStudent.classroom_id == classroom_id,
-            ClassroomStudent.student_id == student_id
-        ).first()
-
-        if existing:
-            if existing.is_active:
-                already_enrolled.append(student_id)
-            else:
-                # Re-activate - ใช้ update() เพื่อหลีกเลี่ยงปัญหา SQLAlchemy setting all columns
-                db.query(ClassroomStudent).filter(
-                    ClassroomStudent.id == existing.id
-                ).update(
-                    {ClassroomStudent.is_active: True},
-                    synchronize_session=False
-                )
-                added_count += 1
-            continue
-
-        # ตรวจสอบว่านักเรียนมีชั้นเรียนอื่นในปีการศึกษาเดียวกันหรือไม่
-        # นักเรียน 1 คนสามารถมีชั้นเรียนได้แค่ 1 ชั้นต่อ academic year
-        existing_in_year = db.query(ClassroomStudent).join(
-            Classroom, ClassroomStudent.classroom_id == Classroom.id
-        ).filter(
-            ClassroomStudent.student_id == student_id,
-            Classroom.academic_year == classroom.academic_year,
-            Classroom.school_id == classroom.school_id,
-            ClassroomStudent.is_active == True
-        ).first()
-
-        if existing_in_year:
-            # นักเรียนมีชั้นเรียนอื่นแล้วในปีนี้
-            other_classroom = db.query(Classroom).filter(
-                Classroom.id == existing_in_year.classroom_id
-            ).first()
-            enrolled_in_other_class.append({
-                'student_id': student_id,
-                'existing_classroom': other_classroom.name if other_classroom else f"ชั้นเรียน ID {existing_in_year.classroom_id}"
-            })
-            continue
-
-        # เพิ่มนักเรียนใหม่
-        enrollment = ClassroomStudent(
-            classroom_id=classroom_id,
-            student_id=student_id
-        )
-        db.add(enrollment)
-        
-        # อัปเดต grade_level ของนักเรียน
-        student.grade_level = classroom.grade_level
-        
-        added_count += 1
-
-    db.commit()
-
-    # สร้าง error messages สำหรับนักเรียนที่มีชั้นเรียนอื่นแล้ว
-    for item in enrolled_in_other_class:
-        errors.append(f"⚠️ นักเรียน ID {item['student_id']} มีชั้นเรียนอื่นแล้ว: {item['existing_classroom']} (ค้นหา: academic_year={classroom.academic_year})")
+    errors = [f"ไม่พบนักเรียน ID {student_id}" for student_id in result['not_found']]
+    # สร้าง error messages สำหรับนักเรียนที่มีชั้นเรียนอื่นแล้ว (1 ชั้นต่อ academic year)
+    for item in result['in_other_classroom']:
+        errors.append(f"⚠️ นักเรียน ID {item['student_id']} มีชั้นเรียนอื่นแล้ว: {item['classroom_name']} (ค้นหา: academic_year={classroom.academic_year})")
 
     return AddStudentsResponse(
-        added_count=added_count,
-        already_enrolled=already_enrolled,
+        added_count=len(result['added']) + len(result['reactivated']),
+        already_enrolled=result['already_enrolled'],
         errors=errors
     )
 
 
 @router.get("/{classroom_id}/students", response_model=List[StudentInClassroom])
-async def get_students_in_classroom(
+def get_students_in_classroom(
     classroom_id: int,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user)
@@ -475,7 +416,7 @@ async def get_students_in_classroom(
 
 
 @router.delete("/{classroom_id}/students/{student_id}", status_code=status.HTTP_200_OK)
-async def remove_student_from_classroom(
+def remove_student_from_classroom(
     classroom_id: int,
     student_id: int,
     db: Session = Depends(get_db),
@@ -505,7 +446,7 @@ async def remove_student_from_classroom(
 # ===== Classroom Promotion =====
 
 @router.post("/{classroom_id}/promote", response_model=PromoteClassroomResponse)
-async def promote_classroom(
+def promote_classroom(
     classroom_id: int,
     data: PromoteClassroomRequest,
     db: Session = Depends(get_db),
@@ -616,6 +557,7 @@ async def promote_classroom(
 
     promoted_students = 0
     grades_copied = 0
+    regraded = []
 
     for enrollment in students:
         # ตรวจสอบว่านักเรียนนี้ไม่มีอยู่ในชั้นเรียนเป้าหมายแล้ว
@@ -638,6 +580,7 @@ async def promote_classroom(
         student = db.query(User).filter(User.id == enrollment.student_id).first()
         if student:
             student.grade_level = new_grade_level
+            regraded.append(student.username)
 
         # ถ้าเลือก include_grades - เก็บ reference ไว้ (คะแนนยังอยู่ในตาราง grades)
         # ไม่จำเป็นต้องคัดลอก เพราะสามารถดึงจาก parent_classroom_id ได้
@@ -649,6 +592,7 @@ async def promote_classroom(
             grades_copied += grade_count
 
     db.commit()
+    invalidate_user(*regraded)
 
     return PromoteClassroomResponse(
         message=f"เลื่อนชั้นเรียนสำเร็จ: {classroom.name} → {new_name}",
@@ -659,8 +603,83 @@ async def promote_classroom(
     )
 
 
+def _promotion_school_id(current_user: User, school_id: Optional[int]) -> int:
+    if current_user.role == "owner":
+        if school_id is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ต้องระบุ school_id")
+        return school_id
+    return current_user.school_id
+
+
+@router.post("/promote-school")
+def promote_school(
+    data: PromoteSchoolRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    เลื่อนชั้นทุกชั้นเรียนของโรงเรียนในครั้งเดียว
+
+    - dry_run=true (ค่าเริ่มต้น): คืนแผน ชั้นเดิม -> ชั้นใหม่ จำนวนนักเรียน และชั้นเรียนที่จะสร้าง
+    - dry_run=false: สร้างงานเบื้องหลัง (202) ที่บันทึกทั้งหมดใน transaction เดียว
+      ติดตามความคืบหน้าที่ GET /classrooms/promote-school/jobs/{job_id}
+    """
+    verify_admin_or_owner(current_user)
+    school_id = _promotion_school_id(current_user, data.school_id)
+    options = data.dict(exclude={'dry_run', 'school_id'})
+    try:
+        plan = plan_promotion(db, school_id, **options)
+    except PromotionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if data.dry_run:
+        return {'dry_run': True, **plan}
+    if not plan['classrooms']:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ไม่มีชั้นเรียนที่จะเลื่อน")
+
+    # lock the school row so two requests cannot both pass the check below;
+    # create_job's commit releases it
+    db.query(School.id).filter(School.id == school_id).with_for_update().first()
+    # a job whose worker died mid-run would otherwise block this school forever
+    fail_stale_jobs(db, PROMOTION_JOB_TYPE, school_id)
+    running = db.query(BackgroundJob.id).filter(
+        BackgroundJob.job_type == PROMOTION_JOB_TYPE,
+        BackgroundJob.school_id == school_id,
+        BackgroundJob.status.in_(['queued', 'running'])
+    ).first()
+    if running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"กำลังเลื่อนชั้นของโรงเรียนนี้อยู่ (job {running.id})")
+
+    job = create_job(db, PROMOTION_JOB_TYPE, created_by=current_user.id, school_id=school_id,
+                     total=len(plan['classrooms']))
+    background_tasks.add_task(run_promotion_job, job.id, school_id, options)
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {**job_to_dict(job), 'dry_run': False, 'summary': plan['summary']}
+
+
+@router.get("/promote-school/jobs/{job_id}")
+def get_promote_school_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """สถานะ/ความคืบหน้าของงานเลื่อนชั้นทั้งโรงเรียน (processed = จำนวนชั้นเรียนที่เตรียมแล้ว)"""
+    verify_admin_or_owner(current_user)
+    job = db.query(BackgroundJob).filter(
+        BackgroundJob.id == job_id,
+        BackgroundJob.job_type == PROMOTION_JOB_TYPE
+    ).first()
+    if not job or (current_user.role != "owner" and job.school_id != current_user.school_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="ไม่พบงานเลื่อนชั้น")
+    data = job_to_dict(job)
+    data['skipped'] = job_errors(job)
+    return data
+
+
 @router.get("/{classroom_id}/grades-from-previous")
-async def get_grades_from_previous_term(
+def get_grades_from_previous_term(
     classroom_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -707,7 +726,7 @@ async def get_grades_from_previous_term(
 
 
 @router.get("/my-classrooms", response_model=List[ClassroomResponse])
-async def get_my_classrooms(
+def get_my_classrooms(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -747,7 +766,7 @@ async def get_my_classrooms(
 # ===== Generic Routes (ต้องอยู่ที่ท้ายสุด เพื่อไม่ให้ match ก่อน specific routes) =====
 
 @router.get("/{classroom_id}", response_model=ClassroomResponse)
-async def get_classroom(
+def get_classroom(
     classroom_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -777,7 +796,7 @@ async def get_classroom(
 
 
 @router.put("/{classroom_id}", response_model=ClassroomResponse)
-async def update_classroom_put(
+def update_classroom_put(
     classroom_id: int,
     data: ClassroomUpdate,
     db: Session = Depends(get_db),
@@ -835,7 +854,7 @@ async def update_classroom_put(
 
 
 @router.patch("/{classroom_id}", response_model=ClassroomResponse)
-async def update_classroom(
+def update_classroom(
     classroom_id: int,
     data: ClassroomUpdate,
     db: Session = Depends(get_db),
@@ -891,7 +910,7 @@ async def update_classroom(
 
 
 @router.delete("/{classroom_id}")
-async def delete_classroom(
+def delete_classroom(
     classroom_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -901,9 +920,8 @@ async def delete_classroom(
     classroom = get_classroom_or_404(classroom_id, db)
 
     # ลบ ClassroomStudent ที่เกี่ยวข้องก่อน (ป้องกัน IntegrityError)
-    db.query(ClassroomStudent).filter(
-        ClassroomStudent.classroom_id == classroom.id
-    ).delete(synchronize_session=False)
+    db.execute(delete(ClassroomStudent.__table__).where(ClassroomStudent.__table__.c.classroom_id == classroom.id))
+    invalidate_schools(db.connection(), [classroom.school_id])
 
     db.delete(classroom)
     db.commit()
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from typing import List, Dict
 from sqlalchemy import distinct, func
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 
-from database.connection import get_db
+from database.connection import get_db, get_read_db
 from routers.user import get_current_user
 from models.subject import Subject as SubjectModel
 from models.grade import Grade as GradeModel
@@ -15,9 +16,15 @@ from models.classroom_subject import ClassroomSubject as ClassroomSubjectModel
 from models.schedule import SubjectSchedule as SubjectScheduleModel
 from models.school import School as SchoolModel
 from schemas.grade import GradesBulk, GradeResponse, AssignmentCreate, AssignmentUpdate, AssignmentResponse
+from utils.transcript import build_transcripts, build_activity_breakdowns
+from utils.ranking import refresh_student_scores, classroom_ranking, school_ranking
+from utils.pagination import PageParams, paginate
+from utils.activity import record_activity
 
 router = APIRouter(prefix="/grades", tags=["grades"])
 
+GRADE_CELL_KEY = 'uq_grade_subject_student_title_classroom_key'
+
 
 def calculate_activity_grades(db: Session, student_id: int, classroom_id: int = None):
     """
@@ -28,76 +35,56 @@ def calculate_activity_grades(db: Session, student_id: int, classroom_id: int =
         'total_activity_percent': sum of percentages
     }
     """
-    # Find all activity subjects that have grades for this student
-    activity_data = db.query(
-        SubjectModel.id,
-        SubjectModel.name,
-        SubjectModel.activity_percentage
-    ).filter(
-        SubjectModel.subject_type == 'activity',
-        SubjectModel.is_ended == False
-    ).all()
-    
-    if not activity_data:
-        return {
-            'activity_subjects': [],
-            'total_activity_score': None,
-            'total_activity_percent': 0
-        }
-    
-    activity_subjects = []
-    total_score = 0
-    total_percent = 0
-    
-    for subject_id, subject_name, activity_percent in activity_data:
-        # Get all grades for this student in this subject
-        grades = db.query(GradeModel).filter(
-            GradeModel.subject_id == subject_id,
-            GradeModel.student_id == student_id
-        )
-        
-        if classroom_id:
-            grades = grades.filter(GradeModel.classroom_id == classroom_id)
-        
-        grades = grades.all()
-        
-        if not grades:
-            continue
-        
-        # Calculate average score for this subject
-        valid_grades = [g for g in grades if g.grade is not None and g.max_score]
-        if not valid_grades:
-            continue
-        
-        avg_score = sum([g.grade for g in valid_grades]) / len(valid_grades)
-        max_score = valid_grades[0].max_score  # Assume all have same max_score
-        
-        # Normalize to 100 scale
-        normalized_score = (avg_score / max_score) * 100 if max_score else 0
-        
-        # Calculate contribution
-        percent = activity_percent or 0
-        contribution = (normalized_score * percent) / 100
-        
-        activity_subjects.append({
-            'subject_id': subject_id,
-            'subject_name': subject_name,
-            'raw_score': round(avg_score, 2),
-            'max_score': round(max_score, 2),
-            'normalized_score': round(normalized_score, 2),
-            'percentage': percent,
-            'contribution': round(contribution, 2),
-            'grade_count': len(valid_grades)
-        })
-        
-        total_score += contribution
-        total_percent += percent
-    
-    return {
-        'activity_subjects': activity_subjects,
-        'total_activity_score': min(round(total_score, 2), 100),  # Cap at 100
-        'total_activity_percent': total_percent
-    }
+    return build_activity_breakdowns(db, [student_id], classroom_id)[student_id]
+
+
+def _is_grade_cell_conflict(e: IntegrityError) -> bool:
+    """True when ``e`` is a concurrent save of the same grade cell (not e.g. an unknown student_id)."""
+    message = str(e.orig)
+    # MySQL/PostgreSQL name the key; SQLite lists its columns
+    return GRADE_CELL_KEY in message or 'UNIQUE constraint failed: grades.' in message
+
+
+def _upsert_grade_sheets(db: Session, payload: GradesBulk, sheets):
+    """Stage inserts/updates for every (title, student) cell. Returns (created, updated, student_ids)."""
+    # Prefetch every existing grade for (subject, titles, classroom) in one query
+    existing_query = db.query(GradeModel).filter(
+        GradeModel.subject_id == payload.subject_id,
+        GradeModel.title.in_({title for title, _, _ in sheets})
+    )
+    if payload.classroom_id is not None:
+        existing_query = existing_query.filter(GradeModel.classroom_id == payload.classroom_id)
+    else:
+        existing_query = existing_query.filter(GradeModel.classroom_id.is_(None))
+    existing = {}
+    for g in existing_query.order_by(GradeModel.id).all():
+        existing.setdefault((g.title, g.student_id), g)
+
+    created = []
+    updated_count = 0
+    touched_students = set()
+    for title, max_score, entries in sheets:
+        for entry in entries:
+            g = existing.get((title, entry.student_id))
+            if g:
+                g.max_score = max_score
+                g.grade = entry.grade
+                updated_count += 1
+            else:
+                g = GradeModel(
+                    subject_id=payload.subject_id,
+                    student_id=entry.student_id,
+                    title=title,
+                    max_score=max_score,
+                    grade=entry.grade,
+                    classroom_id=payload.classroom_id
+                )
+                existing[(title, entry.student_id)] = g
+                created.append(g)
+            touched_students.add(entry.student_id)
+
+    db.add_all(created)
+    return len(created), updated_count, touched_students
 
 
 @router.post('/bulk', status_code=status.HTTP_201_CREATED)
@@ -120,49 +107,41 @@ def bulk_grades(payload: GradesBulk, db: Session = Depends(get_db), current_user
     if not is_authorized:
         raise HTTPException(status_code=403, detail='Not authorized to submit grades for this subject')
 
-    results = []
-    for entry in payload.grades:
-        # Filter by subject_id, student_id, title and classroom if provided
-        if payload.classroom_id is not None:
-            g = db.query(GradeModel).filter(
-                GradeModel.subject_id == payload.subject_id,
-                GradeModel.student_id == entry.student_id,
-                GradeModel.title == payload.title,
-                GradeModel.classroom_id == payload.classroom_id
-            ).first()
-        else:
-            g = db.query(GradeModel).filter(
-                GradeModel.subject_id == payload.subject_id,
-                GradeModel.student_id == entry.student_id,
-                GradeModel.title == payload.title,
-                GradeModel.classroom_id.is_(None)
-            ).first()
-        if g:
-            g.title = payload.title
-            g.max_score = payload.max_score
-            g.grade = entry.grade
-            db.commit()
-            db.refresh(g)
-            results.append(g)
-        else:
-            new = GradeModel(
-                subject_id=payload.subject_id,
-                student_id=entry.student_id,
-                title=payload.title,
-                max_score=payload.max_score,
-                grade=entry.grade,
-                classroom_id=payload.classroom_id
-            )
-            db.add(new)
+    # Single title (legacy payload) and/or a whole sheet of assignments
+    sheets = []
+    if payload.title is not None:
+        sheets.append((payload.title, payload.max_score, payload.grades))
+    sheets.extend((a.title, a.max_score, a.grades) for a in payload.assignments)
+    if not sheets:
+        raise HTTPException(status_code=400, detail='No assignment title provided')
+
+    # A concurrent save of the same cells violates uq_grade_subject_student_title_classroom_key;
+    # retry once so this request updates the rows the other one inserted.
+    for attempt in range(2):
+        try:
+            created_count, updated_count, touched_students = _upsert_grade_sheets(db, payload, sheets)
+            refresh_student_scores(db, touched_students)
+            # one feed event per assignment column (not per student)
+            school = db.query(SchoolModel.name).filter(SchoolModel.id == subj.school_id).first()
+            for title, max_score, entries in sheets:
+                record_activity(db, 'grade', subj.school_id, f"Grades recorded for {subj.name}: {title}",
+                                content=f"Students: {len(entries)}, Max score: {max_score}",
+                                actor_id=current_user.id, school_name=school[0] if school else None)
             db.commit()
-            db.refresh(new)
-            results.append(new)
-    return { 'detail': 'ok', 'count': len(results) }
+            break
+        except IntegrityError as e:
+            db.rollback()
+            if not _is_grade_cell_conflict(e):
+                # e.g. a foreign key violation: retrying cannot help
+                raise HTTPException(status_code=400, detail='Grades reference a student, subject or classroom that does not exist')
+            if attempt:
+                raise HTTPException(status_code=409, detail='Grades were modified concurrently, please retry')
+    return { 'detail': 'ok', 'count': created_count + updated_count, 'created': created_count, 'updated': updated_count }
 
 
 @router.get('', response_model=List[GradeResponse])
 @router.get('/', response_model=List[GradeResponse])
-def get_grades(subject_id: int = None, classroom_id: int = None, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_grades(response: Response, subject_id: int = None, classroom_id: int = None, student_id: int = None, page: PageParams = Depends(), db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     # Check if grades are announced (only for students)
     if getattr(current_user, 'role', None) == 'student' and subject_id is not None:
         subject = db.query(SubjectModel).filter(SubjectModel.id == subject_id).first()
@@ -190,8 +169,9 @@ def get_grades(subject_id: int = None, classroom_id: int = None, db: Session = D
         # ONLY return grades for this specific classroom (strict filter)
         query = query.filter(GradeModel.classroom_id == classroom_id)
     # When no classroom_id provided, return ALL grades (no additional filter)
-    rows = query.all()
-    return rows
+    if student_id is not None:
+        query = query.filter(GradeModel.student_id == student_id)
+    return paginate(query, response, page, id_col=GradeModel.id, descending=False)
 
 
 @router.get('/assignments/{subject_id}', response_model=List[AssignmentResponse])
@@ -327,6 +307,7 @@ def create_assignment(subject_id: int, assignment: AssignmentCreate, db: Session
         db.add(grade)
         created_grades.append(grade)
 
+    refresh_student_scores(db, [student.id for student in students])
     db.commit()
 
     # Return assignment info
@@ -411,6 +392,7 @@ def update_assignment(subject_id: int, assignment_title: str, assignment: Assign
             grade.classroom_id = assignment.classroom_id
         grade.updated_at = func.now()
 
+    refresh_student_scores(db, [grade.student_id for grade in existing_grades])
     db.commit()
 
     # Determine classroom_id for response
@@ -467,13 +449,14 @@ def delete_assignment(subject_id: int, assignment_title: str, classroom_id: int
     for grade in existing_grades:
         db.delete(grade)
 
+    refresh_student_scores(db, [grade.student_id for grade in existing_grades])
     db.commit()
 
     return {'detail': 'Assignment deleted successfully'}
 
 
 @router.get('/student/{student_id}/activity-breakdown')
-def get_student_activity_breakdown(student_id: int, classroom_id: int = None, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_student_activity_breakdown(student_id: int, classroom_id: int = None, db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
     """
     Get activity grade breakdown for a student.
     Includes individual activity subjects with their raw scores, percentages, and calculated contributions.
@@ -501,139 +484,11 @@ def get_student_activity_breakdown(student_id: int, classroom_id: int = None, db
 
 def _get_student_transcript_internal(student_id: int, classroom_id: int, db: Session):
     """Internal helper to calculate transcript using scaling logic consistent with UI."""
-    # Get all subjects this student is enrolled in
-    subjects = db.query(SubjectModel).join(
-        SubjectStudentModel, SubjectModel.id == SubjectStudentModel.subject_id
-    ).filter(SubjectStudentModel.student_id == student_id).all()
-    
-    regular_subjects = []
-    
-    def check_is_exam(title):
-        if not title: return False
-        t = title.lower()
-        exam_keywords = ['กลางภาค', 'ปลายภาค', 'final', 'midterm', 'คะแนนสอบ']
-        return any(keyword in t for keyword in exam_keywords)
-
-    for subject in subjects:
-        if subject.subject_type == 'activity':
-            continue
-            
-        # Get grades for this subject
-        grades_query = db.query(GradeModel).filter(
-            GradeModel.subject_id == subject.id,
-            GradeModel.student_id == student_id
-        )
-        # Apply classroom filter if provided (for classroom-specific assignments)
-        if classroom_id:
-            grades_query = grades_query.filter(
-                (GradeModel.classroom_id == classroom_id) | (GradeModel.classroom_id.is_(None))
-            )
-            
-        grades = grades_query.all()
-        if not grades:
-            continue
-            
-        raw_collected_score = 0.0
-        raw_collected_max = 0.0
-        raw_exam_score = 0.0
-        raw_exam_max = 0.0
-        
-        manual_collected = None
-        manual_exam = None
-        
-        has_real_collected = False
-        has_real_exam = False
-        
-        for g in grades:
-            # Handle manual summary titles
-            if g.title == "คะแนนเก็บรวม":
-                manual_collected = float(g.grade or 0)
-                continue
-            if g.title == "คะแนนสอบรวม":
-                manual_exam = float(g.grade or 0)
-                continue
-            
-            score = float(g.grade or 0)
-            max_s = float(g.max_score or 100)
-            
-            if check_is_exam(g.title):
-                has_real_exam = True
-                raw_exam_score += score
-                raw_exam_max += max_s
-            else:
-                has_real_collected = True
-                raw_collected_score += score
-                raw_collected_max += max_s
-        
-        # Subject level settings
-        max_c = float(subject.max_collected_score or 100)
-        max_e = float(subject.max_exam_score or 100)
-        
-        # Scaling logic for Collected Score
-        if not has_real_collected and manual_collected is not None:
-            final_collected = min(manual_collected, max_c)
-        else:
-            final_collected = (raw_collected_score / raw_collected_max * max_c) if raw_collected_max > 0 else raw_collected_score
-            
-        # Scaling logic for Exam Score
-        if not has_real_exam and manual_exam is not None:
-            final_exam = min(manual_exam, max_e)
-        else:
-            final_exam = (raw_exam_score / raw_exam_max * max_e) if raw_exam_max > 0 else raw_exam_score
-            
-        total_score = final_collected + final_exam
-        total_max = max_c + max_e
-        normalized = (total_score / total_max * 100) if total_max > 0 else 0
-        
-        # Get all teachers assigned to this subject (with is_ended status)
-        all_schedules = db.query(SubjectScheduleModel).filter(
-            SubjectScheduleModel.subject_id == subject.id
-        ).all()
-        
-        teachers_list = []
-        for sched in all_schedules:
-            teacher = db.query(UserModel).filter(UserModel.id == sched.teacher_id).first()
-            teacher_name = teacher.full_name or teacher.username if teacher else "Unknown"
-            teachers_list.append({
-                'id': sched.id,
-                'teacher_id': sched.teacher_id,
-                'teacher_name': teacher_name,
-                'is_ended': sched.is_ended
-            })
-
-        regular_subjects.append({
-            'subject_id': subject.id,
-            'subject_name': subject.name,
-            'subject_type': 'regular',
-            'credits': subject.credits or 0,
-            'score': round(total_score, 2),
-            'max_score': round(total_max, 2),
-            'normalized_score': round(normalized, 2),
-            'teachers': teachers_list
-        })
-    
-    # Calculate activity grades (Uses its own scaling logic to 100)
-    activity_breakdown = calculate_activity_grades(db, student_id, classroom_id)
-    
-    # Build transcript
-    transcript = regular_subjects
-    if activity_breakdown['activity_subjects']:
-        transcript.append({
-            'subject_id': None,
-            'subject_name': 'กิจกรรม (Activity)',
-            'subject_type': 'activity',
-            'credits': 0,
-            'score': round(activity_breakdown['total_activity_score'], 2),
-            'max_score': 100.0,
-            'breakdown': activity_breakdown['activity_subjects'],
-            'total_percent': round(activity_breakdown['total_activity_percent'], 2)
-        })
-    
-    return transcript
+    return build_transcripts(db, [student_id], classroom_id)[student_id]
 
 
 @router.get('/student/{student_id}/transcript')
-def get_student_transcript(student_id: int, classroom_id: int = None, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_student_transcript(student_id: int, classroom_id: int = None, db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
     """
     Get student's full transcript with activity grades aggregated into a single "Activity" entry.
     Regular subjects show individual entries; activity subjects are combined.
@@ -659,117 +514,23 @@ def get_student_transcript(student_id: int, classroom_id: int = None, db: Sessio
 
 
 @router.get('/classroom/{classroom_id}/ranking')
-def get_classroom_ranking(classroom_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    """Calculate ranking for all students in a classroom based on weighted average of scores."""
+def get_classroom_ranking(classroom_id: int, db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
+    """Ranking for all students in a classroom, read from the materialized score aggregates."""
     # Check authorization (Admin or Teacher or Student in this class)
     user_role = getattr(current_user, 'role', None)
     if user_role not in ['admin', 'teacher', 'student']:
         raise HTTPException(status_code=403, detail='Not authorized')
 
-    # Get students in classroom
-    students = db.query(UserModel).join(
-        ClassroomStudentModel, UserModel.id == ClassroomStudentModel.student_id
-    ).filter(ClassroomStudentModel.classroom_id == classroom_id).all()
-
-    if not students:
-        return []
-
-    results = []
-    for student in students:
-        transcript = _get_student_transcript_internal(student.id, classroom_id, db)
-        
-        total_score = 0.0
-        total_max = 0.0
-        
-        for item in transcript:
-            # ใช้พจน์ 'score' และ 'max_score' ที่สรุปมาให้แล้วในแต่ละวิชา (รวมวิชากิจกรรมด้วยถ้ามีคะแนน)
-            s = item.get('score') or 0.0
-            m = item.get('max_score') or 0.0
-            
-            total_score += float(s)
-            total_max += float(m)
-        
-        # คำนวณเปอร์เซ็นต์เฉลี่ยจากคะแนนรวมทั้งหมด
-        final_percentage = (total_score / total_max * 100) if total_max > 0 else 0.0
-        
-        results.append({
-            'student_id': student.id,
-            'full_name': student.full_name,
-            'username': student.username,
-            'total_score': round(total_score, 2),
-            'total_max_score': round(total_max, 2),
-            'average_score': round(final_percentage, 2)
-        })
-
-    # Sort descending by total_score as requested
-    results.sort(key=lambda x: x['total_score'], reverse=True)
-
-    # Assign ranks
-    current_rank = 0
-    last_val = -1.0
-    for i, item in enumerate(results):
-        if item['total_score'] != last_val:
-            current_rank = i + 1
-            last_val = item['total_score']
-        item['rank'] = current_rank
-
-    return results
+    # Sorted descending by total_score with dense ranks
+    return classroom_ranking(db, classroom_id)
 
 
 @router.get('/school/{school_id}/ranking')
-def get_school_ranking(school_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    """Calculate ranking for all students in the entire school based on sum of scores."""
+def get_school_ranking(school_id: int, db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
+    """Ranking for all students in the entire school, read from the materialized score aggregates."""
     # Check authorization (Admin or Teacher or Student in this school)
     user_role = getattr(current_user, 'role', None)
     if user_role not in ['admin', 'teacher', 'student']:
         raise HTTPException(status_code=403, detail='Not authorized')
 
-    # Get students in school
-    students = db.query(UserModel).filter(
-        UserModel.school_id == school_id,
-        UserModel.role == 'student'
-    ).all()
-
-    if not students:
-        return []
-
-    results = []
-    for student in students:
-        # Pass classroom_id=None to get overall grades
-        transcript = _get_student_transcript_internal(student.id, None, db)
-        
-        total_score = 0.0
-        total_max = 0.0
-        
-        for item in transcript:
-            s = item.get('score') or 0.0
-            m = item.get('max_score') or 0.0
-            
-            total_score += float(s)
-            total_max += float(m)
-        
-        final_percentage = (total_score / total_max * 100) if total_max > 0 else 0.0
-        
-        results.append({
-            'student_id': student.id,
-            'full_name': student.full_name,
-            'username': student.username,
-            'total_score': round(total_score, 2),
-            'total_max_score': round(total_max, 2),
-            'average_score': round(final_percentage, 2)
-        })
-
-    # Sort descending by total_score
-    results.sort(key=lambda x: x['total_score'], reverse=True)
-
-    # Assign ranks
-    current_rank = 0
-    last_val = -1.0
-    for i, item in enumerate(results):
-        if item['total_score'] != last_val:
-            current_rank = i + 1
-            last_val = item['total_score']
-        item['rank'] = current_rank
-
-    return results
-
+    return school_ranking(db, school_id)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
 from typing import List, Optional
-import json
 from datetime import datetime, timezone
 
 from schemas.homeroom import HomeroomTeacher, HomeroomTeacherCreate, HomeroomTeacherUpdate, HomeroomTeacherWithDetails
@@ -9,12 +9,12 @@ from models.homeroom import HomeroomTeacher as HomeroomTeacherModel
 from models.user import User as UserModel
 from models.classroom import Classroom as ClassroomModel, ClassroomStudent as ClassroomStudentModel
 from models.grade import Grade as GradeModel
-from models.attendance import Attendance as AttendanceModel
 from models.subject import Subject as SubjectModel
 from models.subject_student import SubjectStudent as SubjectStudentModel
 from models.school import School as SchoolModel
-from database.connection import get_db
+from database.connection import get_db, get_read_db
 from routers.user import get_current_user
+from utils.attendance import count_attendance_by_status
 
 router = APIRouter(prefix="/homeroom", tags=["homeroom"])
 
@@ -314,9 +314,111 @@ def get_students_by_grade(
     } for s in students]
 
 
+def _build_students_data(db: Session, students: List[UserModel], grades_announced: bool = True, include_totals: bool = True):
+    """Grades + attendance per subject for a set of students with a fixed number of queries.
+
+    Loads grades, enrollments and attendance counts for the whole student set at once
+    instead of querying per student/per subject. Returns {student_id: data}.
+    """
+    student_ids = list(dict.fromkeys(s.id for s in students))
+    if not student_ids:
+        return {}
+
+    # Grades (with subject) for every student
+    grades_by_student = {sid: {} for sid in student_ids}
+    grade_rows = db.query(GradeModel, SubjectModel).join(
+        SubjectModel, GradeModel.subject_id == SubjectModel.id
+    ).filter(
+        GradeModel.student_id.in_(student_ids)
+    ).order_by(GradeModel.id).all()
+    for grade, subject in grade_rows:
+        grades_by_subject = grades_by_student[grade.student_id]
+        if subject.id not in grades_by_subject:
+            grades_by_subject[subject.id] = {
+                'subject_id': subject.id,
+                'subject_name': subject.name,
+                'is_activity': subject.subject_type == 'activity',
+                'credits': subject.credits if hasattr(subject, 'credits') else None,
+                'assignments': [],
+                'total_score': 0,
+                'total_max_score': 0
+            }
+        # Only include grades if they are announced
+        if grades_announced and grade.grade is not None and grade.max_score:
+            grades_by_subject[subject.id]['assignments'].append({
+                'title': grade.title,
+                'score': float(grade.grade),
+                'max_score': float(grade.max_score)
+            })
+            grades_by_subject[subject.id]['total_score'] += float(grade.grade)
+            grades_by_subject[subject.id]['total_max_score'] += float(grade.max_score)
+
+    # Enrolled subjects for every student
+    enrolled_by_student = {sid: [] for sid in student_ids}
+    enrollment_rows = db.query(SubjectStudentModel.student_id, SubjectModel.id, SubjectModel.name).join(
+        SubjectModel, SubjectStudentModel.subject_id == SubjectModel.id
+    ).filter(
+        SubjectStudentModel.student_id.in_(student_ids)
+    ).order_by(SubjectStudentModel.id).all()
+    subject_ids = set()
+    for sid, subject_id, subject_name in enrollment_rows:
+        enrolled_by_student[sid].append((subject_id, subject_name))
+        subject_ids.add(subject_id)
+
+    # Attendance for all students/subjects; each legacy blob is parsed once
+    attendance_counts = count_attendance_by_status(db, student_ids, subject_ids)
+
+    result = {}
+    for student in students:
+        attendance_by_subject = {}
+        for subject_id, subject_name in enrolled_by_student[student.id]:
+            subject_attendance = {
+                'subject_id': subject_id,
+                'subject_name': subject_name,
+                'total_days': 0,
+                'present_days': 0,
+                'absent_days': 0,
+                'late_days': 0,
+                'sick_leave_days': 0
+            }
+            for status, days in attendance_counts.get((student.id, subject_id), {}).items():
+                subject_attendance['total_days'] += days
+                if status == 'present':
+                    subject_attendance['present_days'] += days
+                elif status == 'absent':
+                    subject_attendance['absent_days'] += days
+                elif status == 'late':
+                    subject_attendance['late_days'] += days
+                elif status == 'sick_leave':
+                    subject_attendance['sick_leave_days'] += days
+            attendance_by_subject[subject_id] = subject_attendance
+
+        data = {
+            'id': student.id,
+            'username': student.username,
+            'full_name': student.full_name,
+            'email': student.email,
+            'grades_by_subject': list(grades_by_student[student.id].values()),
+            'attendance_by_subject': list(attendance_by_subject.values())
+        }
+        if include_totals:
+            # Calculate overall attendance rate
+            total_attendance_days = sum(a['total_days'] for a in attendance_by_subject.values())
+            total_attendance_present = sum(a['present_days'] for a in attendance_by_subject.values())
+            data['attendance'] = {
+                'attendance_rate': round((total_attendance_present / total_attendance_days * 100) if total_attendance_days > 0 else 0, 2),
+                'present_days': total_attendance_present,
+                'absent_days': sum(a['absent_days'] for a in attendance_by_subject.values()),
+                'late_days': sum(a['late_days'] for a in attendance_by_subject.values()),
+                'sick_leave_days': sum(a['sick_leave_days'] for a in attendance_by_subject.values())
+            }
+        result[student.id] = data
+    return result
+
+
 @router.get("/my-classrooms/summary")
 def get_homeroom_summary(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """ดึงข้อมูลสรุปของนักเรียนในชั้นที่ครูประจำ (คะแนน + การเข้าเรียน จัดกลุ่มตามวิชา)"""
@@ -334,10 +436,12 @@ def get_homeroom_summary(
     # Check if grades are announced (for non-admin teachers)
     grades_announced = True
     if current_user.role == 'teacher':
-        for hr in homerooms:
-            school = db.query(SchoolModel).filter(SchoolModel.id == hr.school_id).first()
-            if school and school.grade_announcement_date:
-                now = datetime.now(timezone.utc)
+        schools = db.query(SchoolModel).filter(
+            SchoolModel.id.in_({hr.school_id for hr in homerooms})
+        ).all()
+        now = datetime.now(timezone.utc)
+        for school in schools:
+            if school.grade_announcement_date:
                 announcement_date = school.grade_announcement_date
                 if announcement_date.tzinfo is None:
                     announcement_date = announcement_date.replace(tzinfo=timezone.utc)
@@ -345,128 +449,42 @@ def get_homeroom_summary(
                     grades_announced = False
                     break
     
+    # Classrooms for every homeroom grade level (one query)
+    classrooms = db.query(ClassroomModel).filter(
+        or_(*[
+            and_(ClassroomModel.school_id == hr.school_id, ClassroomModel.grade_level == hr.grade_level)
+            for hr in homerooms
+        ])
+    ).order_by(ClassroomModel.id).all()
+    classrooms_by_homeroom = {}
+    for classroom in classrooms:
+        classrooms_by_homeroom.setdefault((classroom.school_id, classroom.grade_level), []).append(classroom)
+
+    # Active students of all those classrooms (one query)
+    enrollments_by_classroom = {c.id: [] for c in classrooms}
+    if classrooms:
+        enrollments = db.query(ClassroomStudentModel.classroom_id, UserModel).join(
+            UserModel, ClassroomStudentModel.student_id == UserModel.id
+        ).filter(
+            ClassroomStudentModel.classroom_id.in_(list(enrollments_by_classroom.keys())),
+            ClassroomStudentModel.is_active == True
+        ).order_by(ClassroomStudentModel.id).all()
+        for classroom_id, student in enrollments:
+            enrollments_by_classroom[classroom_id].append(student)
+
+    all_students = [student for students in enrollments_by_classroom.values() for student in students]
+    students_data = _build_students_data(db, all_students, grades_announced=grades_announced)
+
     result = []
-    
     for hr in homerooms:
-        # Get classrooms for this grade level
-        classrooms = db.query(ClassroomModel).filter(
-            ClassroomModel.school_id == hr.school_id,
-            ClassroomModel.grade_level == hr.grade_level
-        ).all()
-        
-        for classroom in classrooms:
-            # Get students in this classroom
-            enrollments = db.query(ClassroomStudentModel, UserModel).join(
-                UserModel, ClassroomStudentModel.student_id == UserModel.id
-            ).filter(
-                ClassroomStudentModel.classroom_id == classroom.id,
-                ClassroomStudentModel.is_active == True
-            ).all()
-            
-            students_data = []
-            for enrollment, student in enrollments:
-                # Get grades for this student grouped by subject
-                grades_query = db.query(GradeModel, SubjectModel).join(
-                    SubjectModel, GradeModel.subject_id == SubjectModel.id
-                ).filter(
-                    GradeModel.student_id == student.id
-                ).all()
-                
-                grades_by_subject = {}
-                for grade, subject in grades_query:
-                    if subject.id not in grades_by_subject:
-                        grades_by_subject[subject.id] = {
-                            'subject_id': subject.id,
-                            'subject_name': subject.name,
-                            'is_activity': subject.subject_type == 'activity',
-                            'credits': subject.credits if hasattr(subject, 'credits') else None,
-                            'assignments': [],
-                            'total_score': 0,
-                            'total_max_score': 0
-                        }
-                    # Only include grades if they are announced
-                    if grades_announced and grade.grade is not None and grade.max_score:
-                        grades_by_subject[subject.id]['assignments'].append({
-                            'title': grade.title,
-                            'score': float(grade.grade),
-                            'max_score': float(grade.max_score)
-                        })
-                        grades_by_subject[subject.id]['total_score'] += float(grade.grade)
-                        grades_by_subject[subject.id]['total_max_score'] += float(grade.max_score)
-                
-                # Get attendance grouped by subject
-                enrolled_subjects = db.query(SubjectStudentModel.subject_id).filter(
-                    SubjectStudentModel.student_id == student.id
-                ).all()
-                enrolled_subject_ids = [s[0] for s in enrolled_subjects]
-                
-                attendance_by_subject = {}
-                if enrolled_subject_ids:
-                    for subject_id in enrolled_subject_ids:
-                        subject = db.query(SubjectModel).filter(SubjectModel.id == subject_id).first()
-                        if not subject:
-                            continue
-                        
-                        attendance_records = db.query(AttendanceModel).filter(
-                            AttendanceModel.subject_id == subject_id
-                        ).all()
-                        
-                        subject_attendance = {
-                            'subject_id': subject_id,
-                            'subject_name': subject.name,
-                            'total_days': 0,
-                            'present_days': 0,
-                            'absent_days': 0,
-                            'late_days': 0,
-                            'sick_leave_days': 0
-                        }
-                        
-                        for record in attendance_records:
-                            try:
-                                attendance_data = json.loads(record.present_json) if record.present_json else {}
-                                student_id_str = str(student.id)
-                                if student_id_str in attendance_data:
-                                    status = attendance_data[student_id_str]
-                                    subject_attendance['total_days'] += 1
-                                    if status == 'present':
-                                        subject_attendance['present_days'] += 1
-                                    elif status == 'absent':
-                                        subject_attendance['absent_days'] += 1
-                                    elif status == 'late':
-                                        subject_attendance['late_days'] += 1
-                                    elif status == 'sick_leave':
-                                        subject_attendance['sick_leave_days'] += 1
-                            except:
-                                pass
-                        
-                        attendance_by_subject[subject_id] = subject_attendance
-                
-                # Calculate overall attendance rate
-                total_attendance_days = sum(s['total_days'] for s in attendance_by_subject.values())
-                total_attendance_present = sum(s['present_days'] for s in attendance_by_subject.values())
-                
-                students_data.append({
-                    'id': student.id,
-                    'username': student.username,
-                    'full_name': student.full_name,
-                    'email': student.email,
-                    'grades_by_subject': list(grades_by_subject.values()),
-                    'attendance_by_subject': list(attendance_by_subject.values()),
-                    'attendance': {
-                        'attendance_rate': round((total_attendance_present / total_attendance_days * 100) if total_attendance_days > 0 else 0, 2),
-                        'present_days': total_attendance_present,
-                        'absent_days': sum(s['absent_days'] for s in attendance_by_subject.values()),
-                        'late_days': sum(s['late_days'] for s in attendance_by_subject.values()),
-                        'sick_leave_days': sum(s['sick_leave_days'] for s in attendance_by_subject.values())
-                    }
-                })
-            
+        for classroom in classrooms_by_homeroom.get((hr.school_id, hr.grade_level), []):
+            classroom_students = [students_data[s.id] for s in enrollments_by_classroom[classroom.id]]
             result.append({
                 'classroom_id': classroom.id,
                 'classroom_name': classroom.name,
                 'grade_level': classroom.grade_level,
-                'student_count': len(students_data),
-                'students': students_data
+                'student_count': len(classroom_students),
+                'students': classroom_students
             })
     
     return {"classrooms": result}
@@ -475,7 +493,7 @@ def get_homeroom_summary(
 @router.get("/my-classrooms/{classroom_id}/students")
 def get_homeroom_classroom_students(
     classroom_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """ดึงรายละเอียดนักเรียนในชั้นเรียนที่ครูประจำ"""
@@ -498,102 +516,18 @@ def get_homeroom_classroom_students(
             raise HTTPException(status_code=403, detail="คุณไม่ใช่ครูประจำชั้นของห้องเรียนนี้")
     
     # Get students in this classroom
-    enrollments = db.query(ClassroomStudentModel, UserModel).join(
-        UserModel, ClassroomStudentModel.student_id == UserModel.id
+    students = db.query(UserModel).join(
+        ClassroomStudentModel, ClassroomStudentModel.student_id == UserModel.id
     ).filter(
         ClassroomStudentModel.classroom_id == classroom_id,
         ClassroomStudentModel.is_active == True
-    ).all()
+    ).order_by(ClassroomStudentModel.id).all()
     
-    students_data = []
-    for enrollment, student in enrollments:
-        # Get all grades for this student with subject details
-        grades = db.query(GradeModel, SubjectModel).join(
-            SubjectModel, GradeModel.subject_id == SubjectModel.id
-        ).filter(
-            GradeModel.student_id == student.id
-        ).all()
-        
-        grades_by_subject = {}
-        for grade, subject in grades:
-            if subject.id not in grades_by_subject:
-                grades_by_subject[subject.id] = {
-                    'subject_id': subject.id,
-                    'subject_name': subject.name,
-                    'is_activity': subject.subject_type == 'activity',
-                    'credits': subject.credits if hasattr(subject, 'credits') else None,
-                    'assignments': [],
-                    'total_score': 0,
-                    'total_max_score': 0
-                }
-            if grade.grade is not None and grade.max_score:
-                grades_by_subject[subject.id]['assignments'].append({
-                    'title': grade.title,
-                    'score': float(grade.grade),
-                    'max_score': float(grade.max_score)
-                })
-                grades_by_subject[subject.id]['total_score'] += float(grade.grade)
-                grades_by_subject[subject.id]['total_max_score'] += float(grade.max_score)
-        
-        # Get attendance
-        enrolled_subjects = db.query(SubjectStudentModel.subject_id).filter(
-            SubjectStudentModel.student_id == student.id
-        ).all()
-        enrolled_subject_ids = [s[0] for s in enrolled_subjects]
-        
-        attendance_by_subject = {}
-        if enrolled_subject_ids:
-            for subject_id in enrolled_subject_ids:
-                subject = db.query(SubjectModel).filter(SubjectModel.id == subject_id).first()
-                if not subject:
-                    continue
-                    
-                attendance_records = db.query(AttendanceModel).filter(
-                    AttendanceModel.subject_id == subject_id
-                ).all()
-                
-                subject_attendance = {
-                    'subject_id': subject_id,
-                    'subject_name': subject.name,
-                    'total_days': 0,
-                    'present_days': 0,
-                    'absent_days': 0,
-                    'late_days': 0,
-                    'sick_leave_days': 0
-                }
-                
-                for record in attendance_records:
-                    try:
-                        attendance_data = json.loads(record.present_json) if record.present_json else {}
-                        student_id_str = str(student.id)
-                        if student_id_str in attendance_data:
-                            status = attendance_data[student_id_str]
-                            subject_attendance['total_days'] += 1
-                            if status == 'present':
-                                subject_attendance['present_days'] += 1
-                            elif status == 'absent':
-                                subject_attendance['absent_days'] += 1
-                            elif status == 'late':
-                                subject_attendance['late_days'] += 1
-                            elif status == 'sick_leave':
-                                subject_attendance['sick_leave_days'] += 1
-                    except:
-                        pass
-                
-                attendance_by_subject[subject_id] = subject_attendance
-        
-        students_data.append({
-            'id': student.id,
-            'username': student.username,
-            'full_name': student.full_name,
-            'email': student.email,
-            'grades_by_subject': list(grades_by_subject.values()),
-            'attendance_by_subject': list(attendance_by_subject.values())
-        })
+    students_data = _build_students_data(db, students, include_totals=False)
     
     return {
         'classroom_id': classroom.id,
         'classroom_name': classroom.name,
         'grade_level': classroom.grade_level,
-        'students': students_data
+        'students': [students_data[s.id] for s in students]
     }
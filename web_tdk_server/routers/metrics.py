@@ -0,0 +1,71 @@
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
+
+from database.connection import engine, get_db, read_engine
+from database.pool_metrics import pool_metrics, pool_state
+from routers.user import get_current_user
+from utils.request_metrics import route_metrics
+
+# Static bearer token for a Prometheus scraper; owners can always read the metrics with their login
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+_bearer = OAuth2PasswordBearer(tokenUrl="/users/login", auto_error=False)
+
+
+def require_metrics_access(token: Optional[str] = Depends(_bearer), db: Session = Depends(get_db)):
+    """Allow the configured scrape token or a logged-in owner (route names and pool internals are not public)"""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if METRICS_TOKEN and secrets.compare_digest(token, METRICS_TOKEN):
+        return
+    current_user = get_current_user(token, db)
+    if current_user.role != 'owner':
+        raise HTTPException(status_code=403, detail="Only owners can access this resource")
+
+
+# Operational metrics for this worker process
+router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(require_metrics_access)])
+
+
+def _pool_gauges() -> str:
+    lines = []
+    pools = [("primary", pool_metrics.snapshot(engine.pool))]
+    if read_engine is not engine:
+        pools.append(("replica", pool_state(read_engine.pool)))
+    for name in ("checked_out", "overflow", "pool_size"):
+        lines.append(f"# TYPE db_pool_{name} gauge")
+        for label, data in pools:
+            if name in data:
+                lines.append(f'db_pool_{name}{{pool="{label}"}} {data[name]}')
+    data = pools[0][1]
+    lines.append("# TYPE db_pool_checkouts_total counter")
+    lines.append(f"db_pool_checkouts_total {data['checkouts']}")
+    lines.append("# TYPE db_pool_checkout_timeouts_total counter")
+    lines.append(f"db_pool_checkout_timeouts_total {data['checkout_timeouts']}")
+    lines.append("# TYPE db_pool_checkout_wait_seconds_total counter")
+    lines.append(f"db_pool_checkout_wait_seconds_total {data['checkout_wait_ms_total'] / 1000}")
+    return "\n".join(lines) + "\n"
+
+
+@router.get("", response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    """Per-route statement/DB-time/duration histograms and pool gauges (Prometheus text format)"""
+    return PlainTextResponse(
+        route_metrics.render_prometheus() + _pool_gauges(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+@router.get("/db-pool")
+def get_db_pool_metrics():
+    """Connection pool state and checkout wait times for this worker (counters include the read replica)"""
+    data = pool_metrics.snapshot(engine.pool)
+    if read_engine is not engine:
+        data['read_pool'] = pool_state(read_engine.pool)
+    return data
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import List
+from sqlalchemy import text, func, delete
+from typing import List, Optional
 from schemas.user import UserCreate, User, AdminRequestCreate
 from schemas.school import SchoolCreate, School
 from models.user import User as UserModel
 from models.school import School as SchoolModel
 from models.announcement import Announcement as AnnouncementModel
 from models.subject import Subject as SubjectModel
-from models.attendance import Attendance as AttendanceModel
+from models.attendance import Attendance as AttendanceModel, AttendanceRecord as AttendanceRecordModel
+from models.student_score import StudentScoreAggregate as StudentScoreAggregateModel
+from models.activity_event import ActivityEvent as ActivityEventModel
 from models.grade import Grade as GradeModel
 from models.admin_request import AdminRequest as AdminRequestModel
 from models.document import Document as DocumentModel
@@ -20,10 +22,17 @@ from models.absence import Absence as AbsenceModel
 from models.homeroom import HomeroomTeacher as HomeroomTeacherModel
 from models.school_deletion_request import SchoolDeletionRequest as SchoolDeletionRequestModel
 from models.password_reset_request import PasswordResetRequest as PasswordResetRequestModel
-from utils.security import hash_password
-from database.connection import get_db
+from utils.hashing import hash_password
+from utils.activity import event_to_dict
+from utils.pagination import PageParams, paginate, MAX_PAGE_LIMIT
+from database.connection import get_db, get_read_db
 from routers.user import get_current_user
+from utils.user_cache import invalidate_user
+from utils.timetable import invalidate_schools
 import os
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/owner", tags=["owner"])
@@ -33,37 +42,79 @@ def require_owner(current_user: UserModel = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Only owners can access this resource")
     return current_user
 
-@router.get("/schools", response_model=List[dict])
-def get_schools_with_stats(db: Session = Depends(get_db), current_user: UserModel = Depends(require_owner)):
-    schools = db.query(SchoolModel).all()
+# Short-lived snapshot of the dashboard stats (opt-in via ?cached=true)
+OWNER_STATS_CACHE_SECONDS = float(os.getenv("OWNER_STATS_CACHE_SECONDS", "60"))
+_stats_snapshot = {"expires": 0.0, "rows": None}
+_stats_lock = threading.Lock()
+
+
+def invalidate_school_stats():
+    with _stats_lock:
+        _stats_snapshot["rows"] = None
+        _stats_snapshot["expires"] = 0.0
+
+
+def _compute_school_stats(db: Session) -> List[dict]:
+    """Per-school counters with one GROUP BY query per table (constant in the number of schools)."""
+    as_of = datetime.utcnow()
+    schools = db.query(SchoolModel.id, SchoolModel.name).order_by(SchoolModel.id).all()
+
+    # Count users by role
+    role_counts = defaultdict(dict)
+    for school_id, role, n in db.query(
+        UserModel.school_id, UserModel.role, func.count(UserModel.id)
+    ).filter(
+        UserModel.school_id.isnot(None),
+        UserModel.role.in_(['admin', 'teacher', 'student'])
+    ).group_by(UserModel.school_id, UserModel.role).all():
+        role_counts[school_id][role] = n
+
+    # Count active subjects
+    active_subjects = dict(db.query(SubjectModel.school_id, func.count(SubjectModel.id)).filter(
+        SubjectModel.is_ended == False
+    ).group_by(SubjectModel.school_id).all())
+
+    # Count recent announcements (last 30 days)
+    thirty_days_ago = as_of - timedelta(days=30)
+    recent_announcements = dict(db.query(AnnouncementModel.school_id, func.count(AnnouncementModel.id)).filter(
+        AnnouncementModel.created_at >= thirty_days_ago
+    ).group_by(AnnouncementModel.school_id).all())
+
     result = []
-    for school in schools:
-        # Count users by role
-        admins = db.query(UserModel).filter(UserModel.school_id == school.id, UserModel.role == 'admin').count()
-        teachers = db.query(UserModel).filter(UserModel.school_id == school.id, UserModel.role == 'teacher').count()
-        students = db.query(UserModel).filter(UserModel.school_id == school.id, UserModel.role == 'student').count()
-        
-        # Count active subjects
-        active_subjects = db.query(SubjectModel).filter(SubjectModel.school_id == school.id, SubjectModel.is_ended == False).count()
-        
-        # Count recent announcements (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_announcements = db.query(AnnouncementModel).filter(
-            AnnouncementModel.school_id == school.id,
-            AnnouncementModel.created_at >= thirty_days_ago
-        ).count()
-        
+    for school_id, name in schools:
+        roles = role_counts.get(school_id, {})
         result.append({
-            "id": school.id,
-            "name": school.name,
-            "admins": admins,
-            "teachers": teachers,
-            "students": students,
-            "active_subjects": active_subjects,
-            "recent_announcements": recent_announcements
+            "id": school_id,
+            "name": name,
+            "admins": roles.get('admin', 0),
+            "teachers": roles.get('teacher', 0),
+            "students": roles.get('student', 0),
+            "active_subjects": active_subjects.get(school_id, 0),
+            "recent_announcements": recent_announcements.get(school_id, 0),
+            "as_of": as_of.isoformat()
         })
     return result
 
+
+@router.get("/schools", response_model=List[dict])
+def get_schools_with_stats(
+    cached: bool = Query(False, description="Serve a snapshot up to OWNER_STATS_CACHE_SECONDS old"),
+    db: Session = Depends(get_read_db),
+    current_user: UserModel = Depends(require_owner)
+):
+    if not cached:
+        return _compute_school_stats(db)
+
+    now = time.monotonic()
+    with _stats_lock:
+        if _stats_snapshot["rows"] is not None and _stats_snapshot["expires"] > now:
+            return _stats_snapshot["rows"]
+    rows = _compute_school_stats(db)
+    with _stats_lock:
+        _stats_snapshot["rows"] = rows
+        _stats_snapshot["expires"] = now + OWNER_STATS_CACHE_SECONDS
+    return rows
+
 @router.post("/create_school", response_model=School)
 def create_school(school: SchoolCreate, db: Session = Depends(get_db), current_user: UserModel = Depends(require_owner)):
     # Check if school name already exists
@@ -74,6 +125,7 @@ def create_school(school: SchoolCreate, db: Session = Depends(get_db), current_u
     new_school = SchoolModel(name=school.name)
     db.add(new_school)
     db.commit()
+    invalidate_school_stats()
     db.refresh(new_school)
     return new_school
 
@@ -125,72 +177,24 @@ def create_admin_for_school(
     return db_user
 
 @router.get("/activities", response_model=List[dict])
-def get_recent_activities(limit: int = 50, db: Session = Depends(get_db), current_user: UserModel = Depends(require_owner)):
-    activities = []
-    
-    # Recent announcements
-    announcements = db.query(AnnouncementModel).order_by(AnnouncementModel.created_at.desc()).limit(limit).all()
-    for ann in announcements:
-        school = db.query(SchoolModel).filter(SchoolModel.id == ann.school_id).first()
-        activities.append({
-            "type": "announcement",
-            "school_id": ann.school_id,
-            "school_name": school.name if school else "Unknown",
-            "title": ann.title,
-            "content": ann.content[:100] + "..." if len(ann.content) > 100 else ann.content,
-            "created_at": ann.created_at,
-            "created_by": ann.author_id
-        })
-    
-    # Recent subjects created
-    subjects = db.query(SubjectModel).order_by(SubjectModel.created_at.desc()).limit(limit).all()
-    for subj in subjects:
-        school = db.query(SchoolModel).filter(SchoolModel.id == subj.school_id).first()
-        teacher = db.query(UserModel).filter(UserModel.id == subj.teacher_id).first()
-        activities.append({
-            "type": "subject_created",
-            "school_id": subj.school_id,
-            "school_name": school.name if school else "Unknown",
-            "title": f"Subject '{subj.name}' created",
-            "content": f"Teacher: {teacher.full_name if teacher else 'Unknown'}",
-            "created_at": subj.created_at,
-            "created_by": subj.teacher_id
-        })
-    
-    # Recent attendance records
-    attendances = db.query(AttendanceModel).order_by(AttendanceModel.date.desc()).limit(limit).all()
-    for att in attendances:
-        subject = db.query(SubjectModel).filter(SubjectModel.id == att.subject_id).first()
-        school = db.query(SchoolModel).filter(SchoolModel.id == subject.school_id).first() if subject else None
-        activities.append({
-            "type": "attendance",
-            "school_id": subject.school_id if subject else None,
-            "school_name": school.name if school else "Unknown",
-            "title": f"Attendance recorded for {subject.name if subject else 'Unknown subject'}",
-            "content": f"Date: {att.date}",
-            "created_at": att.created_at,
-            "created_by": subject.teacher_id if subject else None
-        })
-    
-    # Recent grades
-    grades = db.query(GradeModel).order_by(GradeModel.created_at.desc()).limit(limit).all()
-    for grade in grades:
-        subject = db.query(SubjectModel).filter(SubjectModel.id == grade.subject_id).first()
-        school = db.query(SchoolModel).filter(SchoolModel.id == subject.school_id).first() if subject else None
-        student = db.query(UserModel).filter(UserModel.id == grade.student_id).first()
-        activities.append({
-            "type": "grade",
-            "school_id": subject.school_id if subject else None,
-            "school_name": school.name if school else "Unknown",
-            "title": f"Grade recorded for {student.full_name if student else 'Unknown student'}",
-            "content": f"Subject: {subject.name if subject else 'Unknown'}, Grade: {grade.grade}",
-            "created_at": grade.created_at,
-            "created_by": subject.teacher_id if subject else None
-        })
-    
-    # Sort by created_at descending
-    activities.sort(key=lambda x: x["created_at"], reverse=True)
-    return activities[:limit]
+def get_recent_activities(
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    school_id: Optional[int] = None,
+    type: Optional[str] = Query(None, description="announcement, subject_created, attendance or grade"),
+    db: Session = Depends(get_read_db),
+    current_user: UserModel = Depends(require_owner)
+):
+    """Activity feed from the append-only event log (newest first, next page via X-Next-Cursor)"""
+    query = db.query(ActivityEventModel)
+    if school_id is not None:
+        query = query.filter(ActivityEventModel.school_id == school_id)
+    if type is not None:
+        query = query.filter(ActivityEventModel.event_type == type)
+    page = PageParams(limit=limit, cursor=cursor, include_total=False)
+    events = paginate(query, response, page, id_col=ActivityEventModel.id)
+    return [event_to_dict(e) for e in events]
 
 @router.post("/request_admin")
 def request_admin(request: AdminRequestCreate, db: Session = Depends(get_db)):
@@ -257,7 +261,8 @@ def delete_school_as_owner(school_id: int, db: Session = Depends(get_db), curren
         raise HTTPException(status_code=404, detail="School not found")
 
     # Get all user IDs belonging to this school for cascade deletions
-    user_ids = [u.id for u in db.query(UserModel).filter(UserModel.school_id == school_id).all()]
+    school_users = db.query(UserModel.id, UserModel.username).filter(UserModel.school_id == school_id).all()
+    user_ids = [u.id for u in school_users]
     # Get all subject IDs for this school
     subject_ids = [s.id for s in db.query(SubjectModel).filter(SubjectModel.school_id == school_id).all()]
     # Get all classroom IDs for this school
@@ -283,24 +288,28 @@ def delete_school_as_owner(school_id: int, db: Session = Depends(get_db), curren
             (GradeModel.classroom_id.in_(classroom_ids))
         ).delete(synchronize_session=False)
 
+        # Timetable data (steps 4-7, 15, 16) is deleted with Core statements and only this
+        # school's timetables are invalidated; ORM bulk deletes would invalidate every school
+        invalidate_schools(db.connection(), [school_id])
+
         # 4. Delete subject enrollments for students in this school OR for subjects in this school
-        db.query(SubjectStudentModel).filter(
-            (SubjectStudentModel.student_id.in_(user_ids)) |
-            (SubjectStudentModel.subject_id.in_(subject_ids))
-        ).delete(synchronize_session=False)
+        db.execute(delete(SubjectStudentModel.__table__).where(
+            (SubjectStudentModel.__table__.c.student_id.in_(user_ids)) |
+            (SubjectStudentModel.__table__.c.subject_id.in_(subject_ids))
+        ))
 
         # 5. Delete subject schedules (teacher assignments) for teachers/subjects/classrooms in this school
-        db.query(SubjectScheduleModel).filter(
-            (SubjectScheduleModel.subject_id.in_(subject_ids)) |
-            (SubjectScheduleModel.teacher_id.in_(user_ids)) |
-            (SubjectScheduleModel.classroom_id.in_(classroom_ids))
-        ).delete(synchronize_session=False)
+        db.execute(delete(SubjectScheduleModel.__table__).where(
+            (SubjectScheduleModel.__table__.c.subject_id.in_(subject_ids)) |
+            (SubjectScheduleModel.__table__.c.teacher_id.in_(user_ids)) |
+            (SubjectScheduleModel.__table__.c.classroom_id.in_(classroom_ids))
+        ))
 
         # 6. Delete schedule slots created by users in this school (after subject_schedules cleanup)
-        db.query(ScheduleSlotModel).filter(ScheduleSlotModel.created_by.in_(user_ids)).delete(synchronize_session=False)
+        db.execute(delete(ScheduleSlotModel.__table__).where(ScheduleSlotModel.__table__.c.created_by.in_(user_ids)))
 
         # 7. Delete classroom students for students in this school
-        db.query(ClassroomStudentModel).filter(ClassroomStudentModel.student_id.in_(user_ids)).delete(synchronize_session=False)
+        db.execute(delete(ClassroomStudentModel.__table__).where(ClassroomStudentModel.__table__.c.student_id.in_(user_ids)))
 
         # 8. Delete absences (both student_id and approved_by can be from this school)
         db.query(AbsenceModel).filter(AbsenceModel.student_id.in_(user_ids)).delete(synchronize_session=False)
@@ -316,8 +325,19 @@ def delete_school_as_owner(school_id: int, db: Session = Depends(get_db), curren
         db.query(HomeroomTeacherModel).filter(HomeroomTeacherModel.teacher_id.in_(user_ids)).delete(synchronize_session=False)
 
         # 12. Delete attendance records for subjects in this school
+        db.query(AttendanceRecordModel).filter(
+            (AttendanceRecordModel.subject_id.in_(subject_ids)) |
+            (AttendanceRecordModel.student_id.in_(user_ids))
+        ).delete(synchronize_session=False)
         db.query(AttendanceModel).filter(AttendanceModel.subject_id.in_(subject_ids)).delete(synchronize_session=False)
 
+        # 12b. Delete materialized ranking aggregates for students in this school
+        db.query(StudentScoreAggregateModel).filter(
+            (StudentScoreAggregateModel.student_id.in_(user_ids)) |
+            (StudentScoreAggregateModel.school_id == school_id)
+        ).delete(synchronize_session=False)
+        db.query(ActivityEventModel).filter(ActivityEventModel.school_id == school_id).delete(synchronize_session=False)
+
         # 13. Delete classroom_subject relations for subjects/classrooms in this school
         print("Deleting classroom_subjects by subject_ids")
         if subject_ids:
@@ -333,10 +353,10 @@ def delete_school_as_owner(school_id: int, db: Session = Depends(get_db), curren
         db.execute(text("DELETE FROM subjects WHERE school_id = :school_id"), {"school_id": school_id})
 
         # 15. Delete classrooms for this school
-        db.query(ClassroomModel).filter(ClassroomModel.school_id == school_id).delete(synchronize_session=False)
+        db.execute(delete(ClassroomModel.__table__).where(ClassroomModel.__table__.c.school_id == school_id))
 
         # 16. Delete all users belonging to this school
-        db.query(UserModel).filter(UserModel.school_id == school_id).delete(synchronize_session=False)
+        db.execute(delete(UserModel.__table__).where(UserModel.__table__.c.school_id == school_id))
 
         # Keep logo path for safe deletion after commit
         old_logo = school.logo_url
@@ -344,6 +364,9 @@ def delete_school_as_owner(school_id: int, db: Session = Depends(get_db), curren
         # 17. Delete the school
         db.delete(school)
         db.commit()
+        invalidate_school_stats()
+        # Deleted accounts must stop authenticating from the user cache
+        invalidate_user(*(u.username for u in school_users))
 
         # Safely delete logo file if it looks like our managed upload
         try:
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, UploadFile, File, Query
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from database.connection import get_db
@@ -12,9 +14,21 @@ from schemas.schedule import (
     ScheduleSlotUpdate,
     SubjectSchedule as SubjectScheduleSchema,
     SubjectScheduleCreate,
-    StudentScheduleResponse
+    StudentScheduleResponse,
+    ScheduleProposal,
+    ScheduleValidationRequest,
+    ScheduleValidationResult,
+    TimetableImportRequest,
+    GenerateTimetableRequest
 )
 from utils.security import get_current_user
+from utils.pagination import PageParams, paginate
+from utils.timetable import get_timetable, not_modified, effective_time
+from utils.ranking import graded_student_ids, refresh_student_scores
+from utils.schedule_conflicts import CONFLICT_STATUS, day_key, find_conflicts, school_index
+from utils.timetable_import import TimetableFileError, apply_plan, plan_import, public_report, read_sheet
+from utils.timetable_generator import MAX_TIME_BUDGET, build_problem, solution_rows, solve
+from utils.user_import import save_upload
 
 router = APIRouter(prefix="/schedule", tags=["schedule"])
 
@@ -33,7 +47,12 @@ def create_schedule_slot(
         )
     
     # Check for time conflicts
-    dow = str(schedule_slot.day_of_week)
+    dow = day_key(schedule_slot.day_of_week)
+    if dow is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid day_of_week: {schedule_slot.day_of_week}"
+        )
     existing_slot = db.query(ScheduleSlot).filter(
         ScheduleSlot.school_id == current_user.school_id,
         ScheduleSlot.day_of_week == dow,
@@ -48,7 +67,7 @@ def create_schedule_slot(
         )
     
     slot_data = schedule_slot.dict()
-    slot_data['day_of_week'] = str(slot_data.get('day_of_week'))
+    slot_data['day_of_week'] = dow
     db_schedule_slot = ScheduleSlot(
         **slot_data,
         school_id=current_user.school_id,
@@ -94,10 +113,16 @@ def update_schedule_slot(
         )
     
     # Check for time conflicts (excluding current slot)
+    dow = day_key(schedule_slot.day_of_week)
+    if dow is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid day_of_week: {schedule_slot.day_of_week}"
+        )
     existing_slot = db.query(ScheduleSlot).filter(
         ScheduleSlot.school_id == current_user.school_id,
         ScheduleSlot.id != slot_id,
-        ScheduleSlot.day_of_week == str(schedule_slot.day_of_week),
+        ScheduleSlot.day_of_week == dow,
         ScheduleSlot.start_time < schedule_slot.end_time,
         ScheduleSlot.end_time > schedule_slot.start_time
     ).first()
@@ -110,7 +135,7 @@ def update_schedule_slot(
     
     for key, value in schedule_slot.dict().items():
         if key == 'day_of_week':
-            value = str(value)
+            value = dow
         setattr(db_slot, key, value)
     
     db.commit()
@@ -144,6 +169,169 @@ def delete_schedule_slot(
     db.commit()
     return {"message": "Schedule slot deleted successfully"}
 
+def check_assignment(db: Session, school_id: int, assignment, teacher_id: int,
+                     replaces: int = None, check_slots: bool = True):
+    """Reject one assignment with its first conflict (HTTPException); returns its operating-hours slot id."""
+    proposal = ScheduleProposal(**assignment.dict(), id=replaces, teacher_id=teacher_id)
+    conflicts, slot_ids = find_conflicts(school_index(db, school_id), [proposal], check_slots=check_slots)
+    if conflicts:
+        raise HTTPException(status_code=CONFLICT_STATUS[conflicts[0]['type']], detail=conflicts[0]['message'])
+    return slot_ids[0]
+
+
+@router.post("/validate", response_model=ScheduleValidationResult)
+def validate_schedule_assignments(
+    payload: ScheduleValidationRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Check a batch of proposed assignments without saving anything.
+
+    Every teacher, classroom and operating-hours conflict is reported, both with
+    existing assignments and between assignments of the batch.
+    """
+    if current_user.role not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only teachers or admins can validate schedule assignments"
+        )
+    proposals = []
+    for i, p in enumerate(payload.assignments):
+        if current_user.role == "teacher":
+            p = p.copy(update={'teacher_id': current_user.id})
+        elif p.teacher_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"assignments[{i}]: teacher_id is required"
+            )
+        proposals.append(p)
+
+    conflicts, _ = find_conflicts(school_index(db, current_user.school_id), proposals, check_slots=payload.check_slots)
+    return ScheduleValidationResult(valid=not conflicts, conflicts=conflicts)
+
+def _import_timetable(db: Session, current_user: User, rows, mode: str, dry_run: bool, check_slots: bool):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can import timetables"
+        )
+    try:
+        plan = plan_import(db, current_user.school_id, rows, mode=mode, check_slots=check_slots)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if dry_run:
+        return public_report(plan, applied=False, dry_run=True)
+    if not plan['valid']:
+        # all or nothing: the report lists every row error and conflict
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=jsonable_encoder(public_report(plan, applied=False, dry_run=False)))
+    apply_plan(db, plan)
+    return public_report(plan, applied=True, dry_run=False)
+
+
+@router.post("/import", response_model=dict)
+def import_timetable(
+    payload: TimetableImportRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import a whole timetable in one transaction (rows numbered from 1).
+
+    With dry_run=true nothing is written and the diff (create/unchanged/delete)
+    and every error and conflict are returned. Otherwise all rows are applied,
+    or none if any row is invalid (400 with the same report).
+    """
+    rows = [(i, row.dict()) for i, row in enumerate(payload.rows, start=1)]
+    return _import_timetable(db, current_user, rows, payload.mode, payload.dry_run, payload.check_slots)
+
+
+@router.post("/import/excel", response_model=dict)
+def import_timetable_excel(
+    file: UploadFile = File(...),
+    mode: str = Query('merge'),
+    dry_run: bool = Query(False),
+    check_slots: bool = Query(True),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Same as POST /schedule/import from an .xlsx sheet (rows numbered as in the sheet).
+
+    Columns: day_of_week, start_time, end_time, subject_id or subject_code, and optionally
+    teacher_id/teacher_username, classroom_id/classroom_name, schedule_slot_id.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can import timetables"
+        )
+    path = save_upload(file.file)
+    try:
+        rows = read_sheet(path)
+    except TimetableFileError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        os.remove(path)
+    return _import_timetable(db, current_user, rows, mode, dry_run, check_slots)
+
+
+@router.post("/generate", response_model=dict)
+def generate_timetable(
+    payload: GenerateTimetableRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Generate a conflict-free weekly timetable for a set of classrooms.
+
+    Lessons come from the classrooms' subjects (credits x periods_per_credit periods a
+    week), periods from the school's operating hours. Returns the rows in the
+    POST /schedule/import format and the lessons that could not be placed. With
+    apply=true a complete timetable replaces the classrooms' timed assignments
+    (same all-or-nothing write as the import).
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can generate timetables"
+        )
+    try:
+        problem = build_problem(db, current_user.school_id, payload.classroom_ids,
+                                period_minutes=payload.period_minutes,
+                                periods_per_credit=payload.periods_per_credit,
+                                teacher_unavailable=payload.teacher_unavailable)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    solution = solve(problem, time_budget=min(payload.time_budget_seconds, MAX_TIME_BUDGET), seed=payload.seed)
+    rows, unscheduled = solution_rows(problem, solution)
+    result = {
+        'complete': solution.complete and bool(problem.lessons),
+        'stats': {
+            'lessons': len(problem.lessons),
+            'periods': len(problem.periods),
+            'placed': sum(1 for p in solution.assignment if p is not None),
+            'soft_cost': solution.soft_cost,
+            'iterations': solution.iterations,
+            'elapsed_seconds': round(solution.elapsed, 3),
+        },
+        'warnings': problem.warnings,
+        'unscheduled': unscheduled,
+        'rows': rows,
+        'applied': False,
+    }
+    if not payload.apply:
+        return result
+    if not result['complete']:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=jsonable_encoder(result))
+    plan = plan_import(db, current_user.school_id, list(enumerate(rows, start=1)), mode='replace')
+    if not plan['valid']:
+        # the data changed under the solver (or slots were edited): nothing is written
+        result['import'] = public_report(plan, applied=False, dry_run=False)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=jsonable_encoder(result))
+    apply_plan(db, plan)
+    result['applied'] = True
+    result['import'] = public_report(plan, applied=True, dry_run=False)
+    return result
+
+
 # Teacher endpoints - Assign subjects to schedule slots
 @router.post("/assign", response_model=SubjectScheduleSchema)
 def assign_subject_to_schedule(
@@ -186,84 +374,12 @@ def assign_subject_to_schedule(
             detail="Subject not assigned to you"
         )
     
-    # Validate time slot is within school operating hours
-    if assignment.schedule_slot_id:
-        # If schedule_slot_id is provided, validate against it
-        schedule_slot = db.query(ScheduleSlot).filter(
-            ScheduleSlot.id == assignment.schedule_slot_id,
-            ScheduleSlot.school_id == current_user.school_id
-        ).first()
-        
-        if not schedule_slot:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Schedule slot not found"
-            )
-        
-        # Check if the subject time fits within the operating hours
-        if (assignment.start_time < schedule_slot.start_time or 
-            assignment.end_time > schedule_slot.end_time or
-            str(assignment.day_of_week) != str(schedule_slot.day_of_week)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Subject schedule must be within school operating hours"
-            )
-    else:
-        # If no schedule_slot_id, find operating hours for the day
-        schedule_slot = db.query(ScheduleSlot).filter(
-            ScheduleSlot.school_id == current_user.school_id,
-                ScheduleSlot.day_of_week == str(assignment.day_of_week)
-        ).first()
-        
-        if not schedule_slot:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"No operating hours defined for day {assignment.day_of_week}"
-            )
-        
-        # Check if the subject time fits within the operating hours
-        if (assignment.start_time < schedule_slot.start_time or 
-            assignment.end_time > schedule_slot.end_time):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Subject schedule ({assignment.start_time}-{assignment.end_time}) must be within school operating hours ({schedule_slot.start_time}-{schedule_slot.end_time})"
-            )
-    
-    # Check for time conflicts with other subjects on the same day
-    # Same teacher cannot have overlapping schedules at the same time (even across different classrooms)
-    existing_schedule = db.query(SubjectSchedule).filter(
-        SubjectSchedule.day_of_week == str(assignment.day_of_week),
-        SubjectSchedule.start_time < assignment.end_time,
-        SubjectSchedule.end_time > assignment.start_time,
-        SubjectSchedule.teacher_id == current_user.id
-    ).first()
-    
-    if existing_schedule:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Teacher cannot have overlapping schedules at the same time"
-        )
-    
-    # Check if same time slot has a subject in the same classroom already (only one subject per timeslot per classroom)
-    if assignment.classroom_id:
-        existing_subject_in_classroom = db.query(SubjectSchedule).filter(
-            SubjectSchedule.classroom_id == assignment.classroom_id,
-            SubjectSchedule.day_of_week == str(assignment.day_of_week),
-            SubjectSchedule.start_time < assignment.end_time,
-            SubjectSchedule.end_time > assignment.start_time
-        ).first()
-        
-        if existing_subject_in_classroom:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="This classroom already has a subject scheduled at this time"
-            )
+    # Operating hours, teacher overlaps (any classroom) and classroom overlaps
+    schedule_slot_id = check_assignment(db, current_user.school_id, assignment, teacher_id=current_user.id)
     
     try:
-        # Determine schedule_slot_id - use provided one or find appropriate one
-        final_schedule_slot_id = assignment.schedule_slot_id
-        if not final_schedule_slot_id and schedule_slot:
-            final_schedule_slot_id = schedule_slot.id
+        # Determine schedule_slot_id - use provided one or the operating hours it falls into
+        final_schedule_slot_id = schedule_slot_id
         
         # If classroom_id is provided, validate teacher teaches that classroom
         if assignment.classroom_id:
@@ -284,7 +400,7 @@ def assign_subject_to_schedule(
             schedule_slot_id=final_schedule_slot_id,  # Can be None for custom schedules
             teacher_id=current_user.id,
             classroom_id=assignment.classroom_id,  # Optional: specific classroom only
-            day_of_week=str(assignment.day_of_week),
+            day_of_week=day_key(assignment.day_of_week),
             start_time=assignment.start_time,
             end_time=assignment.end_time
         )
@@ -318,6 +434,8 @@ def assign_subject_to_schedule(
 
 @router.get("/teacher", response_model=List[SubjectScheduleSchema])
 def get_teacher_schedules(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -326,36 +444,43 @@ def get_teacher_schedules(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only teachers can access this endpoint"
         )
-    
-    schedules = db.query(SubjectSchedule).options(
-        joinedload(SubjectSchedule.subject),
-        joinedload(SubjectSchedule.schedule_slot),
-        joinedload(SubjectSchedule.classroom)
-    ).filter(
-        SubjectSchedule.teacher_id == current_user.id
-    ).all()
-    
-    result = []
-    for schedule in schedules:
-        result.append(SubjectScheduleSchema(
-            id=schedule.id,
-            subject_id=schedule.subject_id,
-            schedule_slot_id=schedule.schedule_slot_id,
-            teacher_id=schedule.teacher_id,
-            classroom_id=schedule.classroom_id,
-            day_of_week=schedule.day_of_week,
-            start_time=schedule.start_time,
-            end_time=schedule.end_time,
-            subject_name=schedule.subject.name if schedule.subject else None,
-            teacher_name=current_user.full_name,
-            classroom_name=schedule.classroom.name if schedule.classroom else None
-        ))
-    
-    return result
+
+    entries = get_timetable(db, request, response, 'teacher', current_user.id, current_user.school_id)
+    if entries is None:
+        return not_modified(response)
+
+    return [SubjectScheduleSchema(
+        id=e['subject_schedule_id'],
+        subject_id=e['subject_id'],
+        schedule_slot_id=e['schedule_slot_id'],
+        teacher_id=e['teacher_id'],
+        classroom_id=e['classroom_id'],
+        day_of_week=e['day_of_week'],
+        start_time=e['start_time'],
+        end_time=e['end_time'],
+        subject_name=e['subject_name'],
+        subject_code=e['subject_code'],
+        teacher_name=current_user.full_name,
+        classroom_name=e['classroom_name']
+    ) for e in entries]
+
+
+def student_schedule_response(entries) -> List[StudentScheduleResponse]:
+    """Timetable entries as StudentScheduleResponse (day/time of the ScheduleSlot when linked)."""
+    return [StudentScheduleResponse(
+        id=e['subject_schedule_id'],
+        subject_id=e['subject_id'],
+        subject_name=e['subject_name'],
+        subject_code=e['subject_code'],
+        teacher_name=e['teacher_name'] or 'Unknown',
+        **effective_time(e)
+    ) for e in entries]
 
 
 @router.get('/student', response_model=List[StudentScheduleResponse])
 def get_student_schedule_current(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -363,71 +488,55 @@ def get_student_schedule_current(
     if current_user.role != 'student':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Only students can access this endpoint')
 
-    student_id = current_user.id
+    # direct enrollments plus the subjects of the active classroom, ordered by day then time
+    entries = get_timetable(db, request, response, 'student', current_user.id, current_user.school_id)
+    if entries is None:
+        return not_modified(response)
+    return student_schedule_response(entries)
 
-    # Student's active classroom
-    cs = db.query(SubjectStudent).filter(SubjectStudent.student_id == student_id).all()
 
-    from models.classroom import ClassroomStudent as ClassroomStudentModel
-    from models.classroom_subject import ClassroomSubject as ClassroomSubjectModel
-
-    classroom_student = db.query(ClassroomStudentModel).filter(
-        ClassroomStudentModel.student_id == student_id,
-        ClassroomStudentModel.is_active == True
-    ).first()
-    classroom_id = classroom_student.classroom_id if classroom_student else None
-
-    # Direct enrollments
-    enrolled_subject_ids = [r.subject_id for r in db.query(SubjectStudent).filter(SubjectStudent.student_id == student_id).all()]
-
-    # Subjects assigned to classroom
-    classroom_subject_ids = []
-    if classroom_id:
-        classroom_subject_ids = [r.subject_id for r in db.query(ClassroomSubjectModel).filter(ClassroomSubjectModel.classroom_id == classroom_id).all()]
-
-    subject_ids = set(enrolled_subject_ids) | set(classroom_subject_ids)
-
-    if not subject_ids:
-        return []
-
-    # Find schedules for these subjects that are global or target the student's classroom
-    schedules = db.query(SubjectSchedule).options(joinedload(SubjectSchedule.subject), joinedload(SubjectSchedule.teacher)).filter(
-        SubjectSchedule.subject_id.in_(list(subject_ids)),
-        ((SubjectSchedule.classroom_id == None) | (SubjectSchedule.classroom_id == classroom_id))
-    ).all()
-
-    result = []
-    for s in schedules:
-        teacher_name = s.teacher.full_name if s.teacher and getattr(s.teacher, 'full_name', None) else (s.teacher.username if s.teacher else 'Unknown')
-        # Prefer schedule_slot if present
-        if s.schedule_slot:
-            day_of_week = s.schedule_slot.day_of_week
-            start_time = s.schedule_slot.start_time
-            end_time = s.schedule_slot.end_time
-        else:
-            day_of_week = s.day_of_week
-            start_time = s.start_time
-            end_time = s.end_time
-
-        result.append(StudentScheduleResponse(
-            id=s.id,
-            subject_id=s.subject_id,
-            subject_name=s.subject.name if s.subject else None,
-            subject_code=s.subject.code if s.subject else None,
-            teacher_name=teacher_name,
-            day_of_week=day_of_week,
-            start_time=start_time,
-            end_time=end_time
-        ))
+@router.get('/classroom/{classroom_id}', response_model=List[SubjectScheduleSchema])
+def get_classroom_schedule(
+    classroom_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Weekly timetable of one classroom: its own schedules plus school-wide ones of its subjects."""
+    from models.classroom import Classroom, ClassroomStudent
 
-    # Sort by day then starts
-    def sort_key(item):
-        dow = item.day_of_week if item.day_of_week is not None else ''
-        st = item.start_time if item.start_time is not None else ''
-        return (str(dow), str(st))
+    classroom = db.query(Classroom).filter(Classroom.id == classroom_id).first()
+    if not classroom:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Classroom not found")
+    if current_user.role != 'owner' and current_user.school_id != classroom.school_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this classroom's schedule")
+    if current_user.role == 'student':
+        member = db.query(ClassroomStudent.id).filter(
+            ClassroomStudent.classroom_id == classroom_id,
+            ClassroomStudent.student_id == current_user.id,
+            ClassroomStudent.is_active == True
+        ).first()
+        if not member:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this classroom's schedule")
 
-    result.sort(key=sort_key)
-    return result
+    entries = get_timetable(db, request, response, 'classroom', classroom_id, classroom.school_id)
+    if entries is None:
+        return not_modified(response)
+    return [SubjectScheduleSchema(
+        id=e['subject_schedule_id'],
+        subject_id=e['subject_id'],
+        schedule_slot_id=e['schedule_slot_id'],
+        teacher_id=e['teacher_id'],
+        classroom_id=e['classroom_id'],
+        day_of_week=e['day_of_week'],
+        start_time=e['start_time'],
+        end_time=e['end_time'],
+        subject_name=e['subject_name'],
+        subject_code=e['subject_code'],
+        teacher_name=e['teacher_name'],
+        classroom_name=e['classroom_name']
+    ) for e in entries]
 
 @router.put("/assign/{assignment_id}", response_model=SubjectScheduleSchema)
 def update_subject_schedule(
@@ -491,76 +600,10 @@ def update_subject_schedule(
                 detail="Subject not found in your school"
             )
     
-    # Validate time slot is within school operating hours
-    if assignment.schedule_slot_id:
-        schedule_slot = db.query(ScheduleSlot).filter(
-            ScheduleSlot.id == assignment.schedule_slot_id,
-            ScheduleSlot.school_id == current_user.school_id
-        ).first()
-        
-        if not schedule_slot:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Schedule slot not found"
-            )
-        
-        if (assignment.start_time < schedule_slot.start_time or 
-            assignment.end_time > schedule_slot.end_time or
-            str(assignment.day_of_week) != str(schedule_slot.day_of_week)):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Subject schedule must be within school operating hours"
-            )
-    else:
-        schedule_slot = db.query(ScheduleSlot).filter(
-            ScheduleSlot.school_id == current_user.school_id,
-            ScheduleSlot.day_of_week == str(assignment.day_of_week)
-        ).first()
-        
-        if not schedule_slot:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"No operating hours defined for day {assignment.day_of_week}"
-            )
-        
-        if (assignment.start_time < schedule_slot.start_time or 
-            assignment.end_time > schedule_slot.end_time):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Subject schedule ({assignment.start_time}-{assignment.end_time}) must be within school operating hours ({schedule_slot.start_time}-{schedule_slot.end_time})"
-            )
-    
-    # Check for time conflicts with other subjects on the same day (excluding current assignment)
-    # Same teacher cannot have overlapping schedules at the same time (even across different classrooms)
-    existing_schedule = db.query(SubjectSchedule).filter(
-        SubjectSchedule.id != assignment_id,
-        SubjectSchedule.day_of_week == str(assignment.day_of_week),
-        SubjectSchedule.start_time < assignment.end_time,
-        SubjectSchedule.end_time > assignment.start_time,
-        SubjectSchedule.teacher_id == current_user.id
-    ).first()
-    
-    if existing_schedule:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Teacher cannot have overlapping schedules at the same time"
-        )
-    
-    # Check if same time slot has a subject in the same classroom already (only one subject per timeslot per classroom)
-    if assignment.classroom_id:
-        existing_subject_in_classroom = db.query(SubjectSchedule).filter(
-            SubjectSchedule.id != assignment_id,
-            SubjectSchedule.classroom_id == assignment.classroom_id,
-            SubjectSchedule.day_of_week == str(assignment.day_of_week),
-            SubjectSchedule.start_time < assignment.end_time,
-            SubjectSchedule.end_time > assignment.start_time
-        ).first()
-        
-        if existing_subject_in_classroom:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="This classroom already has a subject scheduled at this time"
-            )
+    # Operating hours and overlaps, ignoring the assignment's own current time;
+    # teacher overlaps are checked for the assignment's teacher (also when an admin edits it)
+    check_assignment(db, current_user.school_id, assignment,
+                     teacher_id=db_assignment.teacher_id, replaces=assignment_id)
     
     try:
         # If classroom_id is provided, validate teacher teaches that classroom
@@ -581,7 +624,7 @@ def update_subject_schedule(
         db_assignment.subject_id = assignment.subject_id
         db_assignment.schedule_slot_id = assignment.schedule_slot_id
         db_assignment.classroom_id = assignment.classroom_id
-        db_assignment.day_of_week = str(assignment.day_of_week)
+        db_assignment.day_of_week = day_key(assignment.day_of_week)
         db_assignment.start_time = assignment.start_time
         db_assignment.end_time = assignment.end_time
         
@@ -648,6 +691,10 @@ def delete_subject_schedule(
 
 @router.get("/assignments", response_model=List[SubjectScheduleSchema])
 def get_school_assignments(
+    response: Response,
+    teacher_id: int = None,
+    classroom_id: int = None,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -663,7 +710,12 @@ def get_school_assignments(
         joinedload(SubjectSchedule.teacher)
     ).filter(
         SubjectSchedule.subject.has(school_id=current_user.school_id)
-    ).all()
+    )
+    if teacher_id is not None:
+        schedules = schedules.filter(SubjectSchedule.teacher_id == teacher_id)
+    if classroom_id is not None:
+        schedules = schedules.filter(SubjectSchedule.classroom_id == classroom_id)
+    schedules = paginate(schedules, response, page, id_col=SubjectSchedule.id, descending=False)
     
     result = []
     for schedule in schedules:
@@ -683,63 +735,6 @@ def get_school_assignments(
     
     return result
 
-# Student endpoint - Get student's schedule
-@router.get("/student", response_model=List[StudentScheduleResponse])
-def get_student_schedule(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    if current_user.role != "student":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only students can access this endpoint"
-        )
-    
-    # Import needed models
-    from models.classroom import ClassroomStudent, Classroom
-    
-    # Get student's current classroom
-    student_classroom = db.query(ClassroomStudent).join(
-        Classroom, ClassroomStudent.classroom_id == Classroom.id
-    ).filter(
-        ClassroomStudent.student_id == current_user.id,
-        ClassroomStudent.is_active == True
-    ).first()
-    
-    classroom_id = student_classroom.classroom_id if student_classroom else None
-    
-    # Get all subjects the student is enrolled in
-    student_subjects = db.query(SubjectStudent.subject_id).filter(
-        SubjectStudent.student_id == current_user.id
-    ).subquery()
-    
-    # Get schedules for those subjects
-    # Filter by: (classroom_id matches student's classroom) OR (classroom_id is NULL = applies to all)
-    schedules = db.query(SubjectSchedule).options(
-        joinedload(SubjectSchedule.subject),
-        joinedload(SubjectSchedule.schedule_slot),
-        joinedload(SubjectSchedule.teacher)
-    ).filter(
-        SubjectSchedule.subject_id.in_(student_subjects),
-        # Show schedules that either match student's classroom or apply to all classrooms
-        (SubjectSchedule.classroom_id == classroom_id) | (SubjectSchedule.classroom_id == None)
-    ).all()
-    
-    result = []
-    for schedule in schedules:
-        result.append(StudentScheduleResponse(
-            id=schedule.id,
-            subject_id=schedule.subject_id,
-            subject_name=schedule.subject.name if schedule.subject else "",
-            subject_code=schedule.subject.code if schedule.subject else "",
-            teacher_name=schedule.teacher.full_name if schedule.teacher else "",
-            day_of_week=schedule.day_of_week,
-            start_time=schedule.start_time,
-            end_time=schedule.end_time
-        ))
-    
-    return result
-
 # Admin endpoints - Assign schedules to teachers and students
 @router.post("/assign_admin", response_model=SubjectScheduleSchema)
 def admin_assign_schedule_to_teacher(
@@ -787,35 +782,8 @@ def admin_assign_schedule_to_teacher(
             detail="Subject not found in your school"
         )
     
-    # Check for time conflicts with other subjects on the same day
-    # Same teacher cannot have overlapping schedules at the same time (even across different classrooms)
-    existing_schedule = db.query(SubjectSchedule).filter(
-        SubjectSchedule.day_of_week == str(assignment.day_of_week),
-        SubjectSchedule.start_time < assignment.end_time,
-        SubjectSchedule.end_time > assignment.start_time,
-        SubjectSchedule.teacher_id == teacher_id
-    ).first()
-    
-    if existing_schedule:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Teacher cannot have overlapping schedules at the same time"
-        )
-    
-    # Check if same time slot has a subject in the same classroom already (only one subject per timeslot per classroom)
-    if assignment.classroom_id:
-        existing_subject_in_classroom = db.query(SubjectSchedule).filter(
-            SubjectSchedule.classroom_id == assignment.classroom_id,
-            SubjectSchedule.day_of_week == str(assignment.day_of_week),
-            SubjectSchedule.start_time < assignment.end_time,
-            SubjectSchedule.end_time > assignment.start_time
-        ).first()
-        
-        if existing_subject_in_classroom:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="This classroom already has a subject scheduled at this time"
-            )
+    # Teacher overlaps (any classroom) and classroom overlaps; admins may schedule outside operating hours
+    check_assignment(db, current_user.school_id, assignment, teacher_id=teacher_id, check_slots=False)
     
     try:
         # Determine schedule_slot_id if provided
@@ -840,7 +808,7 @@ def admin_assign_schedule_to_teacher(
             schedule_slot_id=final_schedule_slot_id,
             teacher_id=teacher_id,  # Assign to specified teacher
             classroom_id=assignment.classroom_id,
-            day_of_week=str(assignment.day_of_week),
+            day_of_week=day_key(assignment.day_of_week),
             start_time=assignment.start_time,
             end_time=assignment.end_time
         )
@@ -957,6 +925,8 @@ def admin_assign_schedule_to_student(
             subject_id=subject_id
         )
         db.add(enrollment)
+        db.flush()
+        refresh_student_scores(db, graded_student_ids(db, subject_id, [student_id]))
         db.commit()
         
         return {
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Body
+from fastapi import APIRouter, HTTPException, Depends, status, Body, Request, Response
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -13,6 +14,11 @@ from models.schedule import SubjectSchedule as SubjectScheduleModel
 from database.connection import get_db
 from routers.user import get_current_user
 from schemas.user import User as UserSchema
+from utils.pagination import PageParams, paginate
+from utils.activity import record_activity
+from utils.timetable import get_timetable, invalidate_schools, not_modified, effective_time
+from utils.enrollment import enroll_in_subject
+from utils.ranking import graded_student_ids, refresh_student_scores
 
 router = APIRouter(prefix="/subjects", tags=["subjects"])
 
@@ -79,6 +85,9 @@ def create_subject(subject: SubjectCreate, db: Session = Depends(get_db), curren
         max_exam_score=getattr(subject, 'max_exam_score', 100)
     )
     db.add(new_sub)
+    teacher = db.query(UserModel.full_name).filter(UserModel.id == subject.teacher_id).first() if subject.teacher_id else None
+    record_activity(db, 'subject_created', school_id, f"Subject '{subject.name}' created",
+                    content=f"Teacher: {teacher[0] if teacher else 'Unknown'}", actor_id=current_user.id)
     db.commit()
     db.refresh(new_sub)
     return new_sub
@@ -106,6 +115,8 @@ def update_subject(subject_id: int, subject: SubjectCreate, db: Session = Depend
     if new_type == 'activity' and new_percent:
         validate_activity_percentage(db, subject_id=subject_id, new_percentage=new_percent, school_id=subj.school_id)
     
+    scoring_before = (subj.subject_type, subj.activity_percentage, subj.max_collected_score, subj.max_exam_score)
+
     # Update fields
     if subject.name:
         subj.name = subject.name
@@ -124,6 +135,10 @@ def update_subject(subject_id: int, subject: SubjectCreate, db: Session = Depend
         subj.max_collected_score = subject.max_collected_score
     if getattr(subject, 'max_exam_score', None) is not None:
         subj.max_exam_score = subject.max_exam_score
+
+    # คะแนนรวมที่ใช้จัดอันดับขึ้นกับการตั้งค่าคะแนนของวิชา
+    if (subj.subject_type, subj.activity_percentage, subj.max_collected_score, subj.max_exam_score) != scoring_before:
+        refresh_student_scores(db, graded_student_ids(db, subject_id))
     
     db.commit()
     db.refresh(subj)
@@ -132,11 +147,13 @@ def update_subject(subject_id: int, subject: SubjectCreate, db: Session = Depend
 
 @router.get("", response_model=List[Subject])
 @router.get("/", response_model=List[Subject])
-def list_subjects(db: Session = Depends(get_db), school_id: int = None):
+def list_subjects(response: Response, db: Session = Depends(get_db), school_id: int = None, subject_type: str = None, page: PageParams = Depends()):
     query = db.query(SubjectModel)
     if school_id is not None:
         query = query.filter(SubjectModel.school_id == school_id)
-    return query.order_by(SubjectModel.created_at.desc()).all()
+    if subject_type is not None:
+        query = query.filter(SubjectModel.subject_type == subject_type)
+    return paginate(query, response, page, id_col=SubjectModel.id, sort_col=SubjectModel.created_at)
 
 
 @router.get("/{subject_id}", response_model=Subject)
@@ -511,6 +528,8 @@ def enroll_student(subject_id: int, student_id: int = Body(..., embed=True), db:
         raise HTTPException(status_code=400, detail='Student already enrolled')
     rel = SubjectStudentModel(subject_id=subject_id, student_id=student_id)
     db.add(rel)
+    db.flush()
+    refresh_student_scores(db, graded_student_ids(db, subject_id, [student_id]))
     db.commit()
     db.refresh(rel)
     return { 'detail': 'enrolled', 'id': rel.id }
@@ -534,39 +553,22 @@ def enroll_students_by_grade(subject_id: int, grade_level: str = Body(..., embed
         raise HTTPException(status_code=403, detail='Not authorized to enroll students to this subject')
     
     # Get all students with matching grade_level in the same school
-    students = db.query(UserModel).filter(
+    student_ids = [sid for (sid,) in db.query(UserModel.id).filter(
         UserModel.role == 'student',
         UserModel.grade_level == grade_level,
         UserModel.school_id == subj.school_id
-    ).all()
+    ).order_by(UserModel.id)]
     
-    if not students:
+    if not student_ids:
         raise HTTPException(status_code=404, detail=f'No students found with grade_level: {grade_level}')
     
-    enrolled_count = 0
-    failed_count = 0
-    
-    for student in students:
-        # Check if already enrolled
-        exists = db.query(SubjectStudentModel).filter(
-            SubjectStudentModel.subject_id == subject_id,
-            SubjectStudentModel.student_id == student.id
-        ).first()
-        
-        if not exists:
-            rel = SubjectStudentModel(subject_id=subject_id, student_id=student.id)
-            db.add(rel)
-            enrolled_count += 1
-        else:
-            failed_count += 1
-    
-    db.commit()
+    result = enroll_in_subject(db, subj, student_ids)
     return {
         'detail': f'Bulk enrollment completed',
         'grade_level': grade_level,
-        'enrolled_count': enrolled_count,
-        'already_enrolled_count': failed_count,
-        'total_students': len(students)
+        'enrolled_count': len(result['enrolled']),
+        'already_enrolled_count': len(result['already_enrolled']),
+        'total_students': len(student_ids)
     }
 
 
@@ -590,6 +592,7 @@ def unenroll_student(subject_id: int, student_id: int, db: Session = Depends(get
     if not rel:
         raise HTTPException(status_code=404, detail='Enrollment not found')
     db.delete(rel)
+    refresh_student_scores(db, graded_student_ids(db, subject_id, [student_id]))
     db.commit()
     return
 
@@ -617,29 +620,37 @@ def delete_subject(subject_id: int, db: Session = Depends(get_db), current_user=
     if unfinished_teachers:
         raise HTTPException(status_code=400, detail="ไม่สามารถลบได้ เนื่องจากยังมีครูที่ยังไม่ได้จบคอร์ส ต้องให้ครูทั้งหมดกดจบคอร์สก่อน")
 
+    # Students whose ranking totals include this subject (refreshed once it is gone)
+    graded = graded_student_ids(db, subject_id)
+
     # Delete related records first to avoid foreign key constraint errors
-    from models.attendance import Attendance as AttendanceModel
+    from models.attendance import Attendance as AttendanceModel, AttendanceRecord as AttendanceRecordModel
     from models.grade import Grade as GradeModel
 
     # Delete attendance records
+    db.query(AttendanceRecordModel).filter(AttendanceRecordModel.subject_id == subject_id).delete()
     db.query(AttendanceModel).filter(AttendanceModel.subject_id == subject_id).delete()
 
     # Delete grade records
     db.query(GradeModel).filter(GradeModel.subject_id == subject_id).delete()
 
-    # Delete subject schedules
-    db.query(SubjectScheduleModel).filter(SubjectScheduleModel.subject_id == subject_id).delete()
+    # Delete subject schedules (timetable rows: Core deletes that invalidate only this
+    # school's timetables; an ORM bulk delete would invalidate every school)
+    db.execute(delete(SubjectScheduleModel.__table__).where(SubjectScheduleModel.__table__.c.subject_id == subject_id))
+    invalidate_schools(db.connection(), [subj.school_id])
     db.commit()  # Commit to ensure classroom_subjects are deleted before deleting subject
 
     # Delete student enrollments
-    db.query(SubjectStudentModel).filter(SubjectStudentModel.subject_id == subject_id).delete()
+    db.execute(delete(SubjectStudentModel.__table__).where(SubjectStudentModel.__table__.c.subject_id == subject_id))
 
     # Delete classroom-subject relationships
-    db.query(ClassroomSubjectModel).filter(ClassroomSubjectModel.subject_id == subject_id).delete()
+    db.execute(delete(ClassroomSubjectModel.__table__).where(ClassroomSubjectModel.__table__.c.subject_id == subject_id))
+    invalidate_schools(db.connection(), [subj.school_id])
     db.commit()  # Commit to ensure classroom_subjects are deleted before deleting subject
 
     # Now delete the subject
     db.delete(subj)
+    refresh_student_scores(db, graded)
     db.commit()
     return
 
@@ -667,6 +678,9 @@ def end_subject(subject_id: int, db: Session = Depends(get_db), current_user=Dep
             raise HTTPException(status_code=403, detail="Not authorized to end this subject")
     
     subj.is_ended = True
+    if subj.subject_type == 'activity':
+        # วิชากิจกรรมที่จบแล้วไม่นับในคะแนนรวม
+        refresh_student_scores(db, graded_student_ids(db, subject_id))
     db.commit()
     db.refresh(subj)
     return subj
@@ -681,6 +695,8 @@ def unend_subject(subject_id: int, db: Session = Depends(get_db), current_user=D
     if subj.teacher_id != getattr(current_user, 'id', None):
         raise HTTPException(status_code=403, detail="Not authorized to unend this subject")
     subj.is_ended = False
+    if subj.subject_type == 'activity':
+        refresh_student_scores(db, graded_student_ids(db, subject_id))
     db.commit()
     db.refresh(subj)
     return subj
@@ -719,31 +735,18 @@ def assign_classroom_to_subject(subject_id: int, classroom_id: int = Body(..., e
     db.commit()
     
     # Auto-enroll all active students in this classroom
-    students = db.query(ClassroomStudentModel).filter(
+    student_ids = [sid for (sid,) in db.query(ClassroomStudentModel.student_id).filter(
         ClassroomStudentModel.classroom_id == classroom_id,
         ClassroomStudentModel.is_active == True
-    ).all()
+    ).order_by(ClassroomStudentModel.id)]
     
-    enrolled_count = 0
-    for cs in students:
-        # Check if already enrolled in subject
-        existing_enrollment = db.query(SubjectStudentModel).filter(
-            SubjectStudentModel.subject_id == subject_id,
-            SubjectStudentModel.student_id == cs.student_id
-        ).first()
-        
-        if not existing_enrollment:
-            enrollment = SubjectStudentModel(subject_id=subject_id, student_id=cs.student_id)
-            db.add(enrollment)
-            enrolled_count += 1
-    
-    db.commit()
+    result = enroll_in_subject(db, subject, student_ids)
     
     return {
         'detail': 'Classroom assigned successfully',
         'subject_id': subject_id,
         'classroom_id': classroom_id,
-        'students_enrolled': enrolled_count
+        'students_enrolled': len(result['enrolled'])
     }
 
 
@@ -1028,68 +1031,35 @@ def remove_subject_teacher(subject_id: int, teacher_id: int, classroom_id: int =
 # Schedule endpoints
 # -------------------------
 @router.get('/schedules/teacher/{teacher_id}', response_model=List[SubjectScheduleSchema])
-def get_teacher_schedule(teacher_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_teacher_schedule(teacher_id: int, request: Request, response: Response, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     """Return schedule entries for a teacher using admin-provided assignments.
     Admins may fetch any teacher; teachers may fetch only their own schedule."""
     # Authorization
     if getattr(current_user, 'role', None) != 'admin' and getattr(current_user, 'id', None) != int(teacher_id):
         raise HTTPException(status_code=403, detail='Not authorized to view this teacher\'s schedule')
 
-    schedules = db.query(SubjectScheduleModel).filter(SubjectScheduleModel.teacher_id == teacher_id).all()
-
-    result = []
-    for s in schedules:
-        subject = db.query(SubjectModel).filter(SubjectModel.id == s.subject_id).first()
-        teacher = db.query(UserModel).filter(UserModel.id == s.teacher_id).first()
-        teacher_name = teacher.full_name or teacher.username if teacher else 'Unknown'
-
-        classroom_name = None
-        if s.classroom_id:
-            classroom = db.query(ClassroomModel).filter(ClassroomModel.id == s.classroom_id).first()
-            classroom_name = classroom.name if classroom else None
-
-        # Prefer schedule_slot if present, otherwise use custom fields on SubjectSchedule
-        day_of_week = None
-        start_time = None
-        end_time = None
-        schedule_slot_id = None
-        if s.schedule_slot_id and s.schedule_slot:
-            schedule_slot_id = s.schedule_slot_id
-            day_of_week = s.schedule_slot.day_of_week
-            start_time = s.schedule_slot.start_time
-            end_time = s.schedule_slot.end_time
-        else:
-            day_of_week = s.day_of_week
-            start_time = s.start_time
-            end_time = s.end_time
-
-        result.append({
-            'id': s.id,
-            'subject_id': s.subject_id,
-            'subject_name': subject.name if subject else None,
-            'subject_code': subject.code if subject else None,
-            'teacher_id': s.teacher_id,
-            'teacher_name': teacher_name,
-            'classroom_id': s.classroom_id,
-            'classroom_name': classroom_name,
-            'day_of_week': day_of_week,
-            'start_time': start_time,
-            'end_time': end_time,
-            'schedule_slot_id': schedule_slot_id
-        })
-
-    # Optional: sort by day_of_week then start_time for predictable order
-    def sort_key(item):
-        dow = item['day_of_week'] if item['day_of_week'] is not None else ''
-        st = item['start_time'] if item['start_time'] is not None else ''
-        return (str(dow), str(st))
-
-    result.sort(key=sort_key)
-    return result
+    teacher = db.query(UserModel.school_id).filter(UserModel.id == teacher_id).first()
+    entries = get_timetable(db, request, response, 'teacher', teacher_id, teacher[0] if teacher else None)
+    if entries is None:
+        return not_modified(response)
+
+    # ordered by day_of_week then start_time; day/time of the schedule_slot when present
+    return [{
+        'id': e['subject_schedule_id'],
+        'subject_id': e['subject_id'],
+        'subject_name': e['subject_name'],
+        'subject_code': e['subject_code'],
+        'teacher_id': e['teacher_id'],
+        'teacher_name': e['teacher_name'] or 'Unknown',
+        'classroom_id': e['classroom_id'],
+        'classroom_name': e['classroom_name'],
+        'schedule_slot_id': e['schedule_slot_id'],
+        **effective_time(e)
+    } for e in entries]
 
 
 @router.get('/schedules/student/{student_id}', response_model=List[StudentScheduleResponse])
-def get_student_schedule(student_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_student_schedule(student_id: int, request: Request, response: Response, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     """Return schedule entries for a student based on their enrollments and classroom assignments.
     Admins may fetch any student; students may fetch their own schedule. Teachers are allowed if they teach the student's classroom."""
     # Authorization
@@ -1114,68 +1084,19 @@ def get_student_schedule(student_id: int, db: Session = Depends(get_db), current
         else:
             raise HTTPException(status_code=403, detail='Not authorized to view this student\'s schedule')
 
-    # Determine student's active classroom
-    classroom_student = db.query(ClassroomStudentModel).filter(
-        ClassroomStudentModel.student_id == student_id,
-        ClassroomStudentModel.is_active == True
-    ).first()
-
-    classroom_id = classroom_student.classroom_id if classroom_student else None
-
-    # Subjects the student is directly enrolled in
-    enrolled_subject_ids = [r[0] for r in db.query(SubjectStudentModel.subject_id).filter(SubjectStudentModel.student_id == student_id).all()]
-
-    # Subjects assigned to the student's classroom
-    classroom_subject_ids = []
-    if classroom_id:
-        classroom_subject_ids = [r[0] for r in db.query(ClassroomSubjectModel.subject_id).filter(ClassroomSubjectModel.classroom_id == classroom_id).all()]
-
-    subject_ids = set(enrolled_subject_ids) | set(classroom_subject_ids)
-
-    if not subject_ids:
-        return []
-
-    # Find schedules for these subjects that either are global (classroom_id is NULL) or target the student's classroom
-    schedules = db.query(SubjectScheduleModel).filter(
-        SubjectScheduleModel.subject_id.in_(list(subject_ids)),
-        ((SubjectScheduleModel.classroom_id == None) | (SubjectScheduleModel.classroom_id == classroom_id))
-    ).all()
-
-    result = []
-    for s in schedules:
-        subject = db.query(SubjectModel).filter(SubjectModel.id == s.subject_id).first()
-        teacher = db.query(UserModel).filter(UserModel.id == s.teacher_id).first()
-        teacher_name = teacher.full_name or teacher.username if teacher else 'Unknown'
-
-        # Prefer schedule_slot if present, otherwise use custom fields on SubjectSchedule
-        if s.schedule_slot_id and s.schedule_slot:
-            day_of_week = s.schedule_slot.day_of_week
-            start_time = s.schedule_slot.start_time
-            end_time = s.schedule_slot.end_time
-        else:
-            day_of_week = s.day_of_week
-            start_time = s.start_time
-            end_time = s.end_time
-
-        result.append({
-            'id': s.id,
-            'subject_id': s.subject_id,
-            'subject_name': subject.name if subject else None,
-            'subject_code': subject.code if subject else None,
-            'teacher_name': teacher_name,
-            'day_of_week': day_of_week,
-            'start_time': start_time,
-            'end_time': end_time
-        })
-
-    # Sort by day and time
-    def sort_key2(item):
-        dow = item['day_of_week'] if item['day_of_week'] is not None else ''
-        st = item['start_time'] if item['start_time'] is not None else ''
-        return (str(dow), str(st))
-
-    result.sort(key=sort_key2)
-    return result
+    # direct enrollments plus the subjects of the active classroom, ordered by day and time
+    student = db.query(UserModel.school_id).filter(UserModel.id == student_id).first()
+    entries = get_timetable(db, request, response, 'student', student_id, student[0] if student else None)
+    if entries is None:
+        return not_modified(response)
+    return [{
+        'id': e['subject_schedule_id'],
+        'subject_id': e['subject_id'],
+        'subject_name': e['subject_name'],
+        'subject_code': e['subject_code'],
+        'teacher_name': e['teacher_name'] or 'Unknown',
+        **effective_time(e)
+    } for e in entries]
 
 
 # Teacher-specific end course endpoints
@@ -1,21 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Query, Response, BackgroundTasks
 import secrets
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List
+from sqlalchemy import and_, update
+from typing import List, Optional
 from fastapi import Body
 from sqlalchemy.exc import IntegrityError
 import os
-import smtplib
-from email.message import EmailMessage
 from datetime import timedelta
 
 from schemas.user import User, UserCreate, UserUpdate, Token, ChangePasswordRequest, PasswordResetRequestCreate, PasswordResetRequestResponse, PasswordResetByAdminRequest
 from models.user import User as UserModel
 from models.password_reset_request import PasswordResetRequest as PasswordResetRequestModel
 from database.connection import get_db
-from utils.security import hash_password, verify_password, create_access_token, decode_access_token
+from utils.security import create_access_token, decode_access_token
+from utils.hashing import hash_password, verify_password, verify_and_update
+from utils.pagination import PageParams, paginate, MAX_PAGE_LIMIT, TOTAL_COUNT_HEADER
+from utils.user_cache import get_user_by_username, invalidate_user, user_cache
+from utils.jobs import create_job, job_errors, job_to_dict
+from utils.timetable import invalidate_schools
+from utils.mailer import enqueue_email, mail_enabled
+from utils.user_import import IMPORT_JOB_TYPE, ImportFileError, check_file, import_users, run_user_import_job, save_upload
+from models.background_job import BackgroundJob as BackgroundJobModel
 from typing import List
 from sqlalchemy.orm import Session
 from io import BytesIO
@@ -57,7 +63,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if not username:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = db.query(UserModel).filter(UserModel.username == username).first()
+        user = get_user_by_username(db, username)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -84,15 +90,35 @@ def admin_reset_user_password(user_id: int, db: Session = Depends(get_db), curre
     user.hashed_password = hash_password(temp_password)
     user.must_change_password = True
     db.commit()
+    invalidate_user(user.username)
     # Do NOT log the plaintext password in real systems; return it only to caller here
     return { 'detail': 'รีเซ็ตรหัสผ่านแล้ว', 'temp_password': temp_password }
 
 @router.get("", response_model=List[User])
 @router.get("/", response_model=List[User])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """ดึงข้อมูลผู้ใช้งานทั้งหมด"""
-    users = db.query(UserModel).offset(skip).limit(limit).all()
-    return users
+def get_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    role: Optional[str] = None,
+    school_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """ดึงข้อมูลผู้ใช้งานทั้งหมด (รองรับ cursor จาก header X-Next-Cursor แทน skip)"""
+    query = db.query(UserModel)
+    if role is not None:
+        query = query.filter(UserModel.role == role)
+    if school_id is not None:
+        query = query.filter(UserModel.school_id == school_id)
+    page = PageParams(limit=limit, cursor=cursor, include_total=include_total)
+    if skip and not cursor:
+        # legacy offset paging
+        if include_total:
+            response.headers[TOTAL_COUNT_HEADER] = str(query.count())
+        return query.order_by(UserModel.id).offset(skip).limit(limit).all()
+    return paginate(query, response, page, id_col=UserModel.id, descending=False)
 
 @router.post("", response_model=User, status_code=status.HTTP_201_CREATED)
 @router.post("/", response_model=User, status_code=status.HTTP_201_CREATED)
@@ -131,11 +157,17 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     """ล็อกอินและสร้าง JWT"""
     user = db.query(UserModel).filter(UserModel.username == form_data.username).first()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = verify_and_update(form_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง"
         )
+    if new_hash:
+        # hash was made under an older rounds policy: upgrade it now that we know the password
+        user.hashed_password = new_hash
+        db.commit()
+        invalidate_user(user.username)
     
     if not user.is_active:
         raise HTTPException(
@@ -155,6 +187,13 @@ def get_current_user_info(current_user: UserModel = Depends(get_current_user)):
     """ดึงข้อมูลผู้ใช้งานปัจจุบันจาก JWT"""
     return current_user
 
+@router.get("/cache_stats")
+def get_user_cache_stats(current_user: UserModel = Depends(get_current_user)):
+    """Admin/owner-only: hit/miss counters of the authenticated-user cache"""
+    if getattr(current_user, 'role', None) not in ('admin', 'owner'):
+        raise HTTPException(status_code=403, detail='ไม่มีสิทธิ์เข้าถึง')
+    return user_cache.stats()
+
 
 @router.post('/forgot_password')
 def forgot_password(email: str = Body(..., embed=True), db: Session = Depends(get_db)):
@@ -172,31 +211,15 @@ def forgot_password(email: str = Body(..., embed=True), db: Session = Depends(ge
     # create reset token (1 hour validity)
     token = create_access_token({"sub": user.username, "action": "reset_password"}, expires_delta=timedelta(hours=1))
 
-    # Attempt to send email if SMTP configured
-    smtp_host = os.getenv('SMTP_HOST')
-    smtp_port = os.getenv('SMTP_PORT')
-    smtp_user = os.getenv('SMTP_USER')
-    smtp_pass = os.getenv('SMTP_PASS')
-    from_addr = os.getenv('EMAIL_FROM') or smtp_user
+    # Queue the reset email if a mail backend is configured (sent by the outbox worker)
     frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:3000')
-
-    if smtp_host and smtp_user and smtp_pass:
-        try:
-            reset_link = f"{frontend_url}/reset-password?token={token}"
-            msg = EmailMessage()
-            msg['Subject'] = 'Password reset request'
-            msg['From'] = from_addr
-            msg['To'] = email
-            msg.set_content(f'You requested a password reset. Click the link to reset: {reset_link}\nIf you did not request this, ignore this email.')
-
-            with smtplib.SMTP(smtp_host, int(smtp_port or 25)) as smtp:
-                smtp.starttls()
-                smtp.login(smtp_user, smtp_pass)
-                smtp.send_message(msg)
-        except Exception as e:
-            # log and still return generic
-            print('failed to send reset email', e)
-            return generic
+    if mail_enabled():
+        reset_link = f"{frontend_url}/reset-password?token={token}"
+        enqueue_email(
+            db, email, 'Password reset request',
+            f'You requested a password reset. Click the link to reset: {reset_link}\nIf you did not request this, ignore this email.'
+        )
+        db.commit()
         return generic
 
     # If SMTP not configured, optionally return token for dev convenience
@@ -343,6 +366,7 @@ def approve_password_reset(
     reset_request.status = "approved"
     
     db.commit()
+    invalidate_user(user.username)
     
     return {
         "detail": f"รีเซ็ตรหัสผ่านสำหรับ {user.username} เรียบร้อยแล้ว",
@@ -416,6 +440,7 @@ def reset_password(token: str = Body(...), new_password: str = Body(...), db: Se
     # update password
     user.hashed_password = hash_password(new_password)
     db.commit()
+    invalidate_user(user.username)
     return {"detail": "อัปเดตรหัสผ่านเรียบร้อยแล้ว"}
 
 
@@ -425,98 +450,82 @@ def bulk_upload_users(file: UploadFile = File(...), db: Session = Depends(get_db
 
     Expected columns (first row header): username,email,full_name,password,role,school_id (optional)
     Only admins are allowed to use this endpoint. If school_id is missing for a row, current_user.school_id is used.
-    Returns a summary of created users and per-row errors.
+    Returns a summary of created users and per-row errors. Large files should use /users/bulk_upload/jobs.
     """
     if getattr(current_user, 'role', None) != 'admin':
         raise HTTPException(status_code=403, detail='Not authorized')
 
-    if openpyxl is None:
-        raise HTTPException(status_code=500, detail='Server missing openpyxl dependency')
+    path = save_upload(file.file)
+    try:
+        return import_users(db, path, getattr(current_user, 'school_id', None))
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(path)
 
-    content = file.file.read()
+
+@router.post('/bulk_upload/jobs', status_code=status.HTTP_202_ACCEPTED)
+def start_bulk_upload_job(background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                          db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_user)):
+    """Queue a streaming user import; poll GET /users/bulk_upload/jobs/{job_id} for progress."""
+    if getattr(current_user, 'role', None) != 'admin':
+        raise HTTPException(status_code=403, detail='Not authorized')
+
+    path = save_upload(file.file)
     try:
-        # data_only=True reads calculated formula values instead of formula strings
-        wb = openpyxl.load_workbook(filename=BytesIO(content), data_only=True)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f'Failed to read Excel file: {str(e)}')
+        total = check_file(path)
+    except ImportFileError as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(e))
 
-    sheet = wb.active
-    rows = list(sheet.iter_rows(values_only=True))
-    if not rows or len(rows) < 2:
-        raise HTTPException(status_code=400, detail='Excel file must contain a header row and at least one data row')
+    job = create_job(db, IMPORT_JOB_TYPE, created_by=current_user.id, school_id=current_user.school_id, total=total)
+    background_tasks.add_task(run_user_import_job, job.id, path, current_user.school_id)
+    return job_to_dict(job)
 
-    header = [str(h).strip().lower() if h is not None else '' for h in rows[0]]
-    # map header names to indexes
-    idx = {name: i for i, name in enumerate(header)}
-    required_cols = ['username', 'email', 'full_name', 'password', 'role']
-    for col in required_cols:
-        if col not in idx:
-            raise HTTPException(status_code=400, detail=f'ขาดคอลัมน์ที่จำเป็น: {col}')
 
-    created = []
-    errors = []
-    for r_i, row in enumerate(rows[1:], start=2):
-        try:
-            username = str(row[idx['username']]).strip() if row[idx['username']] is not None else ''
-            email = str(row[idx['email']]).strip() if row[idx['email']] is not None else ''
-            full_name = str(row[idx['full_name']]).strip() if row[idx['full_name']] is not None else ''
-            password = str(row[idx['password']]).strip() if row[idx['password']] is not None else ''
-            role = str(row[idx['role']]).strip() if row[idx['role']] is not None else ''
-            school_id = None
-            if 'school_id' in idx and row[idx['school_id']] is not None:
-                try:
-                    school_id = int(row[idx['school_id']])
-                except Exception:
-                    school_id = None
-            
-            grade_level = None
-            if 'grade_level' in idx and row[idx['grade_level']] is not None:
-                grade_level = str(row[idx['grade_level']]).strip()
-
-            if not username or not password or role not in ('teacher', 'student'):
-                raise ValueError('ข้อมูลไม่ถูกต้อง - ชื่อผู้ใช้, รหัสผ่าน หายไป หรือบทบาทไม่ถูกต้อง')
-
-            # default school_id to admin's school if not provided
-            if school_id is None:
-                school_id = getattr(current_user, 'school_id', None)
-
-            # uniqueness checks
-            # Username check
-            existing_username = db.query(UserModel).filter(UserModel.username == username).first()
-            if existing_username:
-                raise ValueError(f'ชื่อผู้ใช้ "{username}" นี้มีการใช้งานแล้ว')
-            
-            # Email check (only if provided)
-            db_email = email if email else None
-            if db_email:
-                existing_email = db.query(UserModel).filter(UserModel.email == db_email).first()
-                if existing_email:
-                    raise ValueError(f'อีเมล "{db_email}" นี้มีการใช้งานแล้ว')
-
-            hashed = hash_password(password)
-            new_user = UserModel(
-                username=username, 
-                email=db_email, 
-                full_name=full_name, 
-                hashed_password=hashed, 
-                role=role, 
-                school_id=school_id, 
-                grade_level=grade_level
-            )
-            db.add(new_user)
-            db.flush()
-            created.append({'row': r_i, 'username': username, 'id': new_user.id})
-        except Exception as e:
-            errors.append({'row': r_i, 'error': str(e)})
+def _get_import_job(db: Session, job_id: int, current_user: UserModel):
+    if getattr(current_user, 'role', None) != 'admin':
+        raise HTTPException(status_code=403, detail='Not authorized')
+    job = db.query(BackgroundJobModel).filter(
+        BackgroundJobModel.id == job_id,
+        BackgroundJobModel.job_type == IMPORT_JOB_TYPE
+    ).first()
+    if not job or job.school_id != current_user.school_id:
+        raise HTTPException(status_code=404, detail='Import job not found')
+    return job
+
+
+@router.get('/bulk_upload/jobs/{job_id}')
+def get_bulk_upload_job(job_id: int, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_user)):
+    """Progress/status of an import job, with the first per-row errors"""
+    job = _get_import_job(db, job_id, current_user)
+    data = job_to_dict(job)
+    errors = job_errors(job)
+    data['errors'] = errors[:20]
+    data['error_report_url'] = f'/users/bulk_upload/jobs/{job.id}/errors' if errors else None
+    return data
+
+
+@router.get('/bulk_upload/jobs/{job_id}/errors')
+def download_bulk_upload_errors(job_id: int, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_user)):
+    """Per-row error report of an import job as .xlsx (row, username, error)"""
+    job = _get_import_job(db, job_id, current_user)
+    if openpyxl is None:
+        raise HTTPException(status_code=500, detail='Server missing openpyxl dependency')
 
-    # commit only after processing all rows to keep atomic-ish behavior for created set
-    try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f'ไม่สามารถบันทึกผู้ใช้ที่สร้างขึ้น: {str(e)}')
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('errors')
+    ws.append(['row', 'username', 'error'])
+    for err in job_errors(job):
+        ws.append([err.get('row'), err.get('username'), err.get('error')])
 
-    return { 'created_count': len(created), 'created': created, 'errors': errors }
+    stream = BytesIO()
+    wb.save(stream)
+    stream.seek(0)
+    headers = {
+        'Content-Disposition': f'attachment; filename="user_import_{job.id}_errors.xlsx"'
+    }
+    return StreamingResponse(stream, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers=headers)
 
 @router.put("/me", response_model=User)
 def update_current_user(
@@ -540,10 +549,12 @@ def update_current_user(
     if 'grade_level' in incoming and getattr(current_user, 'role', None) not in ('admin', 'teacher'):
         raise HTTPException(status_code=403, detail='เฉพาะแอดมินหรือครูเท่านั้นที่สามารถอัปเดตชั้นปีได้')
 
+    old_username = current_user.username
     for field, value in incoming.items():
         setattr(current_user, field, value)
     
     db.commit()
+    invalidate_user(old_username, current_user.username)
     db.refresh(current_user)
     return current_user
 
@@ -563,6 +574,7 @@ def change_password(
     current_user.hashed_password = hash_password(password_data.new_password)
     current_user.must_change_password = False  # Clear the flag
     db.commit()
+    invalidate_user(current_user.username)
 
     return {"message": "เปลี่ยนรหัสผ่านเรียบร้อยแล้ว"}
 
@@ -720,8 +732,18 @@ def delete_user(
     
     # If all checks pass, perform deletion
     try:
+        # attendance_records.student_id and student_score_aggregates.student_id reference users.id
+        from models.attendance import AttendanceRecord as AttendanceRecordModel
+        from models.student_score import StudentScoreAggregate as StudentScoreAggregateModel
+        db.query(AttendanceRecordModel).filter(
+            AttendanceRecordModel.student_id == user_id
+        ).delete(synchronize_session=False)
+        db.query(StudentScoreAggregateModel).filter(
+            StudentScoreAggregateModel.student_id == user_id
+        ).delete(synchronize_session=False)
         db.delete(user_to_delete)
         db.commit()
+        invalidate_user(user_to_delete.username)
         return {'message': f'User {user_to_delete.username} deleted successfully'}
     except Exception as e:
         db.rollback()
@@ -760,6 +782,7 @@ def admin_update_student_grade_level(
     # Update grade level
     user.grade_level = grade_level
     db.commit()
+    invalidate_user(user.username)
     db.refresh(user)
     
     return {'message': f'อัปเดตชั้นเรียนของ {user.full_name} เป็น {grade_level} เรียบร้อยแล้ว', 'user': user}
@@ -806,6 +829,7 @@ def bulk_assign_grade_to_students(
     updated = []
     created = []
     errors = []
+    regraded = []  # usernames whose cached grade_level is now stale
     
     for r_i, row in enumerate(rows[1:], start=2):
         try:
@@ -827,6 +851,7 @@ def bulk_assign_grade_to_students(
                 # Update existing student's grade level
                 existing_student.grade_level = grade_level
                 db.flush()
+                regraded.append(existing_student.username)
                 updated.append({
                     'row': r_i,
                     'username': username,
@@ -867,6 +892,7 @@ def bulk_assign_grade_to_students(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f'Failed to commit: {str(e)}')
+    invalidate_user(*regraded)
 
     return {
         'updated_count': len(updated),
@@ -901,6 +927,7 @@ def deactivate_user(
     
     user.is_active = False
     db.commit()
+    invalidate_user(user.username)
     db.refresh(user)
     return {'message': f'User {user.username} deactivated successfully', 'user': user}
 
@@ -921,6 +948,7 @@ def activate_user(
     
     user.is_active = True
     db.commit()
+    invalidate_user(user.username)
     db.refresh(user)
     return {'message': f'User {user.username} activated successfully', 'user': user}
 
@@ -1090,14 +1118,12 @@ def promote_students(
             db.flush()
             return target_classroom
 
-        def deactivate_old_enrollment(enrollment_id_value):
+        def deactivate_old_enrollment(enrollment_id_value, school_id):
             if enrollment_id_value:
-                db.query(ClassroomStudent).filter(
-                    ClassroomStudent.id == enrollment_id_value
-                ).update(
-                    {ClassroomStudent.is_active: False},
-                    synchronize_session=False
-                )
+                db.execute(update(ClassroomStudent.__table__).where(
+                    ClassroomStudent.__table__.c.id == enrollment_id_value
+                ).values(is_active=False))
+                invalidate_schools(db.connection(), [school_id] if school_id is not None else [])
 
         for student_id in student_ids:
             try:
@@ -1150,7 +1176,7 @@ def promote_students(
                             student.grade_level = str(student.grade_level).replace('เทอม 1', 'เทอม 2')
                         else:
                             student.grade_level = f"{student.grade_level} (เทอม 2)" if student.grade_level else "เทอม 2"
-                    deactivate_old_enrollment(enrollment_id)
+                    deactivate_old_enrollment(enrollment_id, student.school_id)
                     
                 elif promotion_type in ['mid_term_with_promotion', 'end_of_year']:
                     # ต้องมีข้อมูลชั้นเรียนเพื่อเลื่อน
@@ -1172,7 +1198,7 @@ def promote_students(
                     
                     # อัพเดต grade_level
                     student.grade_level = new_grade_level
-                    deactivate_old_enrollment(enrollment_id)
+                    deactivate_old_enrollment(enrollment_id, student.school_id)
                 
                 target = ensure_target_classroom()
                 if target:
@@ -1212,6 +1238,7 @@ def promote_students(
         except IntegrityError as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f'Database integrity error during student promotion: {str(e)}')
+        invalidate_user(*(s['username'] for s in promoted_students))
         
     except Exception as e:
         db.rollback()
@@ -1366,6 +1393,7 @@ def promote_students_from_file(
                 errors.append({'row': r_i, 'error': str(e)})
         
         db.commit()
+        invalidate_user(*(s['username'] for s in promoted_students))
         
         return {
             'success': True,
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -108,6 +108,19 @@ class PromoteClassroomResponse(BaseModel):
     grades_copied: int = 0
 
 
+class PromoteSchoolRequest(BaseModel):
+    """เลื่อนชั้นทั้งโรงเรียน (ทุกชั้นเรียนของเทอมต้นทาง) ในครั้งเดียว"""
+    promotion_type: str  # "mid_term", "mid_term_with_promotion" หรือ "end_of_year"
+    grade_map: Dict[str, str] = {}  # ชั้นเดิม -> ชั้นใหม่ เช่น {"ป.1": "ป.2"}; ชั้นที่ไม่มีในนี้จะถูกข้าม
+    new_academic_year: Optional[str] = None  # end_of_year: ค่าเริ่มต้นคือปีเดิม + 1
+    academic_year: Optional[str] = None  # เทอมต้นทาง: ค่าเริ่มต้นคือปีการศึกษาล่าสุด
+    semester: Optional[int] = None
+    classroom_ids: Optional[List[int]] = None  # จำกัดเฉพาะบางชั้นเรียน
+    include_grades: bool = False  # นับจำนวนคะแนนเดิมในรายงาน
+    school_id: Optional[int] = None  # สำหรับ owner; admin ใช้โรงเรียนของตัวเอง
+    dry_run: bool = True  # แสดงแผนอย่างเดียว ไม่บันทึก
+
+
 # ===== Bulk Operations =====
 
 class BulkClassroomCreate(BaseModel):
@@ -7,12 +7,20 @@ class GradeEntry(BaseModel):
     grade: Optional[float] = None
 
 
-class GradesBulk(BaseModel):
-    subject_id: int
+class AssignmentGrades(BaseModel):
     title: str  # Assignment title
     max_score: float = 100.0  # Maximum possible score
     grades: List[GradeEntry]
+
+
+class GradesBulk(BaseModel):
+    subject_id: int
+    title: Optional[str] = None  # Assignment title (single-assignment payload)
+    max_score: float = 100.0  # Maximum possible score
+    grades: List[GradeEntry] = []
     classroom_id: Optional[int] = None
+    # Several assignments at once (a whole gradebook sheet); saved in the same transaction
+    assignments: List[AssignmentGrades] = []
 
 
 class GradeResponse(BaseModel):
@@ -61,4 +61,56 @@ class StudentScheduleResponse(BaseModel):
     end_time: Optional[time] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+class ScheduleProposal(SubjectScheduleBase):
+    id: Optional[int] = None  # existing assignment this one replaces (its old time is ignored)
+    teacher_id: Optional[int] = None  # required for admins; teachers always propose for themselves
+
+class ScheduleValidationRequest(BaseModel):
+    assignments: List[ScheduleProposal]
+    check_slots: bool = True  # also require every assignment to be within operating hours
+
+class ScheduleConflict(BaseModel):
+    index: int  # position in ``assignments``
+    type: str  # teacher_overlap, classroom_overlap, outside_operating_hours, ...
+    message: str
+    schedule_id: Optional[int] = None  # conflicting existing assignment
+    other_index: Optional[int] = None  # conflicting assignment earlier in the same batch
+
+class ScheduleValidationResult(BaseModel):
+    valid: bool
+    conflicts: List[ScheduleConflict]
+
+class TimetableImportRow(BaseModel):
+    # subject/teacher/classroom by id or by code/username/name; teacher defaults to the subject's teacher
+    subject_id: Optional[int] = None
+    subject_code: Optional[str] = None
+    teacher_id: Optional[int] = None
+    teacher_username: Optional[str] = None
+    classroom_id: Optional[int] = None
+    classroom_name: Optional[str] = None
+    day_of_week: Union[int, str]
+    start_time: time
+    end_time: time
+    schedule_slot_id: Optional[int] = None
+
+class TimetableImportRequest(BaseModel):
+    rows: List[TimetableImportRow]
+    mode: str = 'merge'  # merge: only add; replace: also remove other assignments of the imported classrooms
+    dry_run: bool = False  # only return the diff and conflicts
+    check_slots: bool = True  # require every row to be within operating hours
+
+class TeacherUnavailable(BaseModel):
+    teacher_id: int
+    day_of_week: Union[int, str]
+    start_time: time
+    end_time: time
+
+class GenerateTimetableRequest(BaseModel):
+    classroom_ids: Optional[List[int]] = None  # default: every active classroom of the school
+    period_minutes: int = 60
+    periods_per_credit: int = 2  # weekly periods per subject credit (subjects without credits get 1)
+    time_budget_seconds: float = 5.0  # capped by TIMETABLE_MAX_BUDGET_SECONDS
+    seed: Optional[int] = None  # same seed and data -> same timetable
+    teacher_unavailable: List[TeacherUnavailable] = []
+    apply: bool = False  # replace the classrooms' timed assignments with the result (only if complete)
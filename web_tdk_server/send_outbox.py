@@ -0,0 +1,35 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import models  # noqa: F401  register all models
+    from utils.mailer import EMAIL_RETENTION_DAYS, outbox_worker, purge_outbox, send_pending
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you have run: pip install -r requirements.txt")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send queued emails from the email_outbox table")
+    parser.add_argument("--once", action="store_true", help="Send one batch and exit instead of polling forever")
+    parser.add_argument("--retention-days", type=int, default=EMAIL_RETENTION_DAYS,
+                        help="Delete sent/failed rows older than this many days (0 keeps them)")
+    args = parser.parse_args()
+
+    if args.once:
+        counts = send_pending()
+        print(f"sent={counts['sent']} retry={counts['retry']} failed={counts['failed']}")
+        print(f"purged={purge_outbox(args.retention_days)}")
+        sys.exit(0)
+
+    # run the API with EMAIL_WORKER_ENABLED=false when this process does the sending
+    print("Draining email outbox (Ctrl+C to stop)...")
+    try:
+        outbox_worker.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,86 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_user_and_login(role, school_id=None, password='pass1234'):
+    username = f"{role}{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': password,
+        'role': role,
+        'full_name': f'{role.title()} {username[-5:]}',
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': password})
+    assert r.status_code == 200
+    return r.json()['user_info'], {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def create_school_with_students(n):
+    r = client.post('/schools', json={'name': f'Absence School {int(time.time())}-{random.randint(0,99999)}'})
+    assert r.status_code == 201
+    school = r.json()
+    _, admin_headers = create_user_and_login('admin', school['id'])
+    r = client.post('/classrooms/create', json={'name': 'ป.1/1', 'grade_level': 'ป.1', 'room_number': '1', 'semester': 1,
+                                               'academic_year': '2025', 'school_id': school['id']}, headers=admin_headers)
+    assert r.status_code == 200
+    classroom = r.json()
+    students = [create_user_and_login('student', school['id']) for _ in range(n)]
+    r = client.post(f"/classrooms/{classroom['id']}/add-students", json=[s['id'] for s, _ in students], headers=admin_headers)
+    assert r.status_code == 200
+    return school, admin_headers, students
+
+
+def request_absence(headers, start, end=None, days=1):
+    r = client.post('/absences/', json={'subject_id': None, 'absence_date': start, 'absence_date_end': end,
+                                        'days_count': days, 'absence_type': 'personal', 'reason': 'ธุระ'}, headers=headers)
+    assert r.status_code == 201
+    return r.json()
+
+
+def test_admin_listing_is_school_scoped_with_date_overlap_filter(monkeypatch):
+    from utils import request_metrics
+    monkeypatch.setattr(request_metrics, 'QUERY_METRICS_HEADERS', True)
+
+    school, admin_headers, students = create_school_with_students(3)
+    (s1, h1), (s2, h2), (s3, h3) = students
+    a1 = request_absence(h1, '2025-11-03')
+    a2 = request_absence(h2, '2025-11-05', '2025-11-07', 3)
+    a3 = request_absence(h3, '2025-11-20')
+    r = client.put(f"/absences/{a1['id']}", json={'status': 'approved', 'version': a1['version']}, headers=admin_headers)
+    assert r.status_code == 200
+
+    # absences of another school never show up
+    _, _, others = create_school_with_students(1)
+    request_absence(others[0][1], '2025-11-04')
+
+    r = client.get('/absences/', headers=admin_headers)
+    assert r.status_code == 200
+    rows = r.json()
+    assert [row['id'] for row in rows] == [a3['id'], a2['id'], a1['id']]
+    assert rows[2]['student_name'] == s1['full_name']
+    assert rows[2]['approver_name'] and rows[2]['status'] == 'approved'
+    assert rows[0]['approver_name'] is None
+    query_count = int(r.headers['X-DB-Query-Count'])
+
+    # multi-day absence 5-7 overlaps a range starting on the 6th
+    r = client.get('/absences/?date_from=2025-11-06&date_to=2025-11-19', headers=admin_headers)
+    assert [row['id'] for row in r.json()] == [a2['id']]
+    r = client.get('/absences/?date_from=2025-11-01&date_to=2025-11-04&status_filter=approved', headers=admin_headers)
+    assert [row['id'] for row in r.json()] == [a1['id']]
+    assert client.get('/absences/?date_from=2025-11-10&date_to=2025-11-01', headers=admin_headers).status_code == 400
+
+    # names are loaded per page, not per row
+    r = client.get('/absences/?limit=1', headers=admin_headers)
+    assert len(r.json()) == 1
+    assert int(r.headers['X-DB-Query-Count']) == query_count
@@ -6,6 +6,9 @@ import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from main import app
+from database.connection import SessionLocal
+from models.email_outbox import EmailOutbox as EmailOutboxModel
+from utils import mailer
 
 client = TestClient(app)
 
@@ -145,3 +148,29 @@ def test_student_absence_creates_announcement_and_notifies_homeroom():
     assert r.status_code == 200
     announcements = r.json()
     assert not any(student['full_name'] in (a.get('title') or a.get('content') or '') for a in announcements)
+
+
+def test_absence_request_enqueues_notification_without_sending(tmp_path, monkeypatch):
+    monkeypatch.setattr(mailer, 'EMAIL_BACKEND', 'file')
+    monkeypatch.setattr(mailer, 'EMAIL_FILE_DIR', str(tmp_path))
+    school, admin_headers = create_school_and_admin()
+    classroom = create_classroom(school['id'], admin_headers)
+    teacher = create_teacher_and_assign_homeroom(school['id'], admin_headers)
+    student = create_student_and_enroll(school['id'], admin_headers, classroom['id'])
+
+    r = client.post('/users/login', data={'username': student['username'], 'password': 'studentpass'})
+    student_headers = {'Authorization': f"Bearer {r.json()['access_token']}"}
+    payload = {'subject_id': None, 'absence_date': '2025-12-02', 'absence_date_end': None,
+               'days_count': 1, 'absence_type': 'sick', 'reason': 'ไม่สบาย'}
+    r = client.post('/absences/', json=payload, headers=student_headers)
+    assert r.status_code == 201
+
+    db = SessionLocal()
+    try:
+        rows = db.query(EmailOutboxModel).filter(EmailOutboxModel.to_addrs.contains(teacher['email'])).all()
+    finally:
+        db.close()
+    assert len(rows) == 1
+    assert rows[0].status == 'pending'
+    assert student['full_name'] in rows[0].subject
+    assert list(tmp_path.iterdir()) == []
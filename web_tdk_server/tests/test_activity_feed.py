@@ -0,0 +1,58 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_user_and_login(role, school_id=None):
+    username = f"{role}{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'pass1234',
+        'role': role,
+        'full_name': f'Test {role}',
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'pass1234'})
+    assert r.status_code == 200
+    return r.json()['user_info'], {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def test_activity_feed_reads_event_log_with_filters_and_cursor():
+    r = client.post('/schools', json={'name': f'Feed School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+    _, admin_headers = create_user_and_login('admin', school['id'])
+    _, owner_headers = create_user_and_login('owner')
+
+    r = client.post('/subjects', json={'name': 'Art', 'code': 'A101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=admin_headers)
+    assert r.status_code == 201
+    for i in range(3):
+        r = client.post('/announcements', json={'title': f'News {i}', 'content': 'x' * 150, 'school_id': school['id']}, headers=admin_headers)
+        assert r.status_code == 201
+
+    r = client.get(f"/owner/activities?school_id={school['id']}", headers=owner_headers)
+    assert r.status_code == 200
+    events = r.json()
+    assert [e['type'] for e in events] == ['announcement', 'announcement', 'announcement', 'subject_created']
+    assert events[0]['title'] == 'News 2'
+    assert events[0]['school_name'] == school['name']
+    assert events[0]['content'].endswith('...')
+
+    r = client.get(f"/owner/activities?school_id={school['id']}&type=subject_created", headers=owner_headers)
+    assert [e['title'] for e in r.json()] == ["Subject 'Art' created"]
+
+    r = client.get(f"/owner/activities?school_id={school['id']}&limit=2", headers=owner_headers)
+    assert [e['title'] for e in r.json()] == ['News 2', 'News 1']
+    cursor = r.headers['X-Next-Cursor']
+    r = client.get(f"/owner/activities?school_id={school['id']}&limit=2&cursor={cursor}", headers=owner_headers)
+    assert [e['type'] for e in r.json()] == ['announcement', 'subject_created']
+    assert 'X-Next-Cursor' not in r.headers
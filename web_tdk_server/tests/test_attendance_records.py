@@ -0,0 +1,104 @@
+import pytest
+import time
+import random
+import json
+from datetime import date
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from database.connection import SessionLocal
+from models.attendance import Attendance as AttendanceModel, AttendanceRecord as AttendanceRecordModel
+from utils.attendance import backfill_attendance_records
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Test School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+
+    admin_username = f"testadmin{int(time.time())}{random.randint(0,9999)}"
+    r = client.post('/users', json={
+        'username': admin_username,
+        'email': f'{admin_username}@example.com',
+        'password': 'adminpass',
+        'role': 'admin',
+        'full_name': 'Test Admin',
+        'school_id': school['id']
+    })
+    assert r.status_code == 201
+
+    r = client.post('/users/login', data={'username': admin_username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    token = r.json()['access_token']
+    return school, {'Authorization': f'Bearer {token}'}
+
+
+def test_mark_attendance_writes_per_student_records_and_backfills_legacy_blobs():
+    school, headers = create_school_and_admin()
+    r = client.post('/subjects', json={'name': 'Art', 'code': 'A101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+
+    student_ids = []
+    for i in range(2):
+        username = f"student{int(time.time())}{random.randint(0,99999)}"
+        r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'studentpass', 'role': 'student', 'full_name': f'Student {i}', 'school_id': school['id']})
+        assert r.status_code == 201
+        student_ids.append(r.json()['id'])
+    a, b = student_ids
+
+    r = client.post('/attendance/mark', json={'subject_id': subject['id'], 'date': '2025-06-02', 'attendance': {str(a): 'present', str(b): 'absent'}}, headers=headers)
+    assert r.status_code == 201
+    # Re-marking the same day replaces the previous statuses
+    r = client.post('/attendance/mark', json={'subject_id': subject['id'], 'date': '2025-06-02', 'attendance': {str(a): 'late'}}, headers=headers)
+    assert r.status_code == 201
+    assert r.json()['detail'] == 'updated'
+
+    # Legacy list-format blob written before the normalized table existed
+    db = SessionLocal()
+    try:
+        db.add(AttendanceModel(subject_id=subject['id'], date=date(2025, 6, 3), present_json=json.dumps([a, b])))
+        db.commit()
+        assert backfill_attendance_records(db) >= 1
+    finally:
+        db.close()
+
+    r = client.get(f"/attendance?subject_id={subject['id']}", headers=headers)
+    assert r.status_code == 200
+    by_date = {row['date']: row['attendance'] for row in r.json()}
+    assert by_date['2025-06-02'] == {str(a): 'late'}
+    assert by_date['2025-06-03'] == {str(a): 'present', str(b): 'present'}
+
+    r = client.get(f"/attendance?subject_id={subject['id']}&student_id={b}", headers=headers)
+    assert r.status_code == 200
+    assert [row['attendance'] for row in r.json()] == [{str(b): 'present'}]
+
+
+def test_delete_student_removes_their_attendance_records():
+    school, headers = create_school_and_admin()
+    r = client.post('/subjects', json={'name': 'Music', 'code': 'MU101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    username = f"student{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'studentpass', 'role': 'student', 'full_name': 'Leaving Student', 'school_id': school['id']})
+    assert r.status_code == 201
+    student_id = r.json()['id']
+
+    r = client.post('/attendance/mark', json={'subject_id': subject['id'], 'date': '2025-06-02', 'attendance': {str(student_id): 'present'}}, headers=headers)
+    assert r.status_code == 201
+
+    r = client.patch(f'/users/{student_id}/deactivate', headers=headers)
+    assert r.status_code == 200
+    r = client.delete(f'/users/{student_id}', headers=headers)
+    assert r.status_code == 200
+
+    db = SessionLocal()
+    try:
+        # attendance_records.student_id is a foreign key to users.id
+        assert db.query(AttendanceRecordModel).filter(AttendanceRecordModel.student_id == student_id).count() == 0
+    finally:
+        db.close()
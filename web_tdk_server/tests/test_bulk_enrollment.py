@@ -0,0 +1,103 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Enroll School {int(time.time())}-{random.randint(0,99999)}'})
+    assert r.status_code == 201
+    school = r.json()
+    username = f"testadmin{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'adminpass',
+                                    'role': 'admin', 'full_name': 'Test Admin', 'school_id': school['id']})
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    return school, {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def create_user(school_id, role='student'):
+    username = f"{role}{int(time.time())}{random.randint(0,999999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'pass1234',
+                                    'role': role, 'full_name': f'{role.title()} {username[-6:]}', 'school_id': school_id})
+    assert r.status_code == 201
+    return r.json()
+
+
+def create_classroom(school_id, headers, name, grade_level='ป.1', academic_year='2025'):
+    r = client.post('/classrooms/create', json={'name': name, 'grade_level': grade_level, 'room_number': '1', 'semester': 1,
+                                               'academic_year': academic_year, 'school_id': school_id}, headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_add_students_diagnostics_and_constant_query_count(monkeypatch):
+    from utils import request_metrics
+    monkeypatch.setattr(request_metrics, 'QUERY_METRICS_HEADERS', True)
+
+    school, headers = create_school_and_admin()
+    room_a = create_classroom(school['id'], headers, 'ป.1/1')
+    room_b = create_classroom(school['id'], headers, 'ป.1/2')
+    students = [create_user(school['id']) for _ in range(24)]
+    teacher = create_user(school['id'], role='teacher')
+    ids = [s['id'] for s in students]
+
+    r = client.post(f"/classrooms/{room_b['id']}/add-students", json=ids[:2], headers=headers)
+    assert r.status_code == 200
+    assert r.json() == {'added_count': 2, 'already_enrolled': [], 'errors': []}
+    few_queries = int(r.headers['X-DB-Query-Count'])
+
+    # ids[2] is removed from room A (re-activated below), ids[3] stays active there
+    r = client.post(f"/classrooms/{room_a['id']}/add-students", json=[ids[2], ids[3]], headers=headers)
+    assert r.json()['added_count'] == 2
+    r = client.delete(f"/classrooms/{room_a['id']}/students/{ids[2]}", headers=headers)
+    assert r.status_code == 200
+
+    # ids[0] is already in room B this academic year; ids[4] is listed twice
+    payload = [ids[2], ids[3], ids[0], teacher['id'], 999999] + ids[4:] + [ids[4]]
+    r = client.post(f"/classrooms/{room_a['id']}/add-students", json=payload, headers=headers)
+    assert r.status_code == 200
+    result = r.json()
+    assert result['added_count'] == 1 + len(ids[4:])
+    assert result['already_enrolled'] == [ids[3]]
+    assert result['errors'][:2] == [f"ไม่พบนักเรียน ID {teacher['id']}", 'ไม่พบนักเรียน ID 999999']
+    assert result['errors'][2].startswith(f"⚠️ นักเรียน ID {ids[0]} มีชั้นเรียนอื่นแล้ว: ป.1/2")
+    # the checks are per batch, not per student
+    assert int(r.headers['X-DB-Query-Count']) <= few_queries + 2
+
+    r = client.get(f"/classrooms/{room_a['id']}/students", headers=headers)
+    active = {s['student_id'] for s in r.json() if s['is_active']}
+    assert active == {ids[2], ids[3]} | set(ids[4:])
+
+
+def test_enroll_by_grade_and_assign_classroom_are_idempotent():
+    school, headers = create_school_and_admin()
+    room = create_classroom(school['id'], headers, 'ม.1/1', grade_level='ม.1')
+    students = [create_user(school['id']) for _ in range(5)]
+    r = client.post(f"/classrooms/{room['id']}/add-students", json=[s['id'] for s in students[:3]], headers=headers)
+    assert r.json()['added_count'] == 3
+
+    r = client.post('/subjects', json={'name': 'Math', 'code': f'M{random.randint(0,99999)}', 'subject_type': 'main',
+                                       'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+
+    r = client.post(f"/subjects/{subject['id']}/assign-classroom", json={'classroom_id': room['id']}, headers=headers)
+    assert r.status_code == 201
+    assert r.json()['students_enrolled'] == 3
+
+    # the classroom set grade_level ม.1 on its three students; they are already enrolled
+    r = client.post(f"/subjects/{subject['id']}/enroll_by_grade", json={'grade_level': 'ม.1'}, headers=headers)
+    assert r.status_code == 201
+    assert r.json()['enrolled_count'] == 0
+    assert r.json()['already_enrolled_count'] == 3 and r.json()['total_students'] == 3
+
+    r = client.post(f"/subjects/{subject['id']}/enroll_by_grade", json={'grade_level': 'ม.9'}, headers=headers)
+    assert r.status_code == 404
@@ -0,0 +1,19 @@
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dedupe_grades import pick_keeper
+
+Row = namedtuple('Row', 'id grade updated_at')
+
+
+def test_keeper_prefers_scored_then_most_recently_updated_row():
+    placeholder = Row(1, None, datetime(2025, 1, 1))
+    older_score = Row(2, 7.0, datetime(2025, 1, 2))
+    newer_score = Row(3, 8.0, datetime(2025, 1, 3))
+    newer_placeholder = Row(4, None, datetime(2025, 1, 4))
+    assert pick_keeper([placeholder, older_score, newer_score, newer_placeholder]) == newer_score
+    # the oldest row is not kept just because it came first
+    assert pick_keeper([placeholder, newer_placeholder]) == newer_placeholder
+    assert pick_keeper([Row(5, 0.0, None), Row(6, None, datetime(2025, 1, 5))]).id == 5
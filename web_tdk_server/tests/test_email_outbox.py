@@ -0,0 +1,122 @@
+import pytest
+import time
+import random
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from database.connection import SessionLocal
+from models.email_outbox import EmailOutbox as EmailOutboxModel
+from utils import mailer
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def file_sink(tmp_path, monkeypatch):
+    monkeypatch.setattr(mailer, 'EMAIL_BACKEND', 'file')
+    monkeypatch.setattr(mailer, 'EMAIL_FILE_DIR', str(tmp_path))
+    # deliver whatever earlier tests left queued so each test sees only its own messages
+    while sum(mailer.send_pending().values()):
+        pass
+    return tmp_path
+
+
+def outbox_rows(address):
+    db = SessionLocal()
+    try:
+        return db.query(EmailOutboxModel).filter(EmailOutboxModel.to_addrs.contains(address)).all()
+    finally:
+        db.close()
+
+
+def test_forgot_password_only_enqueues_and_worker_delivers(file_sink):
+    username = f"mailuser{int(time.time())}{random.randint(0,99999)}"
+    email = f'{username}@example.com'
+    r = client.post('/users', json={'username': username, 'email': email, 'password': 'pass1234',
+                                    'role': 'teacher', 'full_name': 'Mail User', 'school_id': None})
+    assert r.status_code == 201
+
+    r = client.post('/users/forgot_password', json={'email': email})
+    assert r.status_code == 200
+    assert 'reset_token' not in r.json()
+    [row] = outbox_rows(email)
+    assert row.status == 'pending'
+    assert list(file_sink.glob(f'{row.id}-*.eml')) == []
+
+    counts = mailer.send_pending()
+    assert counts['sent'] >= 1
+    [row] = outbox_rows(email)
+    assert row.status == 'sent' and row.attempts == 1
+    [eml] = list(file_sink.glob(f'{row.id}-*.eml'))
+    content = eml.read_text()
+    assert 'Password reset request' in content and '/reset-password?token=' in content
+    # the reset link is not kept in the database once delivered
+    assert row.body == mailer.REDACTED_BODY
+
+
+class FailingSender:
+    def send(self, msg):
+        raise RuntimeError('relay said no')
+
+    def close(self):
+        pass
+
+
+def test_failed_sends_back_off_then_give_up(file_sink, monkeypatch):
+    address = f'retry{int(time.time())}{random.randint(0,99999)}@example.com'
+    db = SessionLocal()
+    try:
+        row = mailer.enqueue_email(db, [address], 'Hello', 'Body')
+        db.commit()
+        row_id = row.id
+    finally:
+        db.close()
+
+    monkeypatch.setattr(mailer, 'make_sender', lambda: FailingSender())
+    monkeypatch.setattr(mailer, 'EMAIL_MAX_ATTEMPTS', 2)
+    assert mailer.send_pending()['retry'] == 1
+    [row] = outbox_rows(address)
+    assert (row.status, row.attempts, row.last_error) == ('pending', 1, 'relay said no')
+    assert row.next_attempt_at > datetime.utcnow() + timedelta(seconds=mailer.EMAIL_RETRY_BASE_SECONDS - 5)
+
+    # not due yet: nothing is claimed
+    assert mailer.send_pending() == {'sent': 0, 'retry': 0, 'failed': 0}
+
+    db = SessionLocal()
+    try:
+        db.query(EmailOutboxModel).filter(EmailOutboxModel.id == row_id).update({'next_attempt_at': datetime.utcnow()})
+        db.commit()
+    finally:
+        db.close()
+    assert mailer.send_pending()['failed'] == 1
+    [row] = outbox_rows(address)
+    assert (row.status, row.attempts) == ('failed', 2)
+    assert row.body == mailer.REDACTED_BODY
+
+
+def test_purge_deletes_finished_rows_past_retention(file_sink):
+    address = f'purge{int(time.time())}{random.randint(0,99999)}@example.com'
+    db = SessionLocal()
+    try:
+        for subject in ('Old', 'New'):
+            mailer.enqueue_email(db, [address], subject, 'Body')
+        db.commit()
+    finally:
+        db.close()
+    assert mailer.send_pending()['sent'] == 2
+
+    db = SessionLocal()
+    try:
+        db.query(EmailOutboxModel).filter(EmailOutboxModel.to_addrs.contains(address),
+                                          EmailOutboxModel.subject == 'Old').update(
+            {'sent_at': datetime.utcnow() - timedelta(days=8)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    assert mailer.purge_outbox(0) == 0
+    assert mailer.purge_outbox(7) >= 1
+    assert [r.subject for r in outbox_rows(address)] == ['New']
@@ -0,0 +1,329 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Test School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+
+    admin_username = f"testadmin{int(time.time())}{random.randint(0,9999)}"
+    admin_data = {
+        'username': admin_username,
+        'email': f'{admin_username}@example.com',
+        'password': 'adminpass',
+        'role': 'admin',
+        'full_name': 'Test Admin',
+        'school_id': school['id']
+    }
+    r = client.post('/users', json=admin_data)
+    assert r.status_code == 201
+
+    r = client.post('/users/login', data={'username': admin_username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    token = r.json()['access_token']
+    return school, {'Authorization': f'Bearer {token}'}
+
+
+def create_student(school_id, name):
+    username = f"student{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'studentpass',
+        'role': 'student',
+        'full_name': name,
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    return r.json()
+
+
+def test_transcript_and_rankings_use_scaled_scores():
+    school, headers = create_school_and_admin()
+
+    r = client.post('/classrooms/create', json={
+        'name': 'Rank Room',
+        'grade_level': 'Grade 1',
+        'room_number': '1',
+        'semester': 1,
+        'academic_year': '2025',
+        'school_id': school['id']
+    }, headers=headers)
+    assert r.status_code == 200
+    classroom = r.json()
+
+    students = [create_student(school['id'], f'Student {i}') for i in range(3)]
+    r = client.post(f"/classrooms/{classroom['id']}/add-students", json=[s['id'] for s in students], headers=headers)
+    assert r.status_code == 200
+
+    r = client.post('/subjects', json={'name': 'Math', 'code': 'M101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    r = client.post(f"/subjects/{subject['id']}/assign-classroom", json={'classroom_id': classroom['id']}, headers=headers)
+    assert r.status_code == 201
+
+    # collected: 10/20 -> 50 of 100, exam: 40/50 -> 80 of 100
+    r = client.post('/grades/bulk', json={
+        'subject_id': subject['id'], 'title': 'Homework 1', 'max_score': 20, 'classroom_id': classroom['id'],
+        'grades': [{'student_id': students[0]['id'], 'grade': 10}, {'student_id': students[1]['id'], 'grade': 20}, {'student_id': students[2]['id'], 'grade': 10}]
+    }, headers=headers)
+    assert r.status_code == 201
+    r = client.post('/grades/bulk', json={
+        'subject_id': subject['id'], 'title': 'Midterm', 'max_score': 50, 'classroom_id': classroom['id'],
+        'grades': [{'student_id': students[0]['id'], 'grade': 40}, {'student_id': students[1]['id'], 'grade': 50}, {'student_id': students[2]['id'], 'grade': 40}]
+    }, headers=headers)
+    assert r.status_code == 201
+
+    r = client.get(f"/grades/student/{students[0]['id']}/transcript?classroom_id={classroom['id']}", headers=headers)
+    assert r.status_code == 200
+    transcript = r.json()
+    assert len(transcript) == 1
+    assert transcript[0]['score'] == 130.0
+    assert transcript[0]['max_score'] == 200.0
+    assert transcript[0]['normalized_score'] == 65.0
+
+    r = client.get(f"/grades/classroom/{classroom['id']}/ranking", headers=headers)
+    assert r.status_code == 200
+    ranking = {row['student_id']: row for row in r.json()}
+    assert ranking[students[1]['id']]['rank'] == 1
+    assert ranking[students[1]['id']]['total_score'] == 200.0
+    assert ranking[students[0]['id']]['rank'] == ranking[students[2]['id']]['rank']
+
+    r = client.get(f"/grades/school/{school['id']}/ranking", headers=headers)
+    assert r.status_code == 200
+    school_ranking = {row['student_id']: row for row in r.json()}
+    assert school_ranking[students[1]['id']]['rank'] == 1
+    assert school_ranking[students[0]['id']]['average_score'] == 65.0
+
+    # Ranks are dense: the two tied students share rank 2
+    assert ranking[students[0]['id']]['rank'] == 2
+
+    # Aggregates follow grade writes: deleting the midterm drops everyone's exam score
+    r = client.delete(f"/grades/assignments/{subject['id']}/Midterm?classroom_id={classroom['id']}", headers=headers)
+    assert r.status_code == 200
+    r = client.get(f"/grades/classroom/{classroom['id']}/ranking", headers=headers)
+    assert r.status_code == 200
+    ranking = {row['student_id']: row for row in r.json()}
+    assert ranking[students[1]['id']]['total_score'] == 100.0
+    assert ranking[students[0]['id']]['total_score'] == 50.0
+
+
+def test_bulk_grades_saves_whole_sheet_in_one_call():
+    school, headers = create_school_and_admin()
+    student = create_student(school['id'], 'Sheet Student')
+
+    r = client.post('/subjects', json={'name': 'Science', 'code': 'S101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+
+    payload = {
+        'subject_id': subject['id'],
+        'assignments': [
+            {'title': 'Quiz 1', 'max_score': 10, 'grades': [{'student_id': student['id'], 'grade': 7}]},
+            {'title': 'Quiz 2', 'max_score': 10, 'grades': [{'student_id': student['id'], 'grade': 8}]},
+        ]
+    }
+    r = client.post('/grades/bulk', json=payload, headers=headers)
+    assert r.status_code == 201
+    assert r.json()['created'] == 2
+
+    # Re-saving the sheet updates the existing rows instead of duplicating them
+    payload['assignments'][1]['grades'][0]['grade'] = 9
+    r = client.post('/grades/bulk', json=payload, headers=headers)
+    assert r.status_code == 201
+    assert r.json()['updated'] == 2 and r.json()['created'] == 0
+
+    r = client.get(f"/grades?subject_id={subject['id']}", headers=headers)
+    assert r.status_code == 200
+    grades = {g['title']: g['grade'] for g in r.json() if g['student_id'] == student['id']}
+    assert grades == {'Quiz 1': 7, 'Quiz 2': 9}
+
+
+def test_bulk_grades_retries_only_grade_cell_conflicts(monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    from database.connection import SessionLocal
+    from models.grade import Grade
+    import routers.grades as grades_router
+
+    school, headers = create_school_and_admin()
+    student = create_student(school['id'], 'Retry Student')
+    r = client.post('/subjects', json={'name': 'Retry', 'code': 'T101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    subject = r.json()
+    payload = {'subject_id': subject['id'], 'title': 'Race', 'max_score': 10, 'grades': [{'student_id': student['id'], 'grade': 4}]}
+
+    real_upsert = grades_router._upsert_grade_sheets
+    calls = []
+
+    def racing_upsert(db, *args):
+        calls.append(1)
+        result = real_upsert(db, *args)
+        if len(calls) == 1:
+            # another request saves the same cell after this one looked for it
+            other = SessionLocal()
+            try:
+                other.add(Grade(subject_id=subject['id'], student_id=student['id'], title='Race', max_score=10, grade=1))
+                other.commit()
+            finally:
+                other.close()
+        return result
+
+    monkeypatch.setattr(grades_router, '_upsert_grade_sheets', racing_upsert)
+    r = client.post('/grades/bulk', json=payload, headers=headers)
+    assert r.status_code == 201 and r.json()['updated'] == 1
+    assert len(calls) == 2
+
+    # any other integrity error (e.g. an unknown student_id) is a 400 without a retry
+    def bad_reference(db, *args):
+        calls.append(1)
+        raise IntegrityError('INSERT INTO grades ...', {}, Exception('FOREIGN KEY constraint failed'))
+
+    calls.clear()
+    monkeypatch.setattr(grades_router, '_upsert_grade_sheets', bad_reference)
+    r = client.post('/grades/bulk', json=payload, headers=headers)
+    assert r.status_code == 400
+    assert len(calls) == 1
+
+
+def test_grades_keyset_pagination():
+    school, headers = create_school_and_admin()
+    r = client.post('/subjects', json={'name': 'History', 'code': 'H101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    students = [create_student(school['id'], f'Paged {i}') for i in range(5)]
+    r = client.post('/grades/bulk', json={
+        'subject_id': subject['id'], 'title': 'Quiz', 'max_score': 10,
+        'grades': [{'student_id': s['id'], 'grade': i} for i, s in enumerate(students)]
+    }, headers=headers)
+    assert r.status_code == 201
+
+    seen = []
+    cursor = None
+    while True:
+        url = f"/grades?subject_id={subject['id']}&limit=2&include_total=true"
+        if cursor:
+            url += f"&cursor={cursor}"
+        r = client.get(url, headers=headers)
+        assert r.status_code == 200
+        assert r.headers['X-Total-Count'] == '5'
+        seen.extend(g['id'] for g in r.json())
+        cursor = r.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert len(seen) == 5 and seen == sorted(set(seen))
+
+    r = client.get(f"/grades?subject_id={subject['id']}&limit=2&cursor=not-a-cursor", headers=headers)
+    assert r.status_code == 400
+
+
+def test_delete_student_removes_materialized_scores():
+    school, headers = create_school_and_admin()
+    student = create_student(school['id'], 'Ranked Student')
+    from database.connection import SessionLocal
+    from models.student_score import StudentScoreAggregate
+
+    def aggregate_count():
+        db = SessionLocal()
+        try:
+            return db.query(StudentScoreAggregate).filter(StudentScoreAggregate.student_id == student['id']).count()
+        finally:
+            db.close()
+
+    # ranking reads compute missing aggregates in memory and write nothing
+    r = client.get(f"/grades/school/{school['id']}/ranking", headers=headers)
+    assert r.status_code == 200
+    assert [row['student_id'] for row in r.json()] == [student['id']]
+    assert aggregate_count() == 0
+
+    r = client.post('/subjects', json={'name': 'Ranked', 'code': 'R101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    r = client.post(f"/subjects/{subject['id']}/enroll", json={'student_id': student['id']}, headers=headers)
+    assert r.status_code == 201
+    r = client.post('/grades/bulk', json={'subject_id': subject['id'], 'title': 'Quiz', 'max_score': 10,
+                                          'grades': [{'student_id': student['id'], 'grade': 9}]}, headers=headers)
+    assert r.status_code == 201
+    assert aggregate_count() == 1
+    # saving the same cell again updates the aggregate in place
+    r = client.post('/grades/bulk', json={'subject_id': subject['id'], 'title': 'Quiz', 'max_score': 10,
+                                          'grades': [{'student_id': student['id'], 'grade': 6}]}, headers=headers)
+    assert r.status_code == 201
+    assert aggregate_count() == 1
+    r = client.get(f"/grades/school/{school['id']}/ranking", headers=headers)
+    assert r.json()[0]['total_score'] == 60
+
+    r = client.delete(f"/subjects/{subject['id']}/enroll/{student['id']}", headers=headers)
+    assert r.status_code == 204
+    r = client.patch(f"/users/{student['id']}/deactivate", headers=headers)
+    assert r.status_code == 200
+    r = client.delete(f"/users/{student['id']}", headers=headers)
+    assert r.status_code == 200
+
+    # student_score_aggregates.student_id is a foreign key to users.id
+    assert aggregate_count() == 0
+
+
+def test_rankings_follow_subject_settings_and_deletion():
+    school, headers = create_school_and_admin()
+    student = create_student(school['id'], 'Subject Student')
+    subjects = []
+    for code in ('E101', 'H101'):
+        r = client.post('/subjects', json={'name': code, 'code': code, 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+        assert r.status_code == 201
+        subjects.append(r.json())
+        r = client.post(f"/subjects/{subjects[-1]['id']}/enroll", json={'student_id': student['id']}, headers=headers)
+        assert r.status_code == 201
+        r = client.post('/grades/bulk', json={'subject_id': subjects[-1]['id'], 'title': 'Homework', 'max_score': 10,
+                                              'grades': [{'student_id': student['id'], 'grade': 5}]}, headers=headers)
+        assert r.status_code == 201
+
+    def school_total():
+        r = client.get(f"/grades/school/{school['id']}/ranking", headers=headers)
+        assert r.status_code == 200
+        return r.json()[0]['total_score']
+
+    # 5/10 of the default 100 collected points, twice
+    assert school_total() == 100.0
+
+    english = subjects[0]
+    r = client.patch(f"/subjects/{english['id']}", json={'name': english['name'], 'code': english['code'], 'subject_type': 'main',
+                                                           'teacher_id': None, 'max_collected_score': 60}, headers=headers)
+    assert r.status_code == 200
+    assert school_total() == 80.0
+
+    r = client.delete(f"/subjects/{english['id']}", headers=headers)
+    assert r.status_code == 204
+    assert school_total() == 50.0
+
+
+def test_grade_cells_without_classroom_are_unique():
+    from sqlalchemy.exc import IntegrityError
+    from database.connection import SessionLocal
+    from models.grade import Grade as GradeModel
+
+    school, headers = create_school_and_admin()
+    student = create_student(school['id'], 'Unique Student')
+    r = client.post('/subjects', json={'name': 'Art', 'code': 'A101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    r = client.post('/grades/bulk', json={'subject_id': subject['id'], 'title': 'Sketch', 'max_score': 10,
+                                          'grades': [{'student_id': student['id'], 'grade': 6}]}, headers=headers)
+    assert r.status_code == 201
+
+    # a second row for the same cell (what a concurrent save would insert) is rejected
+    db = SessionLocal()
+    try:
+        db.add(GradeModel(subject_id=subject['id'], student_id=student['id'], title='Sketch', max_score=10, grade=7))
+        with pytest.raises(IntegrityError):
+            db.commit()
+        db.rollback()
+    finally:
+        db.close()
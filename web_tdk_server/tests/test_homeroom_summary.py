@@ -0,0 +1,130 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Homeroom School {int(time.time())}-{random.randint(0,99999)}'})
+    assert r.status_code == 201
+    school = r.json()
+    username = f"testadmin{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'adminpass',
+                                    'role': 'admin', 'full_name': 'Test Admin', 'school_id': school['id']})
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    return school, {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def create_user(school_id, role, name):
+    username = f"{role}{int(time.time())}{random.randint(0,999999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': f'{role}pass',
+                                    'role': role, 'full_name': name, 'school_id': school_id})
+    assert r.status_code == 201
+    r2 = client.post('/users/login', data={'username': username, 'password': f'{role}pass'})
+    assert r2.status_code == 200
+    return r.json(), {'Authorization': f"Bearer {r2.json()['access_token']}"}
+
+
+def create_classroom(school_id, headers, grade_level, room, student_ids):
+    r = client.post('/classrooms/create', json={'name': f'{grade_level}/{room}', 'grade_level': grade_level, 'room_number': room,
+                                               'semester': 1, 'academic_year': '2025', 'school_id': school_id}, headers=headers)
+    assert r.status_code == 200
+    classroom = r.json()
+    r = client.post(f"/classrooms/{classroom['id']}/add-students", json=student_ids, headers=headers)
+    assert r.json()['added_count'] == len(student_ids)
+    return classroom
+
+
+def create_subject(school_id, headers, name, subject_type, student_ids, **extra):
+    r = client.post('/subjects', json={'name': name, 'code': name[:3].upper(), 'subject_type': subject_type,
+                                       'teacher_id': None, 'school_id': school_id, **extra}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    for sid in student_ids:
+        r = client.post(f"/subjects/{subject['id']}/enroll", json={'student_id': sid}, headers=headers)
+        assert r.status_code == 201
+    return subject
+
+
+def test_homeroom_summary_reports_grades_and_attendance_per_classroom():
+    school, headers = create_school_and_admin()
+    teacher, teacher_headers = create_user(school['id'], 'teacher', 'Homeroom Teacher')
+    r = client.post('/homeroom', json={'teacher_id': teacher['id'], 'grade_level': 'ป.4', 'school_id': school['id'],
+                                       'academic_year': '2025'}, headers=headers)
+    assert r.status_code == 201
+
+    s1, s2, s3, s4 = (create_user(school['id'], 'student', f'Student {i}')[0]['id'] for i in range(1, 5))
+    room1 = create_classroom(school['id'], headers, 'ป.4', '1', [s1, s2])
+    room2 = create_classroom(school['id'], headers, 'ป.4', '2', [s3])
+    create_classroom(school['id'], headers, 'ป.5', '1', [s4])  # another grade: not in the summary
+
+    math = create_subject(school['id'], headers, 'Math', 'main', [s1, s2, s3])
+    club = create_subject(school['id'], headers, 'Club', 'activity', [s1], activity_percentage=10)
+
+    def save(subject, title, max_score, grades):
+        r = client.post('/grades/bulk', json={'subject_id': subject['id'], 'title': title, 'max_score': max_score,
+                                              'grades': [{'student_id': sid, 'grade': g} for sid, g in grades.items()]},
+                        headers=headers)
+        assert r.status_code == 201
+
+    save(math, 'HW1', 10, {s1: 8, s2: 5})
+    save(math, 'HW2', 20, {s1: 15})
+    save(club, 'Part', 5, {s1: 5})
+
+    def mark(subject, day, statuses):
+        r = client.post('/attendance/mark', json={'subject_id': subject['id'], 'date': day,
+                                                  'attendance': {str(sid): st for sid, st in statuses.items()}}, headers=headers)
+        assert r.status_code == 201
+
+    mark(math, '2025-06-02', {s1: 'present', s2: 'absent', s3: 'late'})
+    mark(math, '2025-06-03', {s1: 'present', s2: 'sick_leave', s3: 'present'})
+    mark(club, '2025-06-02', {s1: 'absent'})
+
+    r = client.get('/homeroom/my-classrooms/summary', headers=teacher_headers)
+    assert r.status_code == 200
+    classrooms = r.json()['classrooms']
+    assert [(c['classroom_id'], c['grade_level'], c['student_count']) for c in classrooms] == [
+        (room1['id'], 'ป.4', 2), (room2['id'], 'ป.4', 1)]
+    students = {s['id']: s for c in classrooms for s in c['students']}
+    assert [s['id'] for s in classrooms[0]['students']] == [s1, s2]
+
+    def attendance_row(subject, total, present=0, absent=0, late=0, sick=0):
+        return {'subject_id': subject['id'], 'subject_name': subject['name'], 'total_days': total, 'present_days': present,
+                'absent_days': absent, 'late_days': late, 'sick_leave_days': sick}
+
+    first = students[s1]
+    assert first['grades_by_subject'] == [
+        {'subject_id': math['id'], 'subject_name': 'Math', 'is_activity': False, 'credits': math['credits'],
+         'assignments': [{'title': 'HW1', 'score': 8.0, 'max_score': 10.0}, {'title': 'HW2', 'score': 15.0, 'max_score': 20.0}],
+         'total_score': 23.0, 'total_max_score': 30.0},
+        {'subject_id': club['id'], 'subject_name': 'Club', 'is_activity': True, 'credits': club['credits'],
+         'assignments': [{'title': 'Part', 'score': 5.0, 'max_score': 5.0}],
+         'total_score': 5.0, 'total_max_score': 5.0},
+    ]
+    assert first['attendance_by_subject'] == [attendance_row(math, 2, present=2), attendance_row(club, 1, absent=1)]
+    assert first['attendance'] == {'attendance_rate': 66.67, 'present_days': 2, 'absent_days': 1, 'late_days': 0, 'sick_leave_days': 0}
+
+    second = students[s2]
+    assert [(g['subject_name'], g['total_score'], g['total_max_score']) for g in second['grades_by_subject']] == [('Math', 5.0, 10.0)]
+    assert second['attendance_by_subject'] == [attendance_row(math, 2, absent=1, sick=1)]
+    assert second['attendance'] == {'attendance_rate': 0, 'present_days': 0, 'absent_days': 1, 'late_days': 0, 'sick_leave_days': 1}
+
+    third = students[s3]
+    assert third['grades_by_subject'] == []
+    assert third['attendance_by_subject'] == [attendance_row(math, 2, present=1, late=1)]
+    assert third['attendance']['attendance_rate'] == 50.0
+
+    # the per-classroom endpoint returns the same rows without the totals
+    r = client.get(f"/homeroom/my-classrooms/{room1['id']}/students", headers=teacher_headers)
+    assert r.status_code == 200
+    detail = {s['id']: s for s in r.json()['students']}
+    assert set(detail) == {s1, s2} and 'attendance' not in detail[s1]
+    assert detail[s1]['grades_by_subject'] == first['grades_by_subject']
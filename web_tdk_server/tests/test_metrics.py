@@ -0,0 +1,73 @@
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def owner_headers():
+    username = f"owner{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'ownerpass', 'role': 'owner', 'full_name': 'Owner'})
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'ownerpass'})
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def test_metrics_require_owner_or_scrape_token(monkeypatch):
+    from routers import metrics
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics/db-pool').status_code == 401
+
+    username = f"admin{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'adminpass', 'role': 'admin', 'full_name': 'Admin'})
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'adminpass'})
+    assert client.get('/metrics', headers={'Authorization': f"Bearer {r.json()['access_token']}"}).status_code == 403
+
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'scrape-secret')
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong-secret'}).status_code == 401
+
+
+def test_db_pool_metrics_report_checkouts():
+    headers = owner_headers()
+    before = client.get('/metrics/db-pool', headers=headers).json()
+    r = client.get('/schools')
+    assert r.status_code == 200
+    after = client.get('/metrics/db-pool', headers=headers).json()
+    assert after['checkouts'] > before['checkouts']
+    assert after['checkout_wait_ms_max'] >= 0
+    assert {'pool_size', 'checked_out', 'overflow'} <= set(after)
+
+
+def test_query_metrics_headers_and_prometheus_histograms(monkeypatch):
+    from utils import request_metrics
+    monkeypatch.setattr(request_metrics, 'QUERY_METRICS_HEADERS', True)
+
+    r = client.get('/schools')
+    assert r.status_code == 200
+    assert int(r.headers['X-DB-Query-Count']) >= 1
+    assert float(r.headers['X-DB-Time-Ms']) >= 0
+
+    r = client.get('/metrics', headers=owner_headers())
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/plain')
+    assert 'http_request_db_statements_bucket{method="GET",route="/schools"' in r.text
+    assert 'db_pool_checked_out{pool="primary"}' in r.text
+
+
+def test_query_budget_logs_warning(monkeypatch, caplog):
+    from utils import request_metrics
+    headers = owner_headers()
+
+    # owner stats run one grouped query per table: over a budget of 2
+    monkeypatch.setattr(request_metrics, 'QUERY_BUDGET', 2)
+    with caplog.at_level('WARNING', logger='web_tdk.query_metrics'):
+        r = client.get('/owner/schools', headers=headers)
+    assert r.status_code == 200
+    assert any('Query budget exceeded: GET /owner/schools' in rec.getMessage() for rec in caplog.records)
+    assert 'http_request_query_budget_exceeded_total{method="GET",route="/owner/schools"}' in client.get('/metrics', headers=headers).text
@@ -0,0 +1,107 @@
+import pytest
+import time
+import random
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from database.connection import SessionLocal
+from models.announcement import Announcement as AnnouncementModel
+
+client = TestClient(app)
+
+
+def login(username, password):
+    r = client.post('/users/login', data={'username': username, 'password': password})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def create_user(role, school_id=None):
+    username = f"{role}{int(time.time())}{random.randint(0,999999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': f'{role}pass',
+                                    'role': role, 'full_name': f'Stats {role}', 'school_id': school_id})
+    assert r.status_code == 201
+    return r.json(), login(username, f'{role}pass')
+
+
+def create_school(owner_headers):
+    r = client.post('/owner/create_school', json={'name': f'Stats School {int(time.time())}-{random.randint(0,999999)}'},
+                    headers=owner_headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def stats_by_id(rows, school_ids):
+    return {row['id']: row for row in rows if row['id'] in school_ids}
+
+
+def counts(row):
+    return {k: row[k] for k in ('admins', 'teachers', 'students', 'active_subjects', 'recent_announcements')}
+
+
+def test_owner_school_stats_counts_and_cached_snapshot():
+    _, owner = create_user('owner')
+    school_a = create_school(owner)
+    school_b = create_school(owner)
+
+    _, admin_a = create_user('admin', school_a['id'])
+    for _ in range(2):
+        create_user('teacher', school_a['id'])
+    for _ in range(3):
+        create_user('student', school_a['id'])
+    create_user('admin', school_b['id'])
+    create_user('student', school_b['id'])
+
+    subject_ids = []
+    for code in ('S1', 'S2'):
+        r = client.post('/subjects', json={'name': code, 'code': code, 'subject_type': 'main', 'teacher_id': None,
+                                           'school_id': school_a['id']}, headers=admin_a)
+        assert r.status_code == 201
+        subject_ids.append(r.json()['id'])
+    assert client.patch(f'/subjects/{subject_ids[1]}/end', headers=admin_a).status_code == 200
+
+    announcement_ids = []
+    for title in ('New', 'Old'):
+        r = client.post('/announcements', json={'title': title, 'content': 'x', 'school_id': school_a['id']}, headers=admin_a)
+        assert r.status_code == 201
+        announcement_ids.append(r.json()['id'])
+    db = SessionLocal()
+    try:
+        db.query(AnnouncementModel).filter(AnnouncementModel.id == announcement_ids[1]).update(
+            {'created_at': datetime.utcnow() - timedelta(days=40)})
+        db.commit()
+    finally:
+        db.close()
+
+    ids = {school_a['id'], school_b['id']}
+    r = client.get('/owner/schools', headers=owner)
+    assert r.status_code == 200
+    live = stats_by_id(r.json(), ids)
+    assert counts(live[school_a['id']]) == {'admins': 1, 'teachers': 2, 'students': 3, 'active_subjects': 1, 'recent_announcements': 1}
+    assert counts(live[school_b['id']]) == {'admins': 1, 'teachers': 0, 'students': 1, 'active_subjects': 0, 'recent_announcements': 0}
+    assert live[school_a['id']]['name'] == school_a['name']
+
+    # the snapshot is served until it expires, with the time it was computed
+    snapshot = stats_by_id(client.get('/owner/schools?cached=true', headers=owner).json(), ids)
+    assert {k: counts(v) for k, v in snapshot.items()} == {k: counts(v) for k, v in live.items()}
+    create_user('student', school_b['id'])
+    again = stats_by_id(client.get('/owner/schools?cached=true', headers=owner).json(), ids)
+    assert again == snapshot
+    assert stats_by_id(client.get('/owner/schools', headers=owner).json(), ids)[school_b['id']]['students'] == 2
+
+    # school writes by the owner drop the snapshot
+    school_c = create_school(owner)
+    fresh = client.get('/owner/schools?cached=true', headers=owner).json()
+    assert school_c['id'] in {row['id'] for row in fresh}
+    fresh = stats_by_id(fresh, ids)
+    assert fresh[school_b['id']]['students'] == 2
+    assert fresh[school_b['id']]['as_of'] > snapshot[school_b['id']]['as_of']
+
+    _, admin_c = create_user('admin', school_c['id'])
+    r = client.post('/admin/request_school_deletion', json={'school_id': school_c['id'], 'reason': 'test'}, headers=admin_c)
+    assert r.status_code == 201
+    assert client.delete(f"/owner/schools/{school_c['id']}", headers=owner).status_code == 204
+    assert school_c['id'] not in {row['id'] for row in client.get('/owner/schools?cached=true', headers=owner).json()}
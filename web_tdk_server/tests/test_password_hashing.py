@@ -0,0 +1,59 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from database.connection import SessionLocal
+from models.user import User as UserModel
+from utils import hashing, security
+
+client = TestClient(app)
+
+
+def test_login_rehashes_password_made_under_old_rounds_policy():
+    username = f"rehash{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': None,
+        'password': 'pass1234',
+        'role': 'teacher',
+        'full_name': 'Rehash Teacher',
+        'school_id': None
+    })
+    assert r.status_code == 201
+
+    # simulate a hash stored before PASSWORD_HASH_ROUNDS was raised
+    old_hash = security.pwd_context.handler('pbkdf2_sha256').using(rounds=1000).hash('pass1234')
+    db = SessionLocal()
+    try:
+        db.query(UserModel).filter(UserModel.username == username).update({'hashed_password': old_hash})
+        db.commit()
+    finally:
+        db.close()
+
+    r = client.post('/users/login', data={'username': username, 'password': 'pass1234'})
+    assert r.status_code == 200
+
+    db = SessionLocal()
+    try:
+        stored = db.query(UserModel.hashed_password).filter(UserModel.username == username).scalar()
+    finally:
+        db.close()
+    assert stored != old_hash
+    assert f"${security.PASSWORD_HASH_ROUNDS}$" in stored
+    assert not security.pwd_context.needs_update(stored)
+
+    # a wrong password neither logs in nor touches the hash
+    r = client.post('/users/login', data={'username': username, 'password': 'wrong'})
+    assert r.status_code == 401
+
+
+def test_hashing_service_inline_mode(monkeypatch):
+    monkeypatch.setattr(hashing, 'HASH_WORKERS', 0)
+    inline = hashing.hash_password('secret')
+    assert hashing.verify_password('secret', inline)
+    assert hashing.verify_and_update('secret', inline) == (True, None)
+    assert hashing.verify_and_update('nope', inline) == (False, None)
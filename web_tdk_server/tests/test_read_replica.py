@@ -0,0 +1,133 @@
+import pytest
+import time
+import random
+import sqlite3
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+import database.connection as connection
+
+client = TestClient(app)
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Replica School {int(time.time())}-{random.randint(0,99999)}'})
+    assert r.status_code == 201
+    school = r.json()
+    username = f"testadmin{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'adminpass',
+                                    'role': 'admin', 'full_name': 'Test Admin', 'school_id': school['id']})
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    return school, {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def create_student(school_id, name):
+    username = f"student{int(time.time())}{random.randint(0,999999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'studentpass',
+                                    'role': 'student', 'full_name': name, 'school_id': school_id})
+    assert r.status_code == 201
+    return r.json()
+
+
+def save_quiz(subject_id, classroom_id, headers, grades):
+    r = client.post('/grades/bulk', json={'subject_id': subject_id, 'title': 'Quiz', 'max_score': 10, 'classroom_id': classroom_id,
+                                          'grades': [{'student_id': sid, 'grade': g} for sid, g in grades.items()]}, headers=headers)
+    assert r.status_code == 201
+
+
+def write_recorder(statements):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(WRITE_PREFIXES):
+            statements.append(statement)
+    return before_cursor_execute
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """Return a function that snapshots the SQLite primary into a second file and routes get_read_db to it."""
+    if connection.engine.dialect.name != 'sqlite':
+        pytest.skip('the replica is a copy of the SQLite primary')
+    engines = []
+
+    def start():
+        path = tmp_path / 'replica.db'
+        src, dst = sqlite3.connect(connection.engine.url.database), sqlite3.connect(str(path))
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+        url = f'sqlite:///{path}'
+        read_engine = create_engine(url, **connection.engine_kwargs(url))
+        engines.append(read_engine)
+        monkeypatch.setattr(connection, 'read_engine', read_engine)
+        monkeypatch.setattr(connection, 'ReadSessionLocal', sessionmaker(autocommit=False, autoflush=False, bind=read_engine))
+        return read_engine
+
+    yield start
+    for read_engine in engines:
+        read_engine.dispose()
+
+
+def test_rankings_and_reports_read_through_the_replica(replica):
+    school, headers = create_school_and_admin()
+    r = client.post('/classrooms/create', json={'name': 'Replica Room', 'grade_level': 'Grade 1', 'room_number': '1',
+                                               'semester': 1, 'academic_year': '2025', 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 200
+    classroom = r.json()
+    students = [create_student(school['id'], f'Replica Student {i}') for i in range(2)]
+    r = client.post(f"/classrooms/{classroom['id']}/add-students", json=[s['id'] for s in students], headers=headers)
+    assert r.status_code == 200
+    r = client.post('/subjects', json={'name': 'Math', 'code': 'M101', 'subject_type': 'main', 'teacher_id': None,
+                                       'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    r = client.post(f"/subjects/{subject['id']}/assign-classroom", json={'classroom_id': classroom['id']}, headers=headers)
+    assert r.status_code == 201
+    first, second = students[0]['id'], students[1]['id']
+    save_quiz(subject['id'], classroom['id'], headers, {first: 9, second: 4})
+
+    read_engine = replica()
+    # the replica lags: a later grade write lands on the primary only
+    save_quiz(subject['id'], classroom['id'], headers, {first: 2, second: 10})
+    # and the replica has no materialized aggregates, so rankings must compute them in memory
+    with read_engine.begin() as conn:
+        conn.execute(text('DELETE FROM student_score_aggregates WHERE student_id IN (:a, :b)'), {'a': first, 'b': second})
+
+    primary_writes, replica_writes = [], []
+    on_primary, on_replica = write_recorder(primary_writes), write_recorder(replica_writes)
+    event.listen(connection.engine, 'before_cursor_execute', on_primary)
+    event.listen(read_engine, 'before_cursor_execute', on_replica)
+    try:
+        r = client.get(f"/grades/classroom/{classroom['id']}/ranking", headers=headers)
+        assert r.status_code == 200
+        ranking = {row['student_id']: row for row in r.json()}
+        assert ranking[first]['rank'] == 1 and ranking[first]['total_score'] == 90.0
+        assert ranking[second]['total_score'] == 40.0
+
+        r = client.get(f"/grades/school/{school['id']}/ranking", headers=headers)
+        assert r.status_code == 200
+        assert [row['student_id'] for row in r.json()] == [first, second]
+
+        r = client.get(f"/grades/student/{first}/transcript?classroom_id={classroom['id']}", headers=headers)
+        assert r.status_code == 200
+        assert r.json()[0]['score'] == 90.0  # 9/10 on the replica, 2/10 on the primary
+
+        # ranking reads never write, to either database
+        assert replica_writes == [] and primary_writes == []
+
+        # grade writes refresh the aggregates on the primary only
+        save_quiz(subject['id'], classroom['id'], headers, {first: 3})
+        assert any('student_score_aggregates' in s for s in primary_writes)
+        assert replica_writes == []
+    finally:
+        event.remove(connection.engine, 'before_cursor_execute', on_primary)
+        event.remove(read_engine, 'before_cursor_execute', on_replica)
@@ -0,0 +1,154 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from utils.schedule_conflicts import normalize_day
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Test School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+
+    admin_username = f"testadmin{int(time.time())}{random.randint(0,9999)}"
+    admin_data = {
+        'username': admin_username,
+        'email': f'{admin_username}@example.com',
+        'password': 'adminpass',
+        'role': 'admin',
+        'full_name': 'Test Admin',
+        'school_id': school['id']
+    }
+    r = client.post('/users', json=admin_data)
+    assert r.status_code == 201
+
+    r = client.post('/users/login', data={'username': admin_username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    token = r.json()['access_token']
+    return school, {'Authorization': f'Bearer {token}'}
+
+
+def create_teacher(school_id):
+    username = f"teacher{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'teacherpass',
+        'role': 'teacher',
+        'full_name': 'Conflict Teacher',
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    return r.json()
+
+
+def create_classroom(school_id, headers, name):
+    r = client.post('/classrooms/create', json={
+        'name': name, 'grade_level': 'Grade 1', 'room_number': name[-1],
+        'semester': 1, 'academic_year': '2025', 'school_id': school_id
+    }, headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_normalize_day_accepts_numbers_and_names():
+    assert normalize_day(0) == 0
+    assert normalize_day('1') == 1
+    assert normalize_day('Monday') == 1
+    assert normalize_day('sat') == 6
+    assert normalize_day('จันทร์') == 1
+    assert normalize_day('7') is None
+    assert normalize_day('someday') is None
+
+
+def test_validate_reports_every_conflict_of_a_batch():
+    school, headers = create_school_and_admin()
+    r = client.post('/schedule/slots', json={'day_of_week': 'monday', 'start_time': '08:00', 'end_time': '16:00'}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()['day_of_week'] == '1'
+
+    teacher = create_teacher(school['id'])
+    other_teacher = create_teacher(school['id'])
+    room_a = create_classroom(school['id'], headers, 'Room A')
+    room_b = create_classroom(school['id'], headers, 'Room B')
+    r = client.post('/subjects', json={'name': 'Science', 'code': 'S101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+
+    r = client.post(f"/schedule/assign_admin?teacher_id={teacher['id']}", json={
+        'subject_id': subject['id'], 'classroom_id': room_a['id'],
+        'day_of_week': 1, 'start_time': '09:00', 'end_time': '10:00'
+    }, headers=headers)
+    assert r.status_code == 200
+    existing = r.json()
+
+    # same teacher on "Monday" spelled differently is still the same day
+    r = client.post(f"/schedule/assign_admin?teacher_id={teacher['id']}", json={
+        'subject_id': subject['id'], 'classroom_id': room_b['id'],
+        'day_of_week': 'Monday', 'start_time': '09:30', 'end_time': '10:30'
+    }, headers=headers)
+    assert r.status_code == 400
+    assert r.json()['detail'] == 'Teacher cannot have overlapping schedules at the same time'
+
+    batch = [
+        # 0: teacher busy in room A at that time
+        {'subject_id': subject['id'], 'teacher_id': teacher['id'], 'classroom_id': room_b['id'],
+         'day_of_week': '1', 'start_time': '09:30', 'end_time': '10:30'},
+        # 1: fine
+        {'subject_id': subject['id'], 'teacher_id': other_teacher['id'], 'classroom_id': room_b['id'],
+         'day_of_week': 'monday', 'start_time': '11:00', 'end_time': '12:00'},
+        # 2: room B already taken by #1 in this batch
+        {'subject_id': subject['id'], 'teacher_id': teacher['id'], 'classroom_id': room_b['id'],
+         'day_of_week': 1, 'start_time': '11:30', 'end_time': '12:30'},
+        # 3: outside operating hours
+        {'subject_id': subject['id'], 'teacher_id': teacher['id'], 'classroom_id': room_a['id'],
+         'day_of_week': 1, 'start_time': '15:30', 'end_time': '16:30'},
+        # 4: no such day
+        {'subject_id': subject['id'], 'teacher_id': teacher['id'], 'day_of_week': 'funday',
+         'start_time': '09:00', 'end_time': '10:00'},
+    ]
+    r = client.post('/schedule/validate', json={'assignments': batch}, headers=headers)
+    assert r.status_code == 200
+    result = r.json()
+    assert result['valid'] is False
+    found = {(c['index'], c['type']) for c in result['conflicts']}
+    assert found == {
+        (0, 'teacher_overlap'),
+        (2, 'classroom_overlap'),
+        (3, 'outside_operating_hours'),
+        (4, 'invalid_day'),
+    }
+    by_index = {c['index']: c for c in result['conflicts']}
+    assert by_index[0]['schedule_id'] == existing['id']
+    assert by_index[2]['other_index'] == 1
+
+    # moving the existing assignment over its own old time is not a conflict
+    moved = {'id': existing['id'], 'subject_id': subject['id'], 'teacher_id': teacher['id'], 'classroom_id': room_a['id'],
+             'day_of_week': 1, 'start_time': '09:15', 'end_time': '10:15'}
+    r = client.post('/schedule/validate', json={'assignments': [batch[1], moved]}, headers=headers)
+    assert r.status_code == 200
+    assert r.json() == {'valid': True, 'conflicts': []}
+
+
+def test_validate_sees_assignments_made_after_the_index_was_cached():
+    school, headers = create_school_and_admin()
+    teacher = create_teacher(school['id'])
+    r = client.post('/subjects', json={'name': 'Art', 'code': 'A101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    subject = r.json()
+    proposal = {'subject_id': subject['id'], 'teacher_id': teacher['id'], 'day_of_week': 3,
+                'start_time': '13:00', 'end_time': '14:00'}
+
+    r = client.post('/schedule/validate', json={'assignments': [proposal], 'check_slots': False}, headers=headers)
+    assert r.json()['valid'] is True
+
+    r = client.post(f"/schedule/assign_admin?teacher_id={teacher['id']}", json=proposal, headers=headers)
+    assert r.status_code == 200
+
+    r = client.post('/schedule/validate', json={'assignments': [proposal], 'check_slots': False}, headers=headers)
+    assert [c['type'] for c in r.json()['conflicts']] == ['teacher_overlap']
@@ -0,0 +1,166 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Promotion School {int(time.time())}-{random.randint(0,99999)}'})
+    assert r.status_code == 201
+    school = r.json()
+    username = f"testadmin{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'adminpass',
+                                    'role': 'admin', 'full_name': 'Test Admin', 'school_id': school['id']})
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    return school, {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def create_student(school_id):
+    username = f"student{int(time.time())}{random.randint(0,999999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'pass1234',
+                                    'role': 'student', 'full_name': f'Student {username[-6:]}', 'school_id': school_id})
+    assert r.status_code == 201
+    return r.json()['id']
+
+
+def create_classroom(school_id, headers, grade_level, room, academic_year='2025', semester=1):
+    r = client.post('/classrooms/create', json={'name': f'{grade_level}/{room}', 'grade_level': grade_level, 'room_number': room,
+                                               'semester': semester, 'academic_year': academic_year,
+                                               'school_id': school_id}, headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def add_students(classroom, headers, ids):
+    r = client.post(f"/classrooms/{classroom['id']}/add-students", json=ids, headers=headers)
+    assert r.status_code == 200
+    assert r.json()['added_count'] == len(ids)
+
+
+def active_students(classroom_id, headers):
+    r = client.get(f'/classrooms/{classroom_id}/students', headers=headers)
+    assert r.status_code == 200
+    return {s['student_id'] for s in r.json() if s['is_active']}
+
+
+def test_end_of_year_promotion_dry_run_then_job():
+    school, headers = create_school_and_admin()
+    p1_1 = create_classroom(school['id'], headers, 'ป.1', '1')
+    p1_2 = create_classroom(school['id'], headers, 'ป.1', '2')
+    p6_1 = create_classroom(school['id'], headers, 'ป.6', '1')
+    # next year's ป.2/1 already exists and already holds one of the students
+    p2_1_next = create_classroom(school['id'], headers, 'ป.2', '1', academic_year='2026')
+    room1 = [create_student(school['id']) for _ in range(3)]
+    room2 = [create_student(school['id']) for _ in range(2)]
+    add_students(p1_1, headers, room1)
+    add_students(p1_2, headers, room2)
+    add_students(p6_1, headers, [create_student(school['id'])])
+    add_students(p2_1_next, headers, room1[:1])
+
+    payload = {'promotion_type': 'end_of_year', 'grade_map': {'ป.1': 'ป.2'}, 'academic_year': '2025'}
+    r = client.post('/classrooms/promote-school', json=payload, headers=headers)
+    assert r.status_code == 200
+    plan = r.json()
+    assert plan['dry_run'] is True
+    assert plan['target'] == {'academic_year': '2026', 'semester': 1}
+    assert plan['summary'] == {'classrooms': 2, 'students': 5, 'create_classrooms': 1, 'skipped': 1}
+    by_source = {c['source_classroom_id']: c for c in plan['classrooms']}
+    assert by_source[p1_1['id']]['target_classroom_id'] == p2_1_next['id']
+    assert by_source[p1_1['id']]['already_in_target'] == 1
+    assert by_source[p1_2['id']]['create'] is True and by_source[p1_2['id']]['target_name'] == 'ป.2/2'
+    assert plan['skipped'][0]['source_classroom_id'] == p6_1['id']
+    # dry run writes nothing
+    assert active_students(p2_1_next['id'], headers) == set(room1[:1])
+
+    r = client.post('/classrooms/promote-school', json={**payload, 'dry_run': False}, headers=headers)
+    assert r.status_code == 202
+    job_id = r.json()['id']
+    r = client.get(f'/classrooms/promote-school/jobs/{job_id}', headers=headers)
+    assert r.status_code == 200
+    job = r.json()
+    assert job['status'] == 'completed', job['message']
+    assert job['processed'] == job['total'] == 2
+    assert job['result']['created_classrooms'] == 1
+    assert job['result']['promoted_students'] == 4
+    assert len(job['skipped']) == 1
+
+    assert active_students(p2_1_next['id'], headers) == set(room1)
+    targets = {c['source_classroom_id']: c['target_classroom_id'] for c in job['result']['classrooms']}
+    assert active_students(targets[p1_2['id']], headers) == set(room2)
+    # source enrollments are kept, as with single-classroom promotion
+    assert active_students(p1_1['id'], headers) == set(room1)
+    r = client.get(f"/users?school_id={school['id']}&role=student", headers=headers)
+    grades = {u['id']: u['grade_level'] for u in r.json()}
+    assert {grades[sid] for sid in room1 + room2} == {'ป.2'}
+
+    # running it again changes nothing
+    r = client.post('/classrooms/promote-school', json=payload, headers=headers)
+    assert r.json()['summary']['create_classrooms'] == 0
+    assert all(c['already_in_target'] == c['students'] for c in r.json()['classrooms'])
+
+
+def test_promote_school_validation():
+    school, headers = create_school_and_admin()
+    r = client.post('/classrooms/promote-school', json={'promotion_type': 'end_of_year'}, headers=headers)
+    assert r.status_code == 400
+    r = client.post('/classrooms/promote-school', json={'promotion_type': 'sideways'}, headers=headers)
+    assert r.status_code == 400
+
+    room = create_classroom(school['id'], headers, 'ม.1', '1')
+    add_students(room, headers, [create_student(school['id'])])
+    r = client.post('/classrooms/promote-school', json={'promotion_type': 'mid_term', 'dry_run': False}, headers=headers)
+    assert r.status_code == 202
+    job = client.get(f"/classrooms/promote-school/jobs/{r.json()['id']}", headers=headers).json()
+    assert job['status'] == 'completed'
+    target = job['result']['classrooms'][0]
+    assert target['target_name'] == 'ม.1/1' and job['result']['target'] == {'academic_year': '2025', 'semester': 2}
+
+    # semester 2 classrooms cannot be promoted mid-term
+    r = client.post('/classrooms/promote-school', json={'promotion_type': 'mid_term', 'semester': 2}, headers=headers)
+    assert r.status_code == 400
+
+
+def test_stale_promotion_job_does_not_block_the_school(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from database.connection import SessionLocal
+    from models.background_job import BackgroundJob
+    from utils import jobs
+    from utils.promotion import PROMOTION_JOB_TYPE
+
+    school, headers = create_school_and_admin()
+    room = create_classroom(school['id'], headers, 'ม.2', '1')
+    add_students(room, headers, [create_student(school['id'])])
+
+    def add_job(heartbeat_age):
+        db = SessionLocal()
+        try:
+            job = BackgroundJob(job_type=PROMOTION_JOB_TYPE, status='running', school_id=school['id'],
+                                heartbeat_at=datetime.now(timezone.utc) - heartbeat_age)
+            db.add(job)
+            db.commit()
+            return job.id
+        finally:
+            db.close()
+
+    payload = {'promotion_type': 'mid_term', 'dry_run': False}
+    # a job that reported progress recently blocks a second one
+    live = add_job(timedelta(seconds=5))
+    r = client.post('/classrooms/promote-school', json=payload, headers=headers)
+    assert r.status_code == 409
+
+    # the same job after its worker died: marked failed, the new job runs
+    monkeypatch.setattr(jobs, 'JOB_STALE_SECONDS', 1)
+    time.sleep(1.1)
+    r = client.post('/classrooms/promote-school', json=payload, headers=headers)
+    assert r.status_code == 202
+    assert client.get(f"/classrooms/promote-school/jobs/{r.json()['id']}", headers=headers).json()['status'] == 'completed'
+    stale = client.get(f'/classrooms/promote-school/jobs/{live}', headers=headers).json()
+    assert stale['status'] == 'failed' and stale['finished_at'] is not None
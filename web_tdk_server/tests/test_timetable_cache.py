@@ -0,0 +1,236 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Test School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+
+    admin_username = f"testadmin{int(time.time())}{random.randint(0,9999)}"
+    admin_data = {
+        'username': admin_username,
+        'email': f'{admin_username}@example.com',
+        'password': 'adminpass',
+        'role': 'admin',
+        'full_name': 'Test Admin',
+        'school_id': school['id']
+    }
+    r = client.post('/users', json=admin_data)
+    assert r.status_code == 201
+
+    r = client.post('/users/login', data={'username': admin_username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    token = r.json()['access_token']
+    return school, {'Authorization': f'Bearer {token}'}
+
+
+def create_user(school_id, role, name):
+    username = f"{role}{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': f'{role}pass',
+        'role': role,
+        'full_name': name,
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    user = r.json()
+    r = client.post('/users/login', data={'username': username, 'password': f'{role}pass'})
+    assert r.status_code == 200
+    return user, {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def assign(headers, teacher_id, subject_id, classroom_id, day, start, end):
+    r = client.post(f'/schedule/assign_admin?teacher_id={teacher_id}', json={
+        'subject_id': subject_id, 'classroom_id': classroom_id,
+        'day_of_week': day, 'start_time': start, 'end_time': end
+    }, headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_timetables_are_cached_with_etags_and_follow_schedule_changes():
+    school, headers = create_school_and_admin()
+    r = client.post('/classrooms/create', json={
+        'name': 'Timetable Room', 'grade_level': 'Grade 1', 'room_number': '1',
+        'semester': 1, 'academic_year': '2025', 'school_id': school['id']
+    }, headers=headers)
+    assert r.status_code == 200
+    classroom = r.json()
+
+    student, student_headers = create_user(school['id'], 'student', 'Timetable Student')
+    teacher, teacher_headers = create_user(school['id'], 'teacher', 'Timetable Teacher')
+    r = client.post(f"/classrooms/{classroom['id']}/add-students", json=[student['id']], headers=headers)
+    assert r.status_code == 200
+
+    r = client.post('/subjects', json={'name': 'Math', 'code': 'M101', 'subject_type': 'main', 'teacher_id': None, 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 201
+    subject = r.json()
+    r = client.post(f"/subjects/{subject['id']}/assign-classroom", json={'classroom_id': classroom['id']}, headers=headers)
+    assert r.status_code == 201
+
+    first = assign(headers, teacher['id'], subject['id'], classroom['id'], '2', '09:00', '10:00')
+
+    r = client.get('/schedule/student', headers=student_headers)
+    assert r.status_code == 200
+    assert [e['id'] for e in r.json()] == [first['id']]
+    assert r.json()[0]['teacher_name'] == 'Timetable Teacher'
+    etag = r.headers['etag']
+
+    # unchanged timetable: 304 without a body
+    r = client.get('/schedule/student', headers={**student_headers, 'If-None-Match': etag})
+    assert r.status_code == 304
+    assert r.headers['etag'] == etag
+    assert r.content == b''
+
+    r = client.get('/schedule/teacher', headers=teacher_headers)
+    assert r.status_code == 200
+    teacher_etag = r.headers['etag']
+    assert [e['subject_name'] for e in r.json()] == ['Math']
+
+    # a new schedule on an earlier day changes the timetable and comes first
+    second = assign(headers, teacher['id'], subject['id'], classroom['id'], '1', '13:00', '14:00')
+    r = client.get('/schedule/student', headers={**student_headers, 'If-None-Match': etag})
+    assert r.status_code == 200
+    assert [e['id'] for e in r.json()] == [second['id'], first['id']]
+    assert r.headers['etag'] != etag
+
+    r = client.get('/schedule/teacher', headers={**teacher_headers, 'If-None-Match': teacher_etag})
+    assert r.status_code == 200
+    assert len(r.json()) == 2
+
+    r = client.get(f"/schedule/classroom/{classroom['id']}", headers=student_headers)
+    assert r.status_code == 200
+    assert [e['id'] for e in r.json()] == [second['id'], first['id']]
+    classroom_etag = r.headers['etag']
+
+    # removing a schedule invalidates every timetable of the school
+    r = client.delete(f"/schedule/assign/{second['id']}", headers=headers)
+    assert r.status_code == 200
+    r = client.get(f"/schedule/classroom/{classroom['id']}", headers={**student_headers, 'If-None-Match': classroom_etag})
+    assert r.status_code == 200
+    assert [e['id'] for e in r.json()] == [first['id']]
+
+    r = client.get(f"/subjects/schedules/student/{student['id']}", headers=headers)
+    assert r.status_code == 200
+    assert [e['id'] for e in r.json()] == [first['id']]
+
+
+def test_classroom_timetable_requires_membership():
+    school, headers = create_school_and_admin()
+    r = client.post('/classrooms/create', json={
+        'name': 'Other Room', 'grade_level': 'Grade 1', 'room_number': '2',
+        'semester': 1, 'academic_year': '2025', 'school_id': school['id']
+    }, headers=headers)
+    assert r.status_code == 200
+    classroom = r.json()
+    _, student_headers = create_user(school['id'], 'student', 'Outsider')
+
+    r = client.get(f"/schedule/classroom/{classroom['id']}", headers=student_headers)
+    assert r.status_code == 403
+    r = client.get(f"/schedule/classroom/{classroom['id']}", headers=headers)
+    assert r.status_code == 200
+    assert r.json() == []
+
+
+def test_materialization_does_not_commit_the_callers_transaction():
+    from database.connection import SessionLocal
+    from models.school import School as SchoolModel
+    from utils.timetable import rebuild, school_generation
+
+    school, headers = create_school_and_admin()
+    name = f'Uncommitted School {int(time.time())}-{random.randint(0,99999)}'
+    db = SessionLocal()
+    try:
+        # a write endpoint's pending change, then timetable reads in the same session
+        db.add(SchoolModel(name=name))
+        assert school_generation(db, school['id'] + 100000) == 0
+        etag, entries = rebuild(db, 'classroom', 999999, school['id'])
+        assert entries == []
+        db.rollback()
+    finally:
+        db.close()
+
+    db = SessionLocal()
+    try:
+        assert db.query(SchoolModel).filter(SchoolModel.name == name).count() == 0
+    finally:
+        db.close()
+
+
+def test_school_writes_only_bump_their_own_generation():
+    from database.connection import SessionLocal
+    from models.timetable import TimetableGeneration
+    from utils.timetable import school_generation
+
+    school_a, headers_a = create_school_and_admin()
+    school_b, _ = create_school_and_admin()
+    db = SessionLocal()
+    try:
+        before = {key: school_generation(db, key) for key in (school_a['id'], school_b['id'], 0)}
+    finally:
+        db.close()
+
+    r = client.post('/subjects', json={'name': 'Bump', 'code': f'B{random.randint(0,99999)}', 'subject_type': 'main',
+                                       'teacher_id': None, 'school_id': school_a['id']}, headers=headers_a)
+    assert r.status_code == 201
+
+    db = SessionLocal()
+    try:
+        after = dict(db.query(TimetableGeneration.school_key, TimetableGeneration.generation).filter(
+            TimetableGeneration.school_key.in_(list(before))).all())
+    finally:
+        db.close()
+    assert after[school_a['id']] > before[school_a['id']]
+    # no shared row that every school's writers would have to lock
+    assert after[school_b['id']] == before[school_b['id']] and after[0] == before[0]
+
+
+def test_subject_and_classroom_deletes_only_bump_their_school(caplog):
+    from database.connection import SessionLocal
+    from models.timetable import TimetableGeneration
+    from utils.timetable import school_generation
+
+    school_a, headers_a = create_school_and_admin()
+    school_b, _ = create_school_and_admin()
+    teacher, _ = create_user(school_a['id'], 'teacher', 'Delete Teacher')
+    student, _ = create_user(school_a['id'], 'student', 'Delete Student')
+    r = client.post('/subjects', json={'name': 'Gone', 'code': f'G{random.randint(0,99999)}', 'subject_type': 'main',
+                                       'teacher_id': teacher['id'], 'school_id': school_a['id']}, headers=headers_a)
+    subject = r.json()
+    r = client.post('/classrooms/create', json={'name': 'Gone Room', 'grade_level': 'ป.1', 'room_number': '9', 'semester': 1,
+                                               'academic_year': '2025', 'school_id': school_a['id']}, headers=headers_a)
+    classroom = r.json()
+    assert client.post(f"/classrooms/{classroom['id']}/add-students", json=[student['id']], headers=headers_a).status_code == 200
+    assert client.post(f"/subjects/{subject['id']}/enroll", json={'student_id': student['id']}, headers=headers_a).status_code == 201
+
+    db = SessionLocal()
+    try:
+        before = {key: school_generation(db, key) for key in (school_a['id'], school_b['id'])}
+    finally:
+        db.close()
+
+    caplog.set_level('WARNING', logger='web_tdk.timetable')
+    assert client.delete(f"/subjects/{subject['id']}", headers=headers_a).status_code == 204
+    assert client.delete(f"/classrooms/{classroom['id']}", headers=headers_a).status_code == 200
+
+    db = SessionLocal()
+    try:
+        after = dict(db.query(TimetableGeneration.school_key, TimetableGeneration.generation).filter(
+            TimetableGeneration.school_key.in_(list(before))).all())
+    finally:
+        db.close()
+    assert after[school_a['id']] > before[school_a['id']]
+    assert after[school_b['id']] == before[school_b['id']]
+    # no ORM bulk statement fell back to invalidating every school
+    assert not [rec for rec in caplog.records if rec.name == 'web_tdk.timetable']
@@ -0,0 +1,172 @@
+import pytest
+import time
+import random
+from datetime import time as dtime
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from utils.timetable_generator import Lesson, Period, Problem, solve
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Test School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+
+    admin_username = f"testadmin{int(time.time())}{random.randint(0,9999)}"
+    admin_data = {
+        'username': admin_username,
+        'email': f'{admin_username}@example.com',
+        'password': 'adminpass',
+        'role': 'admin',
+        'full_name': 'Test Admin',
+        'school_id': school['id']
+    }
+    r = client.post('/users', json=admin_data)
+    assert r.status_code == 201
+
+    r = client.post('/users/login', data={'username': admin_username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    token = r.json()['access_token']
+    return school, {'Authorization': f'Bearer {token}'}
+
+
+def create_teacher(school_id):
+    username = f"teacher{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'teacherpass',
+        'role': 'teacher',
+        'full_name': 'Generator Teacher',
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    return r.json()
+
+
+def setup_school(math_credits=2):
+    """Two classrooms, Math (one teacher for both rooms) and Science (1 credit), 8 periods a week."""
+    school, headers = create_school_and_admin()
+    for day in (1, 2):
+        r = client.post('/schedule/slots', json={'day_of_week': day, 'start_time': '08:00', 'end_time': '12:00'}, headers=headers)
+        assert r.status_code == 200
+    teachers = [create_teacher(school['id']) for _ in range(2)]
+    tag = f"{int(time.time())}{random.randint(0,99999)}"
+    classrooms = []
+    for name in (f'Room A {tag}', f'Room B {tag}'):
+        r = client.post('/classrooms/create', json={
+            'name': name, 'grade_level': 'Grade 1', 'room_number': '1',
+            'semester': 1, 'academic_year': '2025', 'school_id': school['id']
+        }, headers=headers)
+        assert r.status_code == 200
+        classrooms.append(r.json())
+    subjects = []
+    for name, code, credits, teacher in (('Math', f'M{tag}', math_credits, teachers[0]), ('Science', f'S{tag}', 1, teachers[1])):
+        r = client.post('/subjects', json={'name': name, 'code': code, 'subject_type': 'main', 'credits': credits,
+                                           'teacher_id': teacher['id'], 'school_id': school['id']}, headers=headers)
+        assert r.status_code == 201
+        subjects.append(r.json())
+        for classroom in classrooms:
+            r = client.post(f"/subjects/{subjects[-1]['id']}/assign-classroom",
+                            json={'classroom_id': classroom['id']}, headers=headers)
+            assert r.status_code == 201
+    return headers, teachers, classrooms, subjects
+
+
+def assert_no_double_booking(rows):
+    for key in ('teacher_id', 'classroom_id'):
+        busy = {}
+        for row in rows:
+            for other in busy.get((row[key], row['day_of_week']), []):
+                assert row['end_time'] <= other['start_time'] or other['end_time'] <= row['start_time']
+            busy.setdefault((row[key], row['day_of_week']), []).append(row)
+
+
+def periods_of(rows, **match):
+    return sum((int(r['end_time'][:2]) - int(r['start_time'][:2])) for r in rows
+               if all(r[k] == v for k, v in match.items()))
+
+
+def test_generate_preview_and_apply():
+    headers, teachers, rooms, subjects = setup_school()
+    math, science = subjects
+    room_ids = [room['id'] for room in rooms]
+    payload = {
+        'classroom_ids': room_ids, 'seed': 1, 'time_budget_seconds': 5,
+        # the science teacher is away on Monday morning
+        'teacher_unavailable': [{'teacher_id': teachers[1]['id'], 'day_of_week': 'monday',
+                                 'start_time': '08:00', 'end_time': '10:00'}],
+    }
+
+    r = client.post('/schedule/generate', json=payload, headers=headers)
+    assert r.status_code == 200
+    result = r.json()
+    assert result['complete'] is True and result['applied'] is False
+    assert result['stats']['lessons'] == 12 and result['stats']['periods'] == 8
+    assert result['unscheduled'] == []
+    rows = result['rows']
+    assert_no_double_booking(rows)
+    for room_id in room_ids:
+        assert periods_of(rows, classroom_id=room_id, subject_id=math['id']) == 4
+        assert periods_of(rows, classroom_id=room_id, subject_id=science['id']) == 2
+    assert not [r for r in rows if r['teacher_id'] == teachers[1]['id']
+                and r['day_of_week'] == '1' and r['start_time'] < '10:00:00']
+    # preview only: nothing written yet
+    r = client.get(f'/schedule/classroom/{room_ids[0]}', headers=headers)
+    assert r.json() == []
+
+    r = client.post('/schedule/generate', json={**payload, 'apply': True}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()['applied'] is True
+    r = client.get(f'/schedule/classroom/{room_ids[0]}', headers=headers)
+    assert sum(int(e['end_time'][:2]) - int(e['start_time'][:2]) for e in r.json()) == 6
+
+    # regenerating replaces the classrooms' timetable instead of conflicting with it
+    r = client.post('/schedule/generate', json={**payload, 'seed': 2, 'apply': True}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()['import']['valid'] is True
+    r = client.get(f'/schedule/classroom/{room_ids[1]}', headers=headers)
+    assert sum(int(e['end_time'][:2]) - int(e['start_time'][:2]) for e in r.json()) == 6
+
+
+def test_generate_rejects_unknown_classroom_and_incomplete_apply():
+    # 3 credits x 2 = 6 math periods per room: the math teacher would need 12 of the 8 periods
+    headers, teachers, rooms, subjects = setup_school(math_credits=3)
+    r = client.post('/schedule/generate', json={'classroom_ids': [rooms[0]['id'], 999999]}, headers=headers)
+    assert r.status_code == 400
+
+    payload = {'classroom_ids': [room['id'] for room in rooms], 'seed': 1, 'time_budget_seconds': 1}
+    r = client.post('/schedule/generate', json=payload, headers=headers)
+    assert r.status_code == 200
+    result = r.json()
+    assert result['complete'] is False
+    assert sum(u['periods'] for u in result['unscheduled']) >= 4
+    assert_no_double_booking(result['rows'])
+
+    r = client.post('/schedule/generate', json={**payload, 'apply': True}, headers=headers)
+    assert r.status_code == 400
+    r = client.get(f"/schedule/classroom/{rooms[0]['id']}", headers=headers)
+    assert r.json() == []
+
+
+def test_solver_spreads_subjects_and_reports_infeasible():
+    periods = [Period(day=d, start=dtime(8 + h), end=dtime(9 + h)) for d in (1, 2, 3) for h in range(2)]
+    lessons = [Lesson(1, 10, 100)] * 3 + [Lesson(1, 11, 101)] * 3
+    solution = solve(Problem(periods=periods, lessons=lessons), time_budget=2, seed=3)
+    assert solution.complete and solution.soft_cost == 0
+    # one period of each subject per day
+    for subject in (10, 11):
+        days = [periods[p].day for l, p in zip(lessons, solution.assignment) if l.subject_id == subject]
+        assert sorted(days) == [1, 2, 3]
+
+    # two lessons, one usable period
+    problem = Problem(periods=periods[:2], lessons=[Lesson(1, 10, 100), Lesson(2, 11, 100)],
+                      teacher_unavailable={100: {1}})
+    solution = solve(problem, time_budget=0.5, seed=1)
+    assert not solution.complete
+    assert sorted(solution.assignment, key=lambda p: p is None) == [0, None]
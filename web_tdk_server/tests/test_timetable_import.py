@@ -0,0 +1,157 @@
+import pytest
+import time
+import random
+from io import BytesIO
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Test School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+
+    admin_username = f"testadmin{int(time.time())}{random.randint(0,9999)}"
+    admin_data = {
+        'username': admin_username,
+        'email': f'{admin_username}@example.com',
+        'password': 'adminpass',
+        'role': 'admin',
+        'full_name': 'Test Admin',
+        'school_id': school['id']
+    }
+    r = client.post('/users', json=admin_data)
+    assert r.status_code == 201
+
+    r = client.post('/users/login', data={'username': admin_username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    token = r.json()['access_token']
+    return school, {'Authorization': f'Bearer {token}'}
+
+
+def create_teacher(school_id):
+    username = f"teacher{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'teacherpass',
+        'role': 'teacher',
+        'full_name': 'Import Teacher',
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    return r.json()
+
+
+def setup_school():
+    school, headers = create_school_and_admin()
+    r = client.post('/schedule/slots', json={'day_of_week': 1, 'start_time': '08:00', 'end_time': '16:00'}, headers=headers)
+    assert r.status_code == 200
+    teachers = [create_teacher(school['id']) for _ in range(2)]
+    tag = f"{int(time.time())}{random.randint(0,99999)}"
+    classrooms = []
+    for name in (f'Room A {tag}', f'Room B {tag}'):
+        r = client.post('/classrooms/create', json={
+            'name': name, 'grade_level': 'Grade 1', 'room_number': '1',
+            'semester': 1, 'academic_year': '2025', 'school_id': school['id']
+        }, headers=headers)
+        assert r.status_code == 200
+        classrooms.append(r.json())
+    subjects = []
+    for name, code, teacher in (('Math', f'M{tag}', teachers[0]), ('Science', f'S{tag}', None)):
+        r = client.post('/subjects', json={'name': name, 'code': code, 'subject_type': 'main',
+                                           'teacher_id': teacher['id'] if teacher else None, 'school_id': school['id']}, headers=headers)
+        assert r.status_code == 201
+        subjects.append(r.json())
+    return headers, teachers, classrooms, subjects
+
+
+def classroom_timetable(classroom_id, headers):
+    r = client.get(f'/schedule/classroom/{classroom_id}', headers=headers)
+    assert r.status_code == 200
+    return [(e['subject_id'], e['day_of_week'], e['start_time']) for e in r.json()]
+
+
+def test_json_import_dry_run_apply_and_replace():
+    headers, teachers, rooms, subjects = setup_school()
+    math, science = subjects
+    rows = [
+        # teacher defaults to the subject's teacher
+        {'subject_code': math['code'], 'classroom_name': rooms[0]['name'], 'day_of_week': 'monday',
+         'start_time': '08:00', 'end_time': '09:00'},
+        {'subject_code': science['code'], 'teacher_username': teachers[1]['username'], 'classroom_id': rooms[0]['id'],
+         'day_of_week': 1, 'start_time': '09:00', 'end_time': '10:00'},
+        {'subject_id': math['id'], 'classroom_id': rooms[1]['id'], 'day_of_week': '1',
+         'start_time': '09:00', 'end_time': '10:00'},
+    ]
+
+    r = client.post('/schedule/import', json={'rows': rows, 'dry_run': True}, headers=headers)
+    assert r.status_code == 200
+    report = r.json()
+    assert report['valid'] is True and report['applied'] is False
+    assert report['summary'] == {'rows': 3, 'create': 3, 'unchanged': 0, 'delete': 0}
+    assert report['create'][0]['teacher_id'] == teachers[0]['id']
+    assert classroom_timetable(rooms[0]['id'], headers) == []
+
+    r = client.post('/schedule/import', json={'rows': rows}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()['applied'] is True
+    assert classroom_timetable(rooms[0]['id'], headers) == [
+        (math['id'], '1', '08:00:00'), (science['id'], '1', '09:00:00')]
+
+    # importing the same timetable again changes nothing
+    r = client.post('/schedule/import', json={'rows': rows, 'dry_run': True}, headers=headers)
+    assert r.json()['summary'] == {'rows': 3, 'create': 0, 'unchanged': 3, 'delete': 0}
+
+    # all or nothing: one conflicting and one unknown row reject the whole import
+    bad = rows[:1] + [
+        {'subject_id': science['id'], 'teacher_id': teachers[0]['id'], 'classroom_id': rooms[1]['id'],
+         'day_of_week': 1, 'start_time': '08:30', 'end_time': '09:30'},
+        {'subject_code': 'NOPE', 'day_of_week': 1, 'start_time': '10:00', 'end_time': '11:00'},
+        {'subject_id': science['id'], 'teacher_id': teachers[1]['id'], 'classroom_id': rooms[0]['id'],
+         'day_of_week': 1, 'start_time': '15:00', 'end_time': '17:00'},
+    ]
+    r = client.post('/schedule/import', json={'rows': bad}, headers=headers)
+    assert r.status_code == 400
+    detail = r.json()['detail']
+    assert detail['applied'] is False
+    assert [e['row'] for e in detail['errors']] == [3]
+    assert {(c['row'], c['type']) for c in detail['conflicts']} == {
+        (2, 'teacher_overlap'), (2, 'classroom_overlap'), (4, 'outside_operating_hours')}
+    assert len(classroom_timetable(rooms[0]['id'], headers)) == 2
+
+    # replace: room A keeps only its first row, room B is untouched
+    r = client.post('/schedule/import', json={'rows': rows[:1], 'mode': 'replace'}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()['summary'] == {'rows': 1, 'create': 0, 'unchanged': 1, 'delete': 1}
+    assert classroom_timetable(rooms[0]['id'], headers) == [(math['id'], '1', '08:00:00')]
+    assert classroom_timetable(rooms[1]['id'], headers) == [(math['id'], '1', '09:00:00')]
+
+
+def test_excel_import_dry_run_reports_sheet_rows():
+    openpyxl = pytest.importorskip('openpyxl')
+    headers, teachers, rooms, subjects = setup_school()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['subject_code', 'teacher_username', 'classroom_name', 'day_of_week', 'start_time', 'end_time'])
+    ws.append([subjects[0]['code'], None, rooms[0]['name'], 'Monday', '08:00', '09:00'])
+    ws.append(['UNKNOWN', None, rooms[0]['name'], 'Monday', '09:00', '10:00'])
+    ws.append([subjects[1]['code'], teachers[1]['username'], rooms[1]['name'], 'Monday', '10:00', 'later'])
+    stream = BytesIO()
+    wb.save(stream)
+
+    files = {'file': ('timetable.xlsx', stream.getvalue(), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
+    r = client.post('/schedule/import/excel?dry_run=true', files=files, headers=headers)
+    assert r.status_code == 200
+    report = r.json()
+    assert report['valid'] is False
+    assert report['summary']['create'] == 1
+    assert [e['row'] for e in report['errors']] == [3, 4]
+
+    r = client.post('/schedule/import/excel', files={'file': ('x.xlsx', b'not a workbook', 'application/octet-stream')}, headers=headers)
+    assert r.status_code == 400
@@ -0,0 +1,141 @@
+import pytest
+import time
+import random
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+from utils.user_cache import user_cache
+
+client = TestClient(app)
+
+
+def create_school_and_admin():
+    r = client.post('/schools', json={'name': f'Test School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+
+    admin_username = f"testadmin{int(time.time())}{random.randint(0,9999)}"
+    r = client.post('/users', json={
+        'username': admin_username,
+        'email': f'{admin_username}@example.com',
+        'password': 'adminpass',
+        'role': 'admin',
+        'full_name': 'Test Admin',
+        'school_id': school['id']
+    })
+    assert r.status_code == 201
+
+    r = client.post('/users/login', data={'username': admin_username, 'password': 'adminpass'})
+    assert r.status_code == 200
+    token = r.json()['access_token']
+    return school, admin_username, {'Authorization': f'Bearer {token}'}
+
+
+def test_current_user_is_cached_and_invalidated_on_writes():
+    school, username, headers = create_school_and_admin()
+    user_cache.invalidate(username)
+
+    before = user_cache.stats()
+    for _ in range(3):
+        r = client.get('/users/me', headers=headers)
+        assert r.status_code == 200
+        assert r.json()['username'] == username
+    after = user_cache.stats()
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 2
+
+    # Writes through the cached user still persist
+    r = client.put('/users/me', json={'full_name': 'Renamed Admin'}, headers=headers)
+    assert r.status_code == 200
+    r = client.get('/users/me', headers=headers)
+    assert r.json()['full_name'] == 'Renamed Admin'
+
+    r = client.post('/users/change_password', json={'current_password': 'adminpass', 'new_password': 'newpass123'}, headers=headers)
+    assert r.status_code == 200
+    assert user_cache.get(username) is None
+
+    r = client.get('/users/cache_stats', headers=headers)
+    assert r.status_code == 200
+    assert {'hits', 'misses', 'size'} <= set(r.json())
+
+
+def test_grade_level_writes_invalidate_cached_students():
+    school, _, headers = create_school_and_admin()
+    username = f"student{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'studentpass',
+                                    'role': 'student', 'full_name': 'Cached Student', 'school_id': school['id']})
+    assert r.status_code == 201
+    student_id = r.json()['id']
+    r = client.post('/users/login', data={'username': username, 'password': 'studentpass'})
+    student_headers = {'Authorization': f"Bearer {r.json()['access_token']}"}
+    assert client.get('/users/me', headers=student_headers).json()['grade_level'] is None
+
+    r = client.post('/classrooms/create', json={'name': 'ป.3/1', 'grade_level': 'ป.3', 'room_number': '1', 'semester': 1,
+                                               'academic_year': '2025', 'school_id': school['id']}, headers=headers)
+    assert r.status_code == 200
+    classroom = r.json()
+    r = client.post(f"/classrooms/{classroom['id']}/add-students", json=[student_id], headers=headers)
+    assert r.json()['added_count'] == 1
+    assert client.get('/users/me', headers=student_headers).json()['grade_level'] == 'ป.3'
+
+    r = client.post('/classrooms/promote-school', json={'promotion_type': 'end_of_year', 'grade_map': {'ป.3': 'ป.4'},
+                                                       'dry_run': False}, headers=headers)
+    assert r.status_code == 202
+    assert client.get('/users/me', headers=student_headers).json()['grade_level'] == 'ป.4'
+
+    r = client.patch(f'/users/{student_id}/grade_level', json={'grade_level': 'ป.5'}, headers=headers)
+    assert r.status_code == 200
+    assert client.get('/users/me', headers=student_headers).json()['grade_level'] == 'ป.5'
+
+
+def test_deleted_school_accounts_stop_authenticating():
+    school, username, headers = create_school_and_admin()
+    assert client.get('/users/me', headers=headers).status_code == 200
+    assert user_cache.get(username) is not None
+    r = client.post('/admin/request_school_deletion', json={'school_id': school['id'], 'reason': 'closing'}, headers=headers)
+    assert r.status_code == 201
+
+    owner = f"owner{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': owner, 'email': f'{owner}@example.com', 'password': 'ownerpass', 'role': 'owner', 'full_name': 'Owner'})
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': owner, 'password': 'ownerpass'})
+    owner_headers = {'Authorization': f"Bearer {r.json()['access_token']}"}
+    r = client.delete(f"/owner/schools/{school['id']}", headers=owner_headers)
+    assert r.status_code == 204
+
+    assert client.get('/users/me', headers=headers).status_code == 401
+
+
+def test_password_resets_invalidate_cached_user():
+    from utils.security import create_access_token
+    school, _, headers = create_school_and_admin()
+    username = f"teacher{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={'username': username, 'email': f'{username}@example.com', 'password': 'oldpass123',
+                                    'role': 'teacher', 'full_name': 'Reset Teacher', 'school_id': school['id']})
+    assert r.status_code == 201
+    teacher_id = r.json()['id']
+    r = client.post('/users/login', data={'username': username, 'password': 'oldpass123'})
+    teacher_headers = {'Authorization': f"Bearer {r.json()['access_token']}"}
+    assert client.get('/users/me', headers=teacher_headers).json()['must_change_password'] is False
+
+    # admin-approved reset: the forced-change flag is seen at once
+    r = client.post('/users/request_password_reset', json={'username': username})
+    assert r.status_code == 200
+    [request] = [q for q in client.get('/users/password_reset_requests', headers=headers).json() if q['username'] == username]
+    r = client.post(f"/users/password_reset_requests/{request['id']}/approve",
+                    json={'user_id': teacher_id, 'new_password': 'adminset123'}, headers=headers)
+    assert r.status_code == 200
+    assert client.get('/users/me', headers=teacher_headers).json()['must_change_password'] is True
+    r = client.post('/users/change_password', json={'new_password': 'mine12345'}, headers=teacher_headers)
+    assert r.status_code == 200
+
+    # emailed reset link: change_password checks the new hash, not the cached one
+    assert client.get('/users/me', headers=teacher_headers).status_code == 200
+    token = create_access_token({'sub': username, 'action': 'reset_password'})
+    r = client.post('/users/reset_password', json={'token': token, 'new_password': 'fromlink123'})
+    assert r.status_code == 200
+    r = client.post('/users/change_password', json={'current_password': 'fromlink123', 'new_password': 'final12345'},
+                    headers=teacher_headers)
+    assert r.status_code == 200
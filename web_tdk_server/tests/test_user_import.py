@@ -0,0 +1,111 @@
+import pytest
+import time
+import random
+from io import BytesIO
+from fastapi.testclient import TestClient
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from main import app
+
+openpyxl = pytest.importorskip('openpyxl')
+
+client = TestClient(app)
+
+
+def create_user_and_login(role, school_id=None):
+    username = f"{role}{int(time.time())}{random.randint(0,99999)}"
+    r = client.post('/users', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'pass1234',
+        'role': role,
+        'full_name': f'Test {role}',
+        'school_id': school_id
+    })
+    assert r.status_code == 201
+    r = client.post('/users/login', data={'username': username, 'password': 'pass1234'})
+    assert r.status_code == 200
+    return r.json()['user_info'], {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def make_xlsx(rows, header=('username', 'email', 'full_name', 'password', 'role', 'school_id', 'grade_level')):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(list(header))
+    for row in rows:
+        ws.append(list(row))
+    stream = BytesIO()
+    wb.save(stream)
+    return stream.getvalue()
+
+
+def upload(path, content, headers):
+    files = {'file': ('users.xlsx', content, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
+    return client.post(path, files=files, headers=headers)
+
+
+def test_bulk_upload_job_reports_progress_and_error_report():
+    r = client.post('/schools', json={'name': f'Import School {int(time.time())}-{random.randint(0,9999)}'})
+    assert r.status_code == 201
+    school = r.json()
+    admin, admin_headers = create_user_and_login('admin', school['id'])
+
+    tag = f"{int(time.time())}{random.randint(0,99999)}"
+    content = make_xlsx([
+        (f'imp_a_{tag}', f'imp_a_{tag}@example.com', 'A', 'secret1', 'student', None, 'ป.1'),
+        (f'imp_b_{tag}', None, 'B', 'secret2', 'teacher', None, None),
+        (admin['username'], None, 'Existing', 'secret3', 'student', None, None),
+        (f'imp_a_{tag}', None, 'Duplicate in file', 'secret4', 'student', None, None),
+        (f'imp_c_{tag}', None, 'Bad role', 'secret5', 'admin', None, None),
+        (f'imp_d_{tag}', None, 'D', 'secret6', 'student', None, 'ป.2'),
+    ])
+    r = upload('/users/bulk_upload/jobs', content, admin_headers)
+    assert r.status_code == 202
+    job_id = r.json()['id']
+
+    r = client.get(f'/users/bulk_upload/jobs/{job_id}', headers=admin_headers)
+    assert r.status_code == 200
+    job = r.json()
+    assert job['status'] == 'completed'
+    assert (job['processed'], job['succeeded'], job['failed']) == (6, 3, 3)
+    assert [e['row'] for e in job['errors']] == [4, 5, 6]
+    assert job['error_report_url'] == f'/users/bulk_upload/jobs/{job_id}/errors'
+
+    r = client.get(job['error_report_url'], headers=admin_headers)
+    assert r.status_code == 200
+    ws = openpyxl.load_workbook(BytesIO(r.content)).active
+    report = list(ws.iter_rows(values_only=True))
+    assert report[0] == ('row', 'username', 'error')
+    assert [row[0] for row in report[1:]] == [4, 5, 6]
+
+    r = client.post('/users/login', data={'username': f'imp_d_{tag}', 'password': 'secret6'})
+    assert r.status_code == 200
+    assert r.json()['user_info']['school_id'] == school['id']
+
+    # jobs of other schools are not visible
+    r = client.post('/schools', json={'name': f'Other Import School {tag}'})
+    _, other_headers = create_user_and_login('admin', r.json()['id'])
+    assert client.get(f'/users/bulk_upload/jobs/{job_id}', headers=other_headers).status_code == 404
+
+
+def test_bulk_upload_sync_endpoint_keeps_response_shape():
+    r = client.post('/schools', json={'name': f'Sync Import School {int(time.time())}-{random.randint(0,9999)}'})
+    school = r.json()
+    _, admin_headers = create_user_and_login('admin', school['id'])
+    tag = f"{int(time.time())}{random.randint(0,99999)}"
+
+    r = upload('/users/bulk_upload', make_xlsx([
+        (f'sync_a_{tag}', None, 'A', 'secret1', 'student', None, None),
+        ('', None, 'No username', 'secret2', 'student', None, None),
+    ]), admin_headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert data['created_count'] == 1
+    assert data['created'][0]['username'] == f'sync_a_{tag}' and data['created'][0]['id']
+    assert [e['row'] for e in data['errors']] == [3]
+
+    r = upload('/users/bulk_upload', make_xlsx([('x', 'y')], header=('username', 'email')), admin_headers)
+    assert r.status_code == 400
+    r = upload('/users/bulk_upload/jobs', make_xlsx([('x', 'y')], header=('username', 'email')), admin_headers)
+    assert r.status_code == 400
@@ -0,0 +1,115 @@
+"""Append-only activity event log behind the owner activity feed.
+
+Routers call ``record_activity`` in the same transaction as the write they describe.
+School names are copied into the event so the feed is a single indexed read.
+"""
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models.activity_event import ActivityEvent as ActivityEventModel
+from models.school import School as SchoolModel
+
+EVENT_TYPES = ('announcement', 'subject_created', 'attendance', 'grade')
+CONTENT_PREVIEW_LENGTH = 100
+BACKFILL_PER_TYPE = 50
+
+
+def _preview(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return text[:CONTENT_PREVIEW_LENGTH] + "..." if len(text) > CONTENT_PREVIEW_LENGTH else text
+
+
+def record_activity(db: Session, event_type: str, school_id: Optional[int], title: str,
+                    content: Optional[str] = None, actor_id: Optional[int] = None,
+                    school_name: Optional[str] = None) -> ActivityEventModel:
+    """Add one event to the session (does not commit)."""
+    if school_name is None and school_id is not None:
+        row = db.query(SchoolModel.name).filter(SchoolModel.id == school_id).first()
+        school_name = row[0] if row else None
+    event = ActivityEventModel(
+        event_type=event_type,
+        school_id=school_id,
+        school_name=school_name,
+        title=title[:255],
+        content=_preview(content),
+        actor_id=actor_id
+    )
+    db.add(event)
+    return event
+
+
+def event_to_dict(event: ActivityEventModel) -> dict:
+    return {
+        "id": event.id,
+        "type": event.event_type,
+        "school_id": event.school_id,
+        "school_name": event.school_name or "Unknown",
+        "title": event.title,
+        "content": event.content,
+        "created_at": event.created_at,
+        "created_by": event.actor_id
+    }
+
+
+def backfill_activity_events(db: Session, per_type: int = BACKFILL_PER_TYPE) -> int:
+    """Seed an empty event log with the latest rows of each source table.
+
+    No-op once the log has any event. Lookups are batched per table.
+    """
+    if db.query(ActivityEventModel.id).first() is not None:
+        return 0
+
+    # import here to keep this module importable from the routers without cycles
+    from models.announcement import Announcement as AnnouncementModel
+    from models.subject import Subject as SubjectModel
+    from models.attendance import Attendance as AttendanceModel
+    from models.grade import Grade as GradeModel
+    from models.user import User as UserModel
+
+    announcements = db.query(AnnouncementModel).order_by(AnnouncementModel.created_at.desc()).limit(per_type).all()
+    subjects = db.query(SubjectModel).order_by(SubjectModel.created_at.desc()).limit(per_type).all()
+    attendances = db.query(AttendanceModel).order_by(AttendanceModel.date.desc()).limit(per_type).all()
+    grades = db.query(GradeModel).order_by(GradeModel.created_at.desc()).limit(per_type).all()
+
+    subject_ids = {a.subject_id for a in attendances} | {g.subject_id for g in grades}
+    subjects_by_id = {s.id: s for s in subjects}
+    missing = subject_ids - set(subjects_by_id)
+    if missing:
+        subjects_by_id.update({s.id: s for s in db.query(SubjectModel).filter(SubjectModel.id.in_(missing)).all()})
+    user_ids = {s.teacher_id for s in subjects if s.teacher_id} | {g.student_id for g in grades}
+    users_by_id = dict(db.query(UserModel.id, UserModel.full_name).filter(UserModel.id.in_(user_ids)).all()) if user_ids else {}
+    school_names = dict(db.query(SchoolModel.id, SchoolModel.name).all())
+
+    # (created_at, event kwargs) so the log is inserted oldest first
+    events = []
+    for ann in announcements:
+        events.append((ann.created_at, dict(
+            event_type='announcement', school_id=ann.school_id, title=ann.title,
+            content=ann.content, actor_id=ann.author_id)))
+    for subj in subjects:
+        events.append((subj.created_at, dict(
+            event_type='subject_created', school_id=subj.school_id, title=f"Subject '{subj.name}' created",
+            content=f"Teacher: {users_by_id.get(subj.teacher_id, 'Unknown')}", actor_id=subj.teacher_id)))
+    for att in attendances:
+        subject = subjects_by_id.get(att.subject_id)
+        events.append((att.created_at, dict(
+            event_type='attendance', school_id=subject.school_id if subject else None,
+            title=f"Attendance recorded for {subject.name if subject else 'Unknown subject'}",
+            content=f"Date: {att.date}", actor_id=subject.teacher_id if subject else None)))
+    for grade in grades:
+        subject = subjects_by_id.get(grade.subject_id)
+        events.append((grade.created_at, dict(
+            event_type='grade', school_id=subject.school_id if subject else None,
+            title=f"Grade recorded for {users_by_id.get(grade.student_id, 'Unknown student')}",
+            content=f"Subject: {subject.name if subject else 'Unknown'}, Grade: {grade.grade}",
+            actor_id=subject.teacher_id if subject else None)))
+
+    events.sort(key=lambda e: (e[0] is not None, e[0] or 0))
+    for created_at, kwargs in events:
+        event = record_activity(db, school_name=school_names.get(kwargs['school_id']), **kwargs)
+        if created_at is not None:
+            event.created_at = created_at
+    db.commit()
+    return len(events)
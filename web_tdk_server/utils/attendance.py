@@ -0,0 +1,158 @@
+"""Helpers for the normalized attendance storage (one AttendanceRecord per student/subject/day)."""
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models.attendance import Attendance as AttendanceModel, AttendanceRecord as AttendanceRecordModel
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def parse_present_json(raw) -> Dict[str, str]:
+    """Parse a legacy present_json blob into {student_id(str): status}.
+
+    Handles the old list format (list of present student ids) as well as the dict format.
+    """
+    try:
+        data = json.loads(raw) if raw else {}
+    except Exception:
+        return {}
+    # Handle backward compatibility: convert old list format to new dict format
+    if isinstance(data, list):
+        return {str(sid): "present" for sid in data}
+    if not isinstance(data, dict):
+        return {}
+    return {str(k): v for k, v in data.items()}
+
+
+def _student_statuses(attendance: Dict[str, str]) -> Dict[int, str]:
+    result = {}
+    for sid, status in attendance.items():
+        try:
+            result[int(sid)] = status
+        except (TypeError, ValueError):
+            continue
+    return result
+
+
+def save_attendance_records(db: Session, rec: AttendanceModel, attendance: Dict[str, str]) -> None:
+    """Replace the records of one attendance session with ``attendance`` (bulk upsert).
+
+    Existing rows for (subject, date) are prefetched in one query, changed rows are
+    updated in place, new ones added together and students no longer in the payload
+    removed. Does not commit.
+    """
+    statuses = _student_statuses(attendance)
+    existing = db.query(AttendanceRecordModel).filter(
+        AttendanceRecordModel.subject_id == rec.subject_id,
+        AttendanceRecordModel.date == rec.date
+    ).all()
+
+    new_rows = []
+    seen = set()
+    for row in existing:
+        if row.student_id in statuses and row.student_id not in seen:
+            row.status = statuses[row.student_id]
+            row.attendance_id = rec.id
+            seen.add(row.student_id)
+        else:
+            db.delete(row)
+    for sid, status in statuses.items():
+        if sid in seen:
+            continue
+        new_rows.append(AttendanceRecordModel(
+            attendance_id=rec.id,
+            subject_id=rec.subject_id,
+            student_id=sid,
+            date=rec.date,
+            status=status
+        ))
+    db.add_all(new_rows)
+
+
+def load_attendance_maps(db: Session, rows: Iterable[AttendanceModel]) -> Dict[int, Dict[str, str]]:
+    """{attendance_id: {student_id(str): status}} for many sessions with one query.
+
+    Sessions that still only have a legacy blob (not yet backfilled) fall back to it.
+    """
+    rows = list(rows)
+    if not rows:
+        return {}
+    maps = {r.id: {} for r in rows}
+    records = db.query(
+        AttendanceRecordModel.attendance_id, AttendanceRecordModel.student_id, AttendanceRecordModel.status
+    ).filter(
+        AttendanceRecordModel.attendance_id.in_(list(maps.keys()))
+    ).all()
+    for attendance_id, student_id, status in records:
+        maps[attendance_id][str(student_id)] = status
+    for r in rows:
+        if not maps[r.id] and r.present_json:
+            maps[r.id] = parse_present_json(r.present_json)
+    return maps
+
+
+def count_attendance_by_status(db: Session, student_ids: Iterable[int], subject_ids: Iterable[int]) -> Dict[tuple, Dict[str, int]]:
+    """{(student_id, subject_id): {status: days}} for a whole set of students in one grouped query.
+
+    Uses the (student_id, subject_id, date) index on attendance_records.
+    """
+    student_ids = list(student_ids)
+    subject_ids = list(subject_ids)
+    counts = defaultdict(dict)
+    if not student_ids or not subject_ids:
+        return counts
+    rows = db.query(
+        AttendanceRecordModel.student_id,
+        AttendanceRecordModel.subject_id,
+        AttendanceRecordModel.status,
+        func.count(AttendanceRecordModel.id)
+    ).filter(
+        AttendanceRecordModel.student_id.in_(student_ids),
+        AttendanceRecordModel.subject_id.in_(subject_ids)
+    ).group_by(
+        AttendanceRecordModel.student_id, AttendanceRecordModel.subject_id, AttendanceRecordModel.status
+    ).all()
+    for student_id, subject_id, status, days in rows:
+        counts[(student_id, subject_id)][status] = days
+
+    # Sessions not yet backfilled: parse each blob once and fan it out to every student
+    wanted = {str(sid): sid for sid in student_ids}
+    legacy_rows = db.query(AttendanceModel.subject_id, AttendanceModel.present_json).filter(
+        AttendanceModel.subject_id.in_(subject_ids),
+        AttendanceModel.present_json.isnot(None)
+    ).all()
+    for subject_id, raw in legacy_rows:
+        for sid_str, status in parse_present_json(raw).items():
+            sid = wanted.get(sid_str)
+            if sid is None:
+                continue
+            bucket = counts[(sid, subject_id)]
+            bucket[status] = bucket.get(status, 0) + 1
+    return counts
+
+
+def backfill_attendance_records(db: Session, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Move legacy present_json blobs (dict and list formats) into attendance_records.
+
+    Idempotent: each migrated blob is cleared in the same transaction, so re-running
+    only touches sessions that still have one. Returns the number of sessions migrated.
+    """
+    migrated = 0
+    while True:
+        batch: List[AttendanceModel] = db.query(AttendanceModel).filter(
+            AttendanceModel.present_json.isnot(None)
+        ).order_by(AttendanceModel.id).limit(batch_size).all()
+        if not batch:
+            break
+        for rec in batch:
+            save_attendance_records(db, rec, parse_present_json(rec.present_json))
+            rec.present_json = None
+            # flush per session so a later session on the same (subject, date) sees these rows
+            db.flush()
+        db.commit()
+        migrated += len(batch)
+    return migrated
@@ -0,0 +1,136 @@
+"""Set-based enrollment of many students into a subject or a classroom.
+
+Per chunk of ENROLL_CHUNK_SIZE student ids, each check (students, existing
+enrollments, classrooms of the same academic year) is one ``IN (...)`` query.
+Writes are one executemany INSERT and one UPDATE per chunk, so enrolling a
+whole grade costs a handful of statements instead of several per student.
+
+The inserts go to the tables directly. ORM-level bulk statements would mark
+every school's timetable stale (utils.timetable), so only the affected school
+is invalidated here, in the same transaction.
+"""
+import os
+from typing import Dict, Iterable, List
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from models.classroom import Classroom as ClassroomModel, ClassroomStudent as ClassroomStudentModel
+from models.subject_student import SubjectStudent as SubjectStudentModel
+from models.user import User as UserModel
+from utils.ranking import graded_student_ids, refresh_student_scores
+from utils.timetable import invalidate_schools
+from utils.user_cache import invalidate_user
+
+ENROLL_CHUNK_SIZE = int(os.getenv("ENROLL_CHUNK_SIZE", "500"))
+
+
+def _unique(ids: Iterable[int]) -> List[int]:
+    return list(dict.fromkeys(ids))
+
+
+def _chunks(ids: List[int], size: int = 0):
+    size = size or ENROLL_CHUNK_SIZE
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def enroll_in_subject(db: Session, subject, student_ids: Iterable[int], commit: bool = True) -> Dict[str, List[int]]:
+    """Enroll ``student_ids`` in ``subject``, skipping students already enrolled.
+
+    Returns ``enrolled`` and ``already_enrolled`` student ids (input order, no duplicates).
+    """
+    ids = _unique(student_ids)
+    enrolled, already = [], []
+    for chunk in _chunks(ids):
+        existing = {sid for (sid,) in db.query(SubjectStudentModel.student_id).filter(
+            SubjectStudentModel.subject_id == subject.id,
+            SubjectStudentModel.student_id.in_(chunk)
+        )}
+        new = [sid for sid in chunk if sid not in existing]
+        already.extend(sid for sid in chunk if sid in existing)
+        if new:
+            db.execute(insert(SubjectStudentModel.__table__),
+                       [{'subject_id': subject.id, 'student_id': sid} for sid in new])
+            enrolled.extend(new)
+    if enrolled:
+        invalidate_schools(db.connection(), [subject.school_id])
+        # students who already had grades in the subject now count it in their totals
+        refresh_student_scores(db, graded_student_ids(db, subject.id, enrolled))
+    if commit:
+        db.commit()
+    return {'enrolled': enrolled, 'already_enrolled': already}
+
+
+def add_to_classroom(db: Session, classroom, student_ids: Iterable[int], commit: bool = True) -> dict:
+    """Add ``student_ids`` to ``classroom`` with the checks of POST /classrooms/{id}/add-students.
+
+    Per student, in this order: not a student -> ``not_found``; already in this
+    classroom -> ``already_enrolled`` (active) or ``reactivated``; active in
+    another classroom of the same school and academic year -> ``in_other_classroom``
+    (with that classroom's id and name); otherwise ``added`` (and the student's
+    grade_level follows the classroom). A student listed twice is only counted once.
+    With ``commit=False`` the caller also invalidates the cached users in ``added``.
+    """
+    ids = _unique(student_ids)
+    result = {'added': [], 'reactivated': [], 'already_enrolled': [], 'not_found': [], 'in_other_classroom': []}
+    regraded = []
+    for chunk in _chunks(ids):
+        students = dict(db.query(UserModel.id, UserModel.username).filter(
+            UserModel.id.in_(chunk), UserModel.role == 'student'
+        ).all())
+        memberships, others = {}, {}
+        for enrollment_id, student_id, is_active in db.query(
+            ClassroomStudentModel.id, ClassroomStudentModel.student_id, ClassroomStudentModel.is_active
+        ).filter(
+            ClassroomStudentModel.classroom_id == classroom.id,
+            ClassroomStudentModel.student_id.in_(chunk)
+        ).order_by(ClassroomStudentModel.id):
+            memberships.setdefault(student_id, (enrollment_id, is_active))
+        for student_id, other_id, other_name in db.query(
+            ClassroomStudentModel.student_id, ClassroomModel.id, ClassroomModel.name
+        ).join(ClassroomModel, ClassroomStudentModel.classroom_id == ClassroomModel.id).filter(
+            ClassroomStudentModel.student_id.in_(chunk),
+            ClassroomStudentModel.is_active == True,
+            ClassroomModel.academic_year == classroom.academic_year,
+            ClassroomModel.school_id == classroom.school_id,
+            ClassroomModel.id != classroom.id
+        ).order_by(ClassroomStudentModel.id):
+            others.setdefault(student_id, (other_id, other_name))
+
+        new, reactivate = [], []
+        for sid in chunk:
+            if sid not in students:
+                result['not_found'].append(sid)
+            elif sid in memberships:
+                enrollment_id, is_active = memberships[sid]
+                if is_active:
+                    result['already_enrolled'].append(sid)
+                else:
+                    reactivate.append(enrollment_id)
+                    result['reactivated'].append(sid)
+            elif sid in others:
+                other_id, other_name = others[sid]
+                result['in_other_classroom'].append(
+                    {'student_id': sid, 'classroom_id': other_id, 'classroom_name': other_name})
+            else:
+                new.append(sid)
+
+        if reactivate:
+            db.execute(update(ClassroomStudentModel.__table__)
+                       .where(ClassroomStudentModel.__table__.c.id.in_(reactivate))
+                       .values(is_active=True))
+        if new:
+            db.execute(insert(ClassroomStudentModel.__table__),
+                       [{'classroom_id': classroom.id, 'student_id': sid, 'is_active': True} for sid in new])
+            db.execute(update(UserModel.__table__)
+                       .where(UserModel.__table__.c.id.in_(new))
+                       .values(grade_level=classroom.grade_level))
+            result['added'].extend(new)
+            regraded.extend(students[sid] for sid in new)
+    if result['added'] or result['reactivated']:
+        invalidate_schools(db.connection(), [classroom.school_id])
+    if commit:
+        db.commit()
+        invalidate_user(*regraded)
+    return result
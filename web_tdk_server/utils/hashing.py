@@ -0,0 +1,90 @@
+"""Password hashing service: hash/verify off the request thread.
+
+pbkdf2 is pure CPU work that holds the GIL, so a hash computed in a worker
+thread stalls every other request of the process. The functions here run it in
+a bounded process pool instead. At most HASH_WORKERS hashes run at once (default:
+CPU count), and callers wait for their result without holding the GIL.
+HASH_WORKERS=0 hashes inline, in the calling thread.
+
+The rounds policy lives in utils.security (PASSWORD_HASH_ROUNDS);
+``verify_and_update`` also returns a new hash when a stored one was made under an
+older policy, so login can upgrade it transparently.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from utils import security
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+# below this many passwords a batch is hashed inline: the process round-trip costs more than it saves
+HASH_POOL_MIN_BATCH = int(os.getenv("HASH_POOL_MIN_BATCH", "8"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Shared process pool, created on first use (spawned, so no DB connections are inherited)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _discard_broken_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    if HASH_WORKERS <= 0:
+        return fn(*args)
+    pool = get_pool()
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool:
+        # a worker died (OOM killer, ...): start a fresh pool next time and answer this call inline
+        _discard_broken_pool(pool)
+        return fn(*args)
+
+
+def hash_password(password: str) -> str:
+    return _run(security.hash_password, password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _run(security.verify_password, plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new_hash) where new_hash is set when the stored hash should be replaced."""
+    return _run(security.verify_and_update_password, plain_password, hashed_password)
+
+
+def hash_many(passwords: List[str]) -> List[str]:
+    """Hash ``passwords`` (same order), spread over the pool for large batches."""
+    if HASH_WORKERS <= 0 or len(passwords) < HASH_POOL_MIN_BATCH:
+        return [security.hash_password(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+    pool = get_pool()
+    try:
+        return list(pool.map(security.hash_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        _discard_broken_pool(pool)
+        return [security.hash_password(p) for p in passwords]
@@ -0,0 +1,106 @@
+"""Background jobs stored in ``background_jobs`` so any worker can report progress.
+
+The job body runs after the response (FastAPI ``BackgroundTasks``) with its own
+session; it reports through ``update_job`` which commits on a separate session,
+so progress is visible to pollers while the job's own transaction is open.
+
+Every ``update_job`` call records ``heartbeat_at``. A job body dies with its worker
+process, so a queued/running job without a heartbeat for JOB_STALE_SECONDS is
+treated as dead (``fail_stale_jobs``).
+"""
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from database.connection import SessionLocal
+from models.background_job import BackgroundJob as BackgroundJobModel
+
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "1800"))
+
+
+def create_job(db: Session, job_type: str, created_by: Optional[int] = None, school_id: Optional[int] = None,
+               total: Optional[int] = None) -> BackgroundJobModel:
+    job = BackgroundJobModel(job_type=job_type, status='queued', created_by=created_by, school_id=school_id, total=total,
+                             heartbeat_at=datetime.now(timezone.utc))
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def update_job(job_id: int, **fields):
+    """Set columns of a job on a short-lived session (``errors``/``result`` are stored as JSON)."""
+    if 'errors' in fields:
+        fields['errors_json'] = json.dumps(fields.pop('errors'), ensure_ascii=False)
+    if 'result' in fields:
+        fields['result_json'] = json.dumps(fields.pop('result'), ensure_ascii=False)
+    now = datetime.now(timezone.utc)
+    fields.setdefault('heartbeat_at', now)
+    if fields.get('status') == 'running':
+        fields.setdefault('started_at', now)
+    if fields.get('status') in ('completed', 'failed'):
+        fields.setdefault('finished_at', now)
+    db = SessionLocal()
+    try:
+        db.query(BackgroundJobModel).filter(BackgroundJobModel.id == job_id).update(fields, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite returns naive datetimes; everything written by this module is UTC
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def fail_stale_jobs(db: Session, job_type: str, school_id: Optional[int] = None) -> int:
+    """Mark queued/running jobs of ``job_type`` without a heartbeat for JOB_STALE_SECONDS as failed.
+
+    Runs in the caller's transaction (flushes, does not commit). Returns the number of jobs marked.
+    """
+    query = db.query(BackgroundJobModel).filter(
+        BackgroundJobModel.job_type == job_type,
+        BackgroundJobModel.status.in_(['queued', 'running'])
+    )
+    if school_id is not None:
+        query = query.filter(BackgroundJobModel.school_id == school_id)
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=JOB_STALE_SECONDS)
+    stale = 0
+    for job in query.all():
+        last_seen = _utc(job.heartbeat_at or job.started_at or job.created_at)
+        if last_seen is not None and last_seen >= cutoff:
+            continue
+        job.status = 'failed'
+        job.message = f'No progress for {JOB_STALE_SECONDS} seconds (worker stopped?)'
+        job.finished_at = now
+        stale += 1
+    if stale:
+        db.flush()
+    return stale
+
+
+def job_errors(job: BackgroundJobModel) -> list:
+    return json.loads(job.errors_json) if job.errors_json else []
+
+
+def job_to_dict(job: BackgroundJobModel) -> dict:
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'succeeded': job.succeeded,
+        'failed': job.failed,
+        'message': job.message,
+        'result': json.loads(job.result_json) if job.result_json else None,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
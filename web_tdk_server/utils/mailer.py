@@ -0,0 +1,301 @@
+"""Email outbox: requests only enqueue, a background worker sends.
+
+``enqueue_email`` adds a row to ``email_outbox`` inside the caller's transaction.
+``OutboxWorker``, started in main's lifespan or by ``send_outbox.py``, claims due
+rows in batches and sends each batch over one reused SMTP connection. Failures
+are retried with exponential backoff until EMAIL_MAX_ATTEMPTS.
+
+Bodies can hold password-reset links, so a row's body is redacted as soon as it
+is sent or has failed for good. ``purge_outbox`` deletes finished rows after
+EMAIL_RETENTION_DAYS; the worker runs it every EMAIL_PURGE_INTERVAL_SECONDS.
+
+EMAIL_BACKEND=file writes every message as an .eml file into EMAIL_FILE_DIR
+instead of using SMTP (tests and local development).
+"""
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Iterable, Optional, Union
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from database.connection import SessionLocal
+from models.email_outbox import EmailOutbox as EmailOutboxModel
+
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "smtp")  # smtp | file
+EMAIL_FILE_DIR = os.getenv("EMAIL_FILE_DIR", "mail_outbox")
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = int(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+EMAIL_WORKER_ENABLED = os.getenv("EMAIL_WORKER_ENABLED", "true").lower() == "true"
+# a row stuck in 'sending' this long (worker died mid-batch) is claimed again
+EMAIL_CLAIM_TIMEOUT_SECONDS = int(os.getenv("EMAIL_CLAIM_TIMEOUT_SECONDS", "600"))
+# sent/failed rows older than this are deleted (0 keeps them, bodies are redacted either way)
+EMAIL_RETENTION_DAYS = int(os.getenv("EMAIL_RETENTION_DAYS", "7"))
+EMAIL_PURGE_INTERVAL_SECONDS = float(os.getenv("EMAIL_PURGE_INTERVAL_SECONDS", "3600"))
+
+REDACTED_BODY = '[redacted]'
+
+logger = logging.getLogger("web_tdk.mailer")
+
+
+def _smtp_settings() -> dict:
+    return {
+        'host': os.getenv('SMTP_HOST'),
+        'port': os.getenv('SMTP_PORT'),
+        'user': os.getenv('SMTP_USER'),
+        'password': os.getenv('SMTP_PASS'),
+    }
+
+
+def mail_enabled() -> bool:
+    """True when messages can be delivered (file sink, or SMTP host and credentials set)."""
+    if EMAIL_BACKEND == 'file':
+        return True
+    settings = _smtp_settings()
+    return bool(settings['host'] and settings['user'] and settings['password'])
+
+
+def enqueue_email(db: Session, to: Union[str, Iterable[str]], subject: str, body: str) -> Optional[EmailOutboxModel]:
+    """Add a message to the outbox; the caller commits. Returns None if nothing was queued."""
+    recipients = [to] if isinstance(to, str) else list(to)
+    recipients = [a for a in recipients if a]
+    if not recipients or not mail_enabled():
+        return None
+    row = EmailOutboxModel(
+        to_addrs=', '.join(recipients),
+        subject=subject[:255],
+        body=body,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(row)
+    return row
+
+
+def backoff_seconds(attempts: int) -> int:
+    """Delay before the next try after ``attempts`` failed ones (30s, 60s, 120s, ... capped)."""
+    return min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+
+
+class MailConnectionError(Exception):
+    """Could not connect/authenticate: the rest of the batch would fail the same way."""
+
+
+class SmtpSender:
+    """One SMTP connection (STARTTLS + login) reused for a whole batch; reopened after an error."""
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self.smtp = None
+
+    def send(self, msg: EmailMessage):
+        if self.smtp is None:
+            try:
+                smtp = smtplib.SMTP(self.settings['host'], int(self.settings['port'] or 25), timeout=30)
+                try:
+                    smtp.starttls()
+                    smtp.login(self.settings['user'], self.settings['password'])
+                except Exception:
+                    smtp.close()
+                    raise
+            except Exception as e:
+                raise MailConnectionError(str(e)) from e
+            self.smtp = smtp
+        try:
+            self.smtp.send_message(msg)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                self.smtp.close()
+            self.smtp = None
+
+
+class FileSender:
+    """Writes each message to ``<directory>/<outbox id>-<random>.eml``."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def send(self, msg: EmailMessage):
+        path = os.path.join(self.directory, f"{msg['X-Outbox-Id']}-{uuid.uuid4().hex[:8]}.eml")
+        with open(path, 'wb') as f:
+            f.write(bytes(msg))
+
+    def close(self):
+        pass
+
+
+def make_sender():
+    if EMAIL_BACKEND == 'file':
+        return FileSender(EMAIL_FILE_DIR)
+    return SmtpSender(_smtp_settings())
+
+
+def _build_message(row: EmailOutboxModel, from_addr: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg['Subject'] = row.subject
+    msg['From'] = from_addr
+    msg['To'] = row.to_addrs
+    msg['X-Outbox-Id'] = str(row.id)
+    msg.set_content(row.body)
+    return msg
+
+
+def _due_condition(now: datetime):
+    stale = now - timedelta(seconds=EMAIL_CLAIM_TIMEOUT_SECONDS)
+    return or_(
+        and_(EmailOutboxModel.status == 'pending', EmailOutboxModel.next_attempt_at <= now),
+        and_(EmailOutboxModel.status == 'sending', EmailOutboxModel.claimed_at < stale),
+    )
+
+
+def claim_batch(db: Session, batch_size: int) -> list:
+    """Mark up to ``batch_size`` due rows as 'sending' for this batch and return them.
+
+    The UPDATE re-checks the due condition, so concurrent workers (one per API
+    process) never claim the same row.
+    """
+    now = datetime.utcnow()
+    ids = [row.id for row in db.query(EmailOutboxModel.id)
+           .filter(_due_condition(now))
+           .order_by(EmailOutboxModel.next_attempt_at, EmailOutboxModel.id)
+           .limit(batch_size)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    db.query(EmailOutboxModel).filter(
+        EmailOutboxModel.id.in_(ids), _due_condition(now)
+    ).update({'status': 'sending', 'claim_token': token, 'claimed_at': now}, synchronize_session=False)
+    db.commit()
+    return db.query(EmailOutboxModel).filter(EmailOutboxModel.claim_token == token).order_by(EmailOutboxModel.id).all()
+
+
+def _record_failure(row: EmailOutboxModel, error: str) -> str:
+    row.attempts += 1
+    row.last_error = error[:2000]
+    row.claim_token = None
+    if row.attempts >= EMAIL_MAX_ATTEMPTS:
+        row.status = 'failed'
+        row.body = REDACTED_BODY
+        return 'failed'
+    row.status = 'pending'
+    row.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(row.attempts))
+    return 'retry'
+
+
+def send_pending(batch_size: Optional[int] = None) -> dict:
+    """Send one batch of due messages. Returns counts: {'sent', 'retry', 'failed'}."""
+    counts = {'sent': 0, 'retry': 0, 'failed': 0}
+    db = SessionLocal()
+    sender = None
+    try:
+        rows = claim_batch(db, batch_size or EMAIL_BATCH_SIZE)
+        if not rows:
+            return counts
+        from_addr = os.getenv('EMAIL_FROM') or _smtp_settings()['user'] or 'no-reply@localhost'
+        sender = make_sender()
+        for i, row in enumerate(rows):
+            try:
+                sender.send(_build_message(row, from_addr))
+            except MailConnectionError as e:
+                logger.warning("Mail server unavailable, deferring %d messages: %s", len(rows) - i, e)
+                for pending in rows[i:]:
+                    counts[_record_failure(pending, f'connection: {e}')] += 1
+                db.commit()
+                break
+            except Exception as e:
+                logger.warning("Failed to send outbox message %s: %s", row.id, e)
+                counts[_record_failure(row, str(e))] += 1
+            else:
+                row.attempts += 1
+                row.status = 'sent'
+                row.sent_at = datetime.utcnow()
+                row.claim_token = None
+                row.body = REDACTED_BODY
+                counts['sent'] += 1
+            # commit per message so a crash mid-batch does not resend delivered mail
+            db.commit()
+        return counts
+    finally:
+        if sender is not None:
+            sender.close()
+        db.close()
+
+
+def purge_outbox(retention_days: Optional[int] = None) -> int:
+    """Delete sent and failed rows older than ``retention_days``; returns the number deleted."""
+    days = EMAIL_RETENTION_DAYS if retention_days is None else retention_days
+    if days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    db = SessionLocal()
+    try:
+        deleted = db.query(EmailOutboxModel).filter(
+            EmailOutboxModel.status.in_(('sent', 'failed')),
+            # failed rows have no sent_at; their last try was at most one backoff after next_attempt_at
+            or_(EmailOutboxModel.sent_at < cutoff,
+                and_(EmailOutboxModel.sent_at.is_(None), EmailOutboxModel.next_attempt_at < cutoff))
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+class OutboxWorker:
+    """Daemon thread draining the outbox every EMAIL_POLL_SECONDS (immediately again after a full batch)."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='email-outbox', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run(self):
+        next_purge = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + EMAIL_PURGE_INTERVAL_SECONDS
+                try:
+                    purge_outbox()
+                except Exception:
+                    logger.exception("Email outbox purge failed")
+            try:
+                counts = send_pending()
+            except Exception:
+                logger.exception("Email outbox iteration failed")
+                counts = None
+            if counts and sum(counts.values()) >= EMAIL_BATCH_SIZE:
+                continue
+            self._stop.wait(EMAIL_POLL_SECONDS)
+
+
+outbox_worker = OutboxWorker()
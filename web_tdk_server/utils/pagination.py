@@ -0,0 +1,131 @@
+"""Keyset (cursor) pagination shared by the list endpoints.
+
+List endpoints keep returning a plain JSON array so existing clients are unaffected.
+Paging is opt-in: pass ``limit`` (and the ``cursor`` from the previous page). The next
+cursor is returned in the ``X-Next-Cursor`` response header, and ``X-Total-Count`` is
+only computed when ``include_total=true`` is requested.
+"""
+import base64
+import json
+from datetime import date, datetime, time
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import and_, or_, func, select
+from sqlalchemy import types as sqltypes
+
+MAX_PAGE_LIMIT = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+class PageParams:
+    """FastAPI dependency holding the common paging query parameters."""
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="Page size; omit to return every row"),
+        cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor header"),
+        include_total: bool = Query(False, description="Also compute X-Total-Count"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.include_total = include_total
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    col_type = column.type
+    try:
+        if isinstance(col_type, sqltypes.DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(col_type, sqltypes.Date):
+            return date.fromisoformat(value)
+        if isinstance(col_type, sqltypes.Time):
+            return time.fromisoformat(value)
+        if isinstance(col_type, sqltypes.Integer):
+            return int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [_decode_value(col, v) for col, v in zip(columns, values)]
+
+
+def _after_cursor(sort_col, id_col, sort_value, id_value, descending: bool):
+    """Rows strictly after (sort_value, id_value) in the (sort_col, id_col) ordering.
+
+    NULL sort values sort last when descending and first when ascending (MySQL/SQLite).
+    """
+    if sort_value is None:
+        if descending:
+            return and_(sort_col.is_(None), id_col < id_value)
+        return or_(sort_col.isnot(None), and_(sort_col.is_(None), id_col > id_value))
+    # Compare against the anchor row's stored value so the comparison uses the DB's own
+    # representation (e.g. SQLite timestamps without microseconds); the encoded value is
+    # only a fallback for when the anchor row has since been deleted.
+    anchor = select(sort_col).where(id_col == id_value).scalar_subquery()
+    sort_ref = func.coalesce(anchor, sort_value)
+    if descending:
+        return or_(
+            sort_col < sort_ref,
+            and_(sort_col == sort_ref, id_col < id_value),
+            sort_col.is_(None)
+        )
+    return or_(sort_col > sort_ref, and_(sort_col == sort_ref, id_col > id_value))
+
+
+def paginate(query, response: Response, page: PageParams, id_col, sort_col=None, descending: bool = True, row_key=None):
+    """Apply ordering and keyset paging to ``query`` and set the paging headers.
+
+    ``sort_col``/``id_col`` define the (sort, id) key, e.g. (created_at, id). When
+    ``sort_col`` is None the key is the id alone. ``row_key`` extracts the key values
+    from a result row when rows are tuples rather than model instances.
+    """
+    if page.include_total:
+        response.headers[TOTAL_COUNT_HEADER] = str(query.order_by(None).count())
+
+    key_cols = [sort_col, id_col] if sort_col is not None else [id_col]
+    if page.cursor:
+        values = decode_cursor(page.cursor, key_cols)
+        if sort_col is not None:
+            query = query.filter(_after_cursor(sort_col, id_col, values[0], values[1], descending))
+        else:
+            query = query.filter(id_col < values[0] if descending else id_col > values[0])
+
+    order = [c.desc() if descending else c.asc() for c in key_cols]
+    query = query.order_by(*order)
+    if page.limit is None:
+        return query.all()
+
+    rows = query.limit(page.limit + 1).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        if row_key is not None:
+            key_values = row_key(last)
+        else:
+            key_values = [getattr(last, c.key) for c in key_cols]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key_values)
+    return rows
@@ -0,0 +1,283 @@
+"""School-wide classroom promotion (mid-term or end of year) as one transaction.
+
+``plan_promotion`` maps every active source classroom of a school term to its
+target classroom. Targets are found by name in the target term or marked to be
+created. A handful of grouped queries fill in student counts, students already
+in the target and (optionally) grade counts; nothing is written, so this is
+also the dry run.
+
+``execute_promotion`` first reads each source's active students, reporting
+progress per classroom. It then creates all missing target classrooms in one
+flush. Enrollments are copied (re-activating old rows in the target) and
+``User.grade_level`` is updated with chunked set-based statements, and
+everything is committed once. Source enrollments are kept, as with
+POST /classrooms/{id}/promote.
+"""
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session, aliased
+
+from database.connection import SessionLocal
+from models.classroom import Classroom as ClassroomModel, ClassroomStudent as ClassroomStudentModel
+from models.grade import Grade as GradeModel
+from models.user import User as UserModel
+from utils.enrollment import ENROLL_CHUNK_SIZE
+from utils.jobs import update_job
+from utils.timetable import invalidate_schools
+from utils.user_cache import invalidate_user
+
+PROMOTION_TYPES = ('mid_term', 'mid_term_with_promotion', 'end_of_year')
+PROMOTION_JOB_TYPE = 'school_promotion'
+
+
+class PromotionError(ValueError):
+    """The promotion request cannot be planned (bad type, missing grade mapping, no source term)."""
+
+
+def _class_name(grade_level: str, room_number: Optional[str]) -> str:
+    return grade_level if not room_number else f"{grade_level}/{room_number}"
+
+
+def _year_key(year: str):
+    return (0, int(year)) if str(year).isdigit() else (-1, str(year))
+
+
+def plan_promotion(db: Session, school_id: int, promotion_type: str, grade_map: Optional[Dict[str, str]] = None,
+                   new_academic_year: Optional[str] = None, academic_year: Optional[str] = None,
+                   semester: Optional[int] = None, classroom_ids: Optional[List[int]] = None,
+                   include_grades: bool = False) -> dict:
+    """Source -> target classroom of every active classroom of the source term; writes nothing.
+
+    ``grade_map`` maps a source grade_level to its new grade_level (required for
+    mid_term_with_promotion and end_of_year). Classrooms whose grade is not in it
+    (e.g. the graduating grade) are listed in ``skipped``. The source term
+    defaults to the school's latest academic year, semester 1 for mid-term
+    promotions and the year's last semester for end of year.
+    """
+    if promotion_type not in PROMOTION_TYPES:
+        raise PromotionError("promotion_type ต้องเป็น 'mid_term', 'mid_term_with_promotion' หรือ 'end_of_year'")
+    grade_map = {str(k).strip(): str(v).strip() for k, v in (grade_map or {}).items() if v}
+    if promotion_type != 'mid_term' and not grade_map:
+        raise PromotionError(f'ต้องระบุ grade_map (ชั้นเดิม -> ชั้นใหม่) สำหรับ {promotion_type}')
+
+    active = db.query(ClassroomModel.academic_year, ClassroomModel.semester).filter(
+        ClassroomModel.school_id == school_id, ClassroomModel.is_active == True
+    ).distinct().all()
+    if academic_year is None:
+        if not active:
+            raise PromotionError('ไม่พบชั้นเรียนที่ใช้งานอยู่ในโรงเรียนนี้')
+        academic_year = max((y for y, _ in active), key=_year_key)
+    if semester is None:
+        semesters = [s for y, s in active if y == academic_year]
+        semester = 1 if promotion_type != 'end_of_year' else max(semesters or [1])
+    if promotion_type != 'end_of_year' and semester == 2:
+        raise PromotionError('ชั้นเรียนต้นทางอยู่เทอม 2 แล้ว ไม่สามารถเลื่อนกลางปีได้')
+
+    if promotion_type == 'end_of_year':
+        if new_academic_year:
+            target_year = str(new_academic_year)
+        elif str(academic_year).isdigit():
+            target_year = str(int(academic_year) + 1)
+        else:
+            raise PromotionError('ต้องระบุ new_academic_year')
+        target_semester = 1
+    else:
+        target_year, target_semester = academic_year, 2
+
+    query = db.query(ClassroomModel).filter(
+        ClassroomModel.school_id == school_id,
+        ClassroomModel.is_active == True,
+        ClassroomModel.academic_year == academic_year,
+        ClassroomModel.semester == semester
+    )
+    if classroom_ids:
+        query = query.filter(ClassroomModel.id.in_(classroom_ids))
+    sources = query.order_by(ClassroomModel.grade_level, ClassroomModel.name).all()
+
+    # every classroom of the target term, active or not (the unique key ignores is_active)
+    existing = {}
+    for c in db.query(ClassroomModel.id, ClassroomModel.name, ClassroomModel.grade_level, ClassroomModel.is_active).filter(
+        ClassroomModel.school_id == school_id,
+        ClassroomModel.academic_year == target_year,
+        ClassroomModel.semester == target_semester
+    ).order_by(ClassroomModel.is_active.desc(), ClassroomModel.id):
+        existing.setdefault(c.name, c)
+
+    source_ids = [c.id for c in sources]
+    counts = dict(db.query(ClassroomStudentModel.classroom_id, func.count(ClassroomStudentModel.id)).filter(
+        ClassroomStudentModel.classroom_id.in_(source_ids), ClassroomStudentModel.is_active == True
+    ).group_by(ClassroomStudentModel.classroom_id).all()) if source_ids else {}
+
+    classrooms, skipped = [], []
+    for c in sources:
+        if promotion_type == 'mid_term':
+            target_grade, target_name = c.grade_level, c.name
+        else:
+            target_grade = grade_map.get(c.grade_level)
+            if not target_grade:
+                skipped.append({'source_classroom_id': c.id, 'source_name': c.name,
+                                'reason': f'ไม่มีชั้นใหม่สำหรับ {c.grade_level} ใน grade_map'})
+                continue
+            target_name = _class_name(target_grade, c.room_number)
+        target = existing.get(target_name)
+        if target is not None and not target.is_active:
+            skipped.append({'source_classroom_id': c.id, 'source_name': c.name,
+                            'reason': f'ชั้นเรียนปลายทาง {target_name} ถูกปิดใช้งานอยู่'})
+            continue
+        classrooms.append({
+            'source_classroom_id': c.id,
+            'source_name': c.name,
+            'source_grade_level': c.grade_level,
+            'room_number': c.room_number,
+            'students': counts.get(c.id, 0),
+            'target_classroom_id': target.id if target is not None else None,
+            'target_name': target_name,
+            'target_grade_level': target.grade_level if target is not None else target_grade,
+            'create': target is None,
+            'already_in_target': 0,
+        })
+
+    # students already active in their (existing) target: one self-join over all sources
+    targets = {item['source_classroom_id']: item['target_classroom_id'] for item in classrooms if not item['create']}
+    if targets:
+        src, dst = aliased(ClassroomStudentModel), aliased(ClassroomStudentModel)
+        overlap = db.query(src.classroom_id, dst.classroom_id, func.count(src.id)).join(
+            dst, dst.student_id == src.student_id
+        ).filter(
+            src.classroom_id.in_(list(targets)), src.is_active == True,
+            dst.classroom_id.in_(set(targets.values())), dst.is_active == True
+        ).group_by(src.classroom_id, dst.classroom_id).all()
+        by_source = {item['source_classroom_id']: item for item in classrooms}
+        for source_id, target_id, n in overlap:
+            if targets[source_id] == target_id:
+                by_source[source_id]['already_in_target'] = n
+
+    if include_grades and classrooms:
+        # grades stay where they are and are reached through parent_classroom_id; report how many
+        grade_counts = dict(db.query(ClassroomStudentModel.classroom_id, func.count(GradeModel.id)).join(
+            GradeModel, GradeModel.student_id == ClassroomStudentModel.student_id
+        ).filter(
+            ClassroomStudentModel.classroom_id.in_([i['source_classroom_id'] for i in classrooms]),
+            ClassroomStudentModel.is_active == True
+        ).group_by(ClassroomStudentModel.classroom_id).all())
+        for item in classrooms:
+            item['grades'] = grade_counts.get(item['source_classroom_id'], 0)
+
+    return {
+        'promotion_type': promotion_type,
+        'source': {'academic_year': academic_year, 'semester': semester},
+        'target': {'academic_year': target_year, 'semester': target_semester},
+        'classrooms': classrooms,
+        'skipped': skipped,
+        'summary': {
+            'classrooms': len(classrooms),
+            'students': sum(i['students'] for i in classrooms),
+            'create_classrooms': len({i['target_name'] for i in classrooms if i['create']}),
+            'skipped': len(skipped),
+        },
+    }
+
+
+def execute_promotion(db: Session, school_id: int, plan: dict, progress: Optional[Callable] = None) -> dict:
+    """Apply ``plan`` in one transaction; ``progress(processed=...)`` is called per source classroom read."""
+    cs = ClassroomStudentModel.__table__
+    users = UserModel.__table__
+    target_year, target_semester = plan['target']['academic_year'], plan['target']['semester']
+
+    # read phase: nothing is written yet, so progress reports do not wait on our transaction
+    work, usernames = [], []
+    for n, item in enumerate(plan['classrooms'], start=1):
+        students = dict(db.query(ClassroomStudentModel.student_id, UserModel.username).join(
+            UserModel, UserModel.id == ClassroomStudentModel.student_id
+        ).filter(
+            ClassroomStudentModel.classroom_id == item['source_classroom_id'],
+            ClassroomStudentModel.is_active == True
+        ).order_by(ClassroomStudentModel.id).all())
+        student_ids = list(students)
+        usernames.extend(students.values())
+        present = {}
+        if item['target_classroom_id'] is not None:
+            for i in range(0, len(student_ids), ENROLL_CHUNK_SIZE):
+                for enrollment_id, student_id, is_active in db.query(
+                    ClassroomStudentModel.id, ClassroomStudentModel.student_id, ClassroomStudentModel.is_active
+                ).filter(
+                    ClassroomStudentModel.classroom_id == item['target_classroom_id'],
+                    ClassroomStudentModel.student_id.in_(student_ids[i:i + ENROLL_CHUNK_SIZE])
+                ).order_by(ClassroomStudentModel.id):
+                    present.setdefault(student_id, (enrollment_id, is_active))
+        work.append((item, student_ids, present))
+        if progress:
+            progress(processed=n)
+
+    try:
+        # all missing target classrooms in one flush
+        created = {}
+        for item, _, _ in work:
+            key = (item['target_name'], item['target_grade_level'])
+            if item['create'] and key not in created:
+                created[key] = ClassroomModel(
+                    name=item['target_name'],
+                    grade_level=item['target_grade_level'],
+                    room_number=item['room_number'],
+                    semester=target_semester,
+                    academic_year=target_year,
+                    school_id=school_id,
+                    parent_classroom_id=item['source_classroom_id']  # อ้างอิงชั้นเรียนเดิม
+                )
+        if created:
+            db.add_all(created.values())
+            db.flush()
+
+        promoted = reactivated = 0
+        results = []
+        for item, student_ids, present in work:
+            target_id = item['target_classroom_id'] or created[(item['target_name'], item['target_grade_level'])].id
+            new = [sid for sid in student_ids if sid not in present]
+            inactive = [enrollment_id for enrollment_id, is_active in present.values() if not is_active]
+            for i in range(0, len(new), ENROLL_CHUNK_SIZE):
+                db.execute(insert(cs), [{'classroom_id': target_id, 'student_id': sid, 'is_active': True}
+                                        for sid in new[i:i + ENROLL_CHUNK_SIZE]])
+            for i in range(0, len(inactive), ENROLL_CHUNK_SIZE):
+                db.execute(update(cs).where(cs.c.id.in_(inactive[i:i + ENROLL_CHUNK_SIZE])).values(is_active=True))
+            for i in range(0, len(student_ids), ENROLL_CHUNK_SIZE):
+                db.execute(update(users).where(users.c.id.in_(student_ids[i:i + ENROLL_CHUNK_SIZE]))
+                           .values(grade_level=item['target_grade_level']))
+            promoted += len(new) + len(inactive)
+            reactivated += len(inactive)
+            results.append({'source_classroom_id': item['source_classroom_id'], 'source_name': item['source_name'],
+                            'target_classroom_id': target_id, 'target_name': item['target_name'],
+                            'students': len(student_ids), 'enrolled': len(new) + len(inactive)})
+        invalidate_schools(db.connection(), [school_id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    # cached current_user objects carry grade_level
+    invalidate_user(*usernames)
+    return {
+        'classrooms': results,
+        'created_classrooms': len(created),
+        'promoted_students': promoted,
+        'reactivated_enrollments': reactivated,
+        'students': sum(len(ids) for _, ids, _ in work),
+    }
+
+
+def run_promotion_job(job_id: int, school_id: int, options: dict):
+    """Background job body: plan again on a fresh session (data may have moved on), then apply."""
+    update_job(job_id, status='running')
+    db = SessionLocal()
+    try:
+        plan = plan_promotion(db, school_id, **options)
+        update_job(job_id, total=len(plan['classrooms']))
+        result = execute_promotion(db, school_id, plan, progress=lambda **counts: update_job(job_id, **counts))
+        update_job(job_id, status='completed', processed=len(plan['classrooms']),
+                   succeeded=result['promoted_students'], failed=len(plan['skipped']),
+                   errors=plan['skipped'], result={**plan['summary'], **result,
+                                                   'source': plan['source'], 'target': plan['target']})
+    except Exception as e:
+        db.rollback()
+        update_job(job_id, status='failed', message=str(e))
+    finally:
+        db.close()
@@ -0,0 +1,205 @@
+"""Materialized per-student score aggregates used by the ranking endpoints.
+
+Grade writes call ``refresh_student_scores`` for the students they touched, so the
+ranking endpoints only need one ordered read. Subject writes (scoring settings,
+end/unend, enrollments, deletion) refresh the students graded in that subject
+(``graded_student_ids``). ``rebuild_rankings.py`` rebuilds the whole table from
+scratch.
+
+The ranking endpoints only read: aggregates that are missing (students without
+grades, or a tree that has not run ``rebuild_rankings.py`` yet) are computed in
+memory for the response and never written from a GET.
+"""
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, func, tuple_
+from sqlalchemy.orm import Session
+
+from models.user import User as UserModel
+from models.classroom import ClassroomStudent as ClassroomStudentModel
+from models.grade import Grade as GradeModel
+from models.student_score import StudentScoreAggregate as StudentScoreModel
+from utils.transcript import build_transcripts, summarize_transcript
+
+# scope_classroom_id value for school-wide (all classrooms) aggregates
+SCHOOL_SCOPE = 0
+REBUILD_BATCH_SIZE = 500
+UPSERT_BATCH_SIZE = 500
+SCORE_VALUE_COLUMNS = ('school_id', 'total_score', 'total_max_score', 'average_score')
+
+
+def _upsert_scores(db: Session, rows: List[dict]) -> None:
+    """Insert or update aggregate rows on uq_student_score_scope in one statement per batch.
+
+    Two requests refreshing the same student (e.g. two assignments saved at once)
+    would otherwise both insert the missing row and one would fail on the key.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = insert(StudentScoreModel.__table__).values(rows[start:start + UPSERT_BATCH_SIZE])
+        if dialect == 'mysql':
+            new = {c: stmt.inserted[c] for c in SCORE_VALUE_COLUMNS}
+            stmt = stmt.on_duplicate_key_update(updated_at=func.now(), **new)
+        else:
+            new = {c: stmt.excluded[c] for c in SCORE_VALUE_COLUMNS}
+            stmt = stmt.on_conflict_do_update(index_elements=['student_id', 'scope_classroom_id'],
+                                              set_=dict(new, updated_at=func.now()))
+        db.execute(stmt)
+
+
+def refresh_student_scores(db: Session, student_ids: Iterable[int]) -> int:
+    """Recompute the school-wide and per-classroom aggregates for ``student_ids``.
+
+    Runs inside the caller's transaction (flushes pending grade changes first, does
+    not commit). Returns the number of aggregate rows written.
+    """
+    student_ids = list(dict.fromkeys(sid for sid in student_ids if sid is not None))
+    if not student_ids:
+        return 0
+    db.flush()
+
+    school_by_student = dict(db.query(UserModel.id, UserModel.school_id).filter(
+        UserModel.id.in_(student_ids)
+    ).all())
+    student_ids = [sid for sid in student_ids if sid in school_by_student]
+    if not student_ids:
+        return 0
+
+    # scope -> students that need an aggregate for that scope
+    students_by_scope = defaultdict(set)
+    students_by_scope[SCHOOL_SCOPE].update(student_ids)
+    memberships = db.query(ClassroomStudentModel.classroom_id, ClassroomStudentModel.student_id).filter(
+        ClassroomStudentModel.student_id.in_(student_ids)
+    ).all()
+    for classroom_id, sid in memberships:
+        students_by_scope[classroom_id].add(sid)
+
+    rows = []
+    for scope, scope_students in students_by_scope.items():
+        transcripts = build_transcripts(db, scope_students, scope or None)
+        for sid, transcript in transcripts.items():
+            summary = summarize_transcript(transcript)
+            rows.append({
+                'student_id': sid,
+                'scope_classroom_id': scope,
+                'school_id': school_by_student.get(sid),
+                'total_score': summary['total_score'],
+                'total_max_score': summary['total_max_score'],
+                'average_score': summary['average_score'],
+            })
+    if rows:
+        _upsert_scores(db, rows)
+
+    # Aggregates for classrooms the student no longer belongs to
+    wanted = {(row['student_id'], row['scope_classroom_id']) for row in rows}
+    stale = [key for key in db.query(StudentScoreModel.student_id, StudentScoreModel.scope_classroom_id).filter(
+        StudentScoreModel.student_id.in_(student_ids)
+    ) if tuple(key) not in wanted]
+    if stale:
+        db.query(StudentScoreModel).filter(
+            tuple_(StudentScoreModel.student_id, StudentScoreModel.scope_classroom_id).in_([tuple(k) for k in stale])
+        ).delete(synchronize_session=False)
+
+    return len(rows)
+
+
+def graded_student_ids(db: Session, subject_id: int, student_ids: Optional[Iterable[int]] = None) -> List[int]:
+    """Students with a grade in ``subject_id`` (optionally only those in ``student_ids``).
+
+    A subject only counts towards a student's total once they have a grade in it,
+    so these are the aggregates a change to the subject can affect.
+    """
+    graded = [sid for (sid,) in db.query(GradeModel.student_id).filter(
+        GradeModel.subject_id == subject_id
+    ).distinct()]
+    if student_ids is not None:
+        wanted = set(student_ids)
+        graded = [sid for sid in graded if sid in wanted]
+    return graded
+
+
+def rebuild_all_scores(db: Session, school_id: Optional[int] = None, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Drop and rebuild every aggregate (optionally for one school), committing per batch."""
+    students_query = db.query(UserModel.id).filter(UserModel.role == 'student')
+    stale_query = db.query(StudentScoreModel)
+    if school_id is not None:
+        students_query = students_query.filter(UserModel.school_id == school_id)
+        stale_query = stale_query.filter(StudentScoreModel.school_id == school_id)
+    student_ids = [row[0] for row in students_query.order_by(UserModel.id).all()]
+
+    stale_query.delete(synchronize_session=False)
+    db.commit()
+
+    written = 0
+    for start in range(0, len(student_ids), batch_size):
+        written += refresh_student_scores(db, student_ids[start:start + batch_size])
+        db.commit()
+    return written
+
+
+def _ranked_rows(db: Session, students_query, scope: int) -> List[dict]:
+    """Read aggregates for ``students_query`` ordered by total score with dense ranks.
+
+    ``db`` may be a read-replica session; nothing is written. Aggregates that are
+    missing are computed in memory for this response only.
+    """
+    rows = students_query.outerjoin(
+        StudentScoreModel,
+        and_(StudentScoreModel.student_id == UserModel.id, StudentScoreModel.scope_classroom_id == scope)
+    ).with_entities(UserModel, StudentScoreModel).order_by(
+        StudentScoreModel.total_score.desc(), UserModel.id
+    ).all()
+
+    entries = [
+        (user, {'total_score': agg.total_score, 'total_max_score': agg.total_max_score, 'average_score': agg.average_score} if agg else None)
+        for user, agg in rows
+    ]
+    missing = [user.id for user, summary in entries if summary is None]
+    if missing:
+        # Students without grades, or a tree that has not run rebuild_rankings.py yet
+        transcripts = build_transcripts(db, missing, scope or None)
+        summaries = {sid: summarize_transcript(t) for sid, t in transcripts.items()}
+        entries = [(user, summary or summaries.get(user.id)) for user, summary in entries]
+        entries.sort(key=lambda e: (-(e[1]['total_score'] if e[1] else 0.0), e[0].id))
+
+    results = []
+    current_rank = 0
+    last_val = None
+    for user, summary in entries:
+        summary = summary or {}
+        total_score = summary.get('total_score', 0.0)
+        if total_score != last_val:
+            current_rank += 1
+            last_val = total_score
+        results.append({
+            'student_id': user.id,
+            'full_name': user.full_name,
+            'username': user.username,
+            'total_score': total_score,
+            'total_max_score': summary.get('total_max_score', 0.0),
+            'average_score': summary.get('average_score', 0.0),
+            'rank': current_rank
+        })
+    return results
+
+
+def classroom_ranking(db: Session, classroom_id: int) -> List[dict]:
+    students_query = db.query(UserModel).join(
+        ClassroomStudentModel, UserModel.id == ClassroomStudentModel.student_id
+    ).filter(ClassroomStudentModel.classroom_id == classroom_id)
+    return _ranked_rows(db, students_query, classroom_id)
+
+
+def school_ranking(db: Session, school_id: int) -> List[dict]:
+    students_query = db.query(UserModel).filter(
+        UserModel.school_id == school_id,
+        UserModel.role == 'student'
+    )
+    return _ranked_rows(db, students_query, SCHOOL_SCOPE)
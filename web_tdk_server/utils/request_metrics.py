@@ -0,0 +1,222 @@
+"""Per-request SQL statement counts and DB time, tagged by route template.
+
+``QueryMetricsMiddleware`` opens a stats object for every HTTP request. SQLAlchemy
+cursor events (registered on every Engine) add to it, including from the worker
+threads that run sync endpoints (anyio copies the request's context into them).
+When the response starts, the middleware:
+
+- adds ``X-DB-Query-Count`` / ``X-DB-Time-Ms`` headers if QUERY_METRICS_HEADERS=true
+- logs one JSON line to the ``web_tdk.query_metrics`` logger if QUERY_METRICS_LOG=true
+- records per-route histograms that ``GET /metrics`` renders in Prometheus text format
+- logs a warning when the route ran more than QUERY_BUDGET statements (0 disables)
+
+All numbers are per worker process.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_METRICS_HEADERS = os.getenv("QUERY_METRICS_HEADERS", "false").lower() == "true"
+QUERY_METRICS_LOG = os.getenv("QUERY_METRICS_LOG", "false").lower() == "true"
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "50"))
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+DB_TIME_HEADER = "X-DB-Time-Ms"
+
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("web_tdk.query_metrics")
+if QUERY_METRICS_LOG and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_query_stats", default=None)
+_stats_lock = threading.Lock()
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats of the request being served in this context (None outside a request)."""
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+    stats = _current.get()
+    if stats is not None:
+        # several threads of one request (sync dependencies) may write concurrently
+        with _stats_lock:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense (per label set)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+
+class RouteMetrics:
+    """Per-(method, route) histograms of statements, DB time and request duration."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.budget_exceeded = {}
+
+    def observe(self, method: str, route: str, status: int, stats: RequestStats, duration: float):
+        key = (method, route)
+        with self._lock:
+            entry = self.routes.get(key)
+            if entry is None:
+                entry = self.routes[key] = {
+                    "statements": Histogram(QUERY_COUNT_BUCKETS),
+                    "db_seconds": Histogram(SECONDS_BUCKETS),
+                    "duration_seconds": Histogram(SECONDS_BUCKETS),
+                }
+            entry["statements"].observe(stats.statements)
+            entry["db_seconds"].observe(stats.db_seconds)
+            entry["duration_seconds"].observe(duration)
+            if QUERY_BUDGET and stats.statements > QUERY_BUDGET:
+                self.budget_exceeded[key] = self.budget_exceeded.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+            self.budget_exceeded.clear()
+
+    def render_prometheus(self) -> str:
+        lines = []
+        specs = (
+            ("statements", "http_request_db_statements", "SQL statements executed per request"),
+            ("db_seconds", "http_request_db_seconds", "Time spent executing SQL per request"),
+            ("duration_seconds", "http_request_duration_seconds", "Request duration"),
+        )
+        with self._lock:
+            items = sorted(self.routes.items())
+            for field, name, help_text in specs:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), entry in items:
+                    hist = entry[field]
+                    labels = f'method="{method}",route="{_escape(route)}"'
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.n}')
+                    lines.append(f"{name}_sum{{{labels}}} {hist.total}")
+                    lines.append(f"{name}_count{{{labels}}} {hist.n}")
+            lines.append("# HELP http_request_query_budget_exceeded_total Requests over QUERY_BUDGET statements")
+            lines.append("# TYPE http_request_query_budget_exceeded_total counter")
+            for (method, route), n in sorted(self.budget_exceeded.items()):
+                lines.append(f'http_request_query_budget_exceeded_total{{method="{method}",route="{_escape(route)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+route_metrics = RouteMetrics()
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
+
+
+class QueryMetricsMiddleware:
+    """ASGI middleware collecting per-request statement counts (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        reported = False
+
+        def report():
+            nonlocal reported
+            if reported:
+                return
+            reported = True
+            duration = time.perf_counter() - start
+            method = scope.get("method", "")
+            route = _route_template(scope)
+            route_metrics.observe(method, route, status_code, stats, duration)
+            if QUERY_BUDGET and stats.statements > QUERY_BUDGET:
+                logger.warning("Query budget exceeded: %s %s ran %d statements (budget %d)",
+                               method, route, stats.statements, QUERY_BUDGET)
+            if QUERY_METRICS_LOG:
+                logger.info(json.dumps({
+                    "method": method,
+                    "route": route,
+                    "path": scope.get("path"),
+                    "status": status_code,
+                    "statements": stats.statements,
+                    "db_ms": round(stats.db_seconds * 1000, 3),
+                    "duration_ms": round(duration * 1000, 3),
+                }))
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if QUERY_METRICS_HEADERS:
+                    headers = list(message.get("headers", []))
+                    headers.append((QUERY_COUNT_HEADER.lower().encode(), str(stats.statements).encode()))
+                    headers.append((DB_TIME_HEADER.lower().encode(), f"{stats.db_seconds * 1000:.3f}".encode()))
+                    message = dict(message, headers=headers)
+                report()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            report()
+            _current.reset(token)
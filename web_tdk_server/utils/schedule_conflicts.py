@@ -0,0 +1,242 @@
+"""Schedule conflict detection over an in-memory interval index per school.
+
+Days are normalized to 0=Sunday .. 6=Saturday (``normalize_day``) and stored as
+'0'..'6' (``day_key``). Older rows that hold 'monday', 'Mon' or a Thai day name
+are still understood.
+
+``school_index`` loads a school's schedules and operating-hour slots once (two
+queries) into sorted interval lists keyed by (teacher, day), (classroom, day)
+and day. The index is cached per process and reused while the school's
+timetable generation (utils.timetable) is unchanged, so it is rebuilt after any
+schedule or slot write. ``find_conflicts`` checks a whole batch of proposed
+assignments against the index and against each other, and returns every
+conflict instead of stopping at the first.
+"""
+import os
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from models.classroom import Classroom as ClassroomModel
+from models.schedule import ScheduleSlot as ScheduleSlotModel, SubjectSchedule as SubjectScheduleModel
+from models.subject import Subject as SubjectModel
+from models.user import User as UserModel
+
+SCHEDULE_INDEX_CACHE_SIZE = int(os.getenv("SCHEDULE_INDEX_CACHE_SIZE", "64"))
+
+DAY_NAMES = {
+    'sunday': 0, 'sun': 0, 'อาทิตย์': 0,
+    'monday': 1, 'mon': 1, 'จันทร์': 1,
+    'tuesday': 2, 'tue': 2, 'อังคาร': 2,
+    'wednesday': 3, 'wed': 3, 'พุธ': 3,
+    'thursday': 4, 'thu': 4, 'พฤหัสบดี': 4, 'พฤหัส': 4,
+    'friday': 5, 'fri': 5, 'ศุกร์': 5,
+    'saturday': 6, 'sat': 6, 'เสาร์': 6,
+}
+
+# conflict type -> HTTP status used when a single-assignment endpoint rejects it
+CONFLICT_STATUS = {
+    'invalid_day': 400,
+    'invalid_time': 400,
+    'slot_not_found': 404,
+    'outside_slot': 400,
+    'no_operating_hours': 400,
+    'outside_operating_hours': 400,
+    'teacher_overlap': 400,
+    'classroom_overlap': 400,
+}
+
+
+def normalize_day(value) -> Optional[int]:
+    """0=Sunday .. 6=Saturday for 0/'0', 'monday', 'Mon', 'จันทร์', ...; None if not a day."""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if text.isdigit():
+        n = int(text)
+        return n if 0 <= n <= 6 else None
+    return DAY_NAMES.get(text)
+
+
+def day_key(value) -> Optional[str]:
+    """Stored form of a day: '0'..'6' (None if ``value`` is not a day)."""
+    day = normalize_day(value)
+    return str(day) if day is not None else None
+
+
+class _Intervals:
+    """Half-open [start, end) intervals sorted by start."""
+
+    __slots__ = ('items',)
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, start, end, ref):
+        insort(self.items, (start, end, ref))
+
+    def overlapping(self, start, end):
+        # only intervals starting before ``end`` can overlap; lists are per teacher/classroom and day, so short
+        stop = bisect_left(self.items, (end,))
+        return [ref for s, e, ref in self.items[:stop] if e > start]
+
+
+class ScheduleIndex:
+    """Schedules of one school by (teacher_id, day) and (classroom_id, day), and its slots by day."""
+
+    def __init__(self):
+        self.teachers: Dict[Tuple[int, int], _Intervals] = {}
+        self.classrooms: Dict[Tuple[int, int], _Intervals] = {}
+        self.slots: Dict[int, list] = {}  # day -> [(start, end, slot_id)] sorted
+        self.slot_by_id: Dict[int, tuple] = {}  # slot_id -> (day, start, end)
+
+    def add_schedule(self, ref, teacher_id, classroom_id, day, start, end):
+        if day is None or start is None or end is None:
+            return
+        if teacher_id is not None:
+            self.teachers.setdefault((teacher_id, day), _Intervals()).add(start, end, ref)
+        if classroom_id is not None:
+            self.classrooms.setdefault((classroom_id, day), _Intervals()).add(start, end, ref)
+
+    def add_slot(self, slot_id, day, start, end):
+        self.slot_by_id[slot_id] = (day, start, end)
+        if day is not None:
+            insort(self.slots.setdefault(day, []), (start, end, slot_id))
+
+    def teacher_overlaps(self, teacher_id, day, start, end):
+        intervals = self.teachers.get((teacher_id, day))
+        return intervals.overlapping(start, end) if intervals else []
+
+    def classroom_overlaps(self, classroom_id, day, start, end):
+        intervals = self.classrooms.get((classroom_id, day))
+        return intervals.overlapping(start, end) if intervals else []
+
+
+def load_index(db: Session, school_id: int) -> ScheduleIndex:
+    """Build the index of ``school_id`` (its subjects', teachers' and classrooms' schedules, and its slots)."""
+    index = ScheduleIndex()
+    school_subjects = select(SubjectModel.id).where(SubjectModel.school_id == school_id)
+    school_teachers = select(UserModel.id).where(UserModel.school_id == school_id)
+    school_classrooms = select(ClassroomModel.id).where(ClassroomModel.school_id == school_id)
+    rows = db.query(
+        SubjectScheduleModel.id, SubjectScheduleModel.teacher_id, SubjectScheduleModel.classroom_id,
+        SubjectScheduleModel.day_of_week, SubjectScheduleModel.start_time, SubjectScheduleModel.end_time
+    ).filter(or_(
+        SubjectScheduleModel.subject_id.in_(school_subjects),
+        SubjectScheduleModel.teacher_id.in_(school_teachers),
+        SubjectScheduleModel.classroom_id.in_(school_classrooms),
+    )).all()
+    for schedule_id, teacher_id, classroom_id, day, start, end in rows:
+        index.add_schedule(schedule_id, teacher_id, classroom_id, normalize_day(day), start, end)
+    for slot_id, day, start, end in db.query(
+        ScheduleSlotModel.id, ScheduleSlotModel.day_of_week, ScheduleSlotModel.start_time, ScheduleSlotModel.end_time
+    ).filter(ScheduleSlotModel.school_id == school_id):
+        index.add_slot(slot_id, normalize_day(day), start, end)
+    return index
+
+
+_cache = OrderedDict()  # school_id -> (generation, ScheduleIndex)
+_cache_lock = threading.Lock()
+
+
+def school_index(db: Session, school_id: int) -> ScheduleIndex:
+    """Cached index of ``school_id``; rebuilt when the school's timetable generation moved on.
+
+    The returned index is shared: callers must not add to it.
+    """
+    from utils.timetable import school_generation
+
+    if school_id is None:
+        return load_index(db, school_id)  # no school counter to validate a cached entry against
+    # read the generation before loading: a write committed in between leaves the entry stale, not wrong
+    generation = school_generation(db, school_id)
+    with _cache_lock:
+        cached = _cache.get(school_id)
+        if cached is not None and cached[0] == generation:
+            _cache.move_to_end(school_id)
+            return cached[1]
+    index = load_index(db, school_id)
+    if SCHEDULE_INDEX_CACHE_SIZE > 0:
+        with _cache_lock:
+            _cache[school_id] = (generation, index)
+            _cache.move_to_end(school_id)
+            while len(_cache) > SCHEDULE_INDEX_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return index
+
+
+def _conflict(index_no, type_, message, schedule_id=None, other_index=None) -> dict:
+    return {'index': index_no, 'type': type_, 'message': message,
+            'schedule_id': schedule_id, 'other_index': other_index}
+
+
+def _check_slot(index: ScheduleIndex, i, p, day, conflicts) -> Optional[int]:
+    """Operating-hours check of proposal ``p``; returns the slot it falls into."""
+    if p.schedule_slot_id:
+        slot = index.slot_by_id.get(p.schedule_slot_id)
+        if slot is None:
+            conflicts.append(_conflict(i, 'slot_not_found', 'Schedule slot not found'))
+            return None
+        slot_day, slot_start, slot_end = slot
+        if p.start_time < slot_start or p.end_time > slot_end or day != slot_day:
+            conflicts.append(_conflict(i, 'outside_slot', 'Subject schedule must be within school operating hours'))
+        return p.schedule_slot_id
+    slots = index.slots.get(day)
+    if not slots:
+        conflicts.append(_conflict(i, 'no_operating_hours', f'No operating hours defined for day {p.day_of_week}'))
+        return None
+    for slot_start, slot_end, slot_id in slots:
+        if slot_start <= p.start_time and p.end_time <= slot_end:
+            return slot_id
+    slot_start, slot_end, _ = slots[0]
+    conflicts.append(_conflict(
+        i, 'outside_operating_hours',
+        f'Subject schedule ({p.start_time}-{p.end_time}) must be within school operating hours ({slot_start}-{slot_end})'))
+    return None
+
+
+def find_conflicts(index: ScheduleIndex, proposals: Iterable, check_slots: bool = True,
+                   ignore: Iterable[int] = ()) -> Tuple[List[dict], List[Optional[int]]]:
+    """Check proposed assignments against ``index`` and against each other.
+
+    Each proposal has ``id`` (the assignment it replaces, or None), ``teacher_id``,
+    ``classroom_id``, ``schedule_slot_id``, ``day_of_week``, ``start_time`` and
+    ``end_time``. Existing assignments in ``ignore`` (about to be deleted) are
+    skipped. Returns (conflicts, slot ids): every conflict found, in proposal
+    order, and per proposal the operating-hours slot it falls into.
+    """
+    proposals = list(proposals)
+    # assignments being replaced no longer occupy their old time
+    replaced = {p.id for p in proposals if getattr(p, 'id', None)} | set(ignore)
+    batch = ScheduleIndex()
+    conflicts, slot_ids = [], []
+    for i, p in enumerate(proposals):
+        day = normalize_day(p.day_of_week)
+        if day is None:
+            conflicts.append(_conflict(i, 'invalid_day', f'Invalid day_of_week: {p.day_of_week}'))
+            slot_ids.append(None)
+            continue
+        if p.start_time >= p.end_time:
+            conflicts.append(_conflict(i, 'invalid_time', 'start_time must be before end_time'))
+            slot_ids.append(None)
+            continue
+        slot_ids.append(_check_slot(index, i, p, day, conflicts) if check_slots else p.schedule_slot_id)
+
+        if p.teacher_id is not None:
+            for ref in index.teacher_overlaps(p.teacher_id, day, p.start_time, p.end_time):
+                if ref not in replaced:
+                    conflicts.append(_conflict(i, 'teacher_overlap', 'Teacher cannot have overlapping schedules at the same time', schedule_id=ref))
+            for other in batch.teacher_overlaps(p.teacher_id, day, p.start_time, p.end_time):
+                conflicts.append(_conflict(i, 'teacher_overlap', 'Teacher cannot have overlapping schedules at the same time', other_index=other))
+        if p.classroom_id is not None:
+            for ref in index.classroom_overlaps(p.classroom_id, day, p.start_time, p.end_time):
+                if ref not in replaced:
+                    conflicts.append(_conflict(i, 'classroom_overlap', 'This classroom already has a subject scheduled at this time', schedule_id=ref))
+            for other in batch.classroom_overlaps(p.classroom_id, day, p.start_time, p.end_time):
+                conflicts.append(_conflict(i, 'classroom_overlap', 'This classroom already has a subject scheduled at this time', other_index=other))
+        batch.add_schedule(i, p.teacher_id, p.classroom_id, day, p.start_time, p.end_time)
+    return conflicts, slot_ids
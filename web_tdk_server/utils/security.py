@@ -1,3 +1,4 @@
+import os
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 import jwt
@@ -17,8 +18,18 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
 
+# จำนวนรอบของ pbkdf2 (29000 = ค่าเริ่มต้นของ passlib) ถ้าเปลี่ยนค่า hash เดิมจะถูก rehash ตอน login
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+
 # สร้าง context สำหรับการเข้ารหัสรหัสผ่าน
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# min/max = default so any hash made under a different rounds policy "needs update"
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=PASSWORD_HASH_ROUNDS,
+)
 
 # ฟังก์ชันสำหรับแฮชรหัสผ่าน
 def hash_password(password: str) -> str:
@@ -28,6 +39,10 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# ตรวจสอบรหัสผ่าน และคืน hash ใหม่ถ้า hash เดิมไม่ตรงกับนโยบายปัจจุบัน (ไม่เช่นนั้นคืน None)
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 # ฟังก์ชันสำหรับสร้าง JWT
 def create_access_token(data: dict, expires_delta: timedelta = None):
     expires_delta = expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -67,10 +82,10 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if not username:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-        # import here to avoid circular import during app startup
-        from models.user import User as UserModel
+        # cached lookup (utils.user_cache) to skip the users query on repeat requests
+        from utils.user_cache import get_user_by_username
 
-        user = db.query(UserModel).filter(UserModel.username == username).first()
+        user = get_user_by_username(db, username)
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
         return user
@@ -90,8 +105,7 @@ def get_optional_current_user(token: str = Depends(oauth2_scheme_optional), db:
         username = payload.get("sub")
         if not username:
             return None
-        from models.user import User as UserModel
-        user = db.query(UserModel).filter(UserModel.username == username).first()
-        return user
+        from utils.user_cache import get_user_by_username
+        return get_user_by_username(db, username)
     except Exception:
         return None
\ No newline at end of file
@@ -0,0 +1,362 @@
+"""Materialized weekly timetables (per student, teacher and classroom) with ETags.
+
+A timetable read used to join SubjectSchedule, Subject, User, Classroom and
+ScheduleSlot (plus the enrollments for students) on every request. Here the
+result is stored in ``timetable_entries``, one row per schedule entry of an
+owner, already ordered by day and time. ``timetable_states`` records the school
+generation and content ETag it was built with.
+
+Invalidation is per school: every flush that touches schedules, enrollments,
+subjects, classrooms or slots bumps ``timetable_generations.generation`` for the
+affected schools in the same transaction. Bulk writes to those tables should be
+Core statements on the table followed by ``invalidate_schools(conn, [school_id])``;
+an ORM bulk UPDATE/DELETE cannot name its schools, so it bumps every school and
+logs a warning. A timetable whose generation is behind is rebuilt on
+the next read, so an unchanged timetable costs one indexed lookup (and answers
+304 when the client sends a matching If-None-Match). Owners without a school can
+follow any school's schedules, so their timetables are built on every read
+instead of being materialized; a school's writes only touch its own counter row.
+
+Materialization writes (generation rows, rebuilt entries) go through their own
+session and commit there: reads may happen inside a write endpoint, whose
+transaction must not be committed early.
+"""
+import hashlib
+import json
+import logging
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import event, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from database.connection import SessionLocal
+from models.classroom import Classroom as ClassroomModel, ClassroomStudent as ClassroomStudentModel
+from models.classroom_subject import ClassroomSubject as ClassroomSubjectModel
+from models.schedule import ScheduleSlot as ScheduleSlotModel, SubjectSchedule as SubjectScheduleModel
+from models.subject import Subject as SubjectModel
+from models.subject_student import SubjectStudent as SubjectStudentModel
+from models.timetable import TimetableEntry, TimetableGeneration, TimetableState
+from models.user import User as UserModel
+from utils.schedule_conflicts import normalize_day
+
+logger = logging.getLogger("web_tdk.timetable")
+
+OWNER_TYPES = ('student', 'teacher', 'classroom')
+UNKNOWN_DAY = 7
+
+
+def day_index(value) -> int:
+    """0=Sunday .. 6=Saturday (see utils.schedule_conflicts.normalize_day); 7 sorts unknown days last."""
+    day = normalize_day(value)
+    return UNKNOWN_DAY if day is None else day
+
+
+# ---------------------------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------------------------
+
+# attributes whose change affects a timetable; None = any change
+_WATCHED = {
+    SubjectScheduleModel: None,
+    ScheduleSlotModel: None,
+    ClassroomSubjectModel: None,
+    SubjectStudentModel: None,
+    ClassroomStudentModel: None,
+    SubjectModel: ('name', 'code', 'school_id'),
+    ClassroomModel: ('name', 'school_id'),
+    UserModel: ('full_name', 'username', 'school_id'),
+}
+
+
+def _values(state, attr: str) -> set:
+    """Current and pre-flush values of ``attr`` without triggering a load."""
+    if attr not in state.mapper.attrs:
+        return set()
+    history = state.attrs[attr].history
+    return {v for v in chain(history.added or (), history.unchanged or (), history.deleted or ()) if v is not None}
+
+
+def _changed(state, attrs) -> bool:
+    return any(state.attrs[a].history.has_changes() for a in attrs)
+
+
+def invalidate_schools(connection, school_ids: Optional[Iterable[int]] = None):
+    """Mark timetables of ``school_ids`` (None = every school) as stale, inside the caller's transaction."""
+    table = TimetableGeneration.__table__
+    stmt = update(table).values(generation=table.c.generation + 1)
+    if school_ids is not None:
+        keys = {int(s) for s in school_ids}
+        if not keys:
+            return
+        stmt = stmt.where(table.c.school_key.in_(keys))
+    connection.execute(stmt)
+
+
+def _after_flush(session: Session, flush_context):
+    school_ids, subject_ids, classroom_ids = set(), set(), set()
+    found = False
+    for category, objs in (('new', session.new), ('dirty', session.dirty), ('deleted', session.deleted)):
+        for obj in objs:
+            attrs = _WATCHED.get(type(obj), False)
+            if attrs is False or (category == 'new' and type(obj) is UserModel):
+                continue  # not timetable data; a new user has no schedules yet
+            state = inspect(obj)
+            if category == 'dirty' and attrs is not None and not _changed(state, attrs):
+                continue
+            found = True
+            if type(obj) in (SubjectModel, ClassroomModel, ScheduleSlotModel, UserModel):
+                school_ids |= _values(state, 'school_id')
+            subject_ids |= _values(state, 'subject_id')
+            classroom_ids |= _values(state, 'classroom_id')
+    if not found:
+        return
+    connection = session.connection()
+    if subject_ids:
+        school_ids |= set(connection.execute(
+            select(SubjectModel.__table__.c.school_id).where(SubjectModel.__table__.c.id.in_(subject_ids))
+        ).scalars())
+    if classroom_ids:
+        school_ids |= set(connection.execute(
+            select(ClassroomModel.__table__.c.school_id).where(ClassroomModel.__table__.c.id.in_(classroom_ids))
+        ).scalars())
+    invalidate_schools(connection, {s for s in school_ids if s is not None})
+
+
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    cls = mapper.class_ if mapper is not None else None
+    if cls not in _WATCHED or (cls is UserModel and orm_execute_state.is_insert):
+        return
+    # the WHERE clause of a bulk statement is not evaluated here, so every school is invalidated
+    # (and every school's counter row stays locked until the caller commits)
+    logger.warning("ORM bulk %s on %s invalidates every school's timetables; use a Core statement "
+                   "and invalidate_schools() instead",
+                   'UPDATE' if orm_execute_state.is_update else 'DELETE' if orm_execute_state.is_delete else 'INSERT',
+                   cls.__tablename__)
+    invalidate_schools(orm_execute_state.session.connection())
+
+
+event.listen(Session, 'after_flush', _after_flush)
+event.listen(Session, 'do_orm_execute', _do_orm_execute)
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+def _schedule_rows(db: Session, *conditions):
+    teacher = aliased(UserModel)
+    return (
+        db.query(
+            SubjectScheduleModel.id, SubjectScheduleModel.subject_id, SubjectScheduleModel.teacher_id,
+            SubjectScheduleModel.classroom_id, SubjectScheduleModel.schedule_slot_id,
+            SubjectScheduleModel.day_of_week, SubjectScheduleModel.start_time, SubjectScheduleModel.end_time,
+            SubjectModel.name.label('subject_name'), SubjectModel.code.label('subject_code'),
+            teacher.full_name.label('teacher_full_name'), teacher.username.label('teacher_username'),
+            ClassroomModel.name.label('classroom_name'),
+            ScheduleSlotModel.day_of_week.label('slot_day_of_week'),
+            ScheduleSlotModel.start_time.label('slot_start_time'),
+            ScheduleSlotModel.end_time.label('slot_end_time'),
+        )
+        .outerjoin(SubjectModel, SubjectModel.id == SubjectScheduleModel.subject_id)
+        .outerjoin(teacher, teacher.id == SubjectScheduleModel.teacher_id)
+        .outerjoin(ClassroomModel, ClassroomModel.id == SubjectScheduleModel.classroom_id)
+        .outerjoin(ScheduleSlotModel, ScheduleSlotModel.id == SubjectScheduleModel.schedule_slot_id)
+        .filter(*conditions)
+        .all()
+    )
+
+
+def _active_classroom_id(db: Session, student_id: int) -> Optional[int]:
+    row = db.query(ClassroomStudentModel.classroom_id).filter(
+        ClassroomStudentModel.student_id == student_id,
+        ClassroomStudentModel.is_active == True
+    ).order_by(ClassroomStudentModel.id).first()
+    return row[0] if row else None
+
+
+def _owner_rows(db: Session, owner_type: str, owner_id: int):
+    if owner_type == 'teacher':
+        return _schedule_rows(db, SubjectScheduleModel.teacher_id == owner_id)
+
+    if owner_type == 'classroom':
+        classroom_subjects = select(ClassroomSubjectModel.subject_id).where(ClassroomSubjectModel.classroom_id == owner_id)
+        return _schedule_rows(db, or_(
+            SubjectScheduleModel.classroom_id == owner_id,
+            (SubjectScheduleModel.classroom_id == None) & SubjectScheduleModel.subject_id.in_(classroom_subjects),
+        ))
+
+    # student: direct enrollments plus the subjects of the active classroom,
+    # scheduled for every classroom or for the student's own
+    classroom_id = _active_classroom_id(db, owner_id)
+    subject_ids = select(SubjectStudentModel.subject_id).where(SubjectStudentModel.student_id == owner_id)
+    if classroom_id:
+        subject_ids = subject_ids.union(
+            select(ClassroomSubjectModel.subject_id).where(ClassroomSubjectModel.classroom_id == classroom_id))
+    classroom_condition = SubjectScheduleModel.classroom_id == None
+    if classroom_id:
+        classroom_condition = or_(classroom_condition, SubjectScheduleModel.classroom_id == classroom_id)
+    return _schedule_rows(db, SubjectScheduleModel.subject_id.in_(subject_ids), classroom_condition)
+
+
+def _entry(owner_type: str, owner_id: int, row) -> dict:
+    return {
+        'owner_type': owner_type,
+        'owner_id': owner_id,
+        'subject_schedule_id': row.id,
+        'subject_id': row.subject_id,
+        'subject_name': row.subject_name,
+        'subject_code': row.subject_code,
+        'teacher_id': row.teacher_id,
+        'teacher_name': row.teacher_full_name or row.teacher_username,
+        'classroom_id': row.classroom_id,
+        'classroom_name': row.classroom_name,
+        'schedule_slot_id': row.schedule_slot_id if row.slot_day_of_week is not None else None,
+        'day_of_week': row.day_of_week,
+        'start_time': row.start_time,
+        'end_time': row.end_time,
+        'slot_day_of_week': row.slot_day_of_week,
+        'slot_start_time': row.slot_start_time,
+        'slot_end_time': row.slot_end_time,
+    }
+
+
+def _sort_key(entry: dict):
+    start = effective_time(entry)['start_time']
+    return (entry['day_index'], start is None, start or 0, entry['subject_schedule_id'])
+
+
+def _etag(entries: List[dict]) -> str:
+    payload = json.dumps(
+        [[e[k] for k in sorted(e) if k not in ('owner_type', 'owner_id')] for e in entries],
+        default=str, ensure_ascii=False, separators=(',', ':'),
+    )
+    return '"' + hashlib.sha1(payload.encode('utf-8')).hexdigest() + '"'
+
+
+def school_generation(db: Session, school_key: int) -> int:
+    """Current timetable generation of a school, created on first use."""
+    generation = db.query(TimetableGeneration.generation).filter(TimetableGeneration.school_key == school_key).scalar()
+    if generation is not None:
+        return generation
+    own = SessionLocal()
+    try:
+        try:
+            own.add(TimetableGeneration(school_key=school_key, generation=0))
+            own.commit()
+        except IntegrityError:
+            own.rollback()  # created concurrently
+        # read back here: ``db`` may still see its snapshot from before the insert
+        return own.query(TimetableGeneration.generation).filter(TimetableGeneration.school_key == school_key).scalar()
+    finally:
+        own.close()
+
+
+def build(db: Session, owner_type: str, owner_id: int) -> Tuple[str, List[dict]]:
+    """Compute one owner's timetable from ``db`` without storing it; returns (etag, entries)."""
+    entries = [_entry(owner_type, owner_id, r) for r in _owner_rows(db, owner_type, owner_id)]
+    for entry in entries:
+        entry['day_index'] = day_index(effective_time(entry)['day_of_week'])
+    entries.sort(key=_sort_key)
+    return _etag(entries), entries
+
+
+def rebuild(db: Session, owner_type: str, owner_id: int, school_id: int) -> Tuple[str, List[dict]]:
+    """Recompute one owner's timetable from ``db`` and store it; returns (etag, entries)."""
+    # read the generation before the source rows: a change committed in between
+    # leaves this build one generation behind, so it is simply rebuilt again
+    generation = school_generation(db, school_id)
+    etag, entries = build(db, owner_type, owner_id)
+    own = SessionLocal()
+    try:
+        own.query(TimetableEntry).filter(
+            TimetableEntry.owner_type == owner_type, TimetableEntry.owner_id == owner_id
+        ).delete(synchronize_session=False)
+        if entries:
+            own.bulk_insert_mappings(TimetableEntry, entries)
+        state = own.get(TimetableState, (owner_type, owner_id))
+        if state is None:
+            own.add(TimetableState(owner_type=owner_type, owner_id=owner_id, school_key=school_id,
+                                   generation=generation, etag=etag))
+        else:
+            state.school_key = school_id
+            state.generation = generation
+            state.etag = etag
+        own.commit()
+    except IntegrityError:
+        # another request stored the same timetable first; serve what was computed
+        own.rollback()
+    finally:
+        own.close()
+    return etag, entries
+
+
+def _load(db: Session, owner_type: str, owner_id: int) -> List[dict]:
+    columns = [c for c in TimetableEntry.__table__.columns if c.name != 'id']
+    rows = db.query(*columns).filter(
+        TimetableEntry.owner_type == owner_type, TimetableEntry.owner_id == owner_id
+    ).order_by(TimetableEntry.id).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def _fresh_etag(db: Session, owner_type: str, owner_id: int, school_id: Optional[int]) -> Optional[str]:
+    row = db.query(TimetableState.etag, TimetableState.school_key, TimetableState.generation,
+                   TimetableGeneration.generation).outerjoin(
+        TimetableGeneration, TimetableGeneration.school_key == TimetableState.school_key
+    ).filter(TimetableState.owner_type == owner_type, TimetableState.owner_id == owner_id).first()
+    if row is None or row[1] != school_id or row[3] is None or row[2] != row[3]:
+        return None
+    return row[0]
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match lists ``etag`` (weak comparison) or is ``*``."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+
+def get_timetable(db: Session, request: Request, response: Response, owner_type: str, owner_id: int,
+                  school_id: Optional[int]) -> Optional[List[dict]]:
+    """Entries of one owner's weekly timetable (ordered by day, then time).
+
+    Sets ETag/Cache-Control on ``response``. Returns None when the client's
+    If-None-Match is still current; the caller then answers ``not_modified``.
+    """
+    etag = _fresh_etag(db, owner_type, owner_id, school_id) if school_id is not None else None
+    if etag is not None:
+        if etag_matches(request, etag):
+            response.headers['ETag'] = etag
+            return None
+        entries = _load(db, owner_type, owner_id)
+    else:
+        etag, entries = (rebuild(db, owner_type, owner_id, school_id) if school_id is not None
+                         else build(db, owner_type, owner_id))
+        if etag_matches(request, etag):
+            response.headers['ETag'] = etag
+            return None
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return entries
+
+
+def not_modified(response: Response) -> Response:
+    return Response(status_code=304, headers={'ETag': response.headers['ETag'], 'Cache-Control': 'private, no-cache'})
+
+
+def effective_time(entry: dict) -> dict:
+    """Day/time of an entry preferring its ScheduleSlot, as the student and /subjects views show it."""
+    if entry['schedule_slot_id'] is not None:
+        return {'day_of_week': entry['slot_day_of_week'], 'start_time': entry['slot_start_time'],
+                'end_time': entry['slot_end_time']}
+    return {'day_of_week': entry['day_of_week'], 'start_time': entry['start_time'], 'end_time': entry['end_time']}
@@ -0,0 +1,424 @@
+"""Weekly timetable generator for a set of classrooms (pure Python, in-process).
+
+``build_problem`` turns the school's data into a ``Problem``:
+- periods: every ScheduleSlot (operating hours) cut into periods of ``period_minutes``;
+- lessons: per ClassroomSubject link, credits x ``periods_per_credit`` lessons (1 without
+  credits), taught by the teacher assigned to that subject and classroom;
+- teacher availability: periods overlapping the teacher's assignments in other
+  classrooms, plus explicitly blocked times, are excluded.
+
+``solve`` places every lesson in a period with a greedy most-constrained-first pass. It
+then repairs the result with a min-conflicts local search (move a conflicting lesson,
+or swap it with another lesson of its classroom; short tabu list, some random walk)
+until no classroom or teacher is double-booked and the time budget allows no
+further improvement. Soft cost: the same subject more often per day than needed to
+spread it over the week.
+"""
+import math
+import os
+import random
+import time as _time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from models.classroom import Classroom as ClassroomModel
+from models.classroom_subject import ClassroomSubject as ClassroomSubjectModel
+from models.schedule import ScheduleSlot as ScheduleSlotModel, SubjectSchedule as SubjectScheduleModel
+from models.subject import Subject as SubjectModel
+from models.user import User as UserModel
+from utils.schedule_conflicts import normalize_day
+
+# upper bound for the time budget a request may ask for
+MAX_TIME_BUDGET = float(os.getenv("TIMETABLE_MAX_BUDGET_SECONDS", "30"))
+
+HARD_WEIGHT = 1000
+TABU_TENURE = 10
+RANDOM_WALK = 0.05
+# stop polishing the soft cost after this many iterations without improvement
+STALL_ITERATIONS = 3000
+
+
+@dataclass
+class Period:
+    day: int
+    start: time
+    end: time
+    slot_id: Optional[int] = None
+
+
+@dataclass
+class Lesson:
+    classroom_id: int
+    subject_id: int
+    teacher_id: int
+
+
+@dataclass
+class Problem:
+    periods: List[Period]
+    lessons: List[Lesson]
+    # teacher_id -> period indexes the teacher cannot take
+    teacher_unavailable: Dict[int, Set[int]] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+    # display names, filled by build_problem
+    names: Dict[str, dict] = field(default_factory=dict)
+
+
+@dataclass
+class Solution:
+    assignment: List[Optional[int]]  # period index per lesson, None = could not be placed
+    hard_conflicts: int
+    soft_cost: int
+    iterations: int
+    elapsed: float
+
+    @property
+    def complete(self) -> bool:
+        return all(p is not None for p in self.assignment)
+
+
+def _overlaps(a_start, a_end, b_start, b_end) -> bool:
+    return a_start < b_end and b_start < a_end
+
+
+def slot_periods(slots: Iterable[Tuple[int, int, time, time]], period_minutes: int) -> List[Period]:
+    """Cut (slot_id, day, start, end) operating hours into consecutive periods, ordered by day and time."""
+    periods = []
+    step = timedelta(minutes=period_minutes)
+    for slot_id, day, start, end in slots:
+        if day is None:
+            continue
+        cursor = datetime.combine(datetime.min, start)
+        limit = datetime.combine(datetime.min, end)
+        while cursor + step <= limit:
+            periods.append(Period(day=day, start=cursor.time(), end=(cursor + step).time(), slot_id=slot_id))
+            cursor += step
+    periods.sort(key=lambda p: (p.day, p.start))
+    return periods
+
+
+class _State:
+    """Incremental counts of one assignment: classroom/teacher per period and subject per day."""
+
+    def __init__(self, problem: Problem):
+        self.problem = problem
+        lessons = problem.lessons
+        self.day_of = [p.day for p in problem.periods]
+        self.assign: List[Optional[int]] = [None] * len(lessons)
+        self.class_cells = defaultdict(list)  # (classroom, period) -> lesson indexes
+        self.teacher_cells = defaultdict(int)  # (teacher, period) -> count
+        self.day_cells = defaultdict(int)  # (classroom, subject, day) -> count
+        days = len(set(self.day_of)) or 1
+        required = defaultdict(int)
+        for l in lessons:
+            required[(l.classroom_id, l.subject_id)] += 1
+        # a subject needing n periods a week should appear at most ceil(n / days) times a day
+        self.day_limit = {k: math.ceil(n / days) for k, n in required.items()}
+        self.domains = []
+        for l in lessons:
+            blocked = problem.teacher_unavailable.get(l.teacher_id, ())
+            self.domains.append([p for p in range(len(problem.periods)) if p not in blocked])
+        self.hard = 0
+        self.soft = 0
+
+    # cost of the cells touched by a lesson, as (hard, soft)
+    def _cells_cost(self, l: Lesson, p: int) -> Tuple[int, int]:
+        return (max(0, len(self.class_cells[(l.classroom_id, p)]) - 1) + max(0, self.teacher_cells[(l.teacher_id, p)] - 1),
+                max(0, self.day_cells[(l.classroom_id, l.subject_id, self.day_of[p])]
+                    - self.day_limit[(l.classroom_id, l.subject_id)]))
+
+    def place(self, i: int, p: int):
+        l = self.problem.lessons[i]
+        hard, soft = self._cells_cost(l, p)
+        self.class_cells[(l.classroom_id, p)].append(i)
+        self.teacher_cells[(l.teacher_id, p)] += 1
+        self.day_cells[(l.classroom_id, l.subject_id, self.day_of[p])] += 1
+        new_hard, new_soft = self._cells_cost(l, p)
+        self.hard += new_hard - hard
+        self.soft += new_soft - soft
+        self.assign[i] = p
+
+    def remove(self, i: int):
+        p = self.assign[i]
+        l = self.problem.lessons[i]
+        hard, soft = self._cells_cost(l, p)
+        self.class_cells[(l.classroom_id, p)].remove(i)
+        self.teacher_cells[(l.teacher_id, p)] -= 1
+        self.day_cells[(l.classroom_id, l.subject_id, self.day_of[p])] -= 1
+        new_hard, new_soft = self._cells_cost(l, p)
+        self.hard += new_hard - hard
+        self.soft += new_soft - soft
+        self.assign[i] = None
+
+    def score(self) -> int:
+        return self.hard * HARD_WEIGHT + self.soft
+
+    def move_delta(self, i: int, p: int) -> int:
+        before = self.score()
+        old = self.assign[i]
+        self.remove(i)
+        self.place(i, p)
+        delta = self.score() - before
+        self.remove(i)
+        self.place(i, old)
+        return delta
+
+    def swap(self, i: int, j: int):
+        pi, pj = self.assign[i], self.assign[j]
+        self.remove(i)
+        self.remove(j)
+        self.place(i, pj)
+        self.place(j, pi)
+
+    def swap_delta(self, i: int, j: int) -> int:
+        before = self.score()
+        self.swap(i, j)
+        delta = self.score() - before
+        self.swap(i, j)
+        return delta
+
+    def conflicted(self) -> List[int]:
+        lessons = self.problem.lessons
+        return [i for i, p in enumerate(self.assign)
+                if p is not None and (len(self.class_cells[(lessons[i].classroom_id, p)]) > 1
+                or self.teacher_cells[(lessons[i].teacher_id, p)] > 1)]
+
+
+def _greedy(state: _State, rng: random.Random):
+    lessons = state.problem.lessons
+    load = defaultdict(int)
+    for l in lessons:
+        load[l.teacher_id] += 1
+    order = sorted(range(len(lessons)), key=lambda i: (len(state.domains[i]), -load[lessons[i].teacher_id], rng.random()))
+    for i in order:
+        domain = state.domains[i]
+        if not domain:
+            continue  # the teacher has no free period: stays unscheduled
+        best, best_cost = [], None
+        l = lessons[i]
+        for p in domain:
+            cost = ((len(state.class_cells[(l.classroom_id, p)]) + state.teacher_cells[(l.teacher_id, p)]) * HARD_WEIGHT
+                    + state.day_cells[(l.classroom_id, l.subject_id, state.day_of[p])])
+            if best_cost is None or cost < best_cost:
+                best, best_cost = [p], cost
+            elif cost == best_cost:
+                best.append(p)
+        state.place(i, rng.choice(best))
+
+
+def solve(problem: Problem, time_budget: float = 5.0, seed: Optional[int] = None) -> Solution:
+    """Assign a period to every lesson within ``time_budget`` seconds.
+
+    Lessons still double-booked in the best assignment found are returned as None.
+    """
+    started = _time.monotonic()
+    deadline = started + max(time_budget, 0)
+    rng = random.Random(seed)
+    if not problem.lessons or not problem.periods:
+        return Solution([None] * len(problem.lessons), 0, 0, 0, 0.0)
+
+    state = _State(problem)
+    _greedy(state, rng)
+    best = (state.score(), list(state.assign))
+    lessons = problem.lessons
+    tabu = {}
+    iterations = stall = 0
+    while _time.monotonic() < deadline:
+        if state.hard == 0 and (state.soft == 0 or stall >= STALL_ITERATIONS):
+            break
+        iterations += 1
+        conflicted = state.conflicted() if state.hard else []
+        if conflicted:
+            i = rng.choice(conflicted)
+        else:
+            # no hard conflicts left: work on lessons over their per-day limit
+            over = [k for k, p in enumerate(state.assign)
+                    if p is not None and state.day_cells[(lessons[k].classroom_id, lessons[k].subject_id, state.day_of[p])]
+                    > state.day_limit[(lessons[k].classroom_id, lessons[k].subject_id)]]
+            i = rng.choice(over) if over else rng.randrange(len(lessons))
+        l = lessons[i]
+        current = state.assign[i]
+        domain = state.domains[i]
+        if not domain:
+            stall += 1
+            continue
+        if rng.random() < RANDOM_WALK:
+            p = rng.choice(domain)
+            if p != current:
+                state.remove(i)
+                state.place(i, p)
+        else:
+            candidates, best_delta = [], None
+            for p in domain:
+                if p == current:
+                    continue
+                occupants = state.class_cells[(l.classroom_id, p)]
+                if len(occupants) == 1 and current in state.domains[occupants[0]]:
+                    j = occupants[0]
+                    move, delta = ('swap', j, p), state.swap_delta(i, j)
+                else:
+                    move, delta = ('move', None, p), state.move_delta(i, p)
+                if tabu.get((i, p), 0) > iterations and state.score() + delta >= best[0]:
+                    continue
+                if best_delta is None or delta < best_delta:
+                    candidates, best_delta = [move], delta
+                elif delta == best_delta:
+                    candidates.append(move)
+            if not candidates:
+                stall += 1
+                continue
+            kind, j, p = rng.choice(candidates)
+            if kind == 'swap':
+                state.swap(i, j)
+                tabu[(j, p)] = iterations + TABU_TENURE
+            else:
+                state.remove(i)
+                state.place(i, p)
+            tabu[(i, current)] = iterations + TABU_TENURE
+        if state.score() < best[0]:
+            best = (state.score(), list(state.assign))
+            stall = 0
+        else:
+            stall += 1
+
+    # restore the best assignment and drop lessons that are still double-booked
+    state = _State(problem)
+    for i, p in enumerate(best[1]):
+        if p is not None:
+            state.place(i, p)
+    while state.hard:
+        state.remove(state.conflicted()[0])
+    return Solution(state.assign, state.hard, state.soft, iterations, _time.monotonic() - started)
+
+
+def build_problem(db: Session, school_id: int, classroom_ids: Optional[List[int]] = None,
+                  period_minutes: int = 60, periods_per_credit: int = 2,
+                  teacher_unavailable: Iterable = ()) -> Problem:
+    """Load periods, lessons and teacher availability of ``classroom_ids`` (default: all active classrooms)."""
+    if period_minutes <= 0 or periods_per_credit <= 0:
+        raise ValueError('period_minutes and periods_per_credit must be positive')
+    query = db.query(ClassroomModel.id, ClassroomModel.name).filter(
+        ClassroomModel.school_id == school_id, ClassroomModel.is_active == True)
+    if classroom_ids:
+        query = query.filter(ClassroomModel.id.in_(classroom_ids))
+    classrooms = dict(query.all())
+    if classroom_ids:
+        missing = set(classroom_ids) - set(classrooms)
+        if missing:
+            raise ValueError(f'Classrooms not found in your school: {sorted(missing)}')
+    warnings = []
+    if not classrooms:
+        return Problem(periods=[], lessons=[], warnings=['No active classrooms to schedule'])
+
+    periods = slot_periods(
+        ((sid, normalize_day(day), start, end) for sid, day, start, end in db.query(
+            ScheduleSlotModel.id, ScheduleSlotModel.day_of_week, ScheduleSlotModel.start_time, ScheduleSlotModel.end_time
+        ).filter(ScheduleSlotModel.school_id == school_id)),
+        period_minutes)
+    if not periods:
+        warnings.append('No operating hours (schedule slots) long enough for one period')
+
+    links = db.query(
+        ClassroomSubjectModel.classroom_id, SubjectModel.id, SubjectModel.name, SubjectModel.credits, SubjectModel.teacher_id
+    ).join(SubjectModel, SubjectModel.id == ClassroomSubjectModel.subject_id).filter(
+        ClassroomSubjectModel.classroom_id.in_(list(classrooms)),
+        or_(SubjectModel.is_ended == None, SubjectModel.is_ended == False)
+    ).order_by(ClassroomSubjectModel.classroom_id, SubjectModel.id).all()
+    subject_ids = {link[1] for link in links}
+
+    # teacher of (subject, classroom): a teacher assignment for that classroom,
+    # else one for all classrooms, else the subject's own teacher
+    assigned = {}
+    for subject_id, classroom_id, teacher_id, is_ended in (db.query(
+        SubjectScheduleModel.subject_id, SubjectScheduleModel.classroom_id,
+        SubjectScheduleModel.teacher_id, SubjectScheduleModel.is_ended
+    ).filter(SubjectScheduleModel.subject_id.in_(subject_ids)).order_by(SubjectScheduleModel.id) if subject_ids else ()):
+        key = (subject_id, classroom_id)
+        if key not in assigned or (assigned[key][1] and not is_ended):
+            assigned[key] = (teacher_id, bool(is_ended))
+
+    lessons, subject_names = [], {}
+    per_classroom = defaultdict(int)
+    for classroom_id, subject_id, name, credits, subject_teacher in links:
+        subject_names[subject_id] = name
+        teacher = assigned.get((subject_id, classroom_id)) or assigned.get((subject_id, None))
+        teacher_id = teacher[0] if teacher else subject_teacher
+        if teacher_id is None:
+            warnings.append(f'{classrooms[classroom_id]}: subject "{name}" has no teacher, skipped')
+            continue
+        count = credits * periods_per_credit if credits else 1
+        per_classroom[classroom_id] += count
+        lessons.extend(Lesson(classroom_id, subject_id, teacher_id) for _ in range(count))
+    for classroom_id, count in per_classroom.items():
+        if count > len(periods):
+            warnings.append(f'{classrooms[classroom_id]} needs {count} periods but the week has only {len(periods)}')
+
+    # periods a teacher is already busy elsewhere, or asked to keep free
+    teachers = {l.teacher_id for l in lessons}
+    busy = defaultdict(list)
+    if teachers:
+        for teacher_id, classroom_id, day, start, end in db.query(
+            SubjectScheduleModel.teacher_id, SubjectScheduleModel.classroom_id, SubjectScheduleModel.day_of_week,
+            SubjectScheduleModel.start_time, SubjectScheduleModel.end_time
+        ).filter(SubjectScheduleModel.teacher_id.in_(teachers), SubjectScheduleModel.start_time != None):
+            if classroom_id is None or classroom_id not in classrooms:
+                busy[teacher_id].append((normalize_day(day), start, end))
+    for block in teacher_unavailable:
+        busy[block.teacher_id].append((normalize_day(block.day_of_week), block.start_time, block.end_time))
+    unavailable = {}
+    for teacher_id, blocks in busy.items():
+        unavailable[teacher_id] = {i for i, p in enumerate(periods)
+                                   if any(day == p.day and _overlaps(start, end, p.start, p.end) for day, start, end in blocks)}
+
+    teacher_names = {}
+    if teachers:
+        teacher_names = {tid: full_name or username for tid, full_name, username in db.query(
+            UserModel.id, UserModel.full_name, UserModel.username).filter(UserModel.id.in_(teachers))}
+    return Problem(periods=periods, lessons=lessons, teacher_unavailable=unavailable, warnings=warnings,
+                   names={'classroom': classrooms, 'subject': subject_names, 'teacher': teacher_names})
+
+
+def solution_rows(problem: Problem, solution: Solution) -> Tuple[List[dict], List[dict]]:
+    """(rows, unscheduled): placed lessons as /schedule/import rows, back-to-back periods of a lesson merged."""
+    placed = defaultdict(list)
+    unscheduled = defaultdict(int)
+    for lesson, p in zip(problem.lessons, solution.assignment):
+        key = (lesson.classroom_id, lesson.subject_id, lesson.teacher_id)
+        if p is None:
+            unscheduled[key] += 1
+        else:
+            placed[key].append(problem.periods[p])
+    names = problem.names
+    rows = []
+    for (classroom_id, subject_id, teacher_id), periods in placed.items():
+        periods.sort(key=lambda p: (p.day, p.start))
+        merged = []
+        for p in periods:
+            last = merged[-1] if merged else None
+            if last and last.day == p.day and last.end == p.start and last.slot_id == p.slot_id:
+                merged[-1] = Period(last.day, last.start, p.end, last.slot_id)
+            else:
+                merged.append(p)
+        for p in merged:
+            rows.append({
+                'subject_id': subject_id,
+                'subject_name': names.get('subject', {}).get(subject_id),
+                'teacher_id': teacher_id,
+                'teacher_name': names.get('teacher', {}).get(teacher_id),
+                'classroom_id': classroom_id,
+                'classroom_name': names.get('classroom', {}).get(classroom_id),
+                'day_of_week': str(p.day),
+                'start_time': p.start,
+                'end_time': p.end,
+                'schedule_slot_id': p.slot_id,
+            })
+    rows.sort(key=lambda r: (r['classroom_id'], r['day_of_week'], r['start_time']))
+    missing = [{'classroom_id': c, 'classroom_name': names.get('classroom', {}).get(c),
+                'subject_id': s, 'subject_name': names.get('subject', {}).get(s),
+                'teacher_id': t, 'periods': n} for (c, s, t), n in unscheduled.items()]
+    return rows, missing
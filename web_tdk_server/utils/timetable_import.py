@@ -0,0 +1,307 @@
+"""Bulk timetable import (JSON rows or an .xlsx sheet), validated in memory and applied atomically.
+
+``plan_import`` resolves every row's subject, teacher and classroom from three
+queries and diffs the rows against the school's existing assignments. It checks
+the rows against operating hours and overlaps with utils.schedule_conflicts,
+without writing anything. ``apply_plan`` then writes the whole diff in one
+transaction, or nothing if any row has an error or conflict.
+
+Modes:
+- ``merge``: add the rows that do not exist yet; other assignments are kept.
+- ``replace``: also delete the existing timed assignments of every classroom named
+  in the import that the import does not contain (teacher assignments without a
+  day and time are kept).
+"""
+from dataclasses import dataclass
+from datetime import datetime, time
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.classroom import Classroom as ClassroomModel
+from models.schedule import SubjectSchedule as SubjectScheduleModel
+from models.subject import Subject as SubjectModel
+from models.user import User as UserModel
+from utils.schedule_conflicts import day_key, find_conflicts, school_index
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+IMPORT_MODES = ('merge', 'replace')
+SHEET_COLUMNS = ['subject_id', 'subject_code', 'teacher_id', 'teacher_username', 'classroom_id',
+                 'classroom_name', 'day_of_week', 'start_time', 'end_time', 'schedule_slot_id']
+
+
+class TimetableFileError(ValueError):
+    """The uploaded sheet is unusable (not an xlsx, missing columns, no data rows)."""
+
+
+@dataclass
+class PlannedRow:
+    row: int
+    subject_id: int
+    teacher_id: int
+    classroom_id: Optional[int]
+    schedule_slot_id: Optional[int]
+    day_of_week: str
+    start_time: time
+    end_time: time
+    id: Optional[int] = None  # existing identical assignment, if any
+
+
+def parse_time(value) -> Optional[time]:
+    """time from a time/datetime cell, an Excel day fraction or 'HH:MM[:SS]'."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, time):
+        return value
+    if isinstance(value, (int, float)) and 0 <= value < 1:
+        seconds = round(value * 24 * 3600)
+        return time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+    try:
+        return time.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def read_sheet(path: str) -> List[Tuple[int, dict]]:
+    """(sheet row number, row dict) for every non-empty data row of the first sheet."""
+    if openpyxl is None:
+        raise TimetableFileError('Server missing openpyxl dependency')
+    try:
+        wb = openpyxl.load_workbook(filename=path, read_only=True, data_only=True)
+    except Exception as e:
+        raise TimetableFileError(f'Failed to read Excel file: {str(e)}')
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip().lower() if h is not None else '' for h in (next(rows, None) or ())]
+        for required in ('day_of_week', 'start_time', 'end_time'):
+            if required not in header:
+                raise TimetableFileError(f'ขาดคอลัมน์ที่จำเป็น: {required}')
+        if 'subject_id' not in header and 'subject_code' not in header:
+            raise TimetableFileError('ขาดคอลัมน์ที่จำเป็น: subject_id หรือ subject_code')
+        result = []
+        for row_no, row in enumerate(rows, start=2):
+            if not row or all(v is None or str(v).strip() == '' for v in row):
+                continue
+            result.append((row_no, {name: row[i] for i, name in enumerate(header)
+                                    if name in SHEET_COLUMNS and i < len(row)}))
+    finally:
+        wb.close()
+    if not result:
+        raise TimetableFileError('Excel file must contain a header row and at least one data row')
+    return result
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None and str(value).strip() != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _Lookup:
+    """Subjects, teachers and classrooms of a school, by id and by code/username/name."""
+
+    def __init__(self, db: Session, school_id: int):
+        self.subjects = {s.id: s for s in db.query(
+            SubjectModel.id, SubjectModel.name, SubjectModel.code, SubjectModel.teacher_id
+        ).filter(SubjectModel.school_id == school_id)}
+        self.teachers = {t.id: t for t in db.query(
+            UserModel.id, UserModel.username, UserModel.full_name
+        ).filter(UserModel.school_id == school_id, UserModel.role == 'teacher')}
+        self.classrooms = {c.id: c for c in db.query(
+            ClassroomModel.id, ClassroomModel.name
+        ).filter(ClassroomModel.school_id == school_id, ClassroomModel.is_active == True)}
+        self.subject_codes = self._by(self.subjects.values(), 'code')
+        self.usernames = self._by(self.teachers.values(), 'username')
+        self.classroom_names = self._by(self.classrooms.values(), 'name')
+
+    @staticmethod
+    def _by(rows, attr):
+        index = {}
+        for r in rows:
+            key = getattr(r, attr)
+            if key:
+                index.setdefault(str(key).strip().lower(), []).append(r.id)
+        return index
+
+    @staticmethod
+    def resolve(by_id, by_name, raw_id, raw_name, what):
+        """(id, error message)"""
+        if raw_id is not None:
+            if raw_id in by_id:
+                return raw_id, None
+            return None, f'{what} {raw_id} not found in your school'
+        if raw_name is None:
+            return None, None
+        ids = by_name.get(raw_name.lower(), [])
+        if len(ids) == 1:
+            return ids[0], None
+        if not ids:
+            return None, f'{what} "{raw_name}" not found in your school'
+        return None, f'{what} "{raw_name}" is ambiguous, use its id'
+
+
+def _resolve_row(lookup: _Lookup, row_no: int, raw: dict):
+    """(PlannedRow, None) or (None, error message)"""
+    subject_id, error = lookup.resolve(lookup.subjects, lookup.subject_codes,
+                                       _int(raw.get('subject_id')), _text(raw.get('subject_code')), 'Subject')
+    if error or subject_id is None:
+        return None, error or 'subject_id or subject_code is required'
+    teacher_id, error = lookup.resolve(lookup.teachers, lookup.usernames,
+                                       _int(raw.get('teacher_id')), _text(raw.get('teacher_username')), 'Teacher')
+    if error:
+        return None, error
+    if teacher_id is None:
+        # default to the subject's own teacher
+        teacher_id = lookup.subjects[subject_id].teacher_id
+        if teacher_id is None:
+            return None, 'teacher_id or teacher_username is required (the subject has no teacher)'
+    classroom_id, error = lookup.resolve(lookup.classrooms, lookup.classroom_names,
+                                         _int(raw.get('classroom_id')), _text(raw.get('classroom_name')), 'Classroom')
+    if error:
+        return None, error
+    day = day_key(raw.get('day_of_week'))
+    if day is None:
+        return None, f'Invalid day_of_week: {raw.get("day_of_week")}'
+    start, end = parse_time(raw.get('start_time')), parse_time(raw.get('end_time'))
+    if start is None or end is None:
+        return None, 'start_time and end_time must be times (HH:MM)'
+    return PlannedRow(row=row_no, subject_id=subject_id, teacher_id=teacher_id, classroom_id=classroom_id,
+                      schedule_slot_id=_int(raw.get('schedule_slot_id')), day_of_week=day,
+                      start_time=start, end_time=end), None
+
+
+def _key(subject_id, teacher_id, classroom_id, day, start, end):
+    return (subject_id, teacher_id, classroom_id, day_key(day), start, end)
+
+
+def _describe(lookup: _Lookup, subject_id, teacher_id, classroom_id, day, start, end) -> dict:
+    subject = lookup.subjects.get(subject_id)
+    teacher = lookup.teachers.get(teacher_id)
+    classroom = lookup.classrooms.get(classroom_id)
+    return {
+        'subject_id': subject_id,
+        'subject_name': subject.name if subject else None,
+        'teacher_id': teacher_id,
+        'teacher_name': (teacher.full_name or teacher.username) if teacher else None,
+        'classroom_id': classroom_id,
+        'classroom_name': classroom.name if classroom else None,
+        'day_of_week': day,
+        'start_time': start,
+        'end_time': end,
+    }
+
+
+def plan_import(db: Session, school_id: int, rows: Iterable[Tuple[int, dict]],
+                mode: str = 'merge', check_slots: bool = True) -> dict:
+    """Validate ``rows`` ((row number, row dict) pairs) and compute the diff; writes nothing.
+
+    The result holds ``create``/``unchanged``/``delete`` lists, per-row ``errors``
+    and ``conflicts``, and ``valid``. The private ``_create``/``_delete`` entries
+    are what ``apply_plan`` writes.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f'mode must be one of {", ".join(IMPORT_MODES)}')
+    lookup = _Lookup(db, school_id)
+    planned, errors = [], []
+    for row_no, raw in rows:
+        row, error = _resolve_row(lookup, row_no, raw)
+        if error:
+            errors.append({'row': row_no, 'error': error})
+        else:
+            planned.append(row)
+
+    existing = db.query(
+        SubjectScheduleModel.id, SubjectScheduleModel.subject_id, SubjectScheduleModel.teacher_id,
+        SubjectScheduleModel.classroom_id, SubjectScheduleModel.day_of_week,
+        SubjectScheduleModel.start_time, SubjectScheduleModel.end_time
+    ).filter(SubjectScheduleModel.subject_id.in_(list(lookup.subjects))).all() if lookup.subjects else []
+    existing_by_key = {}
+    for e in existing:
+        existing_by_key.setdefault(_key(*e[1:]), []).append(e.id)
+
+    create, unchanged = [], []
+    for row in planned:
+        ids = existing_by_key.get(_key(row.subject_id, row.teacher_id, row.classroom_id,
+                                       row.day_of_week, row.start_time, row.end_time))
+        if ids:
+            row.id = ids.pop(0)  # identical assignment already there: keep it
+            unchanged.append({'row': row.row, 'schedule_id': row.id})
+        else:
+            create.append(row)
+
+    delete = []
+    if mode == 'replace':
+        kept = {row.id for row in planned if row.id}
+        classrooms = {row.classroom_id for row in planned if row.classroom_id is not None}
+        delete = [e for e in existing if e.classroom_id in classrooms and e.id not in kept
+                  and e.start_time is not None]
+
+    conflicts, slot_ids = find_conflicts(school_index(db, school_id), planned, check_slots=check_slots,
+                                         ignore=[e.id for e in delete])
+    for row, slot_id in zip(planned, slot_ids):
+        row.schedule_slot_id = slot_id
+    for c in conflicts:
+        c['row'] = planned[c.pop('index')].row
+        other = c.pop('other_index')
+        c['other_row'] = planned[other].row if other is not None else None
+
+    return {
+        'mode': mode,
+        'valid': not errors and not conflicts,
+        'summary': {'rows': len(planned) + len(errors), 'create': len(create),
+                    'unchanged': len(unchanged), 'delete': len(delete)},
+        'create': [{'row': r.row, 'schedule_slot_id': r.schedule_slot_id,
+                    **_describe(lookup, r.subject_id, r.teacher_id, r.classroom_id, r.day_of_week, r.start_time, r.end_time)}
+                   for r in create],
+        'unchanged': unchanged,
+        'delete': [{'schedule_id': e.id, **_describe(lookup, *e[1:])} for e in delete],
+        'errors': errors,
+        'conflicts': conflicts,
+        '_create': create,
+        '_delete': [e.id for e in delete],
+    }
+
+
+def apply_plan(db: Session, plan: dict) -> None:
+    """Write a valid plan in one transaction (deletions first, then all new assignments)."""
+    if not plan['valid']:
+        raise ValueError('Timetable has errors or conflicts')
+    try:
+        if plan['_delete']:
+            for schedule in db.query(SubjectScheduleModel).filter(SubjectScheduleModel.id.in_(plan['_delete'])):
+                db.delete(schedule)
+            db.flush()
+        db.add_all([SubjectScheduleModel(
+            subject_id=r.subject_id,
+            schedule_slot_id=r.schedule_slot_id,
+            teacher_id=r.teacher_id,
+            classroom_id=r.classroom_id,
+            day_of_week=r.day_of_week,
+            start_time=r.start_time,
+            end_time=r.end_time
+        ) for r in plan['_create']])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def public_report(plan: dict, applied: bool, dry_run: bool) -> dict:
+    report = {k: v for k, v in plan.items() if not k.startswith('_')}
+    report['dry_run'] = dry_run
+    report['applied'] = applied
+    return report
@@ -0,0 +1,291 @@
+"""Set-based transcript engine.
+
+Loads grades, subjects, schedules and teachers for a whole set of students with a
+fixed number of queries, then folds them in memory using the same scaling rules
+as the gradebook UI (exam keywords, manual "คะแนนเก็บรวม"/"คะแนนสอบรวม" totals and
+the subject's max_collected_score/max_exam_score).
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models.subject import Subject as SubjectModel
+from models.grade import Grade as GradeModel
+from models.user import User as UserModel
+from models.subject_student import SubjectStudent as SubjectStudentModel
+from models.schedule import SubjectSchedule as SubjectScheduleModel
+
+EXAM_KEYWORDS = ['กลางภาค', 'ปลายภาค', 'final', 'midterm', 'คะแนนสอบ']
+MANUAL_COLLECTED_TITLE = "คะแนนเก็บรวม"
+MANUAL_EXAM_TITLE = "คะแนนสอบรวม"
+ACTIVITY_SUBJECT_NAME = 'กิจกรรม (Activity)'
+
+
+def check_is_exam(title) -> bool:
+    if not title:
+        return False
+    t = title.lower()
+    return any(keyword in t for keyword in EXAM_KEYWORDS)
+
+
+def _empty_activity_breakdown():
+    return {
+        'activity_subjects': [],
+        'total_activity_score': None,
+        'total_activity_percent': 0
+    }
+
+
+def _score_regular_subject(subject, grades):
+    """Fold one subject's grade rows into (total_score, total_max, normalized)."""
+    raw_collected_score = 0.0
+    raw_collected_max = 0.0
+    raw_exam_score = 0.0
+    raw_exam_max = 0.0
+
+    manual_collected = None
+    manual_exam = None
+
+    has_real_collected = False
+    has_real_exam = False
+
+    for g in grades:
+        # Handle manual summary titles
+        if g.title == MANUAL_COLLECTED_TITLE:
+            manual_collected = float(g.grade or 0)
+            continue
+        if g.title == MANUAL_EXAM_TITLE:
+            manual_exam = float(g.grade or 0)
+            continue
+
+        score = float(g.grade or 0)
+        max_s = float(g.max_score or 100)
+
+        if check_is_exam(g.title):
+            has_real_exam = True
+            raw_exam_score += score
+            raw_exam_max += max_s
+        else:
+            has_real_collected = True
+            raw_collected_score += score
+            raw_collected_max += max_s
+
+    # Subject level settings
+    max_c = float(subject.max_collected_score or 100)
+    max_e = float(subject.max_exam_score or 100)
+
+    # Scaling logic for Collected Score
+    if not has_real_collected and manual_collected is not None:
+        final_collected = min(manual_collected, max_c)
+    else:
+        final_collected = (raw_collected_score / raw_collected_max * max_c) if raw_collected_max > 0 else raw_collected_score
+
+    # Scaling logic for Exam Score
+    if not has_real_exam and manual_exam is not None:
+        final_exam = min(manual_exam, max_e)
+    else:
+        final_exam = (raw_exam_score / raw_exam_max * max_e) if raw_exam_max > 0 else raw_exam_score
+
+    total_score = final_collected + final_exam
+    total_max = max_c + max_e
+    normalized = (total_score / total_max * 100) if total_max > 0 else 0
+    return total_score, total_max, normalized
+
+
+def _score_activity_subjects(activity_data, grades_by_subject):
+    """Aggregate one student's activity grades (same rules as calculate_activity_grades)."""
+    activity_subjects = []
+    total_score = 0
+    total_percent = 0
+
+    for subject_id, subject_name, activity_percent in activity_data:
+        grades = grades_by_subject.get(subject_id)
+        if not grades:
+            continue
+
+        valid_grades = [g for g in grades if g.grade is not None and g.max_score]
+        if not valid_grades:
+            continue
+
+        avg_score = sum([g.grade for g in valid_grades]) / len(valid_grades)
+        max_score = valid_grades[0].max_score  # Assume all have same max_score
+
+        # Normalize to 100 scale
+        normalized_score = (avg_score / max_score) * 100 if max_score else 0
+
+        percent = activity_percent or 0
+        contribution = (normalized_score * percent) / 100
+
+        activity_subjects.append({
+            'subject_id': subject_id,
+            'subject_name': subject_name,
+            'raw_score': round(avg_score, 2),
+            'max_score': round(max_score, 2),
+            'normalized_score': round(normalized_score, 2),
+            'percentage': percent,
+            'contribution': round(contribution, 2),
+            'grade_count': len(valid_grades)
+        })
+
+        total_score += contribution
+        total_percent += percent
+
+    return {
+        'activity_subjects': activity_subjects,
+        'total_activity_score': min(round(total_score, 2), 100),  # Cap at 100
+        'total_activity_percent': total_percent
+    }
+
+
+def build_activity_breakdowns(db: Session, student_ids: Iterable[int], classroom_id: Optional[int] = None) -> Dict[int, dict]:
+    """Activity grade breakdown for every student in ``student_ids`` (2 queries)."""
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return {}
+
+    activity_data = db.query(
+        SubjectModel.id,
+        SubjectModel.name,
+        SubjectModel.activity_percentage
+    ).filter(
+        SubjectModel.subject_type == 'activity',
+        SubjectModel.is_ended == False
+    ).all()
+
+    if not activity_data:
+        return {sid: _empty_activity_breakdown() for sid in student_ids}
+
+    grades_query = db.query(GradeModel).filter(
+        GradeModel.student_id.in_(student_ids),
+        GradeModel.subject_id.in_([row[0] for row in activity_data])
+    )
+    if classroom_id:
+        grades_query = grades_query.filter(GradeModel.classroom_id == classroom_id)
+
+    # student_id -> subject_id -> [grades]
+    grades_map = defaultdict(lambda: defaultdict(list))
+    for g in grades_query.order_by(GradeModel.id).all():
+        grades_map[g.student_id][g.subject_id].append(g)
+
+    return {
+        sid: _score_activity_subjects(activity_data, grades_map.get(sid, {}))
+        for sid in student_ids
+    }
+
+
+def build_transcripts(db: Session, student_ids: Iterable[int], classroom_id: Optional[int] = None) -> Dict[int, List[dict]]:
+    """Build transcripts for many students at once.
+
+    Runs a constant number of queries regardless of how many students or subjects
+    are involved: enrollments, grades, schedules (+ teacher names) and the two
+    activity queries. Returns ``{student_id: transcript}`` where each transcript has
+    the same shape as ``GET /grades/student/{id}/transcript``.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return {}
+
+    # 1) Enrolled subjects for every student
+    enrollment_rows = db.query(SubjectStudentModel.student_id, SubjectModel).join(
+        SubjectModel, SubjectModel.id == SubjectStudentModel.subject_id
+    ).filter(
+        SubjectStudentModel.student_id.in_(student_ids)
+    ).order_by(SubjectStudentModel.id).all()
+
+    subjects_by_student = defaultdict(list)
+    regular_subject_ids = set()
+    for sid, subject in enrollment_rows:
+        if subject.subject_type == 'activity':
+            continue
+        subjects_by_student[sid].append(subject)
+        regular_subject_ids.add(subject.id)
+
+    grades_map = defaultdict(lambda: defaultdict(list))
+    teachers_by_subject = defaultdict(list)
+    if regular_subject_ids:
+        # 2) Grades for all (student, subject) pairs
+        grades_query = db.query(GradeModel).filter(
+            GradeModel.student_id.in_(student_ids),
+            GradeModel.subject_id.in_(regular_subject_ids)
+        )
+        # Apply classroom filter if provided (for classroom-specific assignments)
+        if classroom_id:
+            grades_query = grades_query.filter(
+                (GradeModel.classroom_id == classroom_id) | (GradeModel.classroom_id.is_(None))
+            )
+        for g in grades_query.order_by(GradeModel.id).all():
+            grades_map[g.student_id][g.subject_id].append(g)
+
+        # 3) Teachers assigned to these subjects (with is_ended status)
+        schedule_rows = db.query(
+            SubjectScheduleModel, UserModel.full_name, UserModel.username
+        ).outerjoin(
+            UserModel, UserModel.id == SubjectScheduleModel.teacher_id
+        ).filter(
+            SubjectScheduleModel.subject_id.in_(regular_subject_ids)
+        ).order_by(SubjectScheduleModel.id).all()
+        for sched, full_name, username in schedule_rows:
+            teacher_name = (full_name or username) if username is not None else "Unknown"
+            teachers_by_subject[sched.subject_id].append({
+                'id': sched.id,
+                'teacher_id': sched.teacher_id,
+                'teacher_name': teacher_name,
+                'is_ended': sched.is_ended
+            })
+
+    # 4) Activity subjects (uses its own scaling logic to 100)
+    activity_breakdowns = build_activity_breakdowns(db, student_ids, classroom_id)
+
+    transcripts = {}
+    for sid in student_ids:
+        transcript = []
+        student_grades = grades_map.get(sid, {})
+        for subject in subjects_by_student.get(sid, []):
+            grades = student_grades.get(subject.id)
+            if not grades:
+                continue
+            total_score, total_max, normalized = _score_regular_subject(subject, grades)
+            transcript.append({
+                'subject_id': subject.id,
+                'subject_name': subject.name,
+                'subject_type': 'regular',
+                'credits': subject.credits or 0,
+                'score': round(total_score, 2),
+                'max_score': round(total_max, 2),
+                'normalized_score': round(normalized, 2),
+                'teachers': list(teachers_by_subject.get(subject.id, []))
+            })
+
+        activity_breakdown = activity_breakdowns[sid]
+        if activity_breakdown['activity_subjects']:
+            transcript.append({
+                'subject_id': None,
+                'subject_name': ACTIVITY_SUBJECT_NAME,
+                'subject_type': 'activity',
+                'credits': 0,
+                'score': round(activity_breakdown['total_activity_score'], 2),
+                'max_score': 100.0,
+                'breakdown': activity_breakdown['activity_subjects'],
+                'total_percent': round(activity_breakdown['total_activity_percent'], 2)
+            })
+        transcripts[sid] = transcript
+
+    return transcripts
+
+
+def summarize_transcript(transcript: List[dict]) -> dict:
+    """Sum a transcript into the totals used by the ranking endpoints."""
+    total_score = 0.0
+    total_max = 0.0
+    for item in transcript:
+        total_score += float(item.get('score') or 0.0)
+        total_max += float(item.get('max_score') or 0.0)
+
+    # คำนวณเปอร์เซ็นต์เฉลี่ยจากคะแนนรวมทั้งหมด
+    final_percentage = (total_score / total_max * 100) if total_max > 0 else 0.0
+    return {
+        'total_score': round(total_score, 2),
+        'total_max_score': round(total_max, 2),
+        'average_score': round(final_percentage, 2)
+    }
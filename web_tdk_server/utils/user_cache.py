@@ -0,0 +1,110 @@
+"""In-process cache of authenticated users, keyed by the JWT subject (username).
+
+``get_current_user`` would otherwise run ``SELECT ... FROM users WHERE username = ?``
+on every authenticated request. Entries hold a detached copy of the user's column
+values; on a hit the copy is merged into the request's session without a SELECT,
+so endpoints can still modify and commit ``current_user`` as before.
+
+Endpoints that change a user (password, profile, activation, deletion, grade_level,
+including bulk enrollment and promotion) must call ``invalidate_user`` after their
+commit. Other writers are covered by the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "2048"))
+
+
+class UserCache:
+    """Bounded LRU cache with a per-entry TTL and hit/miss counters (thread-safe)."""
+
+    def __init__(self, ttl_seconds: float = USER_CACHE_TTL_SECONDS, max_size: int = USER_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value) -> None:
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+
+user_cache = UserCache()
+
+
+def _detached_copy(user):
+    """Copy the loaded column values of ``user`` into a new detached instance."""
+    mapper = sa_inspect(user).mapper
+    copy = mapper.class_()
+    for attr in mapper.column_attrs:
+        setattr(copy, attr.key, getattr(user, attr.key))
+    # reset attribute history so the copy can be merged with load=False
+    make_transient_to_detached(copy)
+    return copy
+
+
+def get_user_by_username(db: Session, username: str):
+    """Return the user for ``username`` attached to ``db``, using the cache when possible."""
+    # import here to avoid circular import during app startup
+    from models.user import User as UserModel
+
+    cached = user_cache.get(username)
+    if cached is not None:
+        return db.merge(cached, load=False)
+
+    user = db.query(UserModel).filter(UserModel.username == username).first()
+    if user is not None:
+        user_cache.set(username, _detached_copy(user))
+    return user
+
+
+def invalidate_user(*usernames: Optional[str]) -> None:
+    """Drop cached entries for the given usernames (None values are ignored)."""
+    for username in usernames:
+        if username:
+            user_cache.invalidate(username)
@@ -0,0 +1,237 @@
+"""Streaming bulk user import from Excel (.xlsx).
+
+The sheet is read with openpyxl read-only mode, so rows are streamed from the
+file instead of loading the whole workbook. Rows are handled in chunks of
+USER_IMPORT_CHUNK_SIZE. Each chunk costs one query for the usernames/emails that
+already exist, one process-pool hashing batch (utils.hashing) and one
+executemany INSERT.
+"""
+import os
+import shutil
+import tempfile
+from typing import Callable, Optional
+
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database.connection import SessionLocal
+from models.user import User as UserModel
+from utils.hashing import hash_many
+from utils.jobs import update_job
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+REQUIRED_COLUMNS = ['username', 'email', 'full_name', 'password', 'role']
+IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "500"))
+IMPORT_JOB_TYPE = 'user_import'
+
+
+class ImportFileError(ValueError):
+    """The file itself is unusable (not an xlsx, missing columns, no data rows)."""
+
+
+def save_upload(fileobj) -> str:
+    """Spool an upload to a temporary .xlsx file without reading it into memory; returns the path."""
+    fd, path = tempfile.mkstemp(suffix='.xlsx', prefix='user_import_')
+    with os.fdopen(fd, 'wb') as out:
+        shutil.copyfileobj(fileobj, out, 1024 * 1024)
+    return path
+
+
+def _open_sheet(path: str):
+    if openpyxl is None:
+        raise ImportFileError('Server missing openpyxl dependency')
+    try:
+        # data_only=True reads calculated formula values instead of formula strings
+        wb = openpyxl.load_workbook(filename=path, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f'Failed to read Excel file: {str(e)}')
+    ws = wb.active
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    header = [str(h).strip().lower() if h is not None else '' for h in (header or ())]
+    idx = {name: i for i, name in enumerate(header)}
+    for col in REQUIRED_COLUMNS:
+        if col not in idx:
+            wb.close()
+            raise ImportFileError(f'ขาดคอลัมน์ที่จำเป็น: {col}')
+    # max_row comes from the sheet's dimension tag; it is only an estimate in read-only mode
+    total = ws.max_row - 1 if ws.max_row else None
+    return wb, idx, rows, total
+
+
+def check_file(path: str) -> Optional[int]:
+    """Validate the header row; returns the estimated number of data rows."""
+    wb, _, _, total = _open_sheet(path)
+    wb.close()
+    return total
+
+
+def _cell(row, idx, name):
+    i = idx.get(name)
+    if i is None or i >= len(row) or row[i] is None:
+        return None
+    return row[i]
+
+
+def _parse_row(row, idx, default_school_id) -> dict:
+    username = str(_cell(row, idx, 'username') or '').strip()
+    email = str(_cell(row, idx, 'email') or '').strip()
+    password = str(_cell(row, idx, 'password') or '').strip()
+    role = str(_cell(row, idx, 'role') or '').strip()
+    if not username or not password or role not in ('teacher', 'student'):
+        raise ValueError('ข้อมูลไม่ถูกต้อง - ชื่อผู้ใช้, รหัสผ่าน หายไป หรือบทบาทไม่ถูกต้อง')
+    school_id = None
+    if _cell(row, idx, 'school_id') is not None:
+        try:
+            school_id = int(_cell(row, idx, 'school_id'))
+        except Exception:
+            school_id = None
+    grade_level = _cell(row, idx, 'grade_level')
+    return {
+        'username': username,
+        'email': email or None,
+        'full_name': str(_cell(row, idx, 'full_name') or '').strip(),
+        'password': password,
+        'role': role,
+        # default school_id to the importing admin's school if not provided
+        'school_id': school_id if school_id is not None else default_school_id,
+        'grade_level': str(grade_level).strip() if grade_level is not None else None,
+    }
+
+
+class _ChunkWriter:
+    """Validates uniqueness and inserts one chunk of parsed rows at a time."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.created = []
+        self.errors = []
+        # names already used earlier in this file
+        self.seen_usernames = set()
+        self.seen_emails = set()
+
+    def flush(self, chunk):
+        if not chunk:
+            return
+        usernames = [rec['username'] for _, rec in chunk]
+        emails = [rec['email'] for _, rec in chunk if rec['email']]
+        condition = UserModel.username.in_(usernames)
+        if emails:
+            condition = or_(condition, UserModel.email.in_(emails))
+        taken_usernames, taken_emails = set(), set()
+        for username, email in self.db.query(UserModel.username, UserModel.email).filter(condition):
+            taken_usernames.add(username)
+            if email:
+                taken_emails.add(email)
+
+        valid = []
+        for row_no, rec in chunk:
+            if rec['username'] in taken_usernames or rec['username'] in self.seen_usernames:
+                self._error(row_no, rec, f'ชื่อผู้ใช้ "{rec["username"]}" นี้มีการใช้งานแล้ว')
+                continue
+            if rec['email'] and (rec['email'] in taken_emails or rec['email'] in self.seen_emails):
+                self._error(row_no, rec, f'อีเมล "{rec["email"]}" นี้มีการใช้งานแล้ว')
+                continue
+            self.seen_usernames.add(rec['username'])
+            if rec['email']:
+                self.seen_emails.add(rec['email'])
+            valid.append((row_no, rec))
+        if not valid:
+            return
+
+        hashes = hash_many([rec.pop('password') for _, rec in valid])
+        for (_, rec), hashed in zip(valid, hashes):
+            rec['hashed_password'] = hashed
+        inserted = self._insert(valid)
+        ids = dict(
+            self.db.query(UserModel.username, UserModel.id)
+            .filter(UserModel.username.in_([rec['username'] for _, rec in inserted]))
+            .all()
+        ) if inserted else {}
+        for row_no, rec in inserted:
+            self.created.append({'row': row_no, 'username': rec['username'], 'id': ids.get(rec['username'])})
+
+    def _insert(self, valid):
+        try:
+            self.db.execute(insert(UserModel), [rec for _, rec in valid])
+            self.db.commit()
+            return valid
+        except IntegrityError:
+            self.db.rollback()
+        # someone else took a name meanwhile (or the collation is case-insensitive): retry row by row
+        inserted = []
+        for row_no, rec in valid:
+            try:
+                self.db.execute(insert(UserModel), [rec])
+                self.db.commit()
+                inserted.append((row_no, rec))
+            except IntegrityError:
+                self.db.rollback()
+                self._error(row_no, rec, f'ชื่อผู้ใช้ "{rec["username"]}" หรืออีเมลนี้มีการใช้งานแล้ว')
+        return inserted
+
+    def _error(self, row_no, rec, message):
+        self.errors.append({'row': row_no, 'username': rec.get('username') if rec else None, 'error': message})
+
+
+def import_users(db: Session, path: str, default_school_id: Optional[int] = None,
+                 progress: Optional[Callable] = None, chunk_size: Optional[int] = None) -> dict:
+    """Create users from the .xlsx at ``path``; valid rows are committed chunk by chunk.
+
+    ``progress(total=, processed=, succeeded=, failed=)`` is called after every chunk.
+    Raises ImportFileError for an unusable file. Returns created rows and per-row errors.
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    wb, idx, rows, total = _open_sheet(path)
+    writer = _ChunkWriter(db)
+    processed = 0
+    try:
+        chunk = []
+        for row_no, row in enumerate(rows, start=2):
+            # read-only sheets may report formatted but empty trailing rows
+            if not row or all(v is None or str(v).strip() == '' for v in row):
+                continue
+            processed += 1
+            try:
+                chunk.append((row_no, _parse_row(row, idx, default_school_id)))
+            except ValueError as e:
+                writer._error(row_no, None, str(e))
+            if len(chunk) >= chunk_size:
+                writer.flush(chunk)
+                chunk = []
+                if progress:
+                    progress(total=total, processed=processed, succeeded=len(writer.created), failed=len(writer.errors))
+        writer.flush(chunk)
+    finally:
+        wb.close()
+
+    if processed == 0:
+        raise ImportFileError('Excel file must contain a header row and at least one data row')
+    writer.errors.sort(key=lambda e: e['row'])
+    if progress:
+        progress(total=processed, processed=processed, succeeded=len(writer.created), failed=len(writer.errors))
+    return {'created_count': len(writer.created), 'created': writer.created, 'errors': writer.errors}
+
+
+def run_user_import_job(job_id: int, path: str, default_school_id: Optional[int] = None):
+    """Background job body: import ``path`` and record progress, summary and the per-row error report."""
+    update_job(job_id, status='running')
+    db = SessionLocal()
+    try:
+        summary = import_users(db, path, default_school_id, progress=lambda **counts: update_job(job_id, **counts))
+        update_job(job_id, status='completed', errors=summary['errors'],
+                   result={'created_count': summary['created_count'], 'error_count': len(summary['errors'])})
+    except Exception as e:
+        db.rollback()
+        update_job(job_id, status='failed', message=str(e))
+    finally:
+        db.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass